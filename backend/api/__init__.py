@@ -4,5 +4,9 @@ API模块初始化
 """
 from .detection import detection_bp
 from .health import health_bp
+from .stream import stream_bp
+from .ingest import ingest_bp
+from .metrics import metrics_bp
+from .profile import profile_bp
 
-__all__ = ['detection_bp', 'health_bp']
\ No newline at end of file
+__all__ = ['detection_bp', 'health_bp', 'stream_bp', 'ingest_bp', 'metrics_bp', 'profile_bp']
\ No newline at end of file
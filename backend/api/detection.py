@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from datetime import datetime
 import logging
 import numpy as np
@@ -8,7 +8,14 @@ from pathlib import Path
 
 from models.yolo_detector import YOLODetector
 from models.fall_detector import FallDetector
+from models.stream_session import StreamSessionManager, DEFAULT_STREAM_ID, DEFAULT_IMAGE_STREAM_ID
 from utils.image_processor import ImageProcessor
+from utils.binary_protocol import pack_detection_result, BINARY_RESULT_MIMETYPE
+from utils.serialization import serialize, msgpack_available, JSON_MIMETYPE, MSGPACK_MIMETYPES
+from utils.metrics import timed
+from utils.frame_pool import FrameBufferPool
+from utils.dataset_index import STATUS_LABELED, STATUS_UNLABELED
+from utils.fall_archiver import annotation_objects
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +25,14 @@ detection_bp = Blueprint('detection', __name__)
 # 全局检测器实例（在app.py中初始化）
 yolo_detector = None
 fall_detector = None
+batch_engine = None
+session_manager = None
+archiver = None
+event_capture = None
+dataset_index = None
+frame_pool = FrameBufferPool()
+# 视频帧请求未指定 frame_skip 时是否复用关键帧结果
+frame_skip_default = False
 
 # 新增：跌倒图片保存路径
 FALL_IMAGES_DIR = "fall_training_data"
@@ -25,47 +40,535 @@ Path(FALL_IMAGES_DIR).mkdir(parents=True, exist_ok=True)
 Path(os.path.join(FALL_IMAGES_DIR, "unlabeled")).mkdir(parents=True, exist_ok=True)
 Path(os.path.join(FALL_IMAGES_DIR, "labeled")).mkdir(parents=True, exist_ok=True)
 
-def init_detectors(yolo_det, fall_det):
-    """初始化检测器"""
-    global yolo_detector, fall_detector
+def init_detectors(
+    yolo_det, fall_det, batch_eng=None, session_mgr=None, fall_archiver=None, fall_event_capture=None,
+    sample_index=None, frame_buffer_pool=None, frame_skip_enabled=False
+):
+    """
+    初始化检测器
+
+    Args:
+        yolo_det: YOLO检测器
+        fall_det: 跌倒检测器（作为各路流FallDetector的配置模板）
+        batch_eng: 批处理推理引擎，可为None
+        session_mgr: 流会话管理器，None时按fall_det的配置创建（不启用跟踪）
+        fall_archiver: 跌倒图片异步归档写入器，None时在请求线程中同步保存
+        fall_event_capture: 事件级跌倒采集器，None时视频帧逐帧保存跌倒图片
+        sample_index: 跌倒训练数据集索引，None时标注接口直接操作目录
+        frame_buffer_pool: 结果帧输出缓冲池，None时使用默认配置的缓冲池
+        frame_skip_enabled: 视频帧请求未指定 frame_skip 时是否复用关键帧结果
+    """
+    global yolo_detector, fall_detector, batch_engine, session_manager, archiver, event_capture, dataset_index
+    global frame_pool, frame_skip_default
     yolo_detector = yolo_det
     fall_detector = fall_det
+    batch_engine = batch_eng
+    archiver = fall_archiver
+    event_capture = fall_event_capture
+    dataset_index = sample_index
+    frame_pool = frame_buffer_pool or FrameBufferPool()
+    frame_skip_default = frame_skip_enabled
+    session_manager = session_mgr or StreamSessionManager(
+        lambda: FallDetector(**fall_det.get_config())
+    )
 
-def convert_numpy_types(obj):
-    """递归将numpy类型转换为Python原生类型"""
-    if isinstance(obj, (np.float32, np.float64, np.floating)):
-        return float(obj)
-    elif isinstance(obj, (np.int32, np.int64, np.integer)):
-        return int(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()  # 将numpy数组转换为Python列表
-    elif isinstance(obj, dict):
-        return {k: convert_numpy_types(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    else:
-        return obj  # 其他类型保持不变
+def get_stream_id(data=None):
+    """
+    获取请求所属的流ID
+
+    依次读取请求体中的 stream_id、请求头 X-Stream-ID、查询参数 stream_id，
+    都未提供时返回None（使用默认流）。
+    经多进程服务（serve.py）访问时只有请求头与查询参数参与worker路由，客户端应总是携带请求头。
+    """
+    if data and data.get('stream_id'):
+        return str(data['stream_id'])
+    return request.headers.get('X-Stream-ID') or request.args.get('stream_id')
+
+def score_detections(session, detections, track=False):
+    """
+    对检测结果执行（可选的）跟踪与跌倒判断，同一路流的帧串行更新状态
+
+    Args:
+        session: 流会话
+        detections: 检测结果列表（启用跟踪时其 'id' 会被替换为跟踪ID）
+        track: 是否执行多目标跟踪
+
+    Returns:
+        与detections对应的 (is_fall, fall_score, details) 列表
+    """
+    with session.lock:
+        # 多目标跟踪：分配跨帧稳定的ID，并清理已消失目标的历史记录
+        if track and session.tracker is not None:
+            with timed('track'):
+                detections, removed_ids = session.tracker.update(detections)
+                for track_id in removed_ids:
+                    session.remove_track(track_id)
+        
+        if not detections:
+            return []
+        
+        # 一帧内所有人的跌倒分数向量化批量计算
+        with timed('score'):
+            keypoints = np.stack([detection['keypoints_array'] for detection in detections])
+            return session.fall_detector.detect_batch(
+                keypoints, [detection['id'] for detection in detections]
+            )
+
+def run_pose_detection(image, regions=None):
+    """
+    执行姿态检测：启用批处理引擎时与其他请求合批推理
+
+    指定regions时只对这些区域裁剪推理（各区域已在一次前向中批量处理，不再经过批处理引擎，
+    与批处理引擎的推理由YOLODetector内部的推理锁串行执行）。
+    计入detect阶段的耗时包含批处理引擎中的排队等待。
+    """
+    with timed('detect'):
+        if regions is not None:
+            return yolo_detector.detect(image, regions=regions)
+        if batch_engine is not None:
+            return batch_engine.detect(image)
+        return yolo_detector.detect(image)
+
+def response_format():
+    """
+    按Accept请求头协商结果格式
+
+    客户端对MessagePack的偏好高于JSON且服务端已安装msgpack时返回'msgpack'，
+    其余情况（包括 */* 与未携带Accept）返回'json'。
+    """
+    if not msgpack_available():
+        return 'json'
+    accept = request.accept_mimetypes
+    msgpack_quality = max(accept[mimetype] for mimetype in MSGPACK_MIMETYPES)
+    return 'msgpack' if msgpack_quality > accept[JSON_MIMETYPE] else 'json'
+
+def result_response(payload, status=200):
+    """
+    序列化结果并构建响应
+
+    结果中的numpy数组（边界框、关键点）与numpy标量由编码器直接处理，无需事先递归转换。
+    """
+    with timed('serialize'):
+        body, mimetype = serialize(payload, response_format())
+    return Response(body, status=status, mimetype=mimetype)
 
 # 新增：保存跌倒图片
-def save_fall_image(image, detection_id, details):
-    """保存检测到跌倒的图片用于后续训练"""
+def save_fall_image(image, detection_id, details, stream_id=None, objects=None):
+    """
+    保存检测到跌倒的图片用于后续训练
+
+    启用归档写入器时只入队，由后台线程完成编码与写盘；调用方之后不能再修改image，
+    绘制结果时需传入 retained=True（见 render_detections）。
+
+    Args:
+        image: 原始BGR图像
+        detection_id: 用于生成文件名的标识
+        details: 跌倒详情
+        stream_id: 流ID，同一路流尚未写盘的图片会被合并为最新一张
+        objects: 画面中所有目标的几何信息（原图坐标系下的边界框、关键点与是否跌倒，
+                 见 annotation_objects），用于导出训练标签
+
+    Returns:
+        图片保存路径
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    filename = f"fall_{detection_id}_{timestamp}.jpg"
-    filepath = os.path.join(FALL_IMAGES_DIR, "unlabeled", filename)
+    basename = f"fall_{detection_id}_{timestamp}"
+    filepath = os.path.join(FALL_IMAGES_DIR, "unlabeled", f"{basename}.jpg")
+    metadata = {}
+    if stream_id:
+        metadata['stream_id'] = stream_id
+    if objects:
+        metadata['image_size'] = [int(image.shape[1]), int(image.shape[0])]
+        metadata['objects'] = objects
+    metadata = metadata or None
     
-    # 保存原始图片
-    cv2.imwrite(filepath, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    if archiver is not None:
+        archiver.submit(image, basename, details, key=stream_id, metadata=metadata)
+        return filepath
+    
+    # 保存原始图片（解码得到的已是BGR图像，无需颜色转换）
+    cv2.imwrite(filepath, image)
     
     # 保存标注信息
-    label_filename = f"fall_{detection_id}_{timestamp}.txt"
-    label_filepath = os.path.join(FALL_IMAGES_DIR, "unlabeled", label_filename)
+    label_filepath = os.path.join(FALL_IMAGES_DIR, "unlabeled", f"{basename}.txt")
     with open(label_filepath, "w") as f:
         f.write(f"Timestamp: {datetime.now().isoformat()}\n")
         f.write(f"Details: {str(details)}\n")
     
+    if dataset_index is not None:
+        dataset_index.add_sample(f"{basename}.jpg", details, metadata)
+    
     logger.info(f"已保存跌倒图片: {filepath}")
     return filepath
 
+def parse_flag(value, default=None):
+    """
+    解析开关类请求参数
+
+    Args:
+        value: 请求中的参数（bool、字符串或None）
+        default: 未提供时的默认值
+
+    Returns:
+        开关值，未提供时为default
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('0', 'false', 'no', 'off')
+
+def parse_render_flag(value, default=True):
+    """
+    解析是否需要服务端绘制结果图像的请求参数
+
+    Args:
+        value: 请求中的render参数（bool、字符串或None）
+        default: 未提供时的默认值
+
+    Returns:
+        是否绘制结果图像
+    """
+    return parse_flag(value, default)
+
+def detection_geometry(detection):
+    """提取检测结果中的几何信息（边界框与关键点），供前端自行绘制"""
+    return {
+        'bbox': detection['bbox'],
+        'keypoints': detection['keypoints']
+    }
+
+def analyze_image(image, render=True, stream_id=None):
+    """
+    图片检测流程：YOLO检测 + 跌倒判断 + 绘制结果
+
+    Args:
+        image: 解码后的图像
+        render: 是否绘制结果图像；为False时只返回检测结果（含关键点），
+                跳过绘制、水印与编码，由前端在画布上叠加显示
+        stream_id: 流ID，决定使用哪一路的跌倒检测状态；None时使用图片专用的默认流，
+                   不与视频帧的默认流共享状态
+
+    Returns:
+        (响应数据字典（不含结果图像）, 标注后的结果图像或None)
+    """
+    # 调整图像大小（原始图像不会被修改，检测到跌倒时直接用于归档，无需预先拷贝）
+    original_image = image
+    with timed('resize'):
+        image = ImageProcessor.resize_image(image)
+    
+    # YOLO检测
+    detections = run_pose_detection(image)
+    logger.info(f"YOLO检测到 {len(detections)} 个人体")
+    
+    # 跌倒检测
+    fall_detected = False
+    fall_results = []
+    is_fall_list = []
+    fall_scores = []
+    fall_details = []  # 新增：保存跌倒详情
+    scale_x = original_image.shape[1] / image.shape[1]
+    scale_y = original_image.shape[0] / image.shape[0]
+    
+    session = session_manager.get(stream_id or DEFAULT_IMAGE_STREAM_ID)
+    scores = score_detections(session, detections)
+    
+    for detection, (is_fall, fall_score, details) in zip(detections, scores):
+        
+        if is_fall:
+            fall_detected = True
+            fall_details.append({
+                'id': detection['id'],
+                'details': details
+            })
+        
+        is_fall_list.append(is_fall)
+        fall_scores.append(fall_score)
+        
+        result = {
+            'id': detection['id'],
+            'bbox': detection['bbox'],
+            'is_fall': is_fall,
+            'fall_score': float(fall_score),
+            # 转换置信度为Python float
+            'confidence': float(detection['confidence']),
+            'details': details
+        }
+        if not render:
+            result['keypoints'] = detection['keypoints']
+        fall_results.append(result)
+    
+    # 新增：如果检测到跌倒，保存图片
+    if fall_detected:
+        # 单张图片彼此独立，不参与按流合并
+        with timed('save'):
+            objects = annotation_objects(detections, is_fall_list, scale_x, scale_y)
+            save_fall_image(original_image, id(original_image), fall_details, objects=objects)
+    
+    result_image = None
+    if render:
+        # 绘制检测结果并添加水印（未缩放的原图已交给归档队列时改在输出缓冲上绘制）
+        retained = fall_detected and archiver is not None and image is original_image
+        result_image = render_detections(
+            image, detections, is_fall_list, fall_scores, retained=retained, watermark=True
+        )
+    
+    response = {
+        'success': True,
+        'fall_detected': fall_detected,
+        'detection_count': len(detections),
+        'detections': fall_results,
+        'image_size': [image.shape[1], image.shape[0]],
+        'stream_id': session.stream_id,
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    logger.info(f"检测完成 - 跌倒: {fall_detected}, 人数: {len(detections)}")
+    
+    return response, result_image
+
+def summarize_frame(session, frame, detections, scores, keyframe=True, render=True):
+    """
+    汇总一帧的检测结果：事件采集/跌倒图片归档 + 组装响应 + （可选）绘制结果帧
+
+    Args:
+        session: 流会话
+        frame: 视频帧
+        detections: 检测结果（已跟踪）
+        scores: 与detections对应的 (is_fall, fall_score, details)
+        keyframe: 是否为实际推理的关键帧，只有关键帧参与事件采集与归档
+        render: 是否绘制结果帧
+
+    Returns:
+        (响应数据字典, 标注后的结果帧或None)
+    """
+    # 跌倒检测
+    fall_detected = False
+    fall_results = []
+    is_fall_list = []
+    fall_scores = []
+    fall_details = []  # 新增：保存跌倒详情
+    
+    # 连续的跌倒帧归并为事件，只归档关键帧
+    fall_events = {}
+    if event_capture is not None and keyframe:
+        with timed('save'):
+            fall_events = event_capture.process(session.stream_id, frame, detections, scores)
+    
+    for detection, (is_fall, fall_score, details) in zip(detections, scores):
+        
+        if is_fall:
+            fall_detected = True
+            fall_details.append({
+                'id': detection['id'],
+                'details': details
+            })
+        
+        is_fall_list.append(is_fall)
+        fall_scores.append(fall_score)
+        
+        result = {
+            'id': detection['id'],
+            'is_fall': is_fall,
+            'fall_score': float(fall_score),
+            # 转换置信度为Python float
+            'confidence': float(detection['confidence'])
+        }
+        if detection['id'] in fall_events:
+            result['fall_event_id'] = fall_events[detection['id']]
+        if not render:
+            result.update(detection_geometry(detection))
+        fall_results.append(result)
+    
+    # 新增：如果检测到跌倒，保存帧图像（未启用事件采集时逐帧保存；复用结果的帧不保存）
+    if fall_detected and keyframe and event_capture is None:
+        with timed('save'):
+            objects = annotation_objects(detections, is_fall_list)
+            save_fall_image(frame, id(frame), fall_details, session.stream_id, objects)
+    
+    with session.lock:
+        session.record_frame(keyframe, fall_detected)
+    
+    result_frame = None
+    if render:
+        # 绘制检测结果（帧已交给归档队列或仍被事件采集引用时改在输出缓冲上绘制）
+        if event_capture is not None:
+            retained = event_capture.retains_frames(session.stream_id)
+        else:
+            retained = fall_detected and keyframe and archiver is not None
+        result_frame = render_detections(frame, detections, is_fall_list, fall_scores, retained=retained)
+    
+    response = {
+        'success': True,
+        'fall_detected': fall_detected,
+        'detection_count': len(detections),
+        'detections': fall_results,
+        'image_size': [frame.shape[1], frame.shape[0]],
+        'stream_id': session.stream_id,
+        'keyframe': keyframe,
+        # 复用上一关键帧的检测结果（本帧未推理，跌倒历史也未前进）
+        'reused': not keyframe,
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    return response, result_frame
+
+def analyze_frame(frame, render=True, stream_id=None, frame_skip=None):
+    """
+    视频帧检测流程：YOLO检测 + 多目标跟踪 + 跌倒判断 + 绘制结果
+
+    Args:
+        frame: 解码后的视频帧
+        render: 是否绘制结果帧；为False时返回边界框、关键点与跌倒分数，
+                跳过服务端绘制与JPEG编码
+        stream_id: 流ID，每路流拥有独立的跟踪与跌倒检测状态
+        frame_skip: 画面静止时是否复用上一关键帧的检测结果（响应带 reused: true），
+                    None时使用服务配置的默认值
+
+    Returns:
+        (响应数据字典（不含结果帧）, 标注后的结果帧或None)
+    """
+    session = session_manager.get(stream_id)
+    if frame_skip is None:
+        frame_skip = frame_skip_default
+    
+    # 关键帧调度：画面静止时复用上一关键帧的结果，跳过推理
+    keyframe, thumbnail, schedule_reason = True, None, None
+    if session.scheduler is not None:
+        if frame_skip:
+            keyframe, thumbnail, schedule_reason = session.scheduler.schedule(frame)
+        else:
+            # 本帧逐帧推理；之后的请求开启复用时从新的关键帧开始，不会复用更早的结果
+            session.scheduler.reset()
+    
+    roi_reason = None
+    if keyframe:
+        # ROI裁剪推理：只对上一帧跟踪到的目标与运动区域做姿态估计，定期全画面推理
+        regions = None
+        if session.roi_planner is not None:
+            regions, roi_reason = session.roi_planner.plan(frame)
+        
+        # YOLO检测
+        detections = run_pose_detection(frame, regions)
+        scores = score_detections(session, detections, track=True)
+        if session.roi_planner is not None:
+            if session.tracker is not None:
+                session.roi_planner.update([track['bbox'] for track in session.tracker.get_tracks()])
+            else:
+                session.roi_planner.update([detection['bbox'] for detection in detections])
+        if thumbnail is not None:
+            session.scheduler.update(frame.shape, thumbnail, detections, scores)
+    else:
+        detections, scores = session.scheduler.last_result()
+    
+    response, result_frame = summarize_frame(session, frame, detections, scores, keyframe, render)
+    if schedule_reason is not None:
+        response['schedule_reason'] = schedule_reason
+    if roi_reason is not None:
+        response['roi_reason'] = roi_reason
+    
+    return response, result_frame
+
+def read_binary_image(field_name):
+    """
+    从multipart/form-data或原始二进制请求体中读取并解码图像
+
+    Args:
+        field_name: multipart表单中的文件字段名
+
+    Returns:
+        (图像数组, 错误信息)，成功时错误信息为None
+    """
+    if request.files:
+        upload = request.files.get(field_name) or next(iter(request.files.values()))
+        image_bytes = upload.read()
+    else:
+        # application/octet-stream 或 image/jpeg 请求体
+        image_bytes = request.get_data(cache=False)
+    
+    if not image_bytes:
+        return None, '缺少图像数据'
+    
+    with timed('decode'):
+        image = ImageProcessor.bytes_to_image(image_bytes)
+    if image is None:
+        return None, '图像解码失败'
+    
+    return image, None
+
+def render_detections(frame, detections, is_fall_list, fall_scores, retained=False, watermark=False):
+    """
+    绘制检测结果（可选添加水印）
+
+    帧不再被其他组件引用时直接在帧上绘制，省去一次整帧拷贝；仍被引用时（已交给归档队列，
+    或作为跌倒事件的关键帧/片段帧）从缓冲池借出同尺寸的输出缓冲，编码后由 encode_result_image 归还。
+
+    Args:
+        frame: 解码后的帧，retained为False时会被直接修改
+        detections: 检测结果
+        is_fall_list: 是否跌倒列表
+        fall_scores: 跌倒分数列表
+        retained: 帧是否仍被其他组件引用
+        watermark: 是否添加水印
+
+    Returns:
+        标注后的结果帧
+    """
+    out = frame_pool.acquire(frame) if retained else frame
+    with timed('draw'):
+        result = yolo_detector.draw_detections(frame, detections, is_fall_list, fall_scores, out=out)
+        if watermark:
+            result = ImageProcessor.add_watermark(result, in_place=True)
+    return result
+
+def encode_result_image(image, quality=85, as_base64=False):
+    """
+    编码结果帧，完成后把借出的输出缓冲归还缓冲池
+
+    Args:
+        image: render_detections 返回的结果帧
+        quality: JPEG质量
+        as_base64: 是否编码为base64数据URL
+
+    Returns:
+        JPEG字节或base64字符串，编码失败时返回None
+    """
+    try:
+        with timed('encode'):
+            if as_base64:
+                return ImageProcessor.image_to_base64(image, quality=quality)
+            return ImageProcessor.image_to_bytes(image, quality=quality)
+    finally:
+        frame_pool.release(image)
+
+def binary_response(result, image, quality):
+    """
+    构建二进制响应：检测结果JSON与JPEG结果图像打包在同一个响应体中
+
+    Args:
+        result: 检测结果字典
+        image: 结果图像，为None时（仅结果模式）只返回检测结果
+        quality: JPEG质量
+
+    Returns:
+        Flask响应对象
+    """
+    if image is None:
+        with timed('serialize'):
+            body = pack_detection_result(result)
+        return Response(body, mimetype=BINARY_RESULT_MIMETYPE)
+    
+    image_bytes = encode_result_image(image, quality=quality)
+    if image_bytes is None:
+        return jsonify({
+            'success': False,
+            'error': '结果图像编码失败'
+        }), 500
+    
+    with timed('serialize'):
+        body = pack_detection_result(result, image_bytes)
+    return Response(body, mimetype=BINARY_RESULT_MIMETYPE)
+
 @detection_bp.route('/detect_image', methods=['POST'])
 def detect_image():
     """
@@ -73,7 +576,9 @@ def detect_image():
     
     请求体:
         {
-            "image": "data:image/jpeg;base64,..."
+            "image": "data:image/jpeg;base64,...",
+            "render": true,  // 可选，false时仅返回检测结果（含关键点），不返回result_image
+            "stream_id": "camera-1"  // 可选，也可用X-Stream-ID请求头
         }
     
     响应:
@@ -98,68 +603,21 @@ def detect_image():
         logger.info("收到图片检测请求")
         
         # 解码图像
-        image = ImageProcessor.base64_to_image(image_data)
+        with timed('decode'):
+            image = ImageProcessor.base64_to_image(image_data)
         if image is None:
             return jsonify({
                 'success': False,
                 'error': '图像解码失败'
             }), 400
         
-        # 调整图像大小
-        original_image = image.copy()  # 新增：保存原始图像用于可能的跌倒图片保存
-        image = ImageProcessor.resize_image(image)
-        
-        # YOLO检测
-        detections = yolo_detector.detect(image)
-        logger.info(f"YOLO检测到 {len(detections)} 个人体")
-        
-        # 跌倒检测
-        fall_detected = False
-        fall_results = []
-        is_fall_list = []
-        fall_scores = []
-        fall_details = []  # 新增：保存跌倒详情
-        
-        for detection in detections:
-            keypoints = detection['keypoints_array']
-            is_fall, fall_score, details = fall_detector.detect(keypoints, detection['id'])
-            
-            if is_fall:
-                fall_detected = True
-                fall_details.append({
-                    'id': detection['id'],
-                    'details': details
-                })
-            
-            is_fall_list.append(is_fall)
-            fall_scores.append(fall_score)
-            
-            fall_results.append({
-                'id': detection['id'],
-                # 将bbox的numpy数组转为Python列表并确保元素为float
-                'bbox': [float(coord) for coord in detection['bbox']],
-                'is_fall': is_fall,
-                'fall_score': float(fall_score),
-                # 转换置信度为Python float
-                'confidence': float(detection['confidence']),
-                # 递归处理details中的numpy类型
-                'details': convert_numpy_types(details)
-            })
-        
-        # 新增：如果检测到跌倒，保存图片
-        if fall_detected:
-            save_fall_image(original_image, id(original_image), fall_details)
-        
-        # 绘制检测结果
-        result_image = yolo_detector.draw_detections(
-            image, detections, is_fall_list, fall_scores
-        )
-        
-        # 添加水印
-        result_image = ImageProcessor.add_watermark(result_image)
+        render = parse_render_flag(data.get('render'))
+        response, result_image = analyze_image(image, render=render, stream_id=get_stream_id(data))
+        if not render:
+            return result_response(response)
         
         # 编码结果图像
-        result_image_base64 = ImageProcessor.image_to_base64(result_image)
+        result_image_base64 = encode_result_image(result_image, as_base64=True)
         
         if result_image_base64 is None:
             return jsonify({
@@ -167,20 +625,9 @@ def detect_image():
                 'error': '结果图像编码失败'
             }), 500
         
-        # 构建响应
-        response = {
-            'success': True,
-            'fall_detected': fall_detected,
-            'detection_count': len(detections),
-            'detections': fall_results,
-            'result_image': result_image_base64,
-            'timestamp': datetime.now().isoformat()
-        }
+        response['result_image'] = result_image_base64
         
-        logger.info(f"检测完成 - 跌倒: {fall_detected}, 人数: {len(detections)}")
-        
-        # 对响应进行类型转换后再序列化
-        return jsonify(convert_numpy_types(response))
+        return result_response(response)
         
     except Exception as e:
         logger.error(f"图片检测失败: {str(e)}", exc_info=True)
@@ -189,6 +636,39 @@ def detect_image():
             'error': f'服务器错误: {str(e)}'
         }), 500
 
+@detection_bp.route('/detect_image_raw', methods=['POST'])
+def detect_image_raw():
+    """
+    图片检测接口（二进制版本）
+    
+    请求体:
+        multipart/form-data（文件字段 image）或 application/octet-stream 的JPEG数据
+        查询参数 render=0 时仅返回检测结果，不附带结果图像
+    
+    响应:
+        application/x-fall-detection 二进制结果：
+        [4字节大端JSON长度][检测结果JSON][JPEG结果图像]
+    """
+    try:
+        logger.info("收到二进制图片检测请求")
+        image, error = read_binary_image('image')
+        if image is None:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
+        render = parse_render_flag(request.args.get('render'))
+        response, result_image = analyze_image(image, render=render, stream_id=get_stream_id())
+        return binary_response(response, result_image, quality=85)
+        
+    except Exception as e:
+        logger.error(f"二进制图片检测失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'服务器错误: {str(e)}'
+        }), 500
+
 @detection_bp.route('/detect_video', methods=['POST'])
 def detect_video():
     """
@@ -196,15 +676,23 @@ def detect_video():
     
     请求体:
         {
-            "frame": "data:image/jpeg;base64,..."
+            "frame": "data:image/jpeg;base64,...",
+            "render": true,  // 可选，false时仅返回边界框、关键点和跌倒分数，不返回result_frame
+            "stream_id": "camera-1",  // 可选，每路流独立维护跟踪与跌倒状态，也可用X-Stream-ID请求头
+            "frame_skip": true  // 可选，画面静止时复用上一关键帧的检测结果，默认按服务配置（FRAME_SKIP_ENABLED）
         }
     
+    请求头:
+        X-Stream-ID: camera-1  // 经多进程服务（serve.py）访问时必需，同一路流的请求才会分配到同一个worker
+    
     响应:
         {
             "success": true,
             "fall_detected": false,
             "detections": [...],
             "result_frame": "data:image/jpeg;base64,...",
+            "keyframe": true,
+            "reused": false,  // true表示本帧未推理，复用了上一关键帧的检测结果
             "timestamp": "2025-10-01T10:30:45.123456"
         }
     """
@@ -220,57 +708,23 @@ def detect_video():
         frame_data = data.get('frame', '')
         
         # 解码图像
-        frame = ImageProcessor.base64_to_image(frame_data)
-        original_frame = frame.copy()  # 新增：保存原始帧用于可能的跌倒图片保存
+        with timed('decode'):
+            frame = ImageProcessor.base64_to_image(frame_data)
         if frame is None:
             return jsonify({
                 'success': False,
                 'error': '帧解码失败'
             }), 400
         
-        # YOLO检测
-        detections = yolo_detector.detect(frame)
-        
-        # 跌倒检测
-        fall_detected = False
-        fall_results = []
-        is_fall_list = []
-        fall_scores = []
-        fall_details = []  # 新增：保存跌倒详情
-        
-        for detection in detections:
-            keypoints = detection['keypoints_array']
-            is_fall, fall_score, details = fall_detector.detect(keypoints, detection['id'])
-            
-            if is_fall:
-                fall_detected = True
-                fall_details.append({
-                    'id': detection['id'],
-                    'details': details
-                })
-            
-            is_fall_list.append(is_fall)
-            fall_scores.append(fall_score)
-            
-            fall_results.append({
-                'id': detection['id'],
-                'is_fall': is_fall,
-                'fall_score': float(fall_score),
-                # 转换置信度为Python float
-                'confidence': float(detection['confidence'])
-            })
-        
-        # 新增：如果检测到跌倒，保存帧图像
-        if fall_detected:
-            save_fall_image(original_frame, id(original_frame), fall_details)
-        
-        # 绘制检测结果
-        result_frame = yolo_detector.draw_detections(
-            frame, detections, is_fall_list, fall_scores
+        render = parse_render_flag(data.get('render'))
+        response, result_frame = analyze_frame(
+            frame, render=render, stream_id=get_stream_id(data), frame_skip=parse_flag(data.get('frame_skip'))
         )
+        if not render:
+            return result_response(response)
         
         # 编码结果帧
-        result_frame_base64 = ImageProcessor.image_to_base64(result_frame, quality=75)
+        result_frame_base64 = encode_result_image(result_frame, quality=75, as_base64=True)
         
         if result_frame_base64 is None:
             return jsonify({
@@ -278,18 +732,9 @@ def detect_video():
                 'error': '结果帧编码失败'
             }), 500
         
-        # 构建响应
-        response = {
-            'success': True,
-            'fall_detected': fall_detected,
-            'detection_count': len(detections),
-            'detections': fall_results,
-            'result_frame': result_frame_base64,
-            'timestamp': datetime.now().isoformat()
-        }
+        response['result_frame'] = result_frame_base64
         
-        # 对响应进行类型转换后再序列化
-        return jsonify(convert_numpy_types(response))
+        return result_response(response)
         
     except Exception as e:
         logger.error(f"视频帧检测失败: {str(e)}", exc_info=True)
@@ -298,6 +743,41 @@ def detect_video():
             'error': f'服务器错误: {str(e)}'
         }), 500
 
+@detection_bp.route('/detect_video_raw', methods=['POST'])
+def detect_video_raw():
+    """
+    视频帧检测接口（二进制版本）
+    
+    请求体:
+        multipart/form-data（文件字段 frame）或 application/octet-stream 的JPEG数据
+        查询参数 render=0 时仅返回检测结果，不附带结果帧；
+        frame_skip=1 时画面静止的帧复用上一关键帧的检测结果（结果JSON带 reused: true）
+    
+    响应:
+        application/x-fall-detection 二进制结果：
+        [4字节大端JSON长度][检测结果JSON][JPEG结果帧]
+    """
+    try:
+        frame, error = read_binary_image('frame')
+        if frame is None:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
+        render = parse_render_flag(request.args.get('render'))
+        response, result_frame = analyze_frame(
+            frame, render=render, stream_id=get_stream_id(), frame_skip=parse_flag(request.args.get('frame_skip'))
+        )
+        return binary_response(response, result_frame, quality=75)
+        
+    except Exception as e:
+        logger.error(f"二进制视频帧检测失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'服务器错误: {str(e)}'
+        }), 500
+
 # 新增：标记跌倒图片为已标注
 @detection_bp.route('/label_fall_image', methods=['POST'])
 def label_fall_image():
@@ -311,6 +791,19 @@ def label_fall_image():
             }), 400
         
         filename = data['filename']
+        
+        if dataset_index is not None:
+            result = dataset_index.relabel([filename], STATUS_LABELED, data.get('label'))
+            if not result['updated']:
+                return jsonify({
+                    'success': False,
+                    'error': f'图片 {filename} 不存在'
+                }), 404
+            return jsonify({
+                'success': True,
+                'message': f'图片 {filename} 已标记为已标注'
+            })
+        
         src_path = os.path.join(FALL_IMAGES_DIR, "unlabeled", filename)
         dest_path = os.path.join(FALL_IMAGES_DIR, "labeled", filename)
         
@@ -345,8 +838,28 @@ def label_fall_image():
 # 新增：获取所有未标注的跌倒图片
 @detection_bp.route('/get_unlabeled_falls', methods=['GET'])
 def get_unlabeled_falls():
-    """获取所有未标注的跌倒图片列表"""
+    """
+    获取未标注的跌倒图片列表
+    
+    查询参数（启用数据集索引时）:
+        page: 页码，从1开始（默认1）
+        page_size: 每页数量（默认100，最大1000）
+    """
     try:
+        if dataset_index is not None:
+            page = max(1, request.args.get('page', 1, type=int))
+            page_size = min(max(1, request.args.get('page_size', 100, type=int)), 1000)
+            result = dataset_index.list_samples(
+                limit=page_size, offset=(page - 1) * page_size, status=STATUS_UNLABELED
+            )
+            return jsonify({
+                'success': True,
+                'count': result['total'],
+                'page': page,
+                'page_size': page_size,
+                'images': [sample['filename'] for sample in result['samples']]
+            })
+        
         unlabeled_dir = os.path.join(FALL_IMAGES_DIR, "unlabeled")
         images = [f for f in os.listdir(unlabeled_dir) 
                  if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
@@ -364,6 +877,136 @@ def get_unlabeled_falls():
             'error': str(e)
         }), 500
 
+@detection_bp.route('/dataset/samples', methods=['GET'])
+def list_dataset_samples():
+    """
+    分页、按条件查询跌倒训练样本
+    
+    查询参数:
+        page, page_size: 分页（默认第1页，每页50条，最大1000）
+        status: unlabeled / labeled
+        label, stream_id, track_id, event_id, frame_kind: 精确匹配
+        min_score, max_score, min_angle, max_angle: 分数/身体角度范围
+        since, until: 采集时间范围（Unix时间戳，秒）
+        details: 为1时返回完整的检测详情与元数据
+    """
+    if dataset_index is None:
+        return jsonify({
+            'success': False,
+            'error': '未启用数据集索引'
+        }), 404
+    
+    try:
+        args = request.args
+        page = max(1, args.get('page', 1, type=int))
+        page_size = min(max(1, args.get('page_size', 50, type=int)), 1000)
+        filters = {
+            'status': args.get('status'),
+            'label': args.get('label'),
+            'stream_id': args.get('stream_id'),
+            'track_id': args.get('track_id', type=int),
+            'event_id': args.get('event_id'),
+            'frame_kind': args.get('frame_kind'),
+            'min_score': args.get('min_score', type=float),
+            'max_score': args.get('max_score', type=float),
+            'min_angle': args.get('min_angle', type=float),
+            'max_angle': args.get('max_angle', type=float),
+            'since': args.get('since', type=float),
+            'until': args.get('until', type=float)
+        }
+        result = dataset_index.list_samples(
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            include_details=parse_render_flag(args.get('details'), default=False),
+            **filters
+        )
+        
+        return jsonify({
+            'success': True,
+            'total': result['total'],
+            'page': page,
+            'page_size': page_size,
+            'samples': result['samples']
+        })
+        
+    except Exception as e:
+        logger.error(f"查询训练样本失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@detection_bp.route('/dataset/relabel', methods=['POST'])
+def relabel_dataset_samples():
+    """
+    批量修改训练样本的标注状态
+    
+    请求体:
+        {
+            "filenames": ["fall_xxx.jpg", ...],
+            "status": "labeled",  // 可选，labeled / unlabeled，默认labeled
+            "label": "fall"  // 可选，样本标签
+        }
+    """
+    if dataset_index is None:
+        return jsonify({
+            'success': False,
+            'error': '未启用数据集索引'
+        }), 404
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        filenames = data.get('filenames')
+        if not isinstance(filenames, list) or not filenames:
+            return jsonify({
+                'success': False,
+                'error': '缺少文件名列表'
+            }), 400
+        
+        status = data.get('status', STATUS_LABELED)
+        if status not in (STATUS_LABELED, STATUS_UNLABELED):
+            return jsonify({
+                'success': False,
+                'error': f'无效的状态: {status}'
+            }), 400
+        
+        result = dataset_index.relabel(filenames, status, data.get('label'))
+        return jsonify({
+            'success': True,
+            'updated': len(result['updated']),
+            'missing': result['missing']
+        })
+        
+    except Exception as e:
+        logger.error(f"批量标注失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@detection_bp.route('/dataset/sync', methods=['POST'])
+def sync_dataset_index():
+    """与数据集目录增量同步索引（补录新文件、删除已不存在的文件）"""
+    if dataset_index is None:
+        return jsonify({
+            'success': False,
+            'error': '未启用数据集索引'
+        }), 404
+    
+    try:
+        return jsonify({
+            'success': True,
+            'sync': dataset_index.sync(),
+            'stats': dataset_index.get_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"同步数据集索引失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @detection_bp.route('/reset', methods=['POST'])
 def reset_detector():
     """
@@ -371,14 +1014,33 @@ def reset_detector():
     
     请求体:
         {
-            "object_id": 0  // 可选，不提供则重置所有
+            "object_id": 0,  // 可选，不提供则重置该流的所有对象
+            "stream_id": "camera-1",  // 可选，不提供则重置默认流（也可用X-Stream-ID请求头）
+            "all": false  // 可选，为true时重置所有流
         }
+    
+    指定的流没有会话时返回404（不会为重置请求创建会话）。
     """
     try:
-        data = request.get_json() or {}
+        data = request.get_json(silent=True) or {}
         object_id = data.get('object_id')
         
-        fall_detector.reset_history(object_id)
+        if data.get('all'):
+            stream_id = None
+        else:
+            requested_id = get_stream_id(data)
+            session = session_manager.find(requested_id)
+            if session is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'流会话 {requested_id or DEFAULT_STREAM_ID} 不存在'
+                }), 404
+            stream_id = session.stream_id
+        session_manager.reset(stream_id, object_id)
+        
+        # 结束进行中的跌倒事件，避免重置前后的帧被归并为同一事件
+        if event_capture is not None and object_id is None:
+            event_capture.flush(stream_id)
         
         return jsonify({
             'success': True,
@@ -396,13 +1058,28 @@ def reset_detector():
 def get_config():
     """获取检测器配置"""
     try:
-        # 处理配置中的numpy类型
-        config = convert_numpy_types({
+        config = {
             'yolo': yolo_detector.get_model_info(),
-            'fall_detector': fall_detector.get_config()
-        })
+            'fall_detector': fall_detector.get_config(),
+            'tracker': (
+                session_manager.tracker_factory().get_config()
+                if session_manager.tracker_factory else None
+            ),
+            'frame_scheduler': (
+                dict(session_manager.scheduler_factory().get_config(), default_enabled=frame_skip_default)
+                if session_manager.scheduler_factory else None
+            ),
+            'roi': (
+                session_manager.roi_planner_factory().get_config()
+                if session_manager.roi_planner_factory else None
+            ),
+            'sessions': session_manager.get_stats(),
+            'batching': batch_engine.get_stats() if batch_engine is not None else None,
+            'archiver': archiver.get_stats() if archiver is not None else None,
+            'fall_events': event_capture.get_stats() if event_capture is not None else None
+        }
         
-        return jsonify({
+        return result_response({
             'success': True,
             'config': config
         })
@@ -412,4 +1089,59 @@ def get_config():
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@detection_bp.route('/batch_stats', methods=['GET'])
+def get_batch_stats():
+    """获取批处理推理统计（队列深度、批大小分布）"""
+    if batch_engine is None:
+        return jsonify({
+            'success': True,
+            'enabled': False,
+            'stats': None
+        })
+    
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'stats': batch_engine.get_stats()
+    })
+
+@detection_bp.route('/sessions', methods=['GET'])
+def list_sessions():
+    """获取所有流会话及其状态"""
+    return jsonify({
+        'success': True,
+        'stats': session_manager.get_stats(),
+        'sessions': session_manager.list_sessions()
+    })
+
+@detection_bp.route('/sessions/<stream_id>', methods=['DELETE'])
+def remove_session(stream_id):
+    """移除指定流的会话（释放其跟踪与跌倒检测状态）"""
+    # 进行中的跌倒事件由会话管理器的淘汰回调结束
+    if not session_manager.remove(stream_id):
+        return jsonify({
+            'success': False,
+            'error': f'流会话 {stream_id} 不存在'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'message': f'流会话 {stream_id} 已移除'
+    })
+
+@detection_bp.route('/fall_events', methods=['GET'])
+def list_fall_events():
+    """获取进行中的跌倒事件及事件采集统计"""
+    if event_capture is None:
+        return jsonify({
+            'success': False,
+            'error': '未启用事件级跌倒采集'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'stats': event_capture.get_stats(),
+        'events': event_capture.list_events()
+    })
@@ -1,4 +1,5 @@
 from flask import Blueprint, jsonify
+import os
 import psutil
 import time
 from datetime import datetime
@@ -8,6 +9,9 @@ health_bp = Blueprint('health', __name__)
 # 服务启动时间
 START_TIME = time.time()
 
+# 以非阻塞方式采样CPU占用：首次调用只建立基准，之后每次返回距上次调用期间的平均占用
+psutil.cpu_percent(interval=None)
+
 @health_bp.route('/health', methods=['GET'])
 def health_check():
     """
@@ -18,7 +22,8 @@ def health_check():
             "status": "ok",
             "timestamp": "2025-10-01T10:30:45",
             "uptime": 3600.5,
-            "model": "yolov8n-pose"
+            "model": "yolov8n-pose",
+            "pid": 12345  // 处理请求的进程（多进程服务时为worker进程）
         }
     """
     uptime = time.time() - START_TIME
@@ -28,7 +33,8 @@ def health_check():
         'timestamp': datetime.now().isoformat(),
         'uptime': uptime,
         'model': 'yolov8n-pose',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'pid': os.getpid()
     })
 
 @health_bp.route('/status', methods=['GET'])
@@ -44,7 +50,7 @@ def system_status():
         }
     """
     try:
-        cpu_percent = psutil.cpu_percent(interval=0.1)
+        cpu_percent = psutil.cpu_percent(interval=None)
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
         
@@ -0,0 +1,197 @@
+from flask import Blueprint, Response, request, jsonify, current_app
+import logging
+import threading
+import uuid
+from pathlib import Path
+
+from api import detection
+from models.ingest_pipeline import VideoIngestPipeline, is_live_source
+
+logger = logging.getLogger(__name__)
+
+# 创建蓝图
+ingest_bp = Blueprint('ingest', __name__)
+
+class IngestSource:
+    """一路服务端接入的视频源及其最新检测结果"""
+
+    def __init__(self, stream_id: str, pipeline: VideoIngestPipeline):
+        self.stream_id = stream_id
+        self.pipeline = pipeline
+        self.lock = threading.Lock()
+        self.latest_result = None
+        self.latest_frame = None
+        self.latest_detections = []
+        self.latest_scores = []
+
+    def publish(self, frame, detections, scores):
+        """输出阶段：事件采集/归档，并保存最新一帧的结果供接口查询"""
+        session = detection.session_manager.get(self.stream_id)
+        response, _ = detection.summarize_frame(session, frame, detections, scores, keyframe=True, render=False)
+        with self.lock:
+            self.latest_result = response
+            self.latest_frame = frame
+            self.latest_detections = detections
+            self.latest_scores = scores
+
+    def get_info(self, include_result: bool = False):
+        info = {'stream_id': self.stream_id, **self.pipeline.get_stats()}
+        if include_result:
+            with self.lock:
+                info['latest_result'] = self.latest_result
+        return info
+
+# 流ID -> IngestSource
+_sources = {}
+_sources_lock = threading.Lock()
+
+def resolve_source(source: str):
+    """
+    校验视频源：流地址原样返回，视频文件必须位于INGEST_VIDEO_DIR目录内
+
+    Returns:
+        (可交给cv2.VideoCapture的视频源, 错误信息)
+    """
+    if is_live_source(source):
+        return source, None
+
+    video_dir = Path(current_app.config['INGEST_VIDEO_DIR']).resolve()
+    path = (video_dir / source).resolve()
+    if video_dir not in path.parents:
+        return None, f'视频文件必须位于 {video_dir} 目录内'
+    if not path.is_file():
+        return None, f'视频文件不存在: {source}'
+    return str(path), None
+
+def _score(stream_id):
+    def score(detections):
+        session = detection.session_manager.get(stream_id)
+        return detection.score_detections(session, detections, track=True)
+    return score
+
+@ingest_bp.route('/ingest/sources', methods=['POST'])
+def start_source():
+    """
+    接入视频文件或RTSP/HTTP流，由服务端直接解码与检测
+
+    请求:
+        {
+            "source": "rtsp://192.168.1.10:554/stream1" 或 "ward3.mp4"（INGEST_VIDEO_DIR下的相对路径）,
+            "stream_id": "camera-1",  // 可选，默认自动生成
+            "realtime": false,        // 可选，视频文件是否按原始帧率处理
+            "loop": false             // 可选，视频文件结束后是否循环
+        }
+
+    多进程服务（serve.py）下请同时在 X-Stream-ID 请求头中携带stream_id，
+    使后续查询与停止请求路由到同一个worker。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        source = data.get('source')
+        if not source:
+            return jsonify({'success': False, 'error': '缺少source参数'}), 400
+
+        resolved, error = resolve_source(str(source))
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        stream_id = detection.get_stream_id(data) or f"ingest-{uuid.uuid4().hex[:12]}"
+        config = current_app.config
+
+        with _sources_lock:
+            existing = _sources.get(stream_id)
+            if existing is not None and existing.pipeline.running:
+                return jsonify({'success': False, 'error': f'流 {stream_id} 已在接入中'}), 409
+            active = sum(1 for item in _sources.values() if item.pipeline.running)
+            if active >= config['INGEST_MAX_SOURCES']:
+                return jsonify({
+                    'success': False,
+                    'error': f"接入的视频源已达上限 {config['INGEST_MAX_SOURCES']}"
+                }), 429
+
+            holder = {}
+            pipeline = VideoIngestPipeline(
+                resolved,
+                detect_batch=detection.yolo_detector.detect_batch,
+                score=_score(stream_id),
+                sink=lambda frame, detections, scores: holder['source'].publish(frame, detections, scores),
+                queue_size=config['INGEST_QUEUE_SIZE'],
+                batch_size=config['INGEST_BATCH_SIZE'],
+                batch_wait_ms=config['INGEST_BATCH_WAIT_MS'],
+                realtime=detection.parse_render_flag(data.get('realtime'), default=False),
+                loop=detection.parse_render_flag(data.get('loop'), default=False),
+                reconnect_seconds=config['INGEST_RECONNECT_SECONDS']
+            )
+            holder['source'] = _sources[stream_id] = IngestSource(stream_id, pipeline)
+
+        # 重新接入时从干净的跟踪与跌倒状态开始
+        detection.session_manager.reset(stream_id)
+        pipeline.start()
+        logger.info(f"服务端接入视频源: {source}, 流ID: {stream_id}")
+
+        return detection.result_response({'success': True, 'source': holder['source'].get_info()})
+
+    except Exception as e:
+        logger.error(f"接入视频源失败: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': f'服务器错误: {str(e)}'}), 500
+
+@ingest_bp.route('/ingest/sources', methods=['GET'])
+def list_sources():
+    """列出服务端接入的视频源及其流水线统计"""
+    with _sources_lock:
+        sources = list(_sources.values())
+    return detection.result_response({
+        'success': True,
+        'sources': [source.get_info() for source in sources]
+    })
+
+@ingest_bp.route('/ingest/sources/<stream_id>', methods=['GET'])
+def get_source(stream_id):
+    """获取视频源的流水线统计（各阶段耗时、队列深度、吞吐）与最新一帧的检测结果"""
+    source = _sources.get(stream_id)
+    if source is None:
+        return jsonify({'success': False, 'error': '视频源不存在'}), 404
+    return detection.result_response({
+        'success': True,
+        'source': source.get_info(include_result=True)
+    })
+
+@ingest_bp.route('/ingest/sources/<stream_id>/frame', methods=['GET'])
+def get_source_frame(stream_id):
+    """获取视频源最新一帧的标注图像（JPEG），浏览器无需再转发摄像头画面"""
+    source = _sources.get(stream_id)
+    if source is None:
+        return jsonify({'success': False, 'error': '视频源不存在'}), 404
+
+    with source.lock:
+        frame, detections, scores = source.latest_frame, source.latest_detections, source.latest_scores
+    if frame is None:
+        return jsonify({'success': False, 'error': '尚未处理任何帧'}), 404
+
+    # 最新帧由各请求共享，始终绘制到缓冲池的输出缓冲上
+    result_frame = detection.render_detections(
+        frame, detections, [is_fall for is_fall, _, _ in scores], [score for _, score, _ in scores],
+        retained=True
+    )
+    quality = request.args.get('quality', default=current_app.config['JPEG_QUALITY'], type=int)
+    image_bytes = detection.encode_result_image(result_frame, quality=quality)
+    return Response(
+        image_bytes,
+        mimetype='image/jpeg',
+        headers={'Cache-Control': 'no-store'}
+    )
+
+@ingest_bp.route('/ingest/sources/<stream_id>', methods=['DELETE'])
+def stop_source(stream_id):
+    """停止接入视频源并释放其检测状态"""
+    with _sources_lock:
+        source = _sources.pop(stream_id, None)
+    if source is None:
+        return jsonify({'success': False, 'error': '视频源不存在'}), 404
+
+    source.pipeline.stop()
+    # 会话移除时其进行中的跌倒事件随之结束
+    detection.session_manager.remove(stream_id)
+    logger.info(f"已停止接入视频源: {stream_id}")
+
+    return detection.result_response({'success': True, 'source': source.get_info()})
@@ -0,0 +1,105 @@
+from flask import Blueprint, Response, jsonify, current_app
+import time
+import logging
+
+import psutil
+
+from api import detection, ingest
+from api.health import START_TIME
+from utils.metrics import registry, PROMETHEUS_CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+# 创建蓝图
+metrics_bp = Blueprint('metrics', __name__)
+
+def collect_service_metrics():
+    """
+    导出时从各组件的统计信息中采集指标（流帧率、队列深度、丢帧与跌倒事件计数）
+
+    只读取各组件已维护的计数，不在检测热路径上增加任何开销。
+    """
+    yield 'fall_process_uptime_seconds', 'gauge', '服务运行时间（秒）', [({}, time.time() - START_TIME)]
+    yield 'fall_process_resident_memory_bytes', 'gauge', '进程常驻内存（字节）', [({}, psutil.Process().memory_info().rss)]
+
+    session_manager = detection.session_manager
+    if session_manager is not None:
+        sessions = session_manager.get_sessions()
+        stats = session_manager.get_stats()
+        yield 'fall_active_streams', 'gauge', '活跃的流会话数', [({}, stats['active_sessions'])]
+        yield 'fall_evicted_streams_total', 'counter', '被淘汰的流会话数', [({}, stats['evicted_sessions'])]
+        yield 'fall_stream_fps', 'gauge', '各路流最近的处理帧率', [
+            ({'stream_id': session.stream_id}, session.get_fps()) for session in sessions
+        ]
+        yield 'fall_stream_frames_total', 'counter', '各路流已处理的帧数', [
+            ({'stream_id': session.stream_id}, session.processed_frames) for session in sessions
+        ]
+        yield 'fall_stream_keyframes_total', 'counter', '各路流实际推理的关键帧数', [
+            ({'stream_id': session.stream_id}, session.keyframes) for session in sessions
+        ]
+        yield 'fall_stream_fall_frames_total', 'counter', '各路流检测到跌倒的帧数', [
+            ({'stream_id': session.stream_id}, session.fall_frames) for session in sessions
+        ]
+
+    queue_depths = []
+    if detection.batch_engine is not None:
+        stats = detection.batch_engine.get_stats()
+        queue_depths.append(({'queue': 'batch_inference'}, stats['queue_depth']))
+        yield 'fall_batch_frames_total', 'counter', '批处理引擎推理的帧数', [({}, stats['total_frames'])]
+        yield 'fall_batch_batches_total', 'counter', '批处理引擎执行的批次数', [({}, stats['total_batches'])]
+    if detection.archiver is not None:
+        stats = detection.archiver.get_stats()
+        queue_depths.append(({'queue': 'archive'}, stats['queue_depth']))
+        yield 'fall_archive_written_total', 'counter', '已写盘的跌倒图片数', [({}, stats['written'])]
+        yield 'fall_archive_dropped_total', 'counter', '归档队列满而丢弃的跌倒图片数', [({}, stats['dropped'])]
+        yield 'fall_archive_errors_total', 'counter', '跌倒图片写盘失败数', [({}, stats['errors'])]
+    if detection.event_capture is not None:
+        stats = detection.event_capture.get_stats()
+        yield 'fall_events_started_total', 'counter', '开始的跌倒事件数', [({}, stats['events_started'])]
+        yield 'fall_events_closed_total', 'counter', '结束的跌倒事件数', [({}, stats['events_closed'])]
+        yield 'fall_events_open', 'gauge', '进行中的跌倒事件数', [({}, stats['open_events'])]
+
+    stats = detection.frame_pool.get_stats()
+    yield 'fall_frame_pool_leased_buffers', 'gauge', '借出中的结果帧输出缓冲数', [({}, stats['leased'])]
+    yield 'fall_frame_pool_free_bytes', 'gauge', '结果帧缓冲池中空闲缓冲的字节数', [({}, stats['free_mb'] * 1024 * 1024)]
+    yield 'fall_frame_pool_allocations_total', 'counter', '结果帧缓冲池新分配的缓冲数', [({}, stats['allocated'])]
+
+    with ingest._sources_lock:
+        sources = list(ingest._sources.values())
+    ingest_stats = [(source.stream_id, source.pipeline.get_stats()) for source in sources]
+    for stream_id, stats in ingest_stats:
+        for name in ('decode', 'score', 'sink'):
+            queue_depths.append(({'queue': f'ingest_{name}', 'stream_id': stream_id}, stats['queues'][name]))
+    yield 'fall_queue_depth', 'gauge', '各队列当前深度', queue_depths
+
+    if ingest_stats:
+        yield 'fall_ingest_processed_frames_total', 'counter', '服务端接入视频源已处理的帧数', [
+            ({'stream_id': stream_id}, stats['processed_frames']) for stream_id, stats in ingest_stats
+        ]
+        yield 'fall_ingest_dropped_frames_total', 'counter', '服务端接入实时流丢弃的帧数', [
+            ({'stream_id': stream_id}, stats['dropped_frames']) for stream_id, stats in ingest_stats
+        ]
+        yield 'fall_ingest_stage_busy_seconds_total', 'counter', '服务端接入流水线各阶段累计耗时（秒）', [
+            ({'stream_id': stream_id, 'stage': stage}, stage_stats['busy_seconds'])
+            for stream_id, stats in ingest_stats
+            for stage, stage_stats in stats['stages'].items()
+        ]
+
+registry.add_collector(collect_service_metrics)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    运行指标（Prometheus文本格式）
+
+    包含各阶段耗时直方图（fall_stage_latency_seconds）、各路流帧率、队列深度、
+    丢帧与跌倒事件计数。多进程服务（serve.py）下每个worker独立统计，
+    返回的是处理该请求的worker的指标（可用stream_id参数选择worker）。
+    """
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'success': False, 'error': '运行指标未启用'}), 404
+    try:
+        return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    except Exception as e:
+        logger.error(f"导出运行指标失败: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': f'服务器错误: {str(e)}'}), 500
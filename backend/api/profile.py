@@ -0,0 +1,147 @@
+from flask import Blueprint, request, jsonify, g
+import hmac
+import logging
+
+from utils.profiler import PROFILE_MODES
+
+logger = logging.getLogger(__name__)
+
+# 创建蓝图
+profile_bp = Blueprint('profile', __name__)
+
+# 性能剖析器（在app.py中初始化）
+profiler = None
+# 是否允许开启采集（/profile 接口与 X-Profile 请求头），以及开启采集所需的令牌（空表示不校验）
+control_allowed = True
+control_token = ''
+
+# 可被剖析的检测接口
+PROFILED_ENDPOINTS = frozenset({
+    'detection.detect_image',
+    'detection.detect_image_raw',
+    'detection.detect_video',
+    'detection.detect_video_raw'
+})
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_HEADER = 'X-Profile-Token'
+
+def init_profiler(request_profiler, control_enabled=True, token=None):
+    """
+    初始化性能剖析器
+
+    Args:
+        request_profiler: RequestProfiler实例，None表示不提供剖析
+        control_enabled: 是否允许通过 /profile 接口与 X-Profile 请求头开启采集
+        token: 开启采集须在 X-Profile-Token 请求头中携带的令牌，None或空表示不校验
+    """
+    global profiler, control_allowed, control_token
+    profiler = request_profiler
+    control_allowed = control_enabled
+    control_token = token or ''
+
+def _authorized() -> bool:
+    """当前请求是否可以控制性能剖析"""
+    if not control_allowed:
+        return False
+    if not control_token:
+        return True
+    return hmac.compare_digest(request.headers.get(TOKEN_HEADER, ''), control_token)
+
+def _control_error():
+    """不能控制性能剖析时返回错误响应，否则返回None"""
+    if profiler is None:
+        return jsonify({'success': False, 'error': '性能剖析不可用'}), 404
+    if not control_allowed:
+        return jsonify({'success': False, 'error': '已禁止开启性能剖析（PROFILE_CONTROL_ENABLED）'}), 403
+    if not _authorized():
+        return jsonify({'success': False, 'error': f'缺少或错误的 {TOKEN_HEADER} 请求头'}), 401
+    return None
+
+@profile_bp.before_app_request
+def _start_profile():
+    """检测请求开始时按请求头或已开启的剖析计数开始采集"""
+    if profiler is None or request.endpoint not in PROFILED_ENDPOINTS:
+        return
+    header_value = request.headers.get(PROFILE_HEADER)
+    if header_value and not _authorized():
+        # 未授权的请求头直接忽略，不影响请求本身
+        header_value = None
+    mode = profiler.claim(header_value)
+    if mode is not None:
+        g.profile_session = profiler.start(mode)
+
+@profile_bp.after_app_request
+def _finish_profile(response):
+    """检测请求结束时写出剖析结果，并在响应头中返回结果ID"""
+    session = g.pop('profile_session', None)
+    if session is not None:
+        try:
+            summary = profiler.finish(session, request.endpoint, response.status_code)
+            response.headers[PROFILE_HEADER + '-Id'] = summary['id']
+        except Exception as e:
+            logger.error(f"保存性能剖析结果失败: {str(e)}", exc_info=True)
+    return response
+
+@profile_bp.teardown_app_request
+def _abort_profile(error):
+    """请求异常结束（未经过after_request）时停止采集"""
+    session = g.pop('profile_session', None)
+    if session is not None:
+        try:
+            profiler.finish(session, request.endpoint or 'unknown')
+        except Exception as e:
+            logger.error(f"保存性能剖析结果失败: {str(e)}", exc_info=True)
+
+@profile_bp.route('/profile', methods=['GET'])
+def get_profile_status():
+    """获取剖析状态：剩余待采集的请求数与最近的剖析结果"""
+    error = _control_error()
+    if error is not None:
+        return error
+    return jsonify({'success': True, 'profile': profiler.get_status()})
+
+@profile_bp.route('/profile', methods=['POST'])
+def arm_profile():
+    """
+    为接下来的N个检测请求开启性能剖析
+
+    请求体:
+        {
+            "requests": 10,       // 采集的请求数
+            "mode": "sample"      // 可选，sample（调用栈采样，输出火焰图折叠栈）或 cprofile
+        }
+
+    单个请求也可携带 X-Profile: 1 / sample / cprofile 请求头单独采集，
+    响应头 X-Profile-Id 为结果ID，结果写入 PROFILE_DIR 目录（<ID>.json 摘要与 .collapsed / .prof 文件）。
+    配置了 PROFILE_TOKEN 时，本接口与 X-Profile 请求头都须携带 X-Profile-Token 请求头。
+
+    cprofile 只能记录请求线程内的调用；启用批处理推理引擎时推理在批处理线程中执行，
+    此时自动改用 sample 模式（同时采样请求线程与批处理线程），结果摘要中的 mode 为实际使用的模式。
+    """
+    error = _control_error()
+    if error is not None:
+        return error
+    try:
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode')
+        if mode is not None and mode not in PROFILE_MODES:
+            return jsonify({
+                'success': False,
+                'error': f"不支持的剖析模式: {mode}，可选: {', '.join(PROFILE_MODES)}"
+            }), 400
+        count = int(data.get('requests', 1))
+        return jsonify({'success': True, 'profile': profiler.arm(count, mode)})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'参数错误: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"开启性能剖析失败: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': f'服务器错误: {str(e)}'}), 500
+
+@profile_bp.route('/profile', methods=['DELETE'])
+def disarm_profile():
+    """取消尚未执行的性能剖析"""
+    error = _control_error()
+    if error is not None:
+        return error
+    return jsonify({'success': True, 'profile': profiler.disarm()})
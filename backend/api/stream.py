@@ -0,0 +1,210 @@
+from flask import Blueprint, request
+import json
+import logging
+import threading
+import time
+import uuid
+
+from api import detection
+from utils.image_processor import ImageProcessor
+from utils.binary_protocol import pack_detection_result
+from utils.metrics import timed, count_dropped
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:  # 未安装flask-sock时不提供WebSocket接口
+    Sock = None
+    ConnectionClosed = Exception
+
+logger = logging.getLogger(__name__)
+
+# 创建蓝图
+stream_bp = Blueprint('stream', __name__)
+
+# WebSocket流的JPEG编码质量
+STREAM_JPEG_QUALITY = 75
+
+class LatestFrameSlot:
+    """只保留最新一帧的缓冲槽
+
+    接收线程不断写入新帧，处理线程总是取最新帧；
+    处理跟不上时旧帧直接被覆盖丢弃，从而实现背压。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame_bytes: bytes):
+        """写入一帧，覆盖尚未处理的旧帧"""
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+                count_dropped('websocket')
+            self._seq += 1
+            self.received += 1
+            self._frame = (self._seq, time.perf_counter(), frame_bytes)
+            self._condition.notify()
+
+    def take(self):
+        """取出最新一帧，没有新帧时阻塞；槽关闭后返回None"""
+        with self._condition:
+            while self._frame is None and not self._closed:
+                self._condition.wait()
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        """关闭缓冲槽并唤醒处理线程"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+class SerializedSender:
+    """同一连接的串行发送器
+
+    处理线程推送检测结果、接收线程回复控制消息，两者共用一个WebSocket，
+    发送必须加锁，否则两条消息的帧数据可能交错写入套接字。
+    """
+
+    def __init__(self, ws):
+        self._ws = ws
+        self._lock = threading.Lock()
+
+    def send(self, data):
+        with self._lock:
+            self._ws.send(data)
+
+def _stream_worker(sender, slot: LatestFrameSlot, render: bool, stream_id: str, frame_skip=None):
+    """处理线程：解码最新帧、执行检测并推送结果"""
+    while True:
+        item = slot.take()
+        if item is None:
+            break
+
+        seq, received_at, frame_bytes = item
+        try:
+            with timed('decode'):
+                frame = ImageProcessor.bytes_to_image(frame_bytes)
+            if frame is None:
+                sender.send(json.dumps({
+                    'success': False,
+                    'frame_seq': seq,
+                    'error': '帧解码失败'
+                }, ensure_ascii=False))
+                continue
+
+            response, result_frame = detection.analyze_frame(
+                frame, render=render, stream_id=stream_id, frame_skip=frame_skip
+            )
+            image_bytes = None
+            if result_frame is not None:
+                image_bytes = detection.encode_result_image(result_frame, quality=STREAM_JPEG_QUALITY)
+
+            response['frame_seq'] = seq
+            response['dropped_frames'] = slot.dropped
+            response['latency_ms'] = (time.perf_counter() - received_at) * 1000
+
+            with timed('serialize'):
+                message = pack_detection_result(response, image_bytes or b'')
+            sender.send(message)
+        except ConnectionClosed:
+            break
+        except Exception as e:
+            logger.error(f"流式帧检测失败: {str(e)}", exc_info=True)
+            try:
+                sender.send(json.dumps({
+                    'success': False,
+                    'frame_seq': seq,
+                    'error': f'服务器错误: {str(e)}'
+                }, ensure_ascii=False))
+            except ConnectionClosed:
+                break
+
+def _handle_control_message(sender, message: str, slot: LatestFrameSlot, stream_id: str):
+    """处理文本控制消息"""
+    try:
+        command = json.loads(message)
+    except ValueError:
+        sender.send(json.dumps({'success': False, 'error': '无效的控制消息'}, ensure_ascii=False))
+        return
+
+    if command.get('type') == 'stats':
+        sender.send(json.dumps({
+            'type': 'stats',
+            'received_frames': slot.received,
+            'dropped_frames': slot.dropped
+        }))
+    elif command.get('type') == 'reset':
+        detection.session_manager.reset(stream_id, command.get('object_id'))
+        sender.send(json.dumps({'type': 'reset', 'success': True}))
+    else:
+        sender.send(json.dumps({'success': False, 'error': '未知的控制消息类型'}, ensure_ascii=False))
+
+def detection_stream(ws):
+    """
+    视频流检测WebSocket接口
+
+    客户端 -> 服务端:
+        二进制消息: JPEG帧
+        文本消息: JSON控制命令 {"type": "stats"} / {"type": "reset", "object_id": 0}
+
+    服务端 -> 客户端:
+        二进制消息: [4字节大端JSON长度][检测结果JSON][JPEG结果帧]
+        文本消息: 控制命令应答或错误信息(JSON)
+
+    连接查询参数:
+        render=0 时只推送检测结果（边界框、关键点、跌倒分数），
+        不附带结果帧，由前端在画布上自行绘制。
+        stream_id 指定流ID，重连后可继续使用原有的跟踪与跌倒状态；
+        未指定时为本连接生成临时流ID，连接关闭后释放其状态。
+        frame_skip=1 时画面静止的帧复用上一关键帧的检测结果（结果JSON带 reused: true），
+        未指定时按服务配置（FRAME_SKIP_ENABLED）。
+    
+    处理速度跟不上时只处理最新帧，过时的帧直接丢弃。
+    """
+    render = detection.parse_render_flag(request.args.get('render'))
+    frame_skip = detection.parse_flag(request.args.get('frame_skip'))
+    stream_id = request.args.get('stream_id')
+    ephemeral = not stream_id
+    if ephemeral:
+        stream_id = f"ws-{uuid.uuid4().hex[:12]}"
+    
+    logger.info(f"视频流连接建立: {request.remote_addr}, 流ID: {stream_id}, 服务端绘制: {render}")
+    slot = LatestFrameSlot()
+    sender = SerializedSender(ws)
+    worker = threading.Thread(
+        target=_stream_worker, args=(sender, slot, render, stream_id, frame_skip), name='stream-worker', daemon=True
+    )
+    worker.start()
+
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                continue
+            if isinstance(message, (bytes, bytearray)):
+                slot.put(bytes(message))
+            else:
+                _handle_control_message(sender, message, slot, stream_id)
+    finally:
+        slot.close()
+        worker.join(timeout=5)
+        if ephemeral:
+            detection.session_manager.remove(stream_id)
+        logger.info(
+            f"视频流连接关闭: {request.remote_addr}, 流ID: {stream_id}, "
+            f"接收 {slot.received} 帧, 丢弃 {slot.dropped} 帧"
+        )
+
+if Sock is not None:
+    sock = Sock()
+    sock.route('/stream', bp=stream_bp)(detection_stream)
+else:
+    sock = None
+    logger.warning("未安装flask-sock，WebSocket视频流接口不可用")
@@ -11,16 +11,47 @@ sys.path.insert(0, str(Path(__file__).parent))
 from config import get_config
 from models.yolo_detector import YOLODetector
 from models.fall_detector import FallDetector
-from api.detection import detection_bp, init_detectors
+from models.batch_engine import BatchInferenceEngine
+from models.tracker import IoUTracker
+from models.frame_scheduler import FrameScheduler
+from models.roi_planner import RoiPlanner
+from models.stream_session import StreamSessionManager
+from api.detection import detection_bp, init_detectors, FALL_IMAGES_DIR
 from api.health import health_bp
+from api.stream import stream_bp
+from api.ingest import ingest_bp
+from api.metrics import metrics_bp
+from api.profile import profile_bp, init_profiler
 from utils.logger import setup_logger
+from utils.fall_archiver import FallImageArchiver
+from utils.fall_events import FallEventCapture
+from utils.dataset_index import FallDatasetIndex
+from utils import metrics
+from utils.profiler import RequestProfiler
+from utils.frame_pool import FrameBufferPool
 
-def create_app(config_name=None):
+def build_yolo_detector(config, prepare_only=False):
+    """按配置创建YOLO检测器（prepare_only为True时只导出/量化模型文件，不加载模型）"""
+    return YOLODetector(
+        # 优先使用weights目录下的权重，导出的ONNX/OpenVINO模型也缓存在该目录
+        model_path=str(config.MODEL_PATH) if config.MODEL_PATH.exists() else config.MODEL_NAME,
+        confidence=config.MODEL_CONFIDENCE,
+        backend=config.MODEL_BACKEND,
+        imgsz=config.MODEL_IMGSZ,
+        precision=config.MODEL_PRECISION,
+        calibration_dir=config.CALIBRATION_DIR,
+        calibration_size=config.CALIBRATION_SIZE,
+        prepare_only=prepare_only
+    )
+
+def create_app(config_name=None, yolo_detector=None):
     """
     应用工厂函数
     
     Args:
         config_name: 配置环境名称
+        yolo_detector: 预先加载的YOLO检测器（多进程服务时由主进程加载后fork共享），
+                       None时按配置加载
         
     Returns:
         Flask应用实例
@@ -31,6 +62,8 @@ def create_app(config_name=None):
     # 加载配置
     config = get_config(config_name)
     app.config.from_object(config)
+    # 未启用运行指标时热路径不计时
+    metrics.registry.enabled = config.METRICS_ENABLED
     
     # 设置日志
     logger = setup_logger(
@@ -52,7 +85,8 @@ def create_app(config_name=None):
         f"{config.API_PREFIX}/*": {
             "origins": config.CORS_ORIGINS,
             "methods": ["GET", "POST", "PUT", "DELETE"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type", "X-Stream-ID", "X-Profile"],
+            "expose_headers": ["X-Profile-Id"]
         }
     })
     
@@ -61,11 +95,11 @@ def create_app(config_name=None):
     
     try:
         # 初始化YOLO检测器
-        yolo_detector = YOLODetector(
-            model_path=config.MODEL_NAME,
-            confidence=config.MODEL_CONFIDENCE
+        if yolo_detector is None:
+            yolo_detector = build_yolo_detector(config)
+        logger.info(
+            f"✓ YOLO模型加载成功: {config.MODEL_NAME} ({yolo_detector.backend}, {yolo_detector.precision})"
         )
-        logger.info(f"✓ YOLO模型加载成功: {config.MODEL_NAME}")
         
         # 初始化跌倒检测器
         fall_detector = FallDetector(
@@ -78,8 +112,114 @@ def create_app(config_name=None):
         )
         logger.info("✓ 跌倒检测器初始化成功")
         
+        # 初始化流会话管理器：每路流独立的跌倒检测器与多目标跟踪器
+        session_manager = StreamSessionManager(
+            fall_detector_factory=lambda: FallDetector(**fall_detector.get_config()),
+            tracker_factory=lambda: IoUTracker(
+                iou_threshold=config.TRACKER_IOU_THRESHOLD,
+                centroid_weight=config.TRACKER_CENTROID_WEIGHT,
+                max_age=config.TRACKER_MAX_AGE,
+                matcher=config.TRACKER_MATCHER
+            ),
+            # 关键帧调度器总是创建，是否复用结果由请求的 frame_skip 参数（默认FRAME_SKIP_ENABLED）决定
+            scheduler_factory=lambda: FrameScheduler(
+                diff_threshold=config.FRAME_DIFF_THRESHOLD,
+                max_skip_frames=config.FRAME_SKIP_MAX_FRAMES,
+                max_skip_seconds=config.FRAME_SKIP_MAX_SECONDS,
+                alert_score=config.FRAME_ALERT_SCORE,
+                rise_threshold=config.FRAME_ALERT_RISE,
+                alert_hold_frames=config.FRAME_ALERT_HOLD_FRAMES
+            ),
+            roi_planner_factory=(
+                lambda: RoiPlanner(
+                    padding=config.ROI_PADDING,
+                    motion_threshold=config.ROI_MOTION_THRESHOLD,
+                    full_refresh_frames=config.ROI_FULL_REFRESH_FRAMES,
+                    max_area_ratio=config.ROI_MAX_AREA_RATIO,
+                    min_region_size=config.ROI_MIN_SIZE
+                )
+            ) if config.ROI_INFERENCE_ENABLED else None,
+            ttl_seconds=config.SESSION_TTL_SECONDS,
+            max_sessions=config.SESSION_MAX_COUNT
+        )
+        logger.info("✓ 流会话管理器初始化成功")
+        
+        # 初始化跨请求批处理推理引擎
+        batch_engine = None
+        if config.BATCH_INFERENCE_ENABLED:
+            batch_engine = BatchInferenceEngine(
+                yolo_detector,
+                max_batch_size=config.BATCH_MAX_SIZE,
+                max_wait_ms=config.BATCH_MAX_WAIT_MS,
+                max_queue_size=config.BATCH_MAX_QUEUE_SIZE
+            )
+            batch_engine.start()
+            logger.info("✓ 批处理推理引擎启动成功")
+        
+        # 初始化跌倒训练数据集索引，并补录索引建立前已有的图片
+        dataset_index = None
+        if config.DATASET_INDEX_ENABLED:
+            dataset_index = FallDatasetIndex(FALL_IMAGES_DIR, config.DATASET_INDEX_PATH or None)
+            sync_result = dataset_index.sync()
+            logger.info(f"✓ 数据集索引初始化成功: {dataset_index.get_stats()}, 同步: {sync_result}")
+        
+        # 初始化跌倒图片异步归档写入器
+        archiver = None
+        if config.ARCHIVE_ASYNC_ENABLED:
+            archiver = FallImageArchiver(
+                os.path.join(FALL_IMAGES_DIR, "unlabeled"),
+                max_queue_size=config.ARCHIVE_QUEUE_SIZE,
+                drop_policy=config.ARCHIVE_DROP_POLICY,
+                coalesce=config.ARCHIVE_COALESCE,
+                fsync_batch=config.ARCHIVE_FSYNC_BATCH,
+                sample_index=dataset_index
+            )
+            archiver.start()
+            logger.info("✓ 跌倒图片归档写入器启动成功")
+        
+        # 初始化事件级跌倒采集器（依赖异步归档写入器）
+        event_capture = None
+        if config.FALL_EVENT_CAPTURE_ENABLED:
+            if archiver is None:
+                logger.warning("事件级跌倒采集需要启用异步归档写入器，已改为逐帧保存")
+            else:
+                event_capture = FallEventCapture(
+                    archiver,
+                    end_gap_seconds=config.FALL_EVENT_END_GAP,
+                    max_event_seconds=config.FALL_EVENT_MAX_DURATION,
+                    hash_threshold=config.FALL_EVENT_HASH_THRESHOLD,
+                    clip_frames=config.FALL_EVENT_CLIP_FRAMES,
+                    clip_fps=config.FALL_EVENT_CLIP_FPS,
+                    stream_ttl_seconds=config.SESSION_TTL_SECONDS
+                )
+                # 流停止送帧后由后台线程按时结束事件；会话被淘汰或移除时立即结束该路流的事件
+                event_capture.start()
+                session_manager.on_evict = event_capture.flush
+                logger.info("✓ 事件级跌倒采集器初始化成功")
+        
         # 初始化API检测器
-        init_detectors(yolo_detector, fall_detector)
+        frame_pool = FrameBufferPool(max_bytes=int(config.FRAME_POOL_MAX_MB * 1024 * 1024))
+        init_detectors(
+            yolo_detector, fall_detector, batch_engine, session_manager, archiver, event_capture, dataset_index,
+            frame_pool, frame_skip_enabled=config.FRAME_SKIP_ENABLED
+        )
+        
+        # 初始化按需性能剖析器（未开启采集时每个检测请求只有一次计数判断的开销，
+        # 线上出现延迟尖刺时无需重启即可通过 /api/profile 或 X-Profile 请求头开启）
+        request_profiler = RequestProfiler(
+            config.PROFILE_DIR,
+            mode=config.PROFILE_MODE,
+            sample_interval_ms=config.PROFILE_SAMPLE_INTERVAL_MS,
+            max_profiles=config.PROFILE_MAX_FILES
+        )
+        init_profiler(
+            request_profiler, control_enabled=config.PROFILE_CONTROL_ENABLED, token=config.PROFILE_TOKEN
+        )
+        logger.info(
+            f"✓ 性能剖析器初始化成功，结果目录: {config.PROFILE_DIR}, "
+            f"开启采集: {'允许' if config.PROFILE_CONTROL_ENABLED else '禁止'}"
+            f"{'（需要令牌）' if config.PROFILE_TOKEN else ''}"
+        )
         
     except Exception as e:
         logger.error(f"✗ 模型初始化失败: {str(e)}")
@@ -88,6 +228,10 @@ def create_app(config_name=None):
     # 注册蓝图
     app.register_blueprint(detection_bp, url_prefix=f"{config.API_PREFIX}")
     app.register_blueprint(health_bp, url_prefix=f"{config.API_PREFIX}")
+    app.register_blueprint(stream_bp, url_prefix=f"{config.API_PREFIX}")
+    app.register_blueprint(ingest_bp, url_prefix=f"{config.API_PREFIX}")
+    app.register_blueprint(metrics_bp, url_prefix=f"{config.API_PREFIX}")
+    app.register_blueprint(profile_bp, url_prefix=f"{config.API_PREFIX}")
     logger.info("✓ API路由注册成功")
     
     # 根路径
@@ -100,10 +244,22 @@ def create_app(config_name=None):
             'endpoints': {
                 'health': f"{config.API_PREFIX}/health",
                 'status': f"{config.API_PREFIX}/status",
+                'metrics': f"{config.API_PREFIX}/metrics",
+                'profile': f"{config.API_PREFIX}/profile",
                 'detect_image': f"{config.API_PREFIX}/detect_image",
                 'detect_video': f"{config.API_PREFIX}/detect_video",
+                'detect_image_raw': f"{config.API_PREFIX}/detect_image_raw",
+                'detect_video_raw': f"{config.API_PREFIX}/detect_video_raw",
+                'stream': f"ws://{config.HOST}:{config.PORT}{config.API_PREFIX}/stream",
+                'ingest_sources': f"{config.API_PREFIX}/ingest/sources",
                 'config': f"{config.API_PREFIX}/config",
-                'reset': f"{config.API_PREFIX}/reset"
+                'batch_stats': f"{config.API_PREFIX}/batch_stats",
+                'reset': f"{config.API_PREFIX}/reset",
+                'sessions': f"{config.API_PREFIX}/sessions",
+                'fall_events': f"{config.API_PREFIX}/fall_events",
+                'dataset_samples': f"{config.API_PREFIX}/dataset/samples",
+                'dataset_relabel': f"{config.API_PREFIX}/dataset/relabel",
+                'dataset_sync': f"{config.API_PREFIX}/dataset/sync"
             }
         }
     
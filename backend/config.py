@@ -19,6 +19,19 @@ class Config:
     MODEL_NAME = 'yolov8n-pose.pt'
     MODEL_PATH = BASE_DIR / 'models' / 'weights' / MODEL_NAME
     MODEL_CONFIDENCE = float(os.getenv('MODEL_CONFIDENCE', 0.5))
+    # 推理后端: pytorch / onnx / openvino（后两者首次启动时导出并缓存在模型文件旁边）
+    MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'pytorch')
+    MODEL_IMGSZ = int(os.getenv('MODEL_IMGSZ', 640))
+    # 模型精度: fp32 / int8（INT8由ONNX模型静态量化得到，使用跌倒训练数据中的图片校准）
+    MODEL_PRECISION = os.getenv('MODEL_PRECISION', 'fp32')
+    CALIBRATION_DIR = os.getenv('CALIBRATION_DIR', 'fall_training_data')
+    CALIBRATION_SIZE = int(os.getenv('CALIBRATION_SIZE', 100))
+    
+    # 批处理推理配置
+    BATCH_INFERENCE_ENABLED = os.getenv('BATCH_INFERENCE_ENABLED', 'True') == 'True'
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 8))
+    BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', 10))
+    BATCH_MAX_QUEUE_SIZE = int(os.getenv('BATCH_MAX_QUEUE_SIZE', 64))
     
     # 跌倒检测配置
     FALL_THRESHOLD = float(os.getenv('FALL_THRESHOLD', 0.6))
@@ -28,9 +41,65 @@ class Config:
     HEIGHT_RATIO_MID = float(os.getenv('HEIGHT_RATIO_MID', 0.5))
     HISTORY_LENGTH = int(os.getenv('HISTORY_LENGTH', 5))
     
+    # 多目标跟踪配置
+    TRACKER_IOU_THRESHOLD = float(os.getenv('TRACKER_IOU_THRESHOLD', 0.3))
+    TRACKER_CENTROID_WEIGHT = float(os.getenv('TRACKER_CENTROID_WEIGHT', 0.3))
+    TRACKER_MAX_AGE = int(os.getenv('TRACKER_MAX_AGE', 30))
+    TRACKER_MATCHER = os.getenv('TRACKER_MATCHER', 'greedy')
+    
+    # 流会话配置（每路摄像头独立的跟踪与跌倒检测状态）
+    SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', 300))
+    SESSION_MAX_COUNT = int(os.getenv('SESSION_MAX_COUNT', 64))
+    
+    # 视频流自适应关键帧调度（画面静止时复用上一关键帧的检测结果，响应带 reused: true）
+    # 请求未指定 frame_skip 参数时是否启用；默认关闭，由客户端按请求开启
+    FRAME_SKIP_ENABLED = os.getenv('FRAME_SKIP_ENABLED', 'False') == 'True'
+    FRAME_DIFF_THRESHOLD = float(os.getenv('FRAME_DIFF_THRESHOLD', 0.02))  # 缩略灰度图平均绝对差(0~1)
+    FRAME_SKIP_MAX_FRAMES = int(os.getenv('FRAME_SKIP_MAX_FRAMES', 5))
+    FRAME_SKIP_MAX_SECONDS = float(os.getenv('FRAME_SKIP_MAX_SECONDS', 1.0))
+    FRAME_ALERT_SCORE = float(os.getenv('FRAME_ALERT_SCORE', 0.4))  # 跌倒分数达到该值时逐帧推理
+    FRAME_ALERT_RISE = float(os.getenv('FRAME_ALERT_RISE', 0.1))  # 跌倒分数上升超过该值时逐帧推理
+    FRAME_ALERT_HOLD_FRAMES = int(os.getenv('FRAME_ALERT_HOLD_FRAMES', 15))
+    
+    # ROI裁剪推理配置（视频流只对跟踪目标与运动区域做姿态估计，适合高分辨率画面）
+    ROI_INFERENCE_ENABLED = os.getenv('ROI_INFERENCE_ENABLED', 'False') == 'True'
+    ROI_PADDING = float(os.getenv('ROI_PADDING', 0.25))  # 目标框外扩比例
+    ROI_MOTION_THRESHOLD = int(os.getenv('ROI_MOTION_THRESHOLD', 25))  # 帧差二值化阈值(0~255)
+    ROI_FULL_REFRESH_FRAMES = int(os.getenv('ROI_FULL_REFRESH_FRAMES', 30))  # 全画面推理间隔（推理次数）
+    ROI_MAX_AREA_RATIO = float(os.getenv('ROI_MAX_AREA_RATIO', 0.5))  # 区域面积占比超过时全画面推理
+    ROI_MIN_SIZE = int(os.getenv('ROI_MIN_SIZE', 160))  # 区域最小边长（像素）
+    
+    # 服务端视频接入配置（视频文件/RTSP/HTTP流，解码->推理->评分->输出流水线）
+    INGEST_MAX_SOURCES = int(os.getenv('INGEST_MAX_SOURCES', 4))
+    INGEST_VIDEO_DIR = os.getenv('INGEST_VIDEO_DIR', str(BASE_DIR / 'videos'))  # 只允许接入该目录下的视频文件
+    INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 8))
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 4))
+    INGEST_BATCH_WAIT_MS = float(os.getenv('INGEST_BATCH_WAIT_MS', 20))
+    INGEST_RECONNECT_SECONDS = float(os.getenv('INGEST_RECONNECT_SECONDS', 2.0))
+    
+    # 跌倒图片异步归档配置
+    ARCHIVE_ASYNC_ENABLED = os.getenv('ARCHIVE_ASYNC_ENABLED', 'True') == 'True'
+    ARCHIVE_QUEUE_SIZE = int(os.getenv('ARCHIVE_QUEUE_SIZE', 32))
+    ARCHIVE_DROP_POLICY = os.getenv('ARCHIVE_DROP_POLICY', 'drop_oldest')  # drop_oldest / drop_newest
+    ARCHIVE_COALESCE = os.getenv('ARCHIVE_COALESCE', 'True') == 'True'
+    ARCHIVE_FSYNC_BATCH = int(os.getenv('ARCHIVE_FSYNC_BATCH', 8))
+    
+    # 跌倒训练数据集索引配置（SQLite）
+    DATASET_INDEX_ENABLED = os.getenv('DATASET_INDEX_ENABLED', 'True') == 'True'
+    DATASET_INDEX_PATH = os.getenv('DATASET_INDEX_PATH', '')  # 为空时保存在数据集目录下
+    
+    # 事件级跌倒采集配置（连续跌倒帧归并为事件，只保存关键帧）
+    FALL_EVENT_CAPTURE_ENABLED = os.getenv('FALL_EVENT_CAPTURE_ENABLED', 'True') == 'True'
+    FALL_EVENT_END_GAP = float(os.getenv('FALL_EVENT_END_GAP', 1.5))  # 秒
+    FALL_EVENT_MAX_DURATION = float(os.getenv('FALL_EVENT_MAX_DURATION', 30.0))  # 秒
+    FALL_EVENT_HASH_THRESHOLD = int(os.getenv('FALL_EVENT_HASH_THRESHOLD', 6))
+    FALL_EVENT_CLIP_FRAMES = int(os.getenv('FALL_EVENT_CLIP_FRAMES', 0))  # 0表示不保存片段
+    FALL_EVENT_CLIP_FPS = float(os.getenv('FALL_EVENT_CLIP_FPS', 10.0))
+    
     # 图像处理配置
     MAX_IMAGE_SIZE = (1920, 1080)
     JPEG_QUALITY = int(os.getenv('JPEG_QUALITY', 85))
+    FRAME_POOL_MAX_MB = float(os.getenv('FRAME_POOL_MAX_MB', 256))  # 结果帧输出缓冲池的空闲内存上限
     
     # 日志配置
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -38,6 +107,26 @@ class Config:
     LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
     LOG_BACKUP_COUNT = 5
     
+    # 运行指标配置（/api/metrics，Prometheus文本格式）
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+    
+    # 性能剖析配置（剖析器总是创建，未开启采集时没有额外开销；
+    # 由 /api/profile 或 X-Profile 请求头开启，结果写入PROFILE_DIR）
+    PROFILE_CONTROL_ENABLED = os.getenv('PROFILE_CONTROL_ENABLED', 'True') == 'True'  # 是否允许开启采集
+    PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')  # 非空时开启采集须携带 X-Profile-Token 请求头
+    PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'logs' / 'profiles'))
+    PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample')  # sample（调用栈采样）/ cprofile
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 2.0))
+    PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 100))  # 最多保留的剖析结果数
+    
+    # 多进程服务配置（serve.py）
+    SERVE_WORKERS = int(os.getenv('SERVE_WORKERS', os.cpu_count() or 1))
+    # 每个worker的推理线程数，默认按核数平均分配，避免worker之间争抢CPU
+    SERVE_THREADS_PER_WORKER = int(os.getenv(
+        'SERVE_THREADS_PER_WORKER', max(1, (os.cpu_count() or 1) // SERVE_WORKERS)
+    ))
+    SERVE_PRELOAD_MODEL = os.getenv('SERVE_PRELOAD_MODEL', 'auto')  # auto / yes / no
+    
     # API配置
     API_PREFIX = '/api'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
@@ -4,5 +4,13 @@
 """
 from .yolo_detector import YOLODetector
 from .fall_detector import FallDetector
+from .history_buffer import TrackHistoryBuffer
+from .batch_engine import BatchInferenceEngine
+from .tracker import IoUTracker
+from .stream_session import StreamSession, StreamSessionManager
+from .frame_scheduler import FrameScheduler
+from .roi_planner import RoiPlanner
 
-__all__ = ['YOLODetector', 'FallDetector']
\ No newline at end of file
+__all__ = ['YOLODetector', 'FallDetector', 'TrackHistoryBuffer', 'BatchInferenceEngine',
+           'IoUTracker', 'StreamSession', 'StreamSessionManager', 'FrameScheduler',
+           'RoiPlanner']
\ No newline at end of file
@@ -0,0 +1,219 @@
+import threading
+import queue
+import time
+import logging
+from collections import Counter
+from typing import List, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class _PendingRequest:
+    """等待批处理的单帧请求"""
+
+    __slots__ = ('image', 'enqueue_time', 'event', 'result')
+
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self.enqueue_time = time.perf_counter()
+        self.event = threading.Event()
+        self.result = None
+
+class BatchInferenceEngine:
+    """跨请求微批处理推理引擎
+
+    将并发请求中的帧在一个时间窗口内收集起来，合并为一次批量前向推理，
+    再把结果分发回各个等待中的请求线程。
+
+    空闲时到达的单个请求立即推理，不等待凑批；只有存在并发（已有其他请求排队，
+    或请求在上一批推理期间到达）时才在等待窗口内收集更多请求。
+    """
+
+    def __init__(
+        self,
+        detector,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue_size: int = 64,
+        enqueue_timeout: float = 1.0,
+        result_timeout: float = 30.0
+    ):
+        """
+        初始化批处理引擎
+
+        Args:
+            detector: YOLODetector实例（需提供detect_batch方法）
+            max_batch_size: 单批最大帧数
+            max_wait_ms: 存在并发请求时收集一批的最长等待时间（毫秒，自第一个请求入队起算）
+            max_queue_size: 等待队列的最大长度
+            enqueue_timeout: 队列已满时等待入队的最长时间（秒），超时后改为单帧推理
+            result_timeout: 等待批处理结果的默认超时时间（秒）
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.result_timeout = result_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._worker = None
+        # 上一批推理结束的时间，在此之前入队的请求说明推理期间有请求到达
+        self._last_batch_end = 0.0
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self._batch_histogram = Counter()
+        self._total_batches = 0
+        self._total_frames = 0
+        self._total_wait = 0.0
+        self._total_infer = 0.0
+
+    def start(self):
+        """启动后台批处理线程"""
+        if self._is_running():
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(
+            target=self._run, name='batch-inference', daemon=True
+        )
+        self._worker.start()
+        logger.info(
+            f"批处理推理引擎已启动 (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait * 1000:.1f})"
+        )
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台批处理线程"""
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+        logger.info("批处理推理引擎已停止")
+
+    def detect(self, image: np.ndarray, timeout: Optional[float] = None) -> List[Dict]:
+        """
+        提交一帧并等待其检测结果（与YOLODetector.detect接口一致）
+
+        Args:
+            image: 输入图像
+            timeout: 等待结果的超时时间（秒），None时使用result_timeout
+
+        Returns:
+            检测结果列表
+        """
+        if not self._is_running():
+            # 引擎未运行时直接退化为单帧推理
+            return self.detector.detect(image)
+
+        pending = _PendingRequest(image)
+        try:
+            self._queue.put(pending, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.warning("批处理队列已满，改为单帧推理")
+            return self.detector.detect(image)
+
+        if not pending.event.wait(self.result_timeout if timeout is None else timeout):
+            if not self._is_running() and not pending.event.is_set():
+                # 入队时引擎恰好停止（已结束清空队列），请求不会再被处理，直接推理
+                return self.detector.detect(image)
+            if not pending.event.is_set():
+                raise TimeoutError("等待批处理推理结果超时")
+
+        return pending.result
+
+    def _is_running(self) -> bool:
+        """后台批处理线程是否在运行"""
+        worker = self._worker
+        return worker is not None and worker.is_alive()
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        """收集一批请求：空闲时的单个请求立即返回，存在并发时等到批满或等待窗口结束"""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # 空闲时的单个请求立即推理，避免单路请求每帧都多等一个窗口
+        if len(batch) == 1 and first.enqueue_time >= self._last_batch_end:
+            return batch
+
+        deadline = first.enqueue_time + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """后台批处理主循环"""
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = self.detector.detect_batch([p.image for p in batch])
+            except Exception as e:
+                logger.error(f"批处理推理失败: {str(e)}")
+                results = [[] for _ in batch]
+            self._last_batch_end = time.perf_counter()
+            infer_time = self._last_batch_end - start
+
+            for pending, detections in zip(batch, results):
+                pending.result = detections
+                pending.image = None
+                pending.event.set()
+
+            with self._stats_lock:
+                self._batch_histogram[len(batch)] += 1
+                self._total_batches += 1
+                self._total_frames += len(batch)
+                self._total_wait += sum(start - p.enqueue_time for p in batch)
+                self._total_infer += infer_time
+
+        # 唤醒停止后仍在等待的请求，避免请求线程永久阻塞
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.result = self.detector.detect(pending.image)
+            pending.event.set()
+
+    def get_stats(self) -> Dict:
+        """获取批处理统计信息"""
+        with self._stats_lock:
+            frames = self._total_frames
+            batches = self._total_batches
+            return {
+                'running': self._is_running(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_size': self.max_queue_size,
+                'total_batches': batches,
+                'total_frames': frames,
+                'avg_batch_size': frames / batches if batches else 0.0,
+                'avg_queue_wait_ms': self._total_wait / frames * 1000 if frames else 0.0,
+                'avg_batch_infer_ms': self._total_infer / batches * 1000 if batches else 0.0,
+                'batch_size_histogram': {
+                    str(size): count for size, count in sorted(self._batch_histogram.items())
+                }
+            }
@@ -1,10 +1,12 @@
 # filePath：YOLOV8-/backend/models/fall_detector.py
 import numpy as np
 import math
-from typing import List, Tuple, Dict
-from collections import deque
+from typing import List, Tuple, Dict, Optional
 import logging
 from datetime import datetime
+
+from .history_buffer import TrackHistoryBuffer
+
 logger = logging.getLogger(__name__)
 
 class FallDetector:
@@ -64,8 +66,8 @@ class FallDetector:
         self.history_length = history_length
         self.motion_threshold = motion_threshold
         
-        # 每个检测对象的历史记录，增加位置和速度信息
-        self.history = {}
+        # 每个检测对象的历史记录（分数、肩部中心位置、时间戳），预分配的环形缓冲区
+        self.history = TrackHistoryBuffer(history_length)
         
     def detect(self, keypoints: np.ndarray, object_id: int = 0) -> Tuple[bool, float, Dict]:
         """检测是否跌倒"""
@@ -76,21 +78,68 @@ class FallDetector:
         # 计算跌倒分数
         score, details = self.calculate_fall_score(keypoints)
         
-        # 初始化历史记录
-        if object_id not in self.history:
-            self.history[object_id] = deque(maxlen=self.history_length)
-        
         # 提取关键位置用于运动分析
         shoulder_center = self._get_center_point(
             keypoints[self.LEFT_SHOULDER], keypoints[self.RIGHT_SHOULDER]
         )
         
-        # 记录包含位置信息的历史
-        self.history[object_id].append({
-            'score': score,
-            'position': (shoulder_center[0], shoulder_center[1]),  # 肩部中心点
-            'timestamp': datetime.now().timestamp()
-        })
+        is_fall, combined_score, details = self._update_history(
+            object_id, score, details, shoulder_center, datetime.now().timestamp()
+        )
+        
+        # 确保所有值都是Python原生类型，避免JSON序列化问题
+        return is_fall, combined_score, self._convert_to_python_types(details)
+    
+    def detect_batch(
+        self,
+        keypoints: np.ndarray,
+        object_ids: List[int],
+        timestamp: Optional[float] = None
+    ) -> List[Tuple[bool, float, Dict]]:
+        """
+        批量检测一帧中所有人是否跌倒（向量化计算，结果与逐个调用detect一致）
+        
+        Args:
+            keypoints: 关键点数组 [N, 17, 3]
+            object_ids: 与keypoints对应的对象（跟踪）ID列表
+            timestamp: 帧时间戳（秒），None时使用当前时间；离线处理录像时应传入视频时间，
+                       否则运动速度会按处理速度而非实际时间计算
+            
+        Returns:
+            与输入顺序一致的 (是否跌倒, 综合分数, 详情) 列表
+        """
+        if len(object_ids) == 0:
+            return []
+        
+        keypoints = np.asarray(keypoints)
+        if keypoints.ndim != 3 or keypoints.shape[1] <= self.RIGHT_ANKLE:
+            return [self.detect(kp, object_id) for kp, object_id in zip(keypoints, object_ids)]
+        
+        scores, details_list = self.calculate_fall_scores(keypoints)
+        shoulder_centers = self._get_center_points(
+            keypoints[:, self.LEFT_SHOULDER], keypoints[:, self.RIGHT_SHOULDER]
+        ).tolist()
+        
+        # 同一帧中的所有人共用一个时间戳
+        if timestamp is None:
+            timestamp = datetime.now().timestamp()
+        
+        return [
+            self._update_history(object_id, score, details, tuple(center), timestamp)
+            for object_id, score, details, center in zip(object_ids, scores, details_list, shoulder_centers)
+        ]
+    
+    def _update_history(
+        self,
+        object_id: int,
+        score: float,
+        details: Dict,
+        shoulder_center: Tuple[float, float],
+        timestamp: float
+    ) -> Tuple[bool, float, Dict]:
+        """记录历史并结合运动变化与历史平均分数给出最终判断"""
+        # 记录包含位置信息的历史（肩部中心点）
+        self.history.append(object_id, score, shoulder_center[0], shoulder_center[1], timestamp)
         
         # 使用历史数据计算运动变化
         motion_score = self._calculate_motion_score(object_id)
@@ -101,16 +150,15 @@ class FallDetector:
         details['combined_score'] = combined_score
         
         # 使用历史平均值判断
-        avg_score = sum(h['score'] for h in self.history[object_id]) / len(self.history[object_id])
+        avg_score = self.history.mean_score(object_id)
         is_fall = avg_score > self.fall_threshold
         
         details['avg_score'] = avg_score
-        details['history_length'] = len(self.history[object_id])
+        details['history_length'] = self.history.length(object_id)
         
         logger.debug(f"对象 {object_id}: 分数={score:.3f}, 平均={avg_score:.3f}, 跌倒={is_fall}")
         
-        # 确保所有值都是Python原生类型，避免JSON序列化问题
-        return is_fall, float(combined_score), self._convert_to_python_types(details)
+        return is_fall, float(combined_score), details
     
     def calculate_fall_score(self, keypoints: np.ndarray) -> Tuple[float, Dict]:
         """计算跌倒分数"""
@@ -177,6 +225,114 @@ class FallDetector:
         
         return fall_score, details
     
+    def calculate_fall_scores(self, keypoints: np.ndarray) -> Tuple[List[float], List[Dict]]:
+        """
+        向量化计算一帧中所有人的跌倒分数（与calculate_fall_score逐个计算的结果一致）
+        
+        Args:
+            keypoints: 关键点数组 [N, 17, 3]
+            
+        Returns:
+            (跌倒分数列表, 详情列表)
+        """
+        nose = keypoints[:, self.NOSE]
+        left_shoulder = keypoints[:, self.LEFT_SHOULDER]
+        right_shoulder = keypoints[:, self.RIGHT_SHOULDER]
+        left_hip = keypoints[:, self.LEFT_HIP]
+        right_hip = keypoints[:, self.RIGHT_HIP]
+        left_knee = keypoints[:, self.LEFT_KNEE]
+        right_knee = keypoints[:, self.RIGHT_KNEE]
+        left_ankle = keypoints[:, self.LEFT_ANKLE]
+        right_ankle = keypoints[:, self.RIGHT_ANKLE]
+        
+        # 检查关键点置信度
+        min_confidence = 0.4
+        valid = (
+            (left_shoulder[:, 2] > min_confidence) & (right_shoulder[:, 2] > min_confidence)
+            & (left_hip[:, 2] > min_confidence) & (right_hip[:, 2] > min_confidence)
+        )
+        
+        shoulder_center = self._get_center_points(left_shoulder, right_shoulder)
+        hip_center = self._get_center_points(left_hip, right_hip)
+        knee_center = self._get_center_points(left_knee, right_knee)
+        ankle_center = self._get_center_points(left_ankle, right_ankle)
+        
+        # 1. 身体角度（躯干与垂直方向的夹角），dy为0的行不做除法
+        dx = hip_center[:, 0] - shoulder_center[:, 0]
+        dy = hip_center[:, 1] - shoulder_center[:, 1]
+        slope = np.divide(dx, dy, out=np.zeros_like(dx), where=dy != 0)
+        angle = np.where(dy != 0, np.abs(np.arctan(slope) * 180 / math.pi), 90.0)
+        angle_score = np.where(
+            angle > self.angle_threshold_high, 0.35,
+            np.where(angle > self.angle_threshold_mid, 0.15, 0.0)
+        )
+        
+        # 2. 头部高度比例（保持与逐个计算相同的输入精度）
+        ankle_y = (left_ankle[:, 1] + right_ankle[:, 1]) / 2
+        height_valid = ~((ankle_y <= 0) | (nose[:, 1] <= 0))
+        height_ratio = np.divide(
+            ankle_y - nose[:, 1], ankle_y, out=np.ones_like(ankle_y), where=height_valid
+        ).astype(np.float64)
+        height_score = np.where(
+            ~height_valid, 0.0,
+            np.where(
+                height_ratio < self.height_ratio_high, 0.35,
+                np.where(height_ratio < self.height_ratio_mid, 0.15, 0.0)
+            )
+        )
+        
+        # 3. 姿态异常分数
+        posture_score = (
+            0.0
+            + np.where(shoulder_center[:, 1] > hip_center[:, 1], 0.15, 0.0)
+            + np.where(hip_center[:, 1] > knee_center[:, 1] * 0.85, 0.15, 0.0)
+        )
+        
+        # 4. 躯干与腿部比例
+        torso_length = np.hypot(
+            shoulder_center[:, 0] - hip_center[:, 0],
+            shoulder_center[:, 1] - hip_center[:, 1]
+        )
+        leg_length = np.hypot(
+            hip_center[:, 0] - ankle_center[:, 0],
+            hip_center[:, 1] - ankle_center[:, 1]
+        )
+        body_ratio = np.divide(
+            torso_length, leg_length, out=np.zeros_like(torso_length), where=leg_length != 0
+        )
+        body_ratio_score = np.where(
+            body_ratio > 0.8, 0.2, np.where(body_ratio > 0.6, 0.1, 0.0)
+        )
+        
+        # 综合评分
+        total_score = np.minimum(angle_score + height_score + posture_score + body_ratio_score, 1.0)
+        total_score = np.where(valid, total_score, 0.0)
+        
+        scores = total_score.tolist()
+        columns = zip(
+            valid.tolist(), angle.tolist(), angle_score.tolist(),
+            height_ratio.tolist(), height_score.tolist(), posture_score.tolist(),
+            body_ratio.tolist(), body_ratio_score.tolist(), scores
+        )
+        
+        details_list = []
+        for is_valid, a, a_score, h_ratio, h_score, p_score, b_ratio, b_score, total in columns:
+            if not is_valid:
+                details_list.append({'error': 'Low confidence keypoints'})
+                continue
+            details_list.append({
+                'body_angle': a,
+                'angle_score': a_score,
+                'height_ratio': h_ratio,
+                'height_score': h_score,
+                'posture_score': p_score,
+                'body_ratio': b_ratio,
+                'body_ratio_score': b_score,
+                'total_score': total
+            })
+        
+        return scores, details_list
+    
     def _calculate_body_angle(
         self, 
         left_shoulder: np.ndarray, 
@@ -305,21 +461,21 @@ class FallDetector:
     
     def _calculate_motion_score(self, object_id: int) -> float:
         """计算运动变化分数（检测突然的位置变化）"""
-        if object_id not in self.history or len(self.history[object_id]) < 3:
+        if self.history.length(object_id) < 3:
             return 0.0
             
         # 取最近的3个历史记录
-        recent = list(self.history[object_id])[-3:]
+        recent = self.history.window(object_id, 3)
         
         # 计算移动距离
         total_distance = 0
         time_diff = 0
         
         for i in range(1, len(recent)):
-            x1, y1 = recent[i-1]['position']
-            x2, y2 = recent[i]['position']
+            x1, y1 = recent[i-1, TrackHistoryBuffer.X], recent[i-1, TrackHistoryBuffer.Y]
+            x2, y2 = recent[i, TrackHistoryBuffer.X], recent[i, TrackHistoryBuffer.Y]
             total_distance += math.hypot(x2 - x1, y2 - y1)
-            time_diff += recent[i]['timestamp'] - recent[i-1]['timestamp']
+            time_diff += recent[i, TrackHistoryBuffer.TIMESTAMP] - recent[i-1, TrackHistoryBuffer.TIMESTAMP]
         
         # 计算平均速度
         if time_diff > 0:
@@ -339,6 +495,10 @@ class FallDetector:
             float((point1[1] + point2[1]) / 2)
         )
     
+    def _get_center_points(self, points1: np.ndarray, points2: np.ndarray) -> np.ndarray:
+        """批量计算两组点的中心点 [N, 2]（与_get_center_point的计算精度一致）"""
+        return ((points1[:, :2] + points2[:, :2]) / 2).astype(np.float64)
+    
     def _convert_to_python_types(self, data):
         """将numpy类型转换为Python原生类型，避免JSON序列化问题"""
         if isinstance(data, dict):
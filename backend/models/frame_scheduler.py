@@ -0,0 +1,178 @@
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class FrameScheduler:
+    """单路视频流的自适应关键帧调度器
+
+    只在关键帧上执行完整的YOLO推理；两个关键帧之间的帧若与上一关键帧的差异
+    （缩略灰度图的平均绝对差）低于阈值，则直接复用上一关键帧的检测结果。
+    任一目标的跌倒分数较高或正在上升时进入警戒状态，逐帧推理。
+    """
+
+    def __init__(
+        self,
+        diff_threshold: float = 0.02,
+        max_skip_frames: int = 5,
+        max_skip_seconds: float = 1.0,
+        alert_score: float = 0.4,
+        rise_threshold: float = 0.1,
+        alert_hold_frames: int = 15,
+        thumbnail_size: Tuple[int, int] = (64, 36)
+    ):
+        """
+        初始化调度器
+
+        Args:
+            diff_threshold: 帧差分数阈值（0~1），超过时立即推理
+            max_skip_frames: 连续复用结果的最大帧数
+            max_skip_seconds: 连续复用结果的最长时间（秒）
+            alert_score: 任一目标的跌倒分数达到该值时逐帧推理
+            rise_threshold: 最高跌倒分数相比上一关键帧上升超过该值时逐帧推理
+            alert_hold_frames: 进入警戒状态后至少保持逐帧推理的帧数
+            thumbnail_size: 计算帧差的缩略图尺寸 (宽, 高)
+        """
+        self.diff_threshold = diff_threshold
+        self.max_skip_frames = max(0, int(max_skip_frames))
+        self.max_skip_seconds = max_skip_seconds
+        self.alert_score = alert_score
+        self.rise_threshold = rise_threshold
+        self.alert_hold_frames = max(0, int(alert_hold_frames))
+        self.thumbnail_size = tuple(thumbnail_size)
+
+        self._lock = threading.Lock()
+        self._reset_state()
+
+        # 统计信息
+        self.keyframes = 0
+        self.skipped_frames = 0
+
+    def _reset_state(self):
+        self._key_thumbnail = None
+        self._key_time = 0.0
+        self._key_shape = None
+        self._skipped_since_key = 0
+        self._alert_remaining = 0
+        self._track_scores: Dict[int, float] = {}
+        self._detections: List[Dict] = []
+        self._scores: List[Tuple] = []
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """缩略灰度图（先缩放再转灰度，开销远小于一次推理）"""
+        small = cv2.resize(frame, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def frame_difference(self, thumbnail: np.ndarray) -> float:
+        """与上一关键帧的差异分数（0~1）"""
+        if self._key_thumbnail is None:
+            return 1.0
+        return float(cv2.absdiff(thumbnail, self._key_thumbnail).mean()) / 255.0
+
+    def schedule(self, frame: np.ndarray) -> Tuple[bool, Optional[np.ndarray], str]:
+        """
+        判断当前帧是否需要完整推理
+
+        Args:
+            frame: 当前帧
+
+        Returns:
+            (是否推理, 缩略图（推理后传给update）, 原因)
+        """
+        thumbnail = self._thumbnail(frame)
+        now = time.monotonic()
+
+        with self._lock:
+            if self._key_thumbnail is None or frame.shape != self._key_shape:
+                reason = 'first_frame'
+            elif self._alert_remaining > 0:
+                reason = 'alert'
+            elif self._skipped_since_key >= self.max_skip_frames:
+                reason = 'max_skip_frames'
+            elif now - self._key_time >= self.max_skip_seconds:
+                reason = 'max_skip_seconds'
+            elif self.frame_difference(thumbnail) > self.diff_threshold:
+                reason = 'motion'
+            else:
+                self._skipped_since_key += 1
+                self.skipped_frames += 1
+                return False, None, 'static'
+
+        return True, thumbnail, reason
+
+    def update(self, frame_shape, thumbnail: np.ndarray, detections: List[Dict], scores: List[Tuple]):
+        """
+        记录关键帧的推理结果
+
+        Args:
+            frame_shape: 关键帧尺寸
+            thumbnail: schedule返回的缩略图
+            detections: 关键帧的检测结果
+            scores: 与detections对应的 (is_fall, fall_score, details)
+        """
+        track_scores = {
+            detection['id']: float(score) for detection, (_, score, _) in zip(detections, scores)
+        }
+        max_score = max(track_scores.values(), default=0.0)
+
+        with self._lock:
+            # 只与同一目标上一关键帧的分数比较，新出现的目标不算上升
+            max_rise = max(
+                (score - self._track_scores[track_id]
+                 for track_id, score in track_scores.items() if track_id in self._track_scores),
+                default=0.0
+            )
+            if max_score >= self.alert_score or max_rise >= self.rise_threshold:
+                if self._alert_remaining == 0:
+                    logger.debug(f"跌倒分数 {max_score:.2f}（上升 {max_rise:.2f}），切换为逐帧推理")
+                self._alert_remaining = self.alert_hold_frames
+            elif self._alert_remaining > 0:
+                self._alert_remaining -= 1
+
+            self._key_thumbnail = thumbnail
+            self._key_shape = frame_shape
+            self._key_time = time.monotonic()
+            self._skipped_since_key = 0
+            self._track_scores = track_scores
+            self._detections = detections
+            self._scores = scores
+            self.keyframes += 1
+
+    def last_result(self) -> Tuple[List[Dict], List[Tuple]]:
+        """上一关键帧的检测结果 (detections, scores)"""
+        with self._lock:
+            return self._detections, self._scores
+
+    def reset(self):
+        """清空调度状态（下一帧必定推理）"""
+        with self._lock:
+            self._reset_state()
+
+    def get_stats(self) -> Dict:
+        """获取调度统计信息"""
+        with self._lock:
+            total = self.keyframes + self.skipped_frames
+            return {
+                'keyframes': self.keyframes,
+                'skipped_frames': self.skipped_frames,
+                'inference_ratio': self.keyframes / total if total else 0.0,
+                'alert': self._alert_remaining > 0
+            }
+
+    def get_config(self) -> Dict:
+        """获取配置信息"""
+        return {
+            'diff_threshold': float(self.diff_threshold),
+            'max_skip_frames': int(self.max_skip_frames),
+            'max_skip_seconds': float(self.max_skip_seconds),
+            'alert_score': float(self.alert_score),
+            'rise_threshold': float(self.rise_threshold),
+            'alert_hold_frames': int(self.alert_hold_frames)
+        }
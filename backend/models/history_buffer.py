@@ -0,0 +1,145 @@
+import numpy as np
+from typing import Dict
+
+class TrackHistoryBuffer:
+    """按跟踪ID组织的预分配环形历史缓冲区
+
+    所有对象的历史保存在一个 [对象槽位, history_length, 字段] 的NumPy数组中，
+    追加为O(1)写入，最近N条记录的读取为切片操作；
+    每个对象占用的内存固定为 history_length * 字段数 * 8 字节。
+    """
+
+    # 字段索引
+    SCORE = 0
+    X = 1
+    Y = 2
+    TIMESTAMP = 3
+    NUM_FIELDS = 4
+
+    def __init__(self, history_length: int, initial_capacity: int = 16):
+        """
+        初始化历史缓冲区
+
+        Args:
+            history_length: 每个对象保留的历史记录条数
+            initial_capacity: 初始对象槽位数，不足时按倍数扩容
+        """
+        self.history_length = max(1, int(history_length))
+        capacity = max(1, int(initial_capacity))
+
+        self._data = np.zeros((capacity, self.history_length, self.NUM_FIELDS), dtype=np.float64)
+        self._heads = np.zeros(capacity, dtype=np.int64)   # 下一次写入的位置
+        self._counts = np.zeros(capacity, dtype=np.int64)  # 已记录的条数
+        self._slots: Dict[int, int] = {}
+        self._free_slots = list(range(capacity - 1, -1, -1))
+
+    def _allocate_slot(self, object_id: int) -> int:
+        """为新对象分配槽位，槽位用尽时扩容"""
+        if not self._free_slots:
+            capacity = len(self._data)
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+            self._heads = np.concatenate([self._heads, np.zeros(capacity, dtype=np.int64)])
+            self._counts = np.concatenate([self._counts, np.zeros(capacity, dtype=np.int64)])
+            self._free_slots = list(range(2 * capacity - 1, capacity - 1, -1))
+
+        slot = self._free_slots.pop()
+        self._heads[slot] = 0
+        self._counts[slot] = 0
+        self._slots[object_id] = slot
+        return slot
+
+    def append(self, object_id: int, score: float, x: float, y: float, timestamp: float):
+        """
+        追加一条历史记录（超过history_length时覆盖最旧的记录）
+
+        Args:
+            object_id: 对象ID
+            score: 跌倒分数
+            x: 肩部中心x坐标
+            y: 肩部中心y坐标
+            timestamp: 时间戳（秒）
+        """
+        slot = self._slots.get(object_id)
+        if slot is None:
+            slot = self._allocate_slot(object_id)
+
+        head = self._heads[slot]
+        row = self._data[slot, head]
+        row[self.SCORE] = score
+        row[self.X] = x
+        row[self.Y] = y
+        row[self.TIMESTAMP] = timestamp
+
+        self._heads[slot] = (head + 1) % self.history_length
+        if self._counts[slot] < self.history_length:
+            self._counts[slot] += 1
+
+    def length(self, object_id: int) -> int:
+        """获取对象已记录的历史条数"""
+        slot = self._slots.get(object_id)
+        return 0 if slot is None else int(self._counts[slot])
+
+    def window(self, object_id: int, n: int = None) -> np.ndarray:
+        """
+        按时间顺序（旧 -> 新）读取对象最近n条记录
+
+        Args:
+            object_id: 对象ID
+            n: 记录条数，None表示全部已记录的条数
+
+        Returns:
+            [n, NUM_FIELDS] 数组；环形缓冲未回绕时为视图，回绕时为拷贝
+        """
+        slot = self._slots.get(object_id)
+        if slot is None:
+            return np.zeros((0, self.NUM_FIELDS), dtype=np.float64)
+
+        count = int(self._counts[slot])
+        n = count if n is None else min(int(n), count)
+        head = int(self._heads[slot])
+        start = head - n
+
+        if start >= 0:
+            return self._data[slot, start:head]
+        # 环形缓冲回绕：拼接尾部与头部两段
+        return np.concatenate([self._data[slot, start:], self._data[slot, :head]])
+
+    def mean_score(self, object_id: int) -> float:
+        """对象全部历史记录的平均分数"""
+        scores = self.window(object_id)[:, self.SCORE]
+        return float(scores.sum() / len(scores)) if len(scores) else 0.0
+
+    def __contains__(self, object_id) -> bool:
+        return object_id in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __delitem__(self, object_id):
+        slot = self._slots.pop(object_id)
+        self._counts[slot] = 0
+        self._heads[slot] = 0
+        self._free_slots.append(slot)
+
+    def clear(self):
+        """清空所有对象的历史记录"""
+        self._slots.clear()
+        self._heads[:] = 0
+        self._counts[:] = 0
+        self._free_slots = list(range(len(self._data) - 1, -1, -1))
+
+    def get_state(self) -> Dict:
+        """导出所有对象的历史记录（可JSON序列化，按时间顺序），用于断点续跑"""
+        return {str(object_id): self.window(object_id).tolist() for object_id in self._slots}
+
+    def load_state(self, state: Dict):
+        """清空后恢复 get_state 导出的历史记录（对象ID为整数）"""
+        self.clear()
+        for object_id, rows in state.items():
+            for score, x, y, timestamp in rows[-self.history_length:]:
+                self.append(int(object_id), score, x, y, timestamp)
+
+    @property
+    def nbytes(self) -> int:
+        """缓冲区占用的内存字节数"""
+        return self._data.nbytes + self._heads.nbytes + self._counts.nbytes
@@ -0,0 +1,409 @@
+import threading
+import queue
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LIVE_SOURCE_PREFIXES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+# 流水线结束标记
+_END = object()
+
+def is_live_source(source: str) -> bool:
+    """是否为实时流（RTSP/HTTP等），实时流队列满时丢弃旧帧，文件源则阻塞等待"""
+    return str(source).lower().startswith(LIVE_SOURCE_PREFIXES)
+
+class _FrameItem:
+    """在各阶段之间传递的一帧"""
+
+    __slots__ = ('seq', 'position_ms', 'decoded_at', 'frame', 'detections', 'scores')
+
+    def __init__(self, seq: int, position_ms: float, frame: np.ndarray):
+        self.seq = seq
+        self.position_ms = position_ms
+        self.decoded_at = time.perf_counter()
+        self.frame = frame
+        self.detections = None
+        self.scores = None
+
+class StageStats:
+    """单个流水线阶段的计时统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.items = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, items: int = 1):
+        with self._lock:
+            self.calls += 1
+            self.items += items
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'items': self.items,
+                'avg_ms': self.total_time / self.calls * 1000 if self.calls else 0.0,
+                'max_ms': self.max_time * 1000,
+                'per_item_ms': self.total_time / self.items * 1000 if self.items else 0.0,
+                'busy_seconds': self.total_time
+            }
+
+class VideoIngestPipeline:
+    """服务端视频接入流水线（视频文件或RTSP/HTTP流）
+
+    解码 -> 批量推理 -> 跌倒评分 -> 结果输出 四个阶段各占一个线程，
+    阶段之间由有界队列连接，解码下一帧、推理当前批与评分上一批同时进行。
+    实时流在推理跟不上时丢弃最旧的已解码帧，保证处理的总是最新画面；
+    视频文件则由有界队列反压解码线程，逐帧处理不丢帧。
+    """
+
+    def __init__(
+        self,
+        source: str,
+        detect_batch: Callable[[List[np.ndarray]], List[List[Dict]]],
+        score: Callable[[List[Dict]], List[tuple]],
+        sink: Callable[[np.ndarray, List[Dict], List[tuple]], None],
+        queue_size: int = 8,
+        batch_size: int = 4,
+        batch_wait_ms: float = 20.0,
+        realtime: bool = False,
+        loop: bool = False,
+        reconnect_seconds: float = 2.0,
+        on_finish: Optional[Callable[['VideoIngestPipeline'], None]] = None
+    ):
+        """
+        初始化接入流水线
+
+        Args:
+            source: 视频文件路径或流地址
+            detect_batch: 批量姿态检测函数（如 YOLODetector.detect_batch）
+            score: 评分函数 检测结果 -> 跌倒评分列表 [(is_fall, fall_score, details), ...]，
+                   按帧顺序调用，可在检测结果中写入跟踪ID
+            sink: 结果输出函数 (帧, 检测结果, 跌倒评分列表)
+            queue_size: 各阶段之间队列的最大长度
+            batch_size: 推理阶段单批最大帧数
+            batch_wait_ms: 推理阶段凑批的最长等待时间（毫秒）
+            realtime: 视频文件是否按原始帧率解码（模拟摄像头）
+            loop: 视频文件结束后是否从头循环
+            reconnect_seconds: 实时流断开后的重连间隔（秒）
+            on_finish: 流水线结束（文件读完、出错或被停止）后的回调
+        """
+        self.source = source
+        self.detect_batch = detect_batch
+        self.score = score
+        self.sink = sink
+        self.queue_size = max(1, int(queue_size))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = max(0.0, float(batch_wait_ms)) / 1000.0
+        self.realtime = realtime
+        self.loop = loop
+        self.reconnect_seconds = reconnect_seconds
+        self.on_finish = on_finish
+        self.live = is_live_source(source)
+
+        self._decode_queue = queue.Queue(maxsize=self.queue_size)
+        self._score_queue = queue.Queue(maxsize=self.queue_size)
+        self._sink_queue = queue.Queue(maxsize=self.queue_size)
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        self.stages = {name: StageStats(name) for name in ('decode', 'infer', 'score', 'sink')}
+        self._stats_lock = threading.Lock()
+        self.state = 'created'
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.source_fps = None
+        self.frame_size = None
+        self.decoded_frames = 0
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.reconnects = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        """启动各阶段线程"""
+        if self._threads:
+            return
+        self.started_at = time.time()
+        self.state = 'running'
+        for name, target in (
+            ('decode', self._decode_loop),
+            ('infer', self._infer_loop),
+            ('score', self._score_loop),
+            ('sink', self._sink_loop)
+        ):
+            thread = threading.Thread(target=target, name=f'ingest-{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"视频接入流水线已启动: {self.source} (实时流: {self.live})")
+
+    def stop(self, timeout: float = 5.0):
+        """停止流水线（丢弃尚未处理的帧）"""
+        self._stop_event.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待流水线结束，返回是否已结束"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+        return not any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """阻塞写入下一阶段队列（可被停止信号打断），返回是否写入成功"""
+        while not self._stop_event.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue, timeout: float = 0.1):
+        try:
+            return source.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _open(self) -> Optional[cv2.VideoCapture]:
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            capture.release()
+            return None
+        if self.live:
+            # 实时流只缓存最少的帧，降低延迟（部分后端不支持，忽略返回值）
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        self.source_fps = fps if fps and fps > 0 else None
+        self.frame_size = [
+            int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        ]
+        return capture
+
+    def _decode_loop(self):
+        """解码阶段：读取帧并送入推理队列"""
+        seq = 0
+        capture = None
+        try:
+            while not self._stop_event.is_set():
+                if capture is None:
+                    capture = self._open()
+                    if capture is None:
+                        if not self.live:
+                            raise RuntimeError(f"无法打开视频源: {self.source}")
+                        logger.warning(f"无法连接视频流 {self.source}，{self.reconnect_seconds}秒后重试")
+                        self._stop_event.wait(self.reconnect_seconds)
+                        self.reconnects += 1
+                        continue
+                    next_frame_at = time.perf_counter()
+
+                start = time.perf_counter()
+                ok, frame = capture.read()
+                elapsed = time.perf_counter() - start
+
+                if not ok:
+                    capture.release()
+                    capture = None
+                    if self.live:
+                        logger.warning(f"视频流 {self.source} 中断，正在重连")
+                        self.reconnects += 1
+                        continue
+                    if self.loop:
+                        continue
+                    break
+
+                self.stages['decode'].record(elapsed)
+                seq += 1
+                self.decoded_frames += 1
+                item = _FrameItem(seq, capture.get(cv2.CAP_PROP_POS_MSEC), frame)
+
+                if self.live:
+                    # 实时流：队列满时丢弃最旧的帧，保证延迟有界
+                    while True:
+                        try:
+                            self._decode_queue.put_nowait(item)
+                            break
+                        except queue.Full:
+                            try:
+                                self._decode_queue.get_nowait()
+                                self.dropped_frames += 1
+                            except queue.Empty:
+                                pass
+                elif not self._put(self._decode_queue, item):
+                    break
+
+                if self.realtime and not self.live and self.source_fps:
+                    next_frame_at += 1.0 / self.source_fps
+                    delay = next_frame_at - time.perf_counter()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"视频解码失败: {str(e)}")
+        finally:
+            if capture is not None:
+                capture.release()
+            self._put(self._decode_queue, _END)
+
+    def _collect_batch(self):
+        """收集一批帧：达到批大小或等待窗口结束即返回，遇到结束标记时一并返回"""
+        first = self._get(self._decode_queue)
+        if first is None or first is _END:
+            return [], first is _END
+
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = (
+                    self._decode_queue.get_nowait() if remaining <= 0
+                    else self._decode_queue.get(timeout=remaining)
+                )
+            except queue.Empty:
+                break
+            if item is _END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _infer_loop(self):
+        """推理阶段：一批帧一次前向推理"""
+        finished = False
+        try:
+            while not finished and not self._stop_event.is_set():
+                batch, finished = self._collect_batch()
+                if not batch:
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    results = self.detect_batch([item.frame for item in batch])
+                except Exception as e:
+                    logger.error(f"接入流水线推理失败: {str(e)}")
+                    results = [[] for _ in batch]
+                self.stages['infer'].record(time.perf_counter() - start, len(batch))
+
+                for item, detections in zip(batch, results):
+                    item.detections = detections
+                    if not self._put(self._score_queue, item):
+                        return
+        finally:
+            self._put(self._score_queue, _END)
+
+    def _score_loop(self):
+        """评分阶段：按帧顺序执行跟踪与跌倒判断"""
+        try:
+            while not self._stop_event.is_set():
+                item = self._get(self._score_queue)
+                if item is None:
+                    continue
+                if item is _END:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    item.scores = self.score(item.detections)
+                except Exception as e:
+                    logger.error(f"接入流水线评分失败: {str(e)}")
+                    item.scores = []
+                self.stages['score'].record(time.perf_counter() - start)
+
+                if not self._put(self._sink_queue, item):
+                    return
+        finally:
+            self._put(self._sink_queue, _END)
+
+    def _sink_loop(self):
+        """输出阶段：事件采集、归档与结果发布"""
+        try:
+            while not self._stop_event.is_set():
+                item = self._get(self._sink_queue)
+                if item is None:
+                    continue
+                if item is _END:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    self.sink(item.frame, item.detections, item.scores)
+                except Exception as e:
+                    logger.error(f"接入流水线结果输出失败: {str(e)}")
+                done = time.perf_counter()
+                self.stages['sink'].record(done - start)
+
+                latency = done - item.decoded_at
+                with self._stats_lock:
+                    self.processed_frames += 1
+                    self.total_latency += latency
+                    self.max_latency = max(self.max_latency, latency)
+        finally:
+            self.finished_at = time.time()
+            if self.error:
+                self.state = 'failed'
+            elif self._stop_event.is_set():
+                self.state = 'stopped'
+            else:
+                self.state = 'finished'
+            logger.info(
+                f"视频接入流水线结束: {self.source}, 状态: {self.state}, "
+                f"解码 {self.decoded_frames} 帧, 处理 {self.processed_frames} 帧, 丢弃 {self.dropped_frames} 帧"
+            )
+            if self.on_finish is not None:
+                try:
+                    self.on_finish(self)
+                except Exception as e:
+                    logger.error(f"接入流水线结束回调失败: {str(e)}")
+
+    def get_stats(self) -> Dict:
+        """获取流水线统计信息（各阶段耗时、队列深度、吞吐与端到端延迟）"""
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        with self._stats_lock:
+            processed = self.processed_frames
+            latency = {
+                'avg_ms': self.total_latency / processed * 1000 if processed else 0.0,
+                'max_ms': self.max_latency * 1000
+            }
+        return {
+            'source': self.source,
+            'live': self.live,
+            'state': self.state,
+            'error': self.error,
+            'source_fps': self.source_fps,
+            'frame_size': self.frame_size,
+            'decoded_frames': self.decoded_frames,
+            'processed_frames': processed,
+            'dropped_frames': self.dropped_frames,
+            'reconnects': self.reconnects,
+            'throughput_fps': processed / elapsed if elapsed > 0 else 0.0,
+            'latency': latency,
+            'queues': {
+                'decode': self._decode_queue.qsize(),
+                'score': self._score_queue.qsize(),
+                'sink': self._sink_queue.qsize(),
+                'max_size': self.queue_size
+            },
+            'stages': {name: stage.get_stats() for name, stage in self.stages.items()}
+        }
@@ -0,0 +1,319 @@
+"""
+姿态模型INT8量化与精度评估
+
+校准: 从跌倒训练数据(fall_training_data)中抽取图片，按YOLO的letterbox方式预处理后
+      作为onnxruntime静态量化的校准数据。
+评估: 在不含校准图片的另一批图片上，对比量化前的FP32 ONNX模型与INT8模型的边界框、关键点漂移
+      以及FallDetector的跌倒判定一致性，并给出推理耗时与加速比，用于判断量化后的模型是否可以
+      安全用于跌倒判定（两者运行在同一onnxruntime上，差异只来自量化本身）。
+
+用法（在backend目录下）:
+    python -m models.quantization --data fall_training_data --limit 200 --output logs/int8_report.json
+"""
+import os
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# YOLOv8-pose的检测头（model.22）对量化误差最敏感，保持FP32计算
+DEFAULT_EXCLUDE_PREFIXES = ('/model.22/',)
+
+def find_calibration_images(
+    data_dir: str,
+    limit: int = 100,
+    seed: int = 0,
+    exclude: Sequence[str] = ()
+) -> List[str]:
+    """
+    在数据集目录（含子目录）中随机抽取校准（或评估）图片
+
+    Args:
+        data_dir: 图片目录，如 fall_training_data
+        limit: 最多抽取的图片数
+        seed: 随机种子，保证多次校准使用同一批图片
+        exclude: 不参与抽样的图片路径（如抽取评估图片时排除校准图片）
+
+    Returns:
+        图片路径列表（按路径排序后抽样）
+    """
+    excluded = {os.path.abspath(path) for path in exclude}
+    paths = sorted(
+        str(path) for path in Path(data_dir).rglob('*')
+        if path.suffix.lower() in IMAGE_EXTENSIONS and os.path.abspath(path) not in excluded
+    )
+    if len(paths) > limit:
+        rng = np.random.default_rng(seed)
+        paths = sorted(rng.choice(paths, size=limit, replace=False).tolist())
+    return paths
+
+def letterbox(image: np.ndarray, imgsz: int = 640) -> np.ndarray:
+    """
+    按YOLO推理时的方式缩放并填充图像
+
+    Returns:
+        [1, 3, imgsz, imgsz] float32 输入张量（RGB，归一化到0~1）
+    """
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None]
+    return np.ascontiguousarray(tensor, dtype=np.float32) / 255.0
+
+def quantize_onnx_model(
+    fp32_path: str,
+    int8_path: str,
+    image_paths: Sequence[str],
+    imgsz: int = 640,
+    exclude_prefixes: Sequence[str] = DEFAULT_EXCLUDE_PREFIXES
+):
+    """
+    使用onnxruntime对ONNX模型做静态INT8量化（QDQ格式，权重按通道量化）
+
+    Args:
+        fp32_path: FP32 ONNX模型路径
+        int8_path: 输出的INT8模型路径
+        image_paths: 校准图片路径
+        imgsz: 模型输入尺寸
+        exclude_prefixes: 不量化的节点名前缀
+    """
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    )
+
+    if not image_paths:
+        raise ValueError('没有可用于校准的图片')
+
+    model = onnx.load(fp32_path)
+    input_name = model.graph.input[0].name
+    nodes_to_exclude = [
+        node.name for node in model.graph.node
+        if any(node.name.startswith(prefix) for prefix in exclude_prefixes)
+    ]
+    del model
+
+    class _ImageReader(CalibrationDataReader):
+        """逐张读取校准图片"""
+
+        def __init__(self):
+            self._paths = iter(image_paths)
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: letterbox(image, imgsz)}
+            return None
+
+    logger.info(f"开始INT8量化: {len(image_paths)} 张校准图片, 保持FP32的节点 {len(nodes_to_exclude)} 个")
+    quantize_static(
+        fp32_path,
+        int8_path,
+        _ImageReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=nodes_to_exclude
+    )
+    logger.info(f"INT8量化完成: {int8_path}")
+
+def _match_detections(reference: List[Dict], candidate: List[Dict], iou_threshold: float = 0.5):
+    """按IoU贪心匹配两组检测结果，返回 [(参考索引, 候选索引, IoU), ...]"""
+    from models.tracker import iou_matrix, greedy_match
+
+    if not reference or not candidate:
+        return []
+    boxes_a = np.asarray([d['bbox'] for d in reference], dtype=np.float64)
+    boxes_b = np.asarray([d['bbox'] for d in candidate], dtype=np.float64)
+    iou = iou_matrix(boxes_a, boxes_b)
+    return [(r, c, float(iou[r, c])) for r, c in greedy_match(iou, iou_threshold)]
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+def compare_models(
+    reference_detector,
+    candidate_detector,
+    image_paths: Sequence[str],
+    fall_detector_config: Optional[Dict] = None,
+    keypoint_confidence: float = 0.5
+) -> Dict:
+    """
+    对比两个检测器（通常为量化前的FP32 ONNX模型与INT8模型）的检测结果
+
+    关键点漂移以边界框对角线归一化（只统计两边置信度都超过keypoint_confidence的关键点）；
+    跌倒判定一致性对每对匹配的检测分别用全新的FallDetector做单帧判定后比较。
+
+    Args:
+        reference_detector: 参考检测器（FP32 ONNX）
+        candidate_detector: 待评估的检测器（INT8）
+        image_paths: 评估图片路径
+        fall_detector_config: FallDetector参数
+        keypoint_confidence: 参与漂移统计的关键点置信度阈值
+
+    Returns:
+        评估报告
+    """
+    from models.fall_detector import FallDetector
+
+    fall_detector_config = fall_detector_config or {}
+    reference_times, candidate_times = [], []
+    box_ious, keypoint_drifts, score_diffs = [], [], []
+    images = 0
+    reference_count = candidate_count = matched = 0
+    decisions = {'agree': 0, 'fall_to_normal': 0, 'normal_to_fall': 0}
+
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        images += 1
+
+        start = time.perf_counter()
+        reference = reference_detector.detect(image)
+        reference_times.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        candidate = candidate_detector.detect(image)
+        candidate_times.append((time.perf_counter() - start) * 1000)
+
+        reference_count += len(reference)
+        candidate_count += len(candidate)
+
+        for r, c, iou in _match_detections(reference, candidate):
+            matched += 1
+            box_ious.append(iou)
+
+            ref_det, cand_det = reference[r], candidate[c]
+            ref_kpts = np.asarray(ref_det['keypoints'], dtype=np.float64)
+            cand_kpts = np.asarray(cand_det['keypoints'], dtype=np.float64)
+            x1, y1, x2, y2 = ref_det['bbox']
+            diagonal = max(np.hypot(x2 - x1, y2 - y1), 1e-6)
+            visible = (ref_kpts[:, 2] > keypoint_confidence) & (cand_kpts[:, 2] > keypoint_confidence)
+            if visible.any():
+                drift = np.hypot(*(ref_kpts[visible, :2] - cand_kpts[visible, :2]).T) / diagonal
+                keypoint_drifts.extend(drift.tolist())
+
+            ref_fall, ref_score, _ = FallDetector(**fall_detector_config).detect(ref_kpts)
+            cand_fall, cand_score, _ = FallDetector(**fall_detector_config).detect(cand_kpts)
+            score_diffs.append(abs(ref_score - cand_score))
+            if ref_fall == cand_fall:
+                decisions['agree'] += 1
+            elif ref_fall:
+                decisions['fall_to_normal'] += 1
+            else:
+                decisions['normal_to_fall'] += 1
+
+    # 第一张图包含预热开销，不计入耗时统计
+    reference_latency = _percentile(reference_times[1:] or reference_times, 50)
+    candidate_latency = _percentile(candidate_times[1:] or candidate_times, 50)
+
+    return {
+        'images': images,
+        'detections': {
+            'reference': reference_count,
+            'candidate': candidate_count,
+            'matched': matched,
+            'recall_vs_reference': matched / reference_count if reference_count else None
+        },
+        'box_iou': {
+            'mean': float(np.mean(box_ious)) if box_ious else None,
+            'p5': _percentile(box_ious, 5)
+        },
+        'keypoint_drift': {
+            'unit': 'bbox_diagonal',
+            'mean': float(np.mean(keypoint_drifts)) if keypoint_drifts else None,
+            'p95': _percentile(keypoint_drifts, 95),
+            'max': float(np.max(keypoint_drifts)) if keypoint_drifts else None
+        },
+        'fall_decision': {
+            **decisions,
+            'agreement': decisions['agree'] / matched if matched else None,
+            'score_abs_diff_mean': float(np.mean(score_diffs)) if score_diffs else None,
+            'score_abs_diff_max': float(np.max(score_diffs)) if score_diffs else None
+        },
+        'latency_ms': {
+            'reference_p50': reference_latency,
+            'candidate_p50': candidate_latency,
+            'speedup': (
+                reference_latency / candidate_latency
+                if reference_latency and candidate_latency else None
+            )
+        }
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比FP32与INT8姿态模型的关键点漂移与跌倒判定一致性')
+    parser.add_argument('--data', default='fall_training_data', help='校准/评估图片目录')
+    parser.add_argument('--limit', type=int, default=200, help='评估图片数')
+    parser.add_argument('--output', default=os.path.join('logs', 'int8_report.json'), help='报告输出路径')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from config import get_config
+    from models.yolo_detector import YOLODetector
+    from models.fall_detector import FallDetector
+
+    config = get_config()
+    model_path = str(config.MODEL_PATH) if config.MODEL_PATH.exists() else config.MODEL_NAME
+    fall_config = FallDetector(
+        fall_threshold=config.FALL_THRESHOLD,
+        angle_threshold_high=config.ANGLE_THRESHOLD_HIGH,
+        angle_threshold_mid=config.ANGLE_THRESHOLD_MID,
+        height_ratio_high=config.HEIGHT_RATIO_HIGH,
+        height_ratio_mid=config.HEIGHT_RATIO_MID,
+        history_length=config.HISTORY_LENGTH
+    ).get_config()
+
+    # 参考模型为量化所用的FP32 ONNX模型，而不是PyTorch模型，差异只来自量化
+    reference = YOLODetector(model_path, config.MODEL_CONFIDENCE, backend='onnx', imgsz=config.MODEL_IMGSZ)
+    if reference.backend != 'onnx':
+        raise SystemExit('FP32 ONNX模型不可用，请检查onnxruntime/onnx是否已安装')
+    candidate = YOLODetector(
+        model_path, config.MODEL_CONFIDENCE, backend='onnx', imgsz=config.MODEL_IMGSZ,
+        precision='int8', calibration_dir=args.data, calibration_size=config.CALIBRATION_SIZE
+    )
+    if candidate.precision != 'int8':
+        raise SystemExit('INT8模型不可用，请检查onnxruntime/onnx是否已安装')
+
+    image_paths = find_calibration_images(args.data, args.limit, seed=1, exclude=candidate.calibration_images)
+    if not image_paths:
+        raise SystemExit(f"{args.data} 中除校准图片外没有可用于评估的图片")
+    report = {
+        'reference': reference.get_model_info(),
+        'candidate': candidate.get_model_info(),
+        'calibration_images': len(candidate.calibration_images),
+        **compare_models(reference, candidate, image_paths, fall_config)
+    }
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    decision = report['fall_decision']
+    logger.info(
+        f"评估完成: {report['images']} 张图片, 跌倒判定一致率 {decision['agreement']}, "
+        f"关键点漂移p95 {report['keypoint_drift']['p95']}, 加速比 {report['latency_ms']['speedup']}, "
+        f"报告: {args.output}"
+    )
+
+if __name__ == '__main__':
+    main()
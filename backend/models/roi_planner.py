@@ -0,0 +1,194 @@
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int, int, int]
+
+def merge_regions(regions: List[Region]) -> List[Region]:
+    """合并相互重叠的区域，直到区域两两不相交"""
+    merged = [list(region) for region in regions]
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        while merged:
+            current = merged.pop()
+            i = 0
+            while i < len(merged):
+                other = merged[i]
+                if (current[0] < other[2] and other[0] < current[2]
+                        and current[1] < other[3] and other[1] < current[3]):
+                    current = [
+                        min(current[0], other[0]), min(current[1], other[1]),
+                        max(current[2], other[2]), max(current[3], other[3])
+                    ]
+                    merged.pop(i)
+                    changed = True
+                else:
+                    i += 1
+            result.append(current)
+        merged = result
+    return [tuple(region) for region in merged]
+
+class RoiPlanner:
+    """单路视频流的感兴趣区域（ROI）规划器
+
+    根据上一次推理跟踪到的目标框（外扩padding）和帧差运动区域，
+    只对画面中可能有人的区域裁剪后做姿态估计；每隔若干帧做一次全画面推理，
+    以发现静止进入画面的新目标。区域面积占比过大时直接全画面推理。
+    """
+
+    def __init__(
+        self,
+        padding: float = 0.25,
+        motion_threshold: int = 25,
+        full_refresh_frames: int = 30,
+        max_area_ratio: float = 0.5,
+        min_region_size: int = 160,
+        motion_scale: int = 160
+    ):
+        """
+        初始化ROI规划器
+
+        Args:
+            padding: 目标框向四周外扩的比例（相对框的宽高）
+            motion_threshold: 帧差二值化阈值（灰度0~255）
+            full_refresh_frames: 每隔多少次推理做一次全画面推理
+            max_area_ratio: 区域总面积超过画面面积的该比例时改为全画面推理
+            min_region_size: 区域的最小边长（像素），过小的区域以中心扩大
+            motion_scale: 计算运动区域时缩略图的宽度（像素）
+        """
+        self.padding = padding
+        self.motion_threshold = motion_threshold
+        self.full_refresh_frames = max(1, int(full_refresh_frames))
+        self.max_area_ratio = max_area_ratio
+        self.min_region_size = min_region_size
+        self.motion_scale = motion_scale
+
+        self._lock = threading.Lock()
+        self._reset_state()
+
+        # 统计信息
+        self.full_frames = 0
+        self.roi_frames = 0
+        self.roi_area_ratio_sum = 0.0
+
+    def _reset_state(self):
+        self._prev_gray = None
+        self._prev_shape = None
+        self._boxes: List[List[float]] = []
+        self._since_full = 0
+
+    def _motion_gray(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        scaled_height = max(1, int(round(height * self.motion_scale / width)))
+        small = cv2.resize(frame, (self.motion_scale, scaled_height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def _motion_regions(self, gray: np.ndarray, frame_shape) -> List[Region]:
+        """与上一次推理帧的帧差运动区域（映射回原图坐标）"""
+        mask = cv2.absdiff(gray, self._prev_gray)
+        _, mask = cv2.threshold(mask, self.motion_threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        scale = frame_shape[1] / gray.shape[1]
+        regions = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            regions.append((x * scale, y * scale, (x + w) * scale, (y + h) * scale))
+        return regions
+
+    def _expand(self, box, frame_shape) -> Region:
+        """外扩padding并保证最小边长，裁剪到画面内"""
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = box
+        pad_x, pad_y = (x2 - x1) * self.padding, (y2 - y1) * self.padding
+        x1, y1, x2, y2 = x1 - pad_x, y1 - pad_y, x2 + pad_x, y2 + pad_y
+
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        half_w = max(x2 - x1, self.min_region_size) / 2
+        half_h = max(y2 - y1, self.min_region_size) / 2
+        return (
+            int(max(0, cx - half_w)), int(max(0, cy - half_h)),
+            int(min(width, cx + half_w)), int(min(height, cy + half_h))
+        )
+
+    def plan(self, frame: np.ndarray) -> Tuple[Optional[List[Region]], str]:
+        """
+        规划当前帧的推理区域
+
+        Args:
+            frame: 当前帧（即将推理的帧）
+
+        Returns:
+            (区域列表 [(x1, y1, x2, y2), ...]，None表示全画面推理; 原因)
+        """
+        gray = self._motion_gray(frame)
+
+        with self._lock:
+            reason = None
+            if self._prev_gray is None or frame.shape != self._prev_shape:
+                reason = 'first_frame'
+            elif self._since_full + 1 >= self.full_refresh_frames:
+                reason = 'refresh'
+
+            regions = []
+            if reason is None:
+                candidates = list(self._boxes) + self._motion_regions(gray, frame.shape)
+                regions = merge_regions([self._expand(box, frame.shape) for box in candidates])
+                area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+                area_ratio = area / float(frame.shape[0] * frame.shape[1])
+                if area_ratio > self.max_area_ratio:
+                    reason = 'large_roi'
+
+            self._prev_gray = gray
+            self._prev_shape = frame.shape
+
+            if reason is not None:
+                self._since_full = 0
+                self.full_frames += 1
+                return None, reason
+
+            self._since_full += 1
+            self.roi_frames += 1
+            self.roi_area_ratio_sum += area_ratio
+            return regions, 'roi'
+
+    def update(self, boxes: List):
+        """记录本次推理后仍存活的目标框（含短暂丢失的轨迹），作为下一帧的候选区域"""
+        with self._lock:
+            self._boxes = [list(box) for box in boxes]
+
+    def reset(self):
+        """清空状态（下一帧必定全画面推理）"""
+        with self._lock:
+            self._reset_state()
+
+    def get_stats(self) -> Dict:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                'full_frames': self.full_frames,
+                'roi_frames': self.roi_frames,
+                'mean_roi_area_ratio': (
+                    self.roi_area_ratio_sum / self.roi_frames if self.roi_frames else None
+                )
+            }
+
+    def get_config(self) -> Dict:
+        """获取配置信息"""
+        return {
+            'padding': float(self.padding),
+            'motion_threshold': int(self.motion_threshold),
+            'full_refresh_frames': int(self.full_refresh_frames),
+            'max_area_ratio': float(self.max_area_ratio),
+            'min_region_size': int(self.min_region_size)
+        }
@@ -0,0 +1,281 @@
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_ID = 'default'
+# 未指定流ID的单张图片检测使用的流，与视频帧的默认流分开，避免图片混入视频的跟踪与跌倒历史
+DEFAULT_IMAGE_STREAM_ID = 'default-image'
+
+# 计算流帧率使用的最近帧数，以及超过多久没有新帧即视为帧率为0（秒）
+FPS_WINDOW_FRAMES = 30
+FPS_IDLE_SECONDS = 2.0
+
+class StreamSession:
+    """单路视频流的检测状态（跌倒检测历史、跟踪轨迹）"""
+
+    def __init__(self, stream_id: str, fall_detector, tracker=None, scheduler=None, roi_planner=None):
+        """
+        初始化流会话
+
+        Args:
+            stream_id: 流ID（摄像头/客户端标识）
+            fall_detector: 该流独享的FallDetector实例
+            tracker: 该流独享的跟踪器实例，可为None
+            scheduler: 该流独享的关键帧调度器，可为None（逐帧推理）
+            roi_planner: 该流独享的ROI规划器，可为None（全画面推理）
+        """
+        self.stream_id = stream_id
+        self.fall_detector = fall_detector
+        self.tracker = tracker
+        self.scheduler = scheduler
+        self.roi_planner = roi_planner
+        # 同一路流的帧按顺序更新跟踪与跌倒状态
+        self.lock = threading.RLock()
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.frame_count = 0
+        # 已处理帧统计（供/metrics导出）
+        self.processed_frames = 0
+        self.keyframes = 0
+        self.fall_frames = 0
+        self._frame_times = deque(maxlen=FPS_WINDOW_FRAMES)
+
+    def touch(self):
+        """记录一次访问"""
+        self.last_access = time.time()
+        self.frame_count += 1
+
+    def record_frame(self, keyframe: bool = True, fall_detected: bool = False):
+        """记录一帧处理完成"""
+        self.processed_frames += 1
+        if keyframe:
+            self.keyframes += 1
+        if fall_detected:
+            self.fall_frames += 1
+        self._frame_times.append(time.monotonic())
+
+    def get_fps(self) -> float:
+        """最近若干帧的处理帧率，一段时间没有新帧时为0"""
+        times = list(self._frame_times)
+        if len(times) < 2 or time.monotonic() - times[-1] > FPS_IDLE_SECONDS:
+            return 0.0
+        elapsed = times[-1] - times[0]
+        return (len(times) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def remove_track(self, track_id: int):
+        """清理已消失目标的跌倒检测历史"""
+        self.fall_detector.reset_history(track_id)
+
+    def reset(self, object_id: Optional[int] = None):
+        """重置该流的检测状态"""
+        with self.lock:
+            self.fall_detector.reset_history(object_id)
+            if object_id is None and self.tracker is not None:
+                self.tracker.reset()
+            if self.scheduler is not None:
+                self.scheduler.reset()
+            if self.roi_planner is not None:
+                self.roi_planner.reset()
+
+    def get_info(self) -> Dict:
+        """获取会话信息"""
+        info = {
+            'stream_id': self.stream_id,
+            'created_at': self.created_at,
+            'last_access': self.last_access,
+            'idle_seconds': time.time() - self.last_access,
+            'frame_count': self.frame_count,
+            'processed_frames': self.processed_frames,
+            'keyframes': self.keyframes,
+            'fall_frames': self.fall_frames,
+            'fps': self.get_fps(),
+            'tracked_objects': len(self.fall_detector.history)
+        }
+        if self.scheduler is not None:
+            info['scheduler'] = self.scheduler.get_stats()
+        if self.roi_planner is not None:
+            info['roi'] = self.roi_planner.get_stats()
+        return info
+
+class StreamSessionManager:
+    """按流ID隔离的检测状态存储
+
+    线程安全；空闲超过TTL的会话会被淘汰，会话数超过上限时按LRU淘汰最久未使用的会话。
+    会话被淘汰或移除后调用 on_evict(stream_id)，用于释放该路流在会话之外的状态（如进行中的跌倒事件）。
+    """
+
+    def __init__(
+        self,
+        fall_detector_factory: Callable,
+        tracker_factory: Optional[Callable] = None,
+        scheduler_factory: Optional[Callable] = None,
+        roi_planner_factory: Optional[Callable] = None,
+        ttl_seconds: float = 300,
+        max_sessions: int = 64,
+        eviction_interval: float = 10.0,
+        on_evict: Optional[Callable[[str], None]] = None
+    ):
+        """
+        初始化会话管理器
+
+        Args:
+            fall_detector_factory: 创建FallDetector实例的工厂函数
+            tracker_factory: 创建跟踪器实例的工厂函数，None表示不跟踪
+            scheduler_factory: 创建关键帧调度器的工厂函数，None表示视频帧逐帧推理
+            roi_planner_factory: 创建ROI规划器的工厂函数，None表示视频帧全画面推理
+            ttl_seconds: 会话最大空闲时间（秒），超过后被淘汰
+            max_sessions: 最大会话数（内存上限），超过后淘汰最久未使用的会话
+            eviction_interval: 空闲会话检查的最小间隔（秒）
+            on_evict: 会话被淘汰或移除后的回调（参数为流ID，在锁外调用），可为None
+        """
+        self.fall_detector_factory = fall_detector_factory
+        self.tracker_factory = tracker_factory
+        self.scheduler_factory = scheduler_factory
+        self.roi_planner_factory = roi_planner_factory
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max(1, int(max_sessions))
+        self.eviction_interval = eviction_interval
+        self.on_evict = on_evict
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._last_eviction = time.time()
+        self._evicted_count = 0
+
+    def get(self, stream_id: Optional[str] = None) -> StreamSession:
+        """
+        获取（不存在时创建）指定流的会话
+
+        Args:
+            stream_id: 流ID，None表示默认流
+
+        Returns:
+            流会话
+        """
+        stream_id = str(stream_id) if stream_id else DEFAULT_STREAM_ID
+        evicted = []
+
+        with self._lock:
+            now = time.time()
+            if now - self._last_eviction >= self.eviction_interval:
+                evicted.extend(self._evict_idle_locked(now))
+
+            session = self._sessions.get(stream_id)
+            if session is None:
+                tracker = self.tracker_factory() if self.tracker_factory else None
+                scheduler = self.scheduler_factory() if self.scheduler_factory else None
+                roi_planner = self.roi_planner_factory() if self.roi_planner_factory else None
+                session = StreamSession(
+                    stream_id, self.fall_detector_factory(), tracker, scheduler, roi_planner
+                )
+                self._sessions[stream_id] = session
+                logger.info(f"创建流会话: {stream_id}")
+
+                while len(self._sessions) > self.max_sessions:
+                    evicted_id, _ = self._sessions.popitem(last=False)
+                    evicted.append(evicted_id)
+                    self._evicted_count += 1
+                    logger.info(f"会话数超过上限，淘汰最久未使用的流会话: {evicted_id}")
+            else:
+                self._sessions.move_to_end(stream_id)
+
+            session.touch()
+
+        self._notify_evicted(evicted)
+        return session
+
+    def find(self, stream_id: Optional[str] = None) -> Optional[StreamSession]:
+        """
+        查找指定流的会话（不存在时不创建，也不刷新其访问时间）
+
+        Args:
+            stream_id: 流ID，None表示默认流
+
+        Returns:
+            流会话，不存在时为None
+        """
+        stream_id = str(stream_id) if stream_id else DEFAULT_STREAM_ID
+        with self._lock:
+            return self._sessions.get(stream_id)
+
+    def remove(self, stream_id: str) -> bool:
+        """移除指定流的会话"""
+        with self._lock:
+            removed = self._sessions.pop(str(stream_id), None) is not None
+        if removed:
+            logger.info(f"移除流会话: {stream_id}")
+            self._notify_evicted([str(stream_id)])
+        return removed
+
+    def _notify_evicted(self, stream_ids: List[str]):
+        """通知会话已被淘汰或移除（在锁外调用，回调异常不影响调用方）"""
+        if self.on_evict is None:
+            return
+        for stream_id in stream_ids:
+            try:
+                self.on_evict(stream_id)
+            except Exception as e:
+                logger.error(f"流会话淘汰回调失败 {stream_id}: {str(e)}")
+
+    def reset(self, stream_id: Optional[str] = None, object_id: Optional[int] = None):
+        """
+        重置检测状态
+
+        Args:
+            stream_id: 流ID，None表示重置所有流
+            object_id: 对象ID，None表示重置该流的所有对象
+        """
+        with self._lock:
+            if stream_id is None:
+                sessions = list(self._sessions.values())
+            else:
+                session = self._sessions.get(str(stream_id))
+                sessions = [session] if session is not None else []
+
+        for session in sessions:
+            session.reset(object_id)
+
+    def evict_idle(self) -> int:
+        """立即淘汰空闲超时的会话，返回淘汰数量"""
+        with self._lock:
+            evicted = self._evict_idle_locked(time.time())
+        self._notify_evicted(evicted)
+        return len(evicted)
+
+    def _evict_idle_locked(self, now: float) -> List[str]:
+        """淘汰空闲超时的会话，返回被淘汰的流ID（调用方需持有锁）"""
+        self._last_eviction = now
+        expired = [
+            stream_id for stream_id, session in self._sessions.items()
+            if now - session.last_access > self.ttl_seconds
+        ]
+        for stream_id in expired:
+            del self._sessions[stream_id]
+            logger.info(f"流会话空闲超时，已淘汰: {stream_id}")
+        self._evicted_count += len(expired)
+        return expired
+
+    def get_sessions(self) -> List[StreamSession]:
+        """获取所有会话对象（快照）"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def list_sessions(self) -> List[Dict]:
+        """列出所有会话信息"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [session.get_info() for session in sessions]
+
+    def get_stats(self) -> Dict:
+        """获取会话统计信息"""
+        with self._lock:
+            return {
+                'active_sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl_seconds,
+                'evicted_sessions': self._evicted_count
+            }
@@ -0,0 +1,272 @@
+import threading
+import logging
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # 未安装scipy时只能使用贪心匹配
+    linear_sum_assignment = None
+
+logger = logging.getLogger(__name__)
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    计算两组边界框之间的IoU矩阵
+
+    Args:
+        boxes_a: [N, 4] 边界框 (x1, y1, x2, y2)
+        boxes_b: [M, 4] 边界框 (x1, y1, x2, y2)
+
+    Returns:
+        [N, M] IoU矩阵
+    """
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float64)
+
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def centroid_similarity(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    基于中心点距离的相似度矩阵（距离按边界框对角线归一化，范围0~1）
+
+    Args:
+        boxes_a: [N, 4] 边界框
+        boxes_b: [M, 4] 边界框
+
+    Returns:
+        [N, M] 相似度矩阵，中心重合为1，距离超过一个对角线为0
+    """
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float64)
+
+    centers_a = (boxes_a[:, :2] + boxes_a[:, 2:]) / 2
+    centers_b = (boxes_b[:, :2] + boxes_b[:, 2:]) / 2
+    distance = np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2)
+
+    diag_a = np.hypot(boxes_a[:, 2] - boxes_a[:, 0], boxes_a[:, 3] - boxes_a[:, 1])
+    diag_b = np.hypot(boxes_b[:, 2] - boxes_b[:, 0], boxes_b[:, 3] - boxes_b[:, 1])
+    scale = np.maximum((diag_a[:, None] + diag_b[None, :]) / 2, 1e-9)
+
+    return np.clip(1.0 - distance / scale, 0.0, 1.0)
+
+def greedy_match(similarity: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    """
+    贪心匹配：按相似度从高到低依次配对，每行每列最多匹配一次
+
+    Args:
+        similarity: [N, M] 相似度矩阵
+        threshold: 最低匹配相似度
+
+    Returns:
+        匹配对列表 [(行索引, 列索引), ...]
+    """
+    if similarity.size == 0:
+        return []
+
+    rows, cols = np.nonzero(similarity >= threshold)
+    if len(rows) == 0:
+        return []
+
+    order = np.argsort(-similarity[rows, cols], kind='stable')
+    used_rows = np.zeros(similarity.shape[0], dtype=bool)
+    used_cols = np.zeros(similarity.shape[1], dtype=bool)
+    matches = []
+
+    for r, c in zip(rows[order], cols[order]):
+        if used_rows[r] or used_cols[c]:
+            continue
+        used_rows[r] = True
+        used_cols[c] = True
+        matches.append((int(r), int(c)))
+
+    return matches
+
+def hungarian_match(similarity: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    """
+    匈牙利算法匹配（全局最优），结果中低于阈值的配对会被剔除
+
+    Args:
+        similarity: [N, M] 相似度矩阵
+        threshold: 最低匹配相似度
+
+    Returns:
+        匹配对列表 [(行索引, 列索引), ...]
+    """
+    if similarity.size == 0:
+        return []
+
+    rows, cols = linear_sum_assignment(-similarity)
+    keep = similarity[rows, cols] >= threshold
+    return [(int(r), int(c)) for r, c in zip(rows[keep], cols[keep])]
+
+class IoUTracker:
+    """基于IoU/中心点关联的多目标跟踪器
+
+    为每个检测到的人分配跨帧稳定的跟踪ID，长时间未匹配的轨迹会被淘汰。
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        centroid_weight: float = 0.3,
+        max_age: int = 30,
+        matcher: str = 'greedy'
+    ):
+        """
+        初始化跟踪器
+
+        Args:
+            iou_threshold: 最低关联相似度
+            centroid_weight: 中心点相似度在关联分数中的权重（0表示只用IoU）
+            max_age: 轨迹连续未匹配的最大帧数，超过后被淘汰
+            matcher: 匹配算法 ('greedy' 或 'hungarian'，后者需要scipy)
+        """
+        self.iou_threshold = iou_threshold
+        self.centroid_weight = centroid_weight
+        self.max_age = max_age
+
+        if matcher == 'hungarian' and linear_sum_assignment is None:
+            logger.warning("未安装scipy，跟踪器改用贪心匹配")
+            matcher = 'greedy'
+        self.matcher = matcher
+
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._track_ids = np.zeros(0, dtype=np.int64)
+        self._boxes = np.zeros((0, 4), dtype=np.float64)
+        self._ages = np.zeros(0, dtype=np.int64)
+        self._hits = np.zeros(0, dtype=np.int64)
+
+    def update(self, detections: List[Dict]) -> Tuple[List[Dict], List[int]]:
+        """
+        用当前帧的检测结果更新轨迹，并为每个检测写入跟踪ID
+
+        检测结果的 'id' 与 'track_id' 字段都会被设置为稳定的跟踪ID。
+
+        Args:
+            detections: YOLODetector输出的检测结果列表
+
+        Returns:
+            (带跟踪ID的检测结果列表, 本帧被淘汰的跟踪ID列表)
+        """
+        with self._lock:
+            if detections:
+                boxes = np.asarray([d['bbox'] for d in detections], dtype=np.float64).reshape(-1, 4)
+            else:
+                boxes = np.zeros((0, 4), dtype=np.float64)
+
+            similarity = iou_matrix(self._boxes, boxes)
+            if self.centroid_weight > 0:
+                similarity = (
+                    (1 - self.centroid_weight) * similarity
+                    + self.centroid_weight * centroid_similarity(self._boxes, boxes)
+                )
+
+            if self.matcher == 'hungarian':
+                matches = hungarian_match(similarity, self.iou_threshold)
+            else:
+                matches = greedy_match(similarity, self.iou_threshold)
+
+            assigned = np.full(len(detections), -1, dtype=np.int64)
+            matched_tracks = np.zeros(len(self._track_ids), dtype=bool)
+            for track_idx, det_idx in matches:
+                assigned[det_idx] = self._track_ids[track_idx]
+                matched_tracks[track_idx] = True
+                self._boxes[track_idx] = boxes[det_idx]
+
+            # 更新已有轨迹的状态
+            self._ages = np.where(matched_tracks, 0, self._ages + 1)
+            self._hits = self._hits + matched_tracks
+
+            # 为未匹配的检测创建新轨迹
+            new_mask = assigned < 0
+            new_count = int(new_mask.sum())
+            if new_count:
+                new_ids = np.arange(self._next_id, self._next_id + new_count, dtype=np.int64)
+                self._next_id += new_count
+                assigned[new_mask] = new_ids
+                self._track_ids = np.concatenate([self._track_ids, new_ids])
+                self._boxes = np.concatenate([self._boxes, boxes[new_mask]])
+                self._ages = np.concatenate([self._ages, np.zeros(new_count, dtype=np.int64)])
+                self._hits = np.concatenate([self._hits, np.ones(new_count, dtype=np.int64)])
+
+            # 淘汰长时间未匹配的轨迹
+            expired = self._ages > self.max_age
+            removed_ids = self._track_ids[expired].tolist()
+            if removed_ids:
+                keep = ~expired
+                self._track_ids = self._track_ids[keep]
+                self._boxes = self._boxes[keep]
+                self._ages = self._ages[keep]
+                self._hits = self._hits[keep]
+                logger.debug(f"淘汰轨迹: {removed_ids}")
+
+        for detection, track_id in zip(detections, assigned.tolist()):
+            detection['id'] = track_id
+            detection['track_id'] = track_id
+
+        return detections, removed_ids
+
+    def get_tracks(self) -> List[Dict]:
+        """获取当前存活的轨迹信息"""
+        with self._lock:
+            return [
+                {
+                    'track_id': int(track_id),
+                    'bbox': box.tolist(),
+                    'age': int(age),
+                    'hits': int(hits)
+                }
+                for track_id, box, age, hits in zip(self._track_ids, self._boxes, self._ages, self._hits)
+            ]
+
+    def reset(self):
+        """清空所有轨迹"""
+        with self._lock:
+            self._track_ids = np.zeros(0, dtype=np.int64)
+            self._boxes = np.zeros((0, 4), dtype=np.float64)
+            self._ages = np.zeros(0, dtype=np.int64)
+            self._hits = np.zeros(0, dtype=np.int64)
+        logger.info("已重置所有跟踪轨迹")
+
+    def get_state(self) -> Dict:
+        """导出轨迹状态（可JSON序列化），用于断点续跑时恢复跟踪ID的连续性"""
+        with self._lock:
+            return {
+                'next_id': int(self._next_id),
+                'track_ids': self._track_ids.tolist(),
+                'boxes': self._boxes.tolist(),
+                'ages': self._ages.tolist(),
+                'hits': self._hits.tolist()
+            }
+
+    def load_state(self, state: Dict):
+        """恢复 get_state 导出的轨迹状态"""
+        with self._lock:
+            self._next_id = int(state['next_id'])
+            self._track_ids = np.asarray(state['track_ids'], dtype=np.int64).reshape(-1)
+            self._boxes = np.asarray(state['boxes'], dtype=np.float64).reshape(-1, 4)
+            self._ages = np.asarray(state['ages'], dtype=np.int64).reshape(-1)
+            self._hits = np.asarray(state['hits'], dtype=np.int64).reshape(-1)
+
+    def get_config(self) -> Dict:
+        """获取配置信息"""
+        return {
+            'iou_threshold': float(self.iou_threshold),
+            'centroid_weight': float(self.centroid_weight),
+            'max_age': int(self.max_age),
+            'matcher': self.matcher
+        }
@@ -1,44 +1,267 @@
 from ultralytics import YOLO
 import numpy as np
 import cv2
+import os
+import json
+import threading
+import importlib.util
+from contextlib import contextmanager
+from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import logging
 
+from utils.overlay import get_text_sprite, blend_sprite
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# 推理后端: 名称 -> (ultralytics导出格式, 导出文件名后缀, 所需的运行时模块)
+BACKENDS = {
+    'pytorch': (None, None, None),
+    'onnx': ('onnx', '.onnx', 'onnxruntime'),
+    'openvino': ('openvino', '_openvino_model', 'openvino'),
+}
+
+@contextmanager
+def _file_lock(path: Path):
+    """
+    跨进程的文件锁（path旁边的 .lock 文件，不支持flock的平台不加锁）
+
+    多个进程同时检查、导出同一个模型文件时只有一个执行导出，其余等待后直接使用缓存。
+    """
+    with open(str(path) + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _write_stamp(stamp_path: Path, stamp: Dict):
+    """原子地写入导出参数记录"""
+    tmp_path = Path(str(stamp_path) + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(stamp, f)
+    os.replace(tmp_path, stamp_path)
+
 class YOLODetector:
     """YOLOv8姿态检测器"""
     
-    def __init__(self, model_path: str, confidence: float = 0.5):
+    def __init__(
+        self,
+        model_path: str,
+        confidence: float = 0.5,
+        backend: str = 'pytorch',
+        imgsz: int = 640,
+        precision: str = 'fp32',
+        calibration_dir: Optional[str] = None,
+        calibration_size: int = 100,
+        prepare_only: bool = False
+    ):
         """
         初始化YOLO检测器
         
         Args:
             model_path: 模型文件路径
             confidence: 置信度阈值
+            backend: 推理后端 ('pytorch', 'onnx', 'openvino')；
+                     非PyTorch后端首次使用时导出模型并缓存在model_path旁边
+            imgsz: 导出模型的输入尺寸
+            precision: 模型精度 ('fp32' 或 'int8')；INT8模型由ONNX模型静态量化得到，
+                       使用onnxruntime推理
+            calibration_dir: INT8量化的校准图片目录（如 fall_training_data）
+            calibration_size: 最多使用的校准图片数
+            prepare_only: 只导出/量化所选后端的模型文件，不加载模型（多进程服务在fork前调用，
+                          worker直接使用缓存的模型文件）
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"不支持的推理后端: {backend}，可选: {', '.join(BACKENDS)}")
+        if precision not in ('fp32', 'int8'):
+            raise ValueError(f"不支持的模型精度: {precision}，可选: fp32, int8")
+        if precision == 'int8' and backend != 'onnx':
+            logger.info(f"INT8模型使用onnx后端推理（所选后端: {backend}）")
+            backend = 'onnx'
+        
         self.model_path = model_path
         self.confidence = confidence
+        self.backend = backend
+        self.imgsz = imgsz
+        self.precision = precision
+        self.calibration_dir = calibration_dir
+        self.calibration_size = calibration_size
+        # INT8量化实际使用的校准图片（精度评估时需从评估集中排除）
+        self.calibration_images: List[str] = []
+        self.prepare_only = prepare_only
+        self.runtime_model_path = str(model_path)
         self.model = None
+        # ultralytics的predictor不是线程安全的：批处理引擎、服务端接入流水线与请求线程共用同一个模型，
+        # 所有前向推理都经过该锁串行执行
+        self._infer_lock = threading.Lock()
         self._load_model()
         
     def _load_model(self):
-        """加载YOLO模型"""
+        """加载YOLO模型（按所选后端加载导出后的模型，失败时回退到PyTorch）"""
         try:
-            logger.info(f"正在加载模型: {self.model_path}")
+            logger.info(f"正在加载模型: {self.model_path}, 推理后端: {self.backend}")
+            if self.precision == 'int8':
+                try:
+                    self.runtime_model_path = self._ensure_quantized()
+                    if self.prepare_only:
+                        return
+                    self.model = YOLO(self.runtime_model_path, task='pose')
+                    logger.info(f"INT8模型加载成功: {self.runtime_model_path}")
+                    return
+                except Exception as e:
+                    logger.warning(f"INT8模型不可用，改用FP32模型: {str(e)}")
+                    self.precision = 'fp32'
+            
+            if self.backend != 'pytorch':
+                try:
+                    self.runtime_model_path = self._ensure_exported()
+                    if self.prepare_only:
+                        return
+                    self.model = YOLO(self.runtime_model_path, task='pose')
+                    logger.info(f"模型加载成功: {self.runtime_model_path}")
+                    return
+                except Exception as e:
+                    logger.warning(f"{self.backend}后端不可用，回退到PyTorch: {str(e)}")
+                    self.backend = 'pytorch'
+                    self.runtime_model_path = str(self.model_path)
+            
+            if self.prepare_only:
+                return
             self.model = YOLO(self.model_path)
             logger.info("模型加载成功")
         except Exception as e:
             logger.error(f"模型加载失败: {str(e)}")
             raise
     
-    def detect(self, image: np.ndarray, verbose: bool = False) -> List[Dict]:
+    def _export_path(self) -> Path:
+        """所选后端的导出模型缓存路径（与原模型文件放在同一目录）"""
+        _, suffix, _ = BACKENDS[self.backend]
+        source = Path(self.model_path)
+        return source.with_name(source.stem + suffix)
+    
+    def _ensure_exported(self) -> str:
+        """
+        确保所选后端的导出模型存在且与原模型一致，必要时重新导出
+        
+        导出参数与原模型的大小、修改时间记录在旁边的 .export.json 中，
+        任一项变化都会触发重新导出。
+        
+        Returns:
+            导出模型路径
+        """
+        export_format, _, runtime_module = BACKENDS[self.backend]
+        if importlib.util.find_spec(runtime_module) is None:
+            raise RuntimeError(f"未安装 {runtime_module}")
+        
+        export_path = self._export_path()
+        stamp_path = Path(str(export_path) + '.export.json')
+        
+        # 多个worker同时启动时只由一个进程导出，其余等待后直接使用缓存
+        with _file_lock(export_path):
+            return self._export_locked(export_path, stamp_path, export_format)
+    
+    def _export_locked(self, export_path: Path, stamp_path: Path, export_format: str) -> str:
+        """检查缓存并在需要时导出模型（调用方持有导出文件锁）"""
+        # 权重文件不存在时由ultralytics下载，先加载一次以得到本地文件
+        source_model = None
+        if not Path(self.model_path).exists():
+            source_model = YOLO(self.model_path)
+        
+        source_stat = os.stat(self.model_path)
+        stamp = {
+            'source_size': source_stat.st_size,
+            'source_mtime': int(source_stat.st_mtime),
+            'format': export_format,
+            'imgsz': self.imgsz
+        }
+        
+        if export_path.exists() and stamp_path.exists():
+            try:
+                with open(stamp_path, 'r') as f:
+                    if json.load(f) == stamp:
+                        logger.info(f"使用已缓存的导出模型: {export_path}")
+                        return str(export_path)
+            except (OSError, ValueError):
+                pass
+        
+        logger.info(f"正在导出{self.backend}模型（仅首次或原模型变化时执行）: {export_path}")
+        if source_model is None:
+            source_model = YOLO(self.model_path)
+        # dynamic=True 使导出模型支持批量推理（批处理引擎会一次送入多帧）
+        exported = source_model.export(format=export_format, imgsz=self.imgsz, dynamic=True)
+        if Path(exported).resolve() != export_path.resolve():
+            os.replace(exported, export_path)
+        
+        _write_stamp(stamp_path, stamp)
+        logger.info(f"模型导出完成: {export_path}")
+        return str(export_path)
+    
+    def _ensure_quantized(self) -> str:
+        """
+        确保INT8量化模型存在且与FP32 ONNX模型、校准集一致，必要时重新校准量化
+        
+        Returns:
+            INT8模型路径
+        """
+        from models.quantization import find_calibration_images, quantize_onnx_model
+        
+        fp32_path = Path(self._ensure_exported())
+        int8_path = fp32_path.with_name(fp32_path.stem + '_int8.onnx')
+        stamp_path = Path(str(int8_path) + '.export.json')
+        
+        if not self.calibration_dir:
+            raise RuntimeError('未指定INT8校准图片目录')
+        image_paths = find_calibration_images(self.calibration_dir, self.calibration_size)
+        
+        fp32_stat = os.stat(fp32_path)
+        stamp = {
+            'source_size': fp32_stat.st_size,
+            'source_mtime': int(fp32_stat.st_mtime),
+            'precision': 'int8',
+            # 记录完整的校准图片列表：校准集变化时重新量化，评估时也据此排除校准图片
+            'calibration_images': [os.path.abspath(path) for path in image_paths]
+        }
+        self.calibration_images = stamp['calibration_images']
+        
+        with _file_lock(int8_path):
+            if int8_path.exists() and stamp_path.exists():
+                try:
+                    with open(stamp_path, 'r') as f:
+                        if json.load(f) == stamp:
+                            logger.info(f"使用已缓存的INT8模型: {int8_path}")
+                            return str(int8_path)
+                except (OSError, ValueError):
+                    pass
+            
+            # 先写到临时文件，量化完成后再替换，其他进程不会读到写了一半的模型
+            tmp_path = int8_path.with_name(int8_path.stem + '.tmp.onnx')
+            quantize_onnx_model(str(fp32_path), str(tmp_path), image_paths, self.imgsz)
+            os.replace(tmp_path, int8_path)
+            _write_stamp(stamp_path, stamp)
+        return str(int8_path)
+    
+    def detect(
+        self,
+        image: np.ndarray,
+        verbose: bool = False,
+        regions: Optional[List[Tuple[int, int, int, int]]] = None
+    ) -> List[Dict]:
         """
         检测图像中的人体姿态
         
         Args:
             image: 输入图像 (numpy数组)
             verbose: 是否显示详细信息
+            regions: 只在这些区域 [(x1, y1, x2, y2), ...] 内检测（裁剪后批量推理，
+                     结果映射回原图坐标）；None表示全画面检测
             
         Returns:
             检测结果列表，每个元素包含bbox、keypoints等信息
@@ -46,15 +269,115 @@ class YOLODetector:
         if self.model is None:
             raise RuntimeError("模型未加载")
         
+        if regions is not None:
+            return self._detect_regions(image, regions, verbose)
+        
         try:
-            results = self.model(image, verbose=verbose, conf=self.confidence)
+            results = self._predict(image, verbose)
             detections = self._parse_results(results)
             logger.debug(f"检测到 {len(detections)} 个人体")
             return detections
         except Exception as e:
             logger.error(f"检测失败: {str(e)}")
             return []
-    
+
+    def _predict(self, source, verbose: bool = False):
+        """执行一次前向推理（单张图像或图像列表），同一时刻只有一个线程使用模型"""
+        with self._infer_lock:
+            return self.model(source, verbose=verbose, conf=self.confidence)
+
+    def _detect_regions(
+        self,
+        image: np.ndarray,
+        regions: List[Tuple[int, int, int, int]],
+        verbose: bool = False,
+        nms_threshold: float = 0.5
+    ) -> List[Dict]:
+        """
+        裁剪区域检测：各区域一次批量推理，坐标加上区域偏移后合并
+
+        小区域按模型输入尺寸放大推理，远处目标的关键点精度高于全画面缩放推理。
+        相邻区域边缘可能重复检测到同一个人，按IoU去重保留置信度较高者。
+        """
+        from models.tracker import iou_matrix
+        
+        crops, offsets = [], []
+        for x1, y1, x2, y2 in regions:
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            # 切片是原图的视图，不复制像素
+            crops.append(image[y1:y2, x1:x2])
+            offsets.append((x1, y1))
+        
+        if not crops:
+            return []
+        
+        try:
+            results = self._predict(crops, verbose)
+        except Exception as e:
+            logger.error(f"区域检测失败: {str(e)}")
+            return []
+        
+        detections = []
+        for result, (offset_x, offset_y) in zip(results, offsets):
+            for detection in self._parse_results([result]):
+                # 置信度低于0.5的关键点坐标被置为(0,0)，FallDetector据此判断关键点缺失，
+                # 只平移可见的关键点；在副本上修改，不改动推理结果的原数组
+                keypoints = detection['keypoints'].copy()
+                visible = keypoints[:, 2] >= 0.5
+                keypoints[visible, 0] += offset_x
+                keypoints[visible, 1] += offset_y
+                detection['keypoints'] = keypoints
+                detection['keypoints_array'] = keypoints
+                detection['bbox'] = detection['bbox'] + np.array(
+                    [offset_x, offset_y, offset_x, offset_y], dtype=detection['bbox'].dtype
+                )
+                detections.append(detection)
+        
+        if len(offsets) > 1 and len(detections) > 1:
+            detections.sort(key=lambda d: d['confidence'], reverse=True)
+            iou = iou_matrix(
+                np.asarray([d['bbox'] for d in detections], dtype=np.float64),
+                np.asarray([d['bbox'] for d in detections], dtype=np.float64)
+            )
+            keep = []
+            for i in range(len(detections)):
+                if all(iou[i, j] < nms_threshold for j in keep):
+                    keep.append(i)
+            detections = [detections[i] for i in keep]
+        
+        for i, detection in enumerate(detections):
+            detection['id'] = i
+        
+        logger.debug(f"区域检测: {len(crops)} 个区域, 检测到 {len(detections)} 个人体")
+        return detections
+
+    def detect_batch(self, images: List[np.ndarray], verbose: bool = False) -> List[List[Dict]]:
+        """
+        批量检测多张图像中的人体姿态（一次前向推理）
+
+        Args:
+            images: 输入图像列表
+            verbose: 是否显示详细信息
+
+        Returns:
+            与输入顺序一致的检测结果列表，每个元素为对应图像的检测结果
+        """
+        if self.model is None:
+            raise RuntimeError("模型未加载")
+
+        if not images:
+            return []
+
+        try:
+            results = self._predict(images, verbose)
+            batch_detections = [self._parse_results([result]) for result in results]
+            logger.debug(f"批量检测 {len(images)} 张图像")
+            return batch_detections
+        except Exception as e:
+            logger.error(f"批量检测失败: {str(e)}")
+            return [[] for _ in images]
+
     def _parse_results(self, results) -> List[Dict]:
         """
         解析YOLO检测结果
@@ -78,10 +401,10 @@ class YOLODetector:
             for i, (box, keypoints, conf) in enumerate(zip(boxes, keypoints_data, confidences)):
                 detection = {
                     'id': i,
-                    'bbox': box.tolist(),  # [x1, y1, x2, y2]
+                    'bbox': box,  # numpy数组 [x1, y1, x2, y2]
                     'confidence': float(conf),
-                    'keypoints': keypoints.tolist(),  # [[x, y, conf], ...]
-                    'keypoints_array': keypoints  # numpy数组，用于计算
+                    'keypoints': keypoints,  # numpy数组 [[x, y, conf], ...]，由序列化层直接编码
+                    'keypoints_array': keypoints  # 与keypoints为同一数组，保留以兼容旧调用方
                 }
                 detections.append(detection)
         
@@ -92,7 +415,8 @@ class YOLODetector:
         image: np.ndarray, 
         detections: List[Dict],
         is_fall_list: Optional[List[bool]] = None,
-        fall_scores: Optional[List[float]] = None
+        fall_scores: Optional[List[float]] = None,
+        out: Optional[np.ndarray] = None
     ) -> np.ndarray:
         """
         在图像上绘制检测结果
@@ -102,11 +426,18 @@ class YOLODetector:
             detections: 检测结果列表
             is_fall_list: 是否跌倒列表
             fall_scores: 跌倒分数列表
+            out: 输出图像；为image本身时直接在原图上绘制（不复制），
+                 为同尺寸的其他数组（如帧缓冲池的缓冲）时先复制image再绘制，None时新建副本
             
         Returns:
             标注后的图像
         """
-        result_image = image.copy()
+        if out is None:
+            result_image = image.copy()
+        else:
+            result_image = out
+            if out is not image:
+                np.copyto(out, image)
         
         for i, detection in enumerate(detections):
             bbox = detection['bbox']
@@ -134,28 +465,9 @@ class YOLODetector:
             score = fall_scores[i] if fall_scores and i < len(fall_scores) else 0.0
             text = f"{label} ({score:.2f})"
             
-            # 文本背景
-            (text_width, text_height), baseline = cv2.getTextSize(
-                text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2
-            )
-            cv2.rectangle(
-                result_image, 
-                (x1, y1 - text_height - 10), 
-                (x1 + text_width, y1), 
-                color, 
-                -1
-            )
-            
-            # 绘制文本
-            cv2.putText(
-                result_image, 
-                text, 
-                (x1, y1 - 5), 
-                cv2.FONT_HERSHEY_SIMPLEX, 
-                0.6, 
-                (255, 255, 255), 
-                2
-            )
+            # 标签贴图（带背景框）按文本与颜色缓存，只混合到标签覆盖的区域
+            sprite = get_text_sprite(text, 0.6, 2, (255, 255, 255), color, (0, 5, 0, 5))
+            blend_sprite(result_image, sprite, x1, y1 - 5)
         
         return result_image
     
@@ -200,5 +512,8 @@ class YOLODetector:
             'model_path': str(self.model_path),
             'model_name': self.model_path.split('/')[-1] if isinstance(self.model_path, str) else 'yolov8n-pose',
             'confidence_threshold': self.confidence,
+            'backend': self.backend,
+            'precision': self.precision,
+            'runtime_model_path': self.runtime_model_path,
             'loaded': self.model is not None
         }
\ No newline at end of file
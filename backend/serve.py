@@ -0,0 +1,404 @@
+"""
+多进程（pre-fork）生产服务入口
+
+主进程只负责接收连接：读取（不消费）请求头中的流ID，把连接的文件描述符交给固定的worker进程，
+同一路流的请求（包括WebSocket视频流）总是由同一个worker处理，
+每路流的跟踪与跌倒检测状态都只保存在该worker内。
+每个worker拥有独立的模型与推理线程，吞吐量随CPU核数线性扩展。
+
+主进程只读取请求头，不解析请求体：经本服务访问时，检测接口（/detect_video、/detect_video_raw、
+/detect_image、/reset、/stream 等）必须通过 X-Stream-ID 请求头或 stream_id 查询参数提供流ID，
+只写在JSON请求体中的 stream_id 不参与路由，这类请求与没有流ID的请求一样都归入默认流所在的worker。
+
+worker每处理完一个请求就关闭连接（响应带 Connection: close），客户端的下一个请求会建立新连接
+并按其流ID重新分配worker，keep-alive连接不会把其他流的请求留在最初的worker上。
+
+用法（在backend目录下，仅支持Linux/macOS）:
+    python serve.py --workers 4 --threads 2
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import errno
+import signal
+import socket
+import argparse
+import logging
+import selectors
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# 读取请求头的上限与超时
+MAX_HEADER_BYTES = 16 * 1024
+HEADER_TIMEOUT = 10.0
+
+DEFAULT_ROUTE_KEY = 'default'
+
+def configure_threads(num_threads: int):
+    """限制当前进程的推理线程数，避免多个worker争抢CPU核"""
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(num_threads)
+
+    import cv2
+    cv2.setNumThreads(num_threads)
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+def parse_route_key(header_bytes: bytes) -> str:
+    """
+    从HTTP请求头中解析流ID
+
+    Args:
+        header_bytes: 请求行与请求头（可能不完整）
+
+    Returns:
+        流ID，没有时返回默认流
+    """
+    head = header_bytes.split(b'\r\n\r\n', 1)[0].decode('latin-1')
+    lines = head.split('\r\n')
+
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'x-stream-id' and value.strip():
+            return value.strip()
+
+    parts = lines[0].split(' ')
+    if len(parts) >= 2:
+        stream_ids = parse_qs(urlsplit(parts[1]).query).get('stream_id')
+        if stream_ids and stream_ids[0]:
+            return stream_ids[0]
+
+    return DEFAULT_ROUTE_KEY
+
+def make_request_handler():
+    """
+    创建每个连接只处理一个请求的werkzeug请求处理类
+
+    主进程只在连接建立时按第一个请求的流ID选择worker，处理完一个请求就关闭连接
+    （响应带 Connection: close），保证之后的每个请求都重新路由。
+    """
+    from werkzeug.serving import WSGIRequestHandler
+
+    class SingleRequestHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def handle_one_request(self):
+            super().handle_one_request()
+            self.close_connection = True
+
+    return SingleRequestHandler
+
+def uses_pytorch_backend(config) -> bool:
+    """按配置创建的检测器是否使用PyTorch后端（INT8精度时YOLODetector会改用onnx后端）"""
+    return config.MODEL_BACKEND == 'pytorch' and config.MODEL_PRECISION != 'int8'
+
+def prepare_model_files(config_name) -> bool:
+    """
+    fork worker前在一个短暂的子进程中导出/量化非PyTorch后端的模型文件
+
+    worker启动时直接使用缓存的导出文件，不会同时导出同一个文件、互相覆盖；
+    导出与INT8校准过程中创建的推理会话随子进程退出，不会被worker继承。
+
+    Returns:
+        是否成功（失败时各worker仍会自行导出，导出过程由文件锁串行化）
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            from app import build_yolo_detector
+            build_yolo_detector(get_config(config_name), prepare_only=True)
+            code = 0
+        except Exception:
+            logger.exception("预先导出模型失败")
+        finally:
+            os._exit(code)
+
+    _, status = os.waitpid(pid, 0)
+    return os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+def pick_worker(route_key: str, num_workers: int) -> int:
+    """按流ID稳定地选择worker（worker重启后流仍分配到同一个编号）"""
+    return zlib.crc32(route_key.encode('utf-8')) % num_workers
+
+def worker_main(index: int, channel: socket.socket, config_name, threads: int, yolo_detector=None):
+    """
+    worker进程主循环：从主进程接收连接并交给Flask应用处理
+
+    Args:
+        index: worker编号
+        channel: 与主进程通信的Unix套接字
+        config_name: 配置环境名称
+        threads: 推理线程数
+        yolo_detector: 主进程预加载的检测器（fork后写时复制共享），None时在worker内加载
+    """
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    configure_threads(threads)
+
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    app = create_app(config_name, yolo_detector=yolo_detector)
+    # 只借用werkzeug的多线程请求处理，监听套接字本身不接收连接
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=make_request_handler())
+    logger.info(f"worker {index} 就绪 (pid {os.getpid()}, 推理线程 {threads})")
+
+    while True:
+        try:
+            message, fds, _, _ = socket.recv_fds(channel, 1024, 1)
+        except InterruptedError:
+            continue
+        if not message:
+            break  # 主进程已退出
+        if not fds:
+            continue
+
+        client_address = tuple(json.loads(message))
+        conn = socket.socket(fileno=fds[0])
+        conn.setblocking(True)
+        server.process_request(conn, client_address)
+
+    server.server_close()
+    os._exit(0)
+
+class PreforkServer:
+    """pre-fork主进程：接收连接、按流ID分发给worker并负责worker的重启"""
+
+    def __init__(self, config_name, host: str, port: int, workers: int, threads: int, preload: bool):
+        self.config_name = config_name
+        self.host = host
+        self.port = port
+        self.num_workers = max(1, workers)
+        self.threads = max(1, threads)
+        self.preload = preload
+
+        self.yolo_detector = None
+        self.workers = {}   # 编号 -> (pid, 主进程端套接字)
+        self.pending = {}   # 连接 -> (客户端地址, 接收时间)
+        self.dispatched = [0] * self.num_workers
+        self.selector = selectors.DefaultSelector()
+        self.listener = None
+        self._stopping = False
+
+    def start(self):
+        """加载模型、fork worker并进入分发循环"""
+        config = get_config(self.config_name)
+        if self.preload:
+            # PyTorch权重在fork前加载一次，worker之间写时复制共享
+            from app import build_yolo_detector
+            configure_threads(self.threads)
+            self.yolo_detector = build_yolo_detector(config)
+        elif not uses_pytorch_backend(config):
+            # 其他后端只能在worker内加载，但导出/量化只在fork前执行一次
+            logger.info("正在准备导出/量化的模型文件")
+            if not prepare_model_files(self.config_name):
+                logger.warning("预先导出模型失败，各worker将自行导出")
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen(1024)
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+
+        for index in range(self.num_workers):
+            self._spawn(index)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        logger.info(
+            f"多进程服务已启动: http://{self.host}:{self.port}, "
+            f"worker {self.num_workers} 个, 每个worker推理线程 {self.threads}, 预加载模型: {self.preload}"
+        )
+        try:
+            self._serve_forever()
+        finally:
+            self._shutdown()
+
+    def _spawn(self, index: int):
+        """fork一个worker"""
+        # Linux上使用SEQPACKET：主进程退出时worker能收到EOF并随之退出
+        sock_type = socket.SOCK_SEQPACKET if sys.platform.startswith('linux') else socket.SOCK_DGRAM
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, sock_type)
+        pid = os.fork()
+        if pid == 0:
+            # 关闭从主进程继承的其他描述符：其他worker的通道（否则主进程退出后这些worker收不到EOF）、
+            # 等待分发的连接（否则主进程超时关闭后连接仍不会断开）、选择器与监听套接字
+            parent_sock.close()
+            for _, channel in self.workers.values():
+                channel.close()
+            for conn in self.pending:
+                conn.close()
+            self.selector.close()
+            self.listener.close()
+            try:
+                worker_main(index, child_sock, self.config_name, self.threads, self.yolo_detector)
+            except Exception:
+                logger.exception(f"worker {index} 异常退出")
+            finally:
+                os._exit(1)
+
+        child_sock.close()
+        self.workers[index] = (pid, parent_sock)
+        logger.info(f"已启动worker {index} (pid {pid})")
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _serve_forever(self):
+        while not self._stopping:
+            for key, _ in self.selector.select(timeout=1.0):
+                if key.fileobj is self.listener:
+                    self._accept()
+                else:
+                    self._peek(key.fileobj)
+            self._expire_pending()
+            self._reap_workers()
+
+    def _accept(self):
+        """接收新连接，等待其请求头到达"""
+        while True:
+            try:
+                conn, address = self.listener.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if e.errno in (errno.EMFILE, errno.ENFILE):
+                    logger.error(f"接收连接失败: {str(e)}")
+                    return
+                raise
+            conn.setblocking(False)
+            self.pending[conn] = (address, time.monotonic())
+            self.selector.register(conn, selectors.EVENT_READ)
+
+    def _peek(self, conn: socket.socket):
+        """预读请求头（不消费数据），读到完整请求头后分发"""
+        try:
+            data = conn.recv(MAX_HEADER_BYTES, socket.MSG_PEEK)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+
+        if not data:
+            self._drop(conn)
+            return
+        if b'\r\n\r\n' in data or len(data) >= MAX_HEADER_BYTES:
+            self._dispatch(conn, parse_route_key(data))
+
+    def _dispatch(self, conn: socket.socket, route_key: str):
+        """把连接交给流ID对应的worker"""
+        address, _ = self.pending.pop(conn)
+        self.selector.unregister(conn)
+
+        index = pick_worker(route_key, self.num_workers)
+        _, channel = self.workers[index]
+        try:
+            socket.send_fds(channel, [json.dumps(list(address[:2])).encode()], [conn.fileno()])
+            self.dispatched[index] += 1
+        except OSError as e:
+            logger.error(f"分发连接到worker {index} 失败: {str(e)}")
+        finally:
+            conn.close()
+
+    def _drop(self, conn: socket.socket):
+        self.pending.pop(conn, None)
+        self.selector.unregister(conn)
+        conn.close()
+
+    def _expire_pending(self):
+        """关闭长时间未发送完整请求头的连接"""
+        now = time.monotonic()
+        for conn, (_, accepted_at) in list(self.pending.items()):
+            if now - accepted_at > HEADER_TIMEOUT:
+                self._drop(conn)
+
+    def _reap_workers(self):
+        """回收退出的worker并在原编号上重启（该worker负责的流状态会重新建立）"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for index, (worker_pid, channel) in list(self.workers.items()):
+                if worker_pid == pid:
+                    channel.close()
+                    if self._stopping:
+                        del self.workers[index]
+                    else:
+                        logger.warning(f"worker {index} (pid {pid}) 已退出，状态码 {status}，正在重启")
+                        self._spawn(index)
+
+    def _shutdown(self):
+        """停止所有worker"""
+        logger.info(f"正在停止多进程服务，各worker分发连接数: {self.dispatched}")
+        for conn in list(self.pending):
+            self._drop(conn)
+        self.listener.close()
+
+        for pid, channel in self.workers.values():
+            channel.close()
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + 10
+        for pid, _ in self.workers.values():
+            while time.monotonic() < deadline:
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if done:
+                    break
+                time.sleep(0.1)
+            else:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+def main(argv=None):
+    env = os.getenv('FLASK_ENV', 'development')
+    config = get_config(env)
+
+    parser = argparse.ArgumentParser(description='跌倒检测多进程服务')
+    parser.add_argument('--host', default=config.HOST)
+    parser.add_argument('--port', type=int, default=config.PORT)
+    parser.add_argument('--workers', type=int, default=config.SERVE_WORKERS, help='worker进程数')
+    parser.add_argument('--threads', type=int, default=config.SERVE_THREADS_PER_WORKER,
+                        help='每个worker的推理线程数')
+    parser.add_argument('--preload', choices=('auto', 'yes', 'no'), default=config.SERVE_PRELOAD_MODEL,
+                        help='fork前在主进程加载模型（只支持PyTorch后端，其他后端fork前只导出模型文件，在worker内加载）')
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, 'fork'):
+        raise SystemExit('当前平台不支持fork，请使用 python app.py 启动')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # ONNX Runtime / OpenVINO的会话在fork后不可用（内部线程池不会被复制），只能在worker内加载
+    preload = args.preload != 'no' and uses_pytorch_backend(config)
+    if args.preload == 'yes' and not preload:
+        logger.warning("非PyTorch后端（含INT8模型）不能在fork前预加载，fork前只导出模型文件，在各worker内加载模型")
+
+    PreforkServer(env, args.host, args.port, args.workers, args.threads, preload).start()
+
+if __name__ == '__main__':
+    main()
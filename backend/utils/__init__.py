@@ -4,5 +4,18 @@
 """
 from .image_processor import ImageProcessor
 from .logger import setup_logger
+from .serialization import dumps_json, dumps_msgpack, serialize
+from .binary_protocol import pack_detection_result, unpack_detection_result
+from .fall_archiver import FallImageArchiver
+from .fall_events import FallEventCapture
+from .dataset_index import FallDatasetIndex
+from .metrics import MetricsRegistry
+from .profiler import RequestProfiler
+from .frame_pool import FrameBufferPool
+from .overlay import get_text_sprite, blend_sprite
 
-__all__ = ['ImageProcessor', 'setup_logger']
\ No newline at end of file
+__all__ = ['ImageProcessor', 'setup_logger', 'dumps_json', 'dumps_msgpack', 'serialize',
+           'pack_detection_result', 'unpack_detection_result',
+           'FallImageArchiver', 'FallEventCapture',
+           'FallDatasetIndex', 'MetricsRegistry', 'RequestProfiler',
+           'FrameBufferPool', 'get_text_sprite', 'blend_sprite']
\ No newline at end of file
@@ -0,0 +1,684 @@
+"""
+离线批量检测工具
+
+对目录（含子目录）中的图片/视频或单个长录像执行检测，不经过HTTP接口：
+多线程解码 -> 跨文件批量YOLO推理 -> 按视频逐帧跟踪与跌倒判断 -> 结果流式写出。
+
+每个视频（或 --image-sequences 时每个图片目录）是一路独立的流，拥有自己的跟踪器与跌倒检测历史，
+跌倒检测的运动速度按视频时间计算；单独的图片逐张独立判断。
+
+输出格式:
+    .jsonl    每帧一行 {"source", "frame", "timestamp", "sequence", "detections": [...]}
+    .parquet  目录，每个检查点写一个part文件，每个检测目标一行（需要安装pyarrow）
+
+断点续跑: 每隔 --checkpoint-seconds 秒记录已完成的文件、进行中视频的帧位置、跟踪器与跌倒历史状态
+以及输出位置，中断后重新执行同一命令即可继续（检查点之后写出的结果会被截掉并重新计算，
+进行中的视频从检查点的帧继续，跟踪ID与跌倒判断和不中断时一致）。
+
+用法（在backend目录下）:
+    python -m utils.batch_process --input /data/footage --output results/ward3.jsonl --workers 4
+    # 调整阈值后用已保存的关键点重新评分（不再运行YOLO）
+    python -m utils.batch_process --rescore results/ward3.jsonl --output results/ward3_t07.jsonl --fall-threshold 0.7
+"""
+import os
+import json
+import glob
+import time
+import queue
+import hashlib
+import argparse
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.serialization import dumps_json
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.ts', '.flv', '.webm')
+
+CHECKPOINT_VERSION = 2
+
+# 解码线程 -> 主线程的消息类型
+_FRAME = 'frame'
+_END = 'end'
+
+def find_units(input_path: str, image_sequences: bool = False) -> List[Tuple[str, str, List[str]]]:
+    """
+    列出待处理的单元（按路径排序，保证断点续跑时顺序一致）
+
+    Args:
+        input_path: 目录或单个视频/图片文件
+        image_sequences: 是否把同一目录下的图片当作按文件名排序的帧序列
+
+    Returns:
+        [(单元ID（相对路径）, 类型 'video' / 'images' / 'sequence', 文件路径列表), ...]
+    """
+    root = Path(input_path)
+    if root.is_file():
+        files, root = [root], root.parent
+    else:
+        files = sorted(path for path in root.rglob('*') if path.is_file())
+
+    units = []
+    sequences = {}
+    for path in files:
+        suffix = path.suffix.lower()
+        unit_id = path.relative_to(root).as_posix()
+        if suffix in VIDEO_EXTENSIONS:
+            units.append((unit_id, 'video', [str(path)]))
+        elif suffix in IMAGE_EXTENSIONS:
+            if image_sequences:
+                sequences.setdefault(path.parent.relative_to(root).as_posix(), []).append(str(path))
+            else:
+                units.append((unit_id, 'images', [str(path)]))
+
+    units.extend((unit_id, 'sequence', paths) for unit_id, paths in sequences.items())
+    units.sort(key=lambda unit: unit[0])
+    return units
+
+class JsonlResultWriter:
+    """JSONL结果写出器：检查点记录文件偏移，续跑时截断到该偏移"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def open(self, state: Optional[Dict] = None):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if state and os.path.exists(self.path):
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(state['offset'])
+            self._file.seek(state['offset'])
+        else:
+            self._file = open(self.path, 'wb')
+
+    def write(self, record: Dict):
+        self._file.write(dumps_json(record) + b'\n')
+
+    def commit(self) -> Dict:
+        """落盘已写出的结果，返回写出器状态"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'offset': self._file.tell()}
+
+    def close(self) -> Dict:
+        state = self.commit()
+        self._file.close()
+        return state
+
+class ParquetResultWriter:
+    """Parquet结果写出器：结果缓存在内存中，每次提交写出一个part文件
+
+    检查点记录已完成的part文件，续跑时删除检查点之后写出的part。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parts: List[str] = []
+        self._rows: List[Dict] = []
+
+    def open(self, state: Optional[Dict] = None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError('写出Parquet需要安装pyarrow（pip install pyarrow），或改用.jsonl输出')
+
+        os.makedirs(self.path, exist_ok=True)
+        self.parts = list(state['parts']) if state else []
+        for path in glob.glob(os.path.join(self.path, 'part-*.parquet*')):
+            if os.path.basename(path) not in self.parts:
+                os.remove(path)
+
+    def write(self, record: Dict):
+        for detection in record['detections']:
+            self._rows.append({
+                'source': record['source'],
+                'frame': record['frame'],
+                'timestamp': record['timestamp'],
+                'track_id': detection['track_id'],
+                'confidence': detection['confidence'],
+                'bbox': detection['bbox'],
+                'keypoints': np.asarray(detection['keypoints'], dtype=np.float32).ravel().tolist(),
+                'is_fall': detection['is_fall'],
+                'fall_score': detection['fall_score'],
+                'details': dumps_json(detection['details']).decode('utf-8')
+            })
+
+    def commit(self) -> Dict:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._rows:
+            schema = pa.schema([
+                ('source', pa.string()),
+                ('frame', pa.int64()),
+                ('timestamp', pa.float64()),
+                ('track_id', pa.int64()),
+                ('confidence', pa.float32()),
+                ('bbox', pa.list_(pa.float32())),
+                ('keypoints', pa.list_(pa.float32())),
+                ('is_fall', pa.bool_()),
+                ('fall_score', pa.float32()),
+                ('details', pa.string())
+            ])
+            name = f"part-{len(self.parts):05d}.parquet"
+            tmp_path = os.path.join(self.path, name + '.tmp')
+            pq.write_table(pa.Table.from_pylist(self._rows, schema=schema), tmp_path)
+            os.replace(tmp_path, os.path.join(self.path, name))
+            self.parts.append(name)
+            self._rows = []
+        return {'parts': list(self.parts)}
+
+    def close(self) -> Dict:
+        return self.commit()
+
+def create_writer(output_path: str, output_format: Optional[str] = None):
+    """按格式（默认由扩展名推断）创建结果写出器"""
+    if output_format is None:
+        output_format = 'parquet' if output_path.rstrip('/').endswith('.parquet') else 'jsonl'
+    if output_format == 'parquet':
+        return ParquetResultWriter(output_path.rstrip('/'))
+    return JsonlResultWriter(output_path)
+
+def _checkpoint_path(output_path: str) -> str:
+    return output_path.rstrip('/') + '.checkpoint.json'
+
+def _load_checkpoint(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get('version') == CHECKPOINT_VERSION else None
+
+def _save_checkpoint(path: str, state: Dict):
+    """原子地写入检查点（先写临时文件再替换）"""
+    state['updated_at'] = datetime.now().isoformat()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class _CompletedUnits:
+    """已完成单元的紧凑记录：编号小于done_before的全部完成，其余完成编号单独记录"""
+
+    def __init__(self, done_before: int = 0, done: Optional[List[int]] = None):
+        self.done_before = done_before
+        self.done = set(done or [])
+
+    def add(self, index: int):
+        self.done.add(index)
+        while self.done_before in self.done:
+            self.done.remove(self.done_before)
+            self.done_before += 1
+
+    def __contains__(self, index: int) -> bool:
+        return index < self.done_before or index in self.done
+
+    def to_dict(self) -> Dict:
+        return {'done_before': self.done_before, 'done': sorted(self.done)}
+
+def _put(target: queue.Queue, item, stop_event: threading.Event) -> bool:
+    while not stop_event.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _decode_unit(unit_index, unit, start_frame, stride, sequence_fps, frames, stop_event) -> Optional[str]:
+    """解码一个单元的所有帧并送入帧队列，返回错误信息"""
+    unit_id, kind, paths = unit
+
+    if kind == 'video':
+        capture = cv2.VideoCapture(paths[0])
+        if not capture.isOpened():
+            return f"无法打开视频: {paths[0]}"
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+            if start_frame:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            index = start_frame
+            while not stop_event.is_set():
+                if index % stride:
+                    # 跳过的帧只解复用不解码
+                    if not capture.grab():
+                        break
+                    index += 1
+                    continue
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                position = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                timestamp = position if position > 0 or not fps else index / fps
+                if not _put(frames, (_FRAME, unit_index, index, timestamp, frame), stop_event):
+                    break
+                index += 1
+        finally:
+            capture.release()
+        return None
+
+    for index in range(start_frame, len(paths)):
+        if stop_event.is_set():
+            break
+        if index % stride:
+            continue
+        frame = cv2.imread(paths[index])
+        if frame is None:
+            logger.warning(f"无法读取图片，已跳过: {paths[index]}")
+            continue
+        timestamp = index / sequence_fps if kind == 'sequence' else 0.0
+        if not _put(frames, (_FRAME, unit_index, index, timestamp, frame), stop_event):
+            break
+    return None
+
+def _decode_worker(units, unit_queue, start_frames, stride, sequence_fps, frames, stop_event):
+    """解码线程：依次领取单元并解码（cv2解码时释放GIL，多线程即可并行）"""
+    while not stop_event.is_set():
+        try:
+            unit_index = unit_queue.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            error = _decode_unit(
+                unit_index, units[unit_index], start_frames.get(unit_index, 0),
+                stride, sequence_fps, frames, stop_event
+            )
+        except Exception as e:
+            error = str(e)
+        _put(frames, (_END, unit_index, error), stop_event)
+
+class _UnitState:
+    """一个单元（一路流）的跟踪与跌倒检测状态"""
+
+    __slots__ = ('fall_detector', 'tracker', 'next_frame')
+
+    def __init__(self, fall_detector, tracker):
+        self.fall_detector = fall_detector
+        self.tracker = tracker
+        self.next_frame = 0
+
+    def get_state(self) -> Dict:
+        """导出检查点中记录的状态：下一帧位置、跟踪器与跌倒检测历史"""
+        return {
+            'next_frame': self.next_frame,
+            'tracker': self.tracker.get_state() if self.tracker is not None else None,
+            'history': self.fall_detector.history.get_state()
+        }
+
+    def load_state(self, state: Dict):
+        """从检查点恢复状态"""
+        self.next_frame = state['next_frame']
+        if self.tracker is not None and state.get('tracker') is not None:
+            self.tracker.load_state(state['tracker'])
+        self.fall_detector.history.load_state(state['history'])
+
+def score_frame(fall_detector, tracker, detections: List[Dict], timestamp: Optional[float]) -> List[Dict]:
+    """
+    对一帧的检测结果执行（可选的）跟踪与跌倒判断
+
+    Returns:
+        输出记录中的检测列表
+    """
+    if tracker is not None:
+        detections, removed_ids = tracker.update(detections)
+        for track_id in removed_ids:
+            fall_detector.reset_history(track_id)
+    if not detections:
+        return []
+
+    keypoints = np.stack([np.asarray(d['keypoints_array'], dtype=np.float64) for d in detections])
+    scores = fall_detector.detect_batch(keypoints, [d['id'] for d in detections], timestamp)
+    return [
+        {
+            'track_id': int(detection['id']),
+            'bbox': [float(coord) for coord in detection['bbox']],
+            'confidence': float(detection['confidence']),
+            'keypoints': detection['keypoints'],
+            'is_fall': bool(is_fall),
+            'fall_score': float(fall_score),
+            'details': details
+        }
+        for detection, (is_fall, fall_score, details) in zip(detections, scores)
+    ]
+
+def process_archive(
+    input_path: str,
+    output_path: str,
+    detector,
+    fall_detector_config: Dict,
+    tracker_config: Dict,
+    output_format: Optional[str] = None,
+    batch_size: int = 8,
+    workers: int = 4,
+    stride: int = 1,
+    image_sequences: bool = False,
+    sequence_fps: float = 10.0,
+    checkpoint_seconds: float = 30.0,
+    restart: bool = False
+) -> Dict:
+    """
+    对目录或录像执行离线批量检测
+
+    Args:
+        input_path: 输入目录或视频文件
+        output_path: 输出路径（.jsonl文件或.parquet目录）
+        detector: YOLODetector实例（需提供detect_batch方法）
+        fall_detector_config: FallDetector参数
+        tracker_config: IoUTracker参数
+        output_format: 'jsonl' / 'parquet'，None时按扩展名推断
+        batch_size: 单次推理的最大帧数（可跨文件组批）
+        workers: 解码线程数
+        stride: 视频每隔stride帧处理一帧
+        image_sequences: 是否把同一目录下的图片当作帧序列（共享跟踪与跌倒历史）
+        sequence_fps: 图片序列的帧率，用于计算运动速度
+        checkpoint_seconds: 检查点间隔（秒）
+        restart: 忽略已有检查点，从头开始
+
+    Returns:
+        处理统计（同时保存在检查点文件中）
+    """
+    from models.fall_detector import FallDetector
+    from models.tracker import IoUTracker
+
+    stride = max(1, int(stride))
+    batch_size = max(1, int(batch_size))
+    units = find_units(input_path, image_sequences)
+    writer = create_writer(output_path, output_format)
+    checkpoint_path = _checkpoint_path(output_path)
+
+    fingerprint = {
+        'input': os.path.abspath(input_path),
+        'units': len(units),
+        'units_sha1': hashlib.sha1('\n'.join(unit[0] for unit in units).encode('utf-8')).hexdigest(),
+        'writer': type(writer).__name__,
+        'stride': stride,
+        'image_sequences': image_sequences,
+        'sequence_fps': sequence_fps,
+        'model': detector.get_model_info().get('runtime_model_path') if hasattr(detector, 'get_model_info') else None,
+        'fall_detector': fall_detector_config,
+        'tracker': tracker_config
+    }
+
+    state = None if restart else _load_checkpoint(checkpoint_path)
+    if state is not None:
+        if state['fingerprint'] != fingerprint:
+            raise RuntimeError(f"检查点 {checkpoint_path} 与当前输入或参数不一致，请使用 --restart 重新开始")
+        if state.get('completed'):
+            logger.info(f"检查点显示已全部处理完成: {output_path}")
+            return state['stats']
+        logger.info(
+            f"从检查点继续: 已完成 {state['completed_units']['done_before'] + len(state['completed_units']['done'])}"
+            f"/{len(units)} 个单元"
+        )
+
+    writer.open(state['writer'] if state else None)
+    completed = _CompletedUnits(**state['completed_units']) if state else _CompletedUnits()
+    in_progress = {int(k): v for k, v in state['in_progress'].items()} if state else {}
+    start_frames = {index: unit_state['next_frame'] for index, unit_state in in_progress.items()}
+    stats = dict(state['stats']) if state else {
+        'units': len(units), 'frames': 0, 'detections': 0, 'fall_detections': 0,
+        'fall_frames': 0, 'failed_units': []
+    }
+    pending_units = [index for index in range(len(units)) if index not in completed]
+    logger.info(f"开始离线检测: {len(pending_units)}/{len(units)} 个单元待处理 -> {output_path}")
+
+    frames = queue.Queue(maxsize=batch_size * 4)
+    unit_queue = queue.Queue()
+    for index in pending_units:
+        unit_queue.put(index)
+    stop_event = threading.Event()
+    threads = [
+        threading.Thread(
+            target=_decode_worker,
+            args=(units, unit_queue, start_frames, stride, sequence_fps, frames, stop_event),
+            name=f'batch-decode-{i}', daemon=True
+        )
+        for i in range(max(1, min(int(workers), len(pending_units) or 1)))
+    ]
+    for thread in threads:
+        thread.start()
+
+    streams: Dict[int, _UnitState] = {}
+    # 单独的图片逐张判断，共用一个跌倒检测器（每张图片前清空历史）
+    single_image_detector = FallDetector(**fall_detector_config)
+
+    def new_unit_state(kind: str) -> _UnitState:
+        if kind == 'images':
+            single_image_detector.reset_history()
+            return _UnitState(single_image_detector, None)
+        return _UnitState(FallDetector(**fall_detector_config), IoUTracker(**tracker_config))
+
+    # 恢复进行中单元的跟踪与跌倒历史，续跑的帧沿用中断前的跟踪ID
+    for index, unit_state in in_progress.items():
+        unit = new_unit_state(units[index][1])
+        unit.load_state(unit_state)
+        streams[index] = unit
+
+    def checkpoint(done: bool = False):
+        writer_state = writer.close() if done else writer.commit()
+        _save_checkpoint(checkpoint_path, {
+            'version': CHECKPOINT_VERSION,
+            'fingerprint': fingerprint,
+            'writer': writer_state,
+            'completed_units': completed.to_dict(),
+            'in_progress': {str(index): unit.get_state() for index, unit in streams.items()},
+            'stats': stats,
+            'completed': done
+        })
+
+    remaining = len(pending_units)
+    last_checkpoint = time.monotonic()
+    started = time.monotonic()
+    run_frames = 0
+    try:
+        while remaining:
+            # 收集一批：阻塞等待第一项，随后取出队列中已就绪的项，最多batch_size帧
+            try:
+                batch = [frames.get(timeout=1.0)]
+            except queue.Empty:
+                if not any(thread.is_alive() for thread in threads):
+                    raise RuntimeError('解码线程已全部退出，但仍有未完成的单元')
+                continue
+            frame_count = int(batch[0][0] == _FRAME)
+            while frame_count < batch_size:
+                try:
+                    item = frames.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                frame_count += item[0] == _FRAME
+
+            images = [item[4] for item in batch if item[0] == _FRAME]
+            results = iter(detector.detect_batch(images) if images else [])
+
+            for item in batch:
+                if item[0] == _END:
+                    _, unit_index, error = item
+                    if error:
+                        logger.error(f"处理失败: {units[unit_index][0]}: {error}")
+                        stats['failed_units'].append(units[unit_index][0])
+                    completed.add(unit_index)
+                    streams.pop(unit_index, None)
+                    remaining -= 1
+                    continue
+
+                _, unit_index, frame_index, timestamp, _ = item
+                unit_id, kind, _ = units[unit_index]
+                unit = streams.get(unit_index)
+                if unit is None:
+                    unit = streams[unit_index] = new_unit_state(kind)
+
+                detections = score_frame(
+                    unit.fall_detector, unit.tracker, next(results),
+                    timestamp if kind != 'images' else None
+                )
+                writer.write({
+                    'source': unit_id,
+                    'frame': frame_index,
+                    'timestamp': round(timestamp, 3),
+                    'sequence': kind != 'images',
+                    'detections': detections
+                })
+                unit.next_frame = frame_index + 1
+
+                falls = sum(1 for detection in detections if detection['is_fall'])
+                stats['frames'] += 1
+                stats['detections'] += len(detections)
+                stats['fall_detections'] += falls
+                stats['fall_frames'] += int(falls > 0)
+                run_frames += 1
+
+            if time.monotonic() - last_checkpoint >= checkpoint_seconds:
+                checkpoint()
+                last_checkpoint = time.monotonic()
+                logger.info(
+                    f"进度: 已完成 {len(units) - remaining}/{len(units)} 个单元, "
+                    f"累计 {stats['frames']} 帧, "
+                    f"{run_frames / max(time.monotonic() - started, 1e-6):.1f} 帧/秒"
+                )
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    checkpoint(done=True)
+    logger.info(
+        f"离线检测完成: {stats['frames']} 帧, {stats['detections']} 个检测目标, "
+        f"跌倒帧 {stats['fall_frames']}, 失败 {len(stats['failed_units'])} 个单元, 结果: {output_path}"
+    )
+    return stats
+
+def rescore_results(
+    results_path: str,
+    output_path: str,
+    fall_detector_config: Dict,
+    output_format: Optional[str] = None
+) -> Dict:
+    """
+    用已保存的关键点与跟踪ID重新执行跌倒判断（调整阈值后无需重新运行YOLO）
+
+    Args:
+        results_path: 之前输出的JSONL结果
+        output_path: 新的输出路径
+        fall_detector_config: 新的FallDetector参数
+        output_format: 'jsonl' / 'parquet'，None时按扩展名推断
+
+    Returns:
+        处理统计
+    """
+    from models.fall_detector import FallDetector
+
+    writer = create_writer(output_path, output_format)
+    writer.open()
+    streams: Dict[str, FallDetector] = {}
+    single = FallDetector(**fall_detector_config)
+    stats = {'frames': 0, 'detections': 0, 'fall_detections': 0, 'fall_frames': 0}
+
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('sequence', True):
+                fall_detector = streams.get(record['source'])
+                if fall_detector is None:
+                    fall_detector = streams[record['source']] = FallDetector(**fall_detector_config)
+                timestamp = record['timestamp']
+            else:
+                fall_detector = single
+                fall_detector.reset_history()
+                timestamp = None
+
+            detections = record['detections']
+            if detections:
+                keypoints = np.asarray([d['keypoints'] for d in detections], dtype=np.float64)
+                scores = fall_detector.detect_batch(keypoints, [d['track_id'] for d in detections], timestamp)
+                for detection, (is_fall, fall_score, details) in zip(detections, scores):
+                    detection.update(is_fall=bool(is_fall), fall_score=float(fall_score), details=details)
+            writer.write(record)
+
+            falls = sum(1 for detection in detections if detection['is_fall'])
+            stats['frames'] += 1
+            stats['detections'] += len(detections)
+            stats['fall_detections'] += falls
+            stats['fall_frames'] += int(falls > 0)
+
+    writer.close()
+    logger.info(
+        f"重新评分完成: {stats['frames']} 帧, 跌倒帧 {stats['fall_frames']}, "
+        f"跌倒目标 {stats['fall_detections']}, 结果: {output_path}"
+    )
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对图片目录或长录像执行离线批量跌倒检测')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', help='输入目录（递归查找图片与视频）或单个视频文件')
+    source.add_argument('--rescore', help='用已有JSONL结果中的关键点重新评分（不运行YOLO）')
+    parser.add_argument('--output', required=True, help='输出路径（.jsonl 或 .parquet）')
+    parser.add_argument('--format', choices=('jsonl', 'parquet'), default=None, help='输出格式，默认按扩展名推断')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='解码线程数')
+    parser.add_argument('--batch-size', type=int, default=None, help='单次推理帧数，默认为BATCH_MAX_SIZE')
+    parser.add_argument('--stride', type=int, default=1, help='视频每隔多少帧处理一帧')
+    parser.add_argument('--image-sequences', action='store_true', help='同一目录下的图片按文件名顺序作为帧序列处理')
+    parser.add_argument('--sequence-fps', type=float, default=10.0, help='图片序列的帧率')
+    parser.add_argument('--checkpoint-seconds', type=float, default=30.0, help='检查点间隔（秒）')
+    parser.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+    parser.add_argument('--fall-threshold', type=float, default=None, help='覆盖FALL_THRESHOLD')
+    parser.add_argument('--history-length', type=int, default=None, help='覆盖HISTORY_LENGTH')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from config import get_config
+    config = get_config()
+
+    fall_detector_config = {
+        'fall_threshold': config.FALL_THRESHOLD if args.fall_threshold is None else args.fall_threshold,
+        'angle_threshold_high': config.ANGLE_THRESHOLD_HIGH,
+        'angle_threshold_mid': config.ANGLE_THRESHOLD_MID,
+        'height_ratio_high': config.HEIGHT_RATIO_HIGH,
+        'height_ratio_mid': config.HEIGHT_RATIO_MID,
+        'history_length': config.HISTORY_LENGTH if args.history_length is None else args.history_length
+    }
+
+    if args.rescore:
+        rescore_results(args.rescore, args.output, fall_detector_config, args.format)
+        return
+
+    from app import build_yolo_detector
+
+    process_archive(
+        args.input,
+        args.output,
+        build_yolo_detector(config),
+        fall_detector_config,
+        tracker_config={
+            'iou_threshold': config.TRACKER_IOU_THRESHOLD,
+            'centroid_weight': config.TRACKER_CENTROID_WEIGHT,
+            'max_age': config.TRACKER_MAX_AGE,
+            'matcher': config.TRACKER_MATCHER
+        },
+        output_format=args.format,
+        batch_size=args.batch_size or config.BATCH_MAX_SIZE,
+        workers=args.workers,
+        stride=args.stride,
+        image_sequences=args.image_sequences,
+        sequence_fps=args.sequence_fps,
+        checkpoint_seconds=args.checkpoint_seconds,
+        restart=args.restart
+    )
+
+if __name__ == '__main__':
+    main()
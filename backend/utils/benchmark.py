@@ -0,0 +1,605 @@
+"""
+端到端性能基准
+
+回放跌倒图片目录中的JPEG与合成的多人画面，分别测量检测流水线各阶段
+（解码、缩放、姿态检测、跟踪与跌倒评分、绘制、JPEG编码、结果序列化）
+以及完整的 /api/detect_video 接口（Flask测试客户端顺序请求与并发压测），
+输出吞吐量、p50/p95/p99延迟与峰值内存（RSS）的JSON报告，并可与保存的基线比较。
+
+合成画面使用固定随机种子生成，图片按文件名排序回放，同一环境下多次运行的输入完全一致。
+接口测试期间的跌倒图片归档写入临时目录，不会混入训练数据。
+
+用法（在backend目录下）:
+    python -m utils.benchmark --output benchmark.json
+    # 部署前保存基线，之后每次构建与基线比较，p95延迟或吞吐量退化超过容差时退出码为1
+    python -m utils.benchmark --save-baseline benchmarks/baseline.json
+    python -m utils.benchmark --baseline benchmarks/baseline.json --tolerance 0.15
+    # 对运行中的服务（如 serve.py 多进程服务）做并发压测
+    python -m utils.benchmark --scenarios load --url http://127.0.0.1:5000 --concurrency 8 --streams 4
+"""
+import os
+import sys
+import json
+import time
+import base64
+import platform
+import argparse
+import logging
+import tempfile
+import threading
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from utils.serialization import dumps_json, json_default
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 1
+
+DEFAULT_IMAGES_DIR = Path(__file__).resolve().parents[2] / 'fall_training_data'
+
+SCENARIO_GROUPS = ('stage', 'e2e', 'load')
+
+# 与基线比较的指标：(指标名, 数值越大越好)
+COMPARED_METRICS = (('p95_ms', False), ('throughput', True))
+
+# 站立姿态的COCO 17关键点模板，单位为人体身高，原点在两脚中点，y轴向下
+_STANDING_POSE = np.array([
+    [0.00, -0.93], [0.02, -0.95], [-0.02, -0.95], [0.05, -0.93], [-0.05, -0.93],
+    [0.11, -0.80], [-0.11, -0.80], [0.15, -0.62], [-0.15, -0.62], [0.16, -0.46], [-0.16, -0.46],
+    [0.08, -0.50], [-0.08, -0.50], [0.09, -0.27], [-0.09, -0.27], [0.09, -0.03], [-0.09, -0.03]
+])
+
+_SKELETON = (
+    (15, 13), (13, 11), (16, 14), (14, 12), (11, 12), (5, 11), (6, 12),
+    (5, 7), (6, 8), (7, 9), (8, 10), (5, 6), (0, 1), (0, 2), (1, 3), (2, 4)
+)
+
+def _peak_rss_mb() -> float:
+    """进程至今的峰值常驻内存（MB）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux单位为KB，macOS为字节
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+
+def summarize_latencies(latencies: Sequence[float], elapsed: float, items: int) -> Dict:
+    """
+    汇总一个场景的计时结果
+
+    Args:
+        latencies: 每次调用的耗时（秒）
+        elapsed: 场景总耗时（秒，并发场景为墙钟时间）
+        items: 处理的帧数
+
+    Returns:
+        吞吐量（帧/秒）、延迟分位数（毫秒）与峰值内存
+    """
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    if values.size == 0:
+        values = np.zeros(1)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'calls': len(latencies),
+        'items': items,
+        'elapsed_seconds': elapsed,
+        'throughput': items / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(values.max()),
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+def measure(fn: Callable, args_list: Sequence, warmup: int = 3, items_per_call: int = 1) -> Dict:
+    """
+    依次以args_list中的每个参数调用fn并计时（预热调用不计入结果）
+
+    Args:
+        fn: 被测函数
+        args_list: 每次调用的参数
+        warmup: 预热次数（循环取用args_list的前几个参数）
+        items_per_call: 每次调用处理的帧数，用于计算吞吐量
+    """
+    for i in range(min(warmup, len(args_list))):
+        fn(args_list[i])
+
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        call_start = time.perf_counter()
+        fn(args)
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    return summarize_latencies(latencies, elapsed, len(args_list) * items_per_call)
+
+def load_images(images_dir, limit: int = 0) -> List[bytes]:
+    """按文件名顺序读取目录（含子目录）中的JPEG原始字节"""
+    if not images_dir or not os.path.isdir(images_dir):
+        return []
+    paths = sorted(
+        path for path in Path(images_dir).rglob('*')
+        if path.suffix.lower() in ('.jpg', '.jpeg')
+    )
+    if limit:
+        paths = paths[:limit]
+    return [path.read_bytes() for path in paths]
+
+def synthetic_pose(center_x: float, feet_y: float, height: float, angle: float) -> np.ndarray:
+    """按站立模板生成一个人的关键点 [17, 3]，angle为绕脚部旋转的角度（度，90为完全躺倒）"""
+    theta = np.radians(angle)
+    rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    points = _STANDING_POSE @ rotation.T * height + np.array([center_x, feet_y])
+    return np.hstack([points, np.full((len(points), 1), 0.9)]).astype(np.float32)
+
+def synthetic_sequence(
+    frames: int,
+    persons: int,
+    width: int = 1280,
+    height: int = 720,
+    fallers: int = 1,
+    seed: int = 0
+):
+    """
+    生成合成的多人视频序列：人物缓慢移动，前fallers个人在序列中段跌倒
+
+    Returns:
+        [(BGR画面, 检测结果列表), ...]，检测结果的格式与YOLODetector.detect一致
+    """
+    rng = np.random.default_rng(seed)
+    person_height = height * rng.uniform(0.35, 0.6, persons)
+    positions = np.column_stack([
+        rng.uniform(0.1, 0.9, persons) * width,
+        rng.uniform(0.7, 0.95, persons) * height
+    ])
+    velocities = rng.uniform(-3, 3, (persons, 2)) * np.array([1.0, 0.2])
+    background = rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+    fall_start = frames // 2
+
+    sequence = []
+    for index in range(frames):
+        frame = background.copy()
+        detections = []
+        for person in range(persons):
+            center_x, feet_y = positions[person] + velocities[person] * index
+            angle = 0.0
+            if person < fallers and index >= fall_start:
+                angle = min(85.0, (index - fall_start) * 12.0)
+            keypoints = synthetic_pose(center_x, feet_y, person_height[person], angle)
+            keypoints[:, :2] += rng.normal(0, 1.5, (len(keypoints), 2))
+
+            for a, b in _SKELETON:
+                cv2.line(
+                    frame, tuple(int(v) for v in keypoints[a, :2]), tuple(int(v) for v in keypoints[b, :2]),
+                    (220, 200, 180), max(2, int(person_height[person] / 40))
+                )
+            cv2.circle(frame, tuple(int(v) for v in keypoints[0, :2]), int(person_height[person] / 14), (200, 180, 170), -1)
+
+            x1, y1 = keypoints[:, :2].min(axis=0) - 10
+            x2, y2 = keypoints[:, :2].max(axis=0) + 10
+            detections.append({
+                'id': person,
+                'bbox': np.array([x1, y1, x2, y2], dtype=np.float32),
+                'confidence': 0.9,
+                'keypoints': keypoints,
+                'keypoints_array': keypoints
+            })
+        sequence.append((frame, detections))
+    return sequence
+
+def run_stage_benchmarks(yolo_detector, fall_detector_config: Dict, tracker_config: Dict,
+                         image_bytes: List[bytes], sequence, batch_size: int, warmup: int) -> Dict:
+    """逐阶段基准：每个阶段单独计时，便于定位延迟预算被哪个阶段消耗"""
+    from models.fall_detector import FallDetector
+    from models.tracker import IoUTracker
+    from utils.image_processor import ImageProcessor
+
+    results = {}
+    synthetic_frames = [frame for frame, _ in sequence]
+    encoded = image_bytes or [ImageProcessor.image_to_bytes(frame) for frame in synthetic_frames]
+
+    results['stage.decode'] = measure(ImageProcessor.bytes_to_image, encoded, warmup)
+    frames = [ImageProcessor.bytes_to_image(data) for data in encoded]
+    results['stage.resize'] = measure(ImageProcessor.resize_image, frames, warmup)
+
+    detect_frames = [ImageProcessor.resize_image(frame) for frame in frames]
+    results['stage.detect'] = measure(yolo_detector.detect, detect_frames, warmup)
+    if batch_size > 1 and len(detect_frames) >= batch_size:
+        batches = [
+            detect_frames[i:i + batch_size]
+            for i in range(0, len(detect_frames) - batch_size + 1, batch_size)
+        ]
+        results['stage.detect_batch'] = measure(
+            yolo_detector.detect_batch, batches, min(warmup, 1), items_per_call=batch_size
+        )
+
+    # 跟踪与评分按序列顺序执行，每次运行使用新的状态与检测结果副本
+    tracker = IoUTracker(**tracker_config)
+    fall_detector = FallDetector(**fall_detector_config)
+    frame_detections = [[dict(detection) for detection in detections] for _, detections in sequence]
+
+    def track_and_score(detections):
+        detections, removed_ids = tracker.update(detections)
+        for track_id in removed_ids:
+            fall_detector.reset_history(track_id)
+        if detections:
+            keypoints = np.stack([detection['keypoints_array'] for detection in detections])
+            fall_detector.detect_batch(keypoints, [detection['id'] for detection in detections])
+
+    results['stage.track_score'] = measure(track_and_score, frame_detections, warmup=0)
+
+    scores = [[(False, 0.3, {}) for _ in detections] for _, detections in sequence]
+    results['stage.draw'] = measure(
+        lambda item: yolo_detector.draw_detections(
+            item[0], item[1], [s[0] for s in item[2]], [s[1] for s in item[2]]
+        ),
+        [(frame, detections, frame_scores) for (frame, detections), frame_scores in zip(sequence, scores)],
+        warmup
+    )
+    results['stage.encode'] = measure(lambda frame: ImageProcessor.image_to_bytes(frame, quality=75),
+                                      synthetic_frames, warmup)
+
+    responses = [
+        {
+            'success': True,
+            'detections': [
+                {
+                    'id': detection['id'], 'is_fall': False, 'fall_score': 0.3, 'confidence': 0.9,
+                    'bbox': detection['bbox'], 'keypoints': detection['keypoints']
+                }
+                for detection in detections
+            ]
+        }
+        for _, detections in sequence
+    ]
+    results['stage.serialize'] = measure(dumps_json, responses, warmup)
+    return results
+
+def _request_payloads(image_bytes: List[bytes], sequence) -> List[bytes]:
+    """接口测试使用的JPEG帧：有回放图片时使用回放图片，否则使用合成画面"""
+    if image_bytes:
+        return image_bytes
+    return [cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes() for frame, _ in sequence]
+
+def run_e2e_benchmarks(app, payloads: List[bytes], render: bool, warmup: int) -> Dict:
+    """通过Flask测试客户端顺序请求完整的视频帧检测接口"""
+    client = app.test_client()
+    render_flag = 1 if render else 0
+    results = {}
+
+    json_bodies = [
+        {
+            'frame': 'data:image/jpeg;base64,' + base64.b64encode(data).decode('ascii'),
+            'render': render,
+            'stream_id': 'bench-e2e-json'
+        }
+        for data in payloads
+    ]
+
+    def post_json(body):
+        response = client.post('/api/detect_video', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/detect_video 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    results['e2e.detect_video'] = measure(post_json, json_bodies, warmup)
+
+    def post_raw(data):
+        response = client.post(
+            f'/api/detect_video_raw?render={render_flag}', data=data,
+            headers={'Content-Type': 'application/octet-stream', 'X-Stream-ID': 'bench-e2e-raw'}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/detect_video_raw 返回 {response.status_code}")
+
+    results['e2e.detect_video_raw'] = measure(post_raw, payloads, warmup)
+    return results
+
+def run_load_benchmark(payloads: List[bytes], requests_total: int, concurrency: int, streams: int,
+                       render: bool, app=None, url: Optional[str] = None) -> Dict:
+    """
+    并发压测：concurrency个客户端线程共发送requests_total个二进制帧请求，按请求序号分配到streams路流
+
+    Args:
+        app: Flask应用（使用测试客户端，在本进程内测量接口处理能力）
+        url: 服务地址（如 http://127.0.0.1:5000），指定时通过HTTP请求运行中的服务
+    """
+    render_flag = 1 if render else 0
+    lock = threading.Lock()
+    counter = {'next': 0, 'errors': 0}
+    latencies = []
+
+    def client_loop():
+        client = app.test_client() if url is None else None
+        while True:
+            with lock:
+                index = counter['next']
+                if index >= requests_total:
+                    return
+                counter['next'] += 1
+            data = payloads[index % len(payloads)]
+            stream_id = f"bench-load-{index % streams}"
+            path = f'/api/detect_video_raw?render={render_flag}&stream_id={stream_id}'
+            headers = {'Content-Type': 'application/octet-stream', 'X-Stream-ID': stream_id}
+
+            start = time.perf_counter()
+            try:
+                if client is not None:
+                    ok = client.post(path, data=data, headers=headers).status_code == 200
+                else:
+                    request = urllib.request.Request(url.rstrip('/') + path, data=data, headers=headers, method='POST')
+                    with urllib.request.urlopen(request, timeout=60) as response:
+                        response.read()
+                        ok = response.status == 200
+            except Exception as e:
+                logger.debug(f"压测请求失败: {str(e)}")
+                ok = False
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    counter['errors'] += 1
+
+    threads = [threading.Thread(target=client_loop, daemon=True) for _ in range(max(1, concurrency))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = summarize_latencies(latencies, elapsed, len(latencies))
+    summary.update({
+        'concurrency': concurrency,
+        'streams': streams,
+        'errors': counter['errors'],
+        'target': url or 'test_client'
+    })
+    return {'load.detect_video_raw': summary}
+
+def compare_reports(report: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """
+    与基线比较，返回退化超过容差的指标
+
+    只比较两份报告中都存在的场景；p95延迟升高或吞吐量下降超过tolerance（比例）视为退化。
+    """
+    regressions = []
+    for name, current in report.get('scenarios', {}).items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append({
+                    'scenario': name,
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change': change
+                })
+    return regressions
+
+def environment_info(config, yolo_detector) -> Dict:
+    """记录影响结果可比性的环境信息"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'model': yolo_detector.get_model_info() if yolo_detector is not None else None,
+        'config': {
+            key: getattr(config, key)
+            for key in (
+                'MODEL_BACKEND', 'MODEL_PRECISION', 'MODEL_IMGSZ', 'BATCH_INFERENCE_ENABLED', 'BATCH_MAX_SIZE',
+                'FRAME_SKIP_ENABLED', 'ROI_INFERENCE_ENABLED', 'ARCHIVE_ASYNC_ENABLED', 'FALL_EVENT_CAPTURE_ENABLED'
+            )
+        }
+    }
+
+def run_benchmark(yolo_detector, config, config_name: Optional[str] = None, images_dir=None,
+                  scenarios: Sequence[str] = SCENARIO_GROUPS, image_limit: int = 0, frames: int = 60,
+                  persons: int = 4, warmup: int = 3, render: bool = True, requests_total: int = 200,
+                  concurrency: int = 4, streams: int = 2, url: Optional[str] = None, seed: int = 0) -> Dict:
+    """
+    运行基准并返回报告
+
+    Args:
+        yolo_detector: YOLO检测器（指定url且只运行load场景时可为None）
+        config: 配置类
+        config_name: 创建Flask应用使用的配置环境名称
+        images_dir: 回放的JPEG目录
+        scenarios: 运行的场景组（stage / e2e / load）
+        image_limit: 最多回放的图片数，0表示全部
+        frames: 合成序列的帧数
+        persons: 合成画面中的人数
+        warmup: 每个场景的预热次数
+        render: 接口测试是否由服务端绘制结果帧
+        requests_total: 并发压测的总请求数
+        concurrency: 并发压测的客户端线程数
+        streams: 并发压测的流数
+        url: 并发压测的服务地址，None表示在本进程内使用测试客户端
+        seed: 合成数据的随机种子
+    """
+    image_bytes = load_images(images_dir, image_limit)
+    sequence = synthetic_sequence(frames, persons, seed=seed)
+    logger.info(f"回放图片 {len(image_bytes)} 张, 合成画面 {len(sequence)} 帧（每帧 {persons} 人）")
+
+    report = {
+        'version': REPORT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'environment': environment_info(config, yolo_detector),
+        'inputs': {
+            'images_dir': str(images_dir) if images_dir else None,
+            'replayed_images': len(image_bytes),
+            'synthetic_frames': len(sequence),
+            'synthetic_persons': persons,
+            'seed': seed,
+            'render': render
+        },
+        'scenarios': {}
+    }
+
+    if 'stage' in scenarios:
+        logger.info("运行逐阶段基准")
+        report['scenarios'].update(run_stage_benchmarks(
+            yolo_detector,
+            {
+                'fall_threshold': config.FALL_THRESHOLD,
+                'angle_threshold_high': config.ANGLE_THRESHOLD_HIGH,
+                'angle_threshold_mid': config.ANGLE_THRESHOLD_MID,
+                'height_ratio_high': config.HEIGHT_RATIO_HIGH,
+                'height_ratio_mid': config.HEIGHT_RATIO_MID,
+                'history_length': config.HISTORY_LENGTH
+            },
+            {
+                'iou_threshold': config.TRACKER_IOU_THRESHOLD,
+                'centroid_weight': config.TRACKER_CENTROID_WEIGHT,
+                'max_age': config.TRACKER_MAX_AGE,
+                'matcher': config.TRACKER_MATCHER
+            },
+            image_bytes, sequence, config.BATCH_MAX_SIZE, warmup
+        ))
+
+    payloads = _request_payloads(image_bytes, sequence)
+    app = None
+    if 'e2e' in scenarios or ('load' in scenarios and url is None):
+        # 接口测试中归档的跌倒图片写入临时目录（跌倒图片目录是相对工作目录的路径）
+        workdir = tempfile.mkdtemp(prefix='fall_benchmark_')
+        os.chdir(workdir)
+        from app import create_app
+        app = create_app(config_name, yolo_detector=yolo_detector)
+        report['inputs']['workdir'] = workdir
+
+    if 'e2e' in scenarios:
+        logger.info("运行接口顺序请求基准")
+        report['scenarios'].update(run_e2e_benchmarks(app, payloads, render, warmup))
+
+    if 'load' in scenarios:
+        logger.info(f"运行并发压测: {concurrency} 个客户端, {streams} 路流, 共 {requests_total} 个请求")
+        report['scenarios'].update(run_load_benchmark(
+            payloads, requests_total, concurrency, streams, render, app=app, url=url
+        ))
+
+    return report
+
+def _write_json(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检测流水线端到端性能基准')
+    parser.add_argument('--images', default=str(DEFAULT_IMAGES_DIR), help='回放的JPEG目录（默认为项目的跌倒图片目录）')
+    parser.add_argument('--image-limit', type=int, default=0, help='最多回放的图片数，0表示全部')
+    parser.add_argument('--frames', type=int, default=60, help='合成序列的帧数')
+    parser.add_argument('--persons', type=int, default=4, help='合成画面中的人数')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--warmup', type=int, default=3, help='每个场景的预热次数')
+    parser.add_argument('--scenarios', default=','.join(SCENARIO_GROUPS), help='运行的场景组，逗号分隔（stage,e2e,load）')
+    parser.add_argument('--no-render', action='store_true', help='接口测试只返回检测结果，不绘制与编码结果帧')
+    parser.add_argument('--requests', type=int, default=200, help='并发压测的总请求数')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发压测的客户端线程数')
+    parser.add_argument('--streams', type=int, default=2, help='并发压测的流数')
+    parser.add_argument('--url', default=None, help='对运行中的服务压测（如 http://127.0.0.1:5000），默认使用进程内测试客户端')
+    parser.add_argument('--output', default=None, help='报告输出路径（JSON），默认输出到标准输出')
+    parser.add_argument('--baseline', default=None, help='与之比较的基线报告')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='允许的退化比例')
+    parser.add_argument('--save-baseline', default=None, help='将本次报告保存为基线')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIO_GROUPS)
+    if unknown:
+        parser.error(f"未知的场景组: {', '.join(sorted(unknown))}")
+
+    # 相对路径在切换到临时工作目录之前解析
+    images_dir = os.path.abspath(args.images) if args.images else None
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_baseline = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    from config import get_config
+    config = get_config()
+
+    yolo_detector = None
+    if scenarios != ['load'] or args.url is None:
+        from app import build_yolo_detector
+        yolo_detector = build_yolo_detector(config)
+
+    report = run_benchmark(
+        yolo_detector, config,
+        images_dir=images_dir,
+        scenarios=scenarios,
+        image_limit=args.image_limit,
+        frames=args.frames,
+        persons=args.persons,
+        warmup=args.warmup,
+        render=not args.no_render,
+        requests_total=args.requests,
+        concurrency=args.concurrency,
+        streams=args.streams,
+        url=args.url,
+        seed=args.seed
+    )
+
+    for name, result in report['scenarios'].items():
+        logger.info(
+            f"{name:<24} {result['throughput']:9.1f} 帧/秒  p50 {result['p50_ms']:8.2f} ms  "
+            f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  峰值RSS {result['peak_rss_mb']:.0f} MB"
+        )
+
+    exit_code = 0
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('environment', {}).get('config') != report['environment']['config']:
+            logger.warning("基线与本次运行的模型或流水线配置不同，比较结果仅供参考")
+        regressions = compare_reports(report, baseline, args.tolerance)
+        report['comparison'] = {
+            'baseline': baseline_path,
+            'baseline_created_at': baseline.get('created_at'),
+            'tolerance': args.tolerance,
+            'regressions': regressions
+        }
+        for item in regressions:
+            logger.error(
+                f"性能退化: {item['scenario']} {item['metric']} "
+                f"{item['baseline']:.2f} -> {item['current']:.2f} ({item['change']:+.1%})"
+            )
+        if regressions:
+            exit_code = 1
+        else:
+            logger.info(f"与基线相比无超过 {args.tolerance:.0%} 的退化")
+
+    if save_baseline:
+        _write_json(save_baseline, report)
+        logger.info(f"基线已保存: {save_baseline}")
+    if output:
+        _write_json(output, report)
+        logger.info(f"报告已保存: {output}")
+    elif not save_baseline:
+        sys.stdout.write(dumps_json(report).decode('utf-8') + '\n')
+
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import json
+import struct
+from typing import Dict, Tuple
+
+from .serialization import dumps_json
+
+# 二进制检测结果格式：[4字节大端JSON长度][检测结果JSON(UTF-8)][编码后的结果图像]
+BINARY_RESULT_MIMETYPE = 'application/x-fall-detection'
+
+_HEADER = struct.Struct('>I')
+
+def pack_detection_result(result: Dict, image_bytes: bytes = b'') -> bytes:
+    """
+    将检测结果与结果图像打包为二进制消息
+    
+    Args:
+        result: 检测结果字典（可直接包含numpy数组与标量）
+        image_bytes: 编码后的结果图像，可为空
+        
+    Returns:
+        打包后的字节串
+    """
+    meta = dumps_json(result)
+    return b''.join((_HEADER.pack(len(meta)), meta, image_bytes))
+
+def unpack_detection_result(data: bytes) -> Tuple[Dict, bytes]:
+    """
+    解析二进制检测结果消息
+    
+    Args:
+        data: pack_detection_result生成的字节串
+        
+    Returns:
+        (检测结果字典, 结果图像字节)
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError('二进制结果长度不足')
+    
+    (meta_length,) = _HEADER.unpack_from(data)
+    meta_end = _HEADER.size + meta_length
+    if len(data) < meta_end:
+        raise ValueError('二进制结果JSON段不完整')
+    
+    result = json.loads(data[_HEADER.size:meta_end].decode('utf-8'))
+    return result, data[meta_end:]
@@ -0,0 +1,347 @@
+"""
+跌倒训练数据集导出工具
+
+把已标注的跌倒样本打包为WebDataset风格的tar分片，每个样本包含:
+    {key}.jpg   原始图片（直接拷贝文件字节，不重新编码）
+    {key}.txt   YOLO-pose标签（由归档时保存的画面中所有目标的边界框与关键点生成）
+    {key}.json  检测详情与元数据
+
+同时生成:
+    keypoints.npy   [样本数, 17, 3] 的关键点数组（可用np.load(mmap_mode='r')按需读取，
+                    每个样本取第一个跌倒目标，像素坐标，缺失时为NaN）
+
+跌倒目标的类别取样本的人工标签，画面中未判定为跌倒的目标标为normal类别；
+没有完整标注（早期版本只归档了跌倒目标的几何信息）的样本不导出，避免把未标注的人当作背景。
+    samples.jsonl   keypoints.npy的行号到分片与样本key的映射
+    manifest.json   分片列表、类别与统计信息
+
+用法（在backend目录下）:
+    python -m utils.dataset_export --output exports/fall_v1 --shard-size 1000 --workers 4
+"""
+import os
+import io
+import json
+import tarfile
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.dataset_index import FallDatasetIndex, STATUS_LABELED
+
+logger = logging.getLogger(__name__)
+
+NUM_KEYPOINTS = 17
+KEYPOINT_VISIBLE_THRESHOLD = 0.5  # 与YOLODetector.draw_detections一致
+DEFAULT_CLASSES = ('fall', 'normal')
+NORMAL_CLASS = 'normal'  # 未判定为跌倒的目标的类别
+
+def sample_objects(metadata: Optional[Dict]) -> Tuple[List[Dict], Optional[List[int]]]:
+    """
+    从样本元数据中取出画面中所有目标的几何信息
+
+    样本元数据为 {'objects': [...], 'image_size': [w, h]}，每个目标带有是否跌倒的 fall 标记。
+    早期版本只归档了跌倒目标（目标没有 fall 标记，或事件采集的元数据只有单个目标的
+    bbox / keypoints），画面中其他人没有标注，这类样本返回空列表。
+
+    Returns:
+        (目标列表 [{'bbox', 'keypoints', 'fall'}]，标注不完整时为空, 图像尺寸 [宽, 高] 或None)
+    """
+    if not metadata:
+        return [], None
+    image_size = metadata.get('image_size')
+    objects = metadata.get('objects') or []
+    if not all('fall' in obj for obj in objects):
+        return [], image_size
+    return objects, image_size
+
+def yolo_pose_label(objects: List[Dict], image_size: List[int], class_id: int) -> str:
+    """
+    生成YOLO-pose格式的标签文本
+
+    每行: class cx cy w h x1 y1 v1 ... x17 y17 v17（坐标按图像宽高归一化，
+    可见性v取2表示可见、0表示未检测到（置信度不超过0.5或坐标为(0,0)）
+
+    Args:
+        objects: 目标列表，bbox为 (x1, y1, x2, y2) 像素坐标，keypoints为 [17, 3] (x, y, 置信度)
+        image_size: 图像尺寸 [宽, 高]
+        class_id: 类别ID
+
+    Returns:
+        标签文本
+    """
+    width, height = float(image_size[0]), float(image_size[1])
+    lines = []
+    for obj in objects:
+        x1, y1, x2, y2 = (float(v) for v in obj['bbox'])
+        box = np.clip(
+            np.array([(x1 + x2) / 2 / width, (y1 + y2) / 2 / height, (x2 - x1) / width, (y2 - y1) / height]),
+            0.0, 1.0
+        )
+
+        keypoints = np.asarray(obj['keypoints'], dtype=np.float64).reshape(-1, 3)[:NUM_KEYPOINTS]
+        # 与绘制时相同的置信度阈值；低置信度关键点已被YOLO置为(0,0)，不能标为可见
+        visible = (keypoints[:, 2] > KEYPOINT_VISIBLE_THRESHOLD) & np.any(keypoints[:, :2] != 0, axis=1)
+        kpts = np.zeros((NUM_KEYPOINTS, 3))
+        kpts[:len(keypoints), 0] = np.where(visible, np.clip(keypoints[:, 0] / width, 0.0, 1.0), 0.0)
+        kpts[:len(keypoints), 1] = np.where(visible, np.clip(keypoints[:, 1] / height, 0.0, 1.0), 0.0)
+        kpts[:len(keypoints), 2] = np.where(visible, 2, 0)
+
+        values = [f"{v:.6f}" for v in box] + [
+            f"{x:.6f} {y:.6f} {int(v)}" for x, y, v in kpts
+        ]
+        lines.append(f"{class_id} " + ' '.join(values))
+    return '\n'.join(lines) + ('\n' if lines else '')
+
+def _primary_keypoints(objects: List[Dict]) -> np.ndarray:
+    """取第一个跌倒目标的关键点（归档时目标已按检测顺序排列），没有时返回NaN数组"""
+    result = np.full((NUM_KEYPOINTS, 3), np.nan, dtype=np.float32)
+    fallen = [obj for obj in objects if obj['fall']]
+    if fallen:
+        keypoints = np.asarray(fallen[0]['keypoints'], dtype=np.float32).reshape(-1, 3)[:NUM_KEYPOINTS]
+        result[:len(keypoints)] = keypoints
+    return result
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes, mtime: float):
+    """向tar中写入一个文件"""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(mtime)
+    tar.addfile(info, io.BytesIO(data))
+
+def write_shard(args) -> Dict:
+    """
+    写入一个tar分片（在子进程中执行）
+
+    Args:
+        args: (分片路径, 图片目录, 样本列表, 类别名列表)
+
+    Returns:
+        分片统计与每个样本的关键点
+    """
+    shard_path, image_dir, samples, classes = args
+    tmp_path = shard_path + '.tmp'
+    keys, keypoints = [], []
+    labeled, unannotated, missing, skipped = 0, 0, 0, 0
+
+    with tarfile.open(tmp_path, 'w') as tar:
+        for sample in samples:
+            filename = sample['filename']
+            label = sample.get('label') or classes[0]
+            if label not in classes:
+                skipped += 1
+                continue
+
+            objects, image_size = sample_objects(sample.get('metadata'))
+            if not objects or not image_size:
+                unannotated += 1
+                continue
+            if not all(obj['fall'] for obj in objects) and NORMAL_CLASS not in classes:
+                skipped += 1
+                continue
+
+            image_path = os.path.join(image_dir, filename)
+            try:
+                with open(image_path, 'rb') as f:
+                    image_bytes = f.read()
+            except OSError:
+                missing += 1
+                continue
+
+            key = os.path.splitext(filename)[0]
+            mtime = sample.get('captured_at') or 0
+            _add_bytes(tar, f"{key}.jpg", image_bytes, mtime)
+
+            # 跌倒目标取样本的人工标签（误报被标为normal时一并改为normal），其余目标为normal
+            label_text = ''.join(
+                yolo_pose_label([obj], image_size, classes.index(label if obj['fall'] else NORMAL_CLASS))
+                for obj in objects
+            )
+            _add_bytes(tar, f"{key}.txt", label_text.encode('utf-8'), mtime)
+            labeled += 1
+
+            _add_bytes(tar, f"{key}.json", json.dumps({
+                'filename': filename,
+                'label': label,
+                'captured_at': sample.get('captured_at'),
+                'stream_id': sample.get('stream_id'),
+                'track_id': sample.get('track_id'),
+                'event_id': sample.get('event_id'),
+                'fall_score': sample.get('fall_score'),
+                'body_angle': sample.get('body_angle'),
+                'details': sample.get('details'),
+                'metadata': sample.get('metadata')
+            }, ensure_ascii=False).encode('utf-8'), mtime)
+
+            keys.append(key)
+            keypoints.append(_primary_keypoints(objects))
+
+    os.replace(tmp_path, shard_path)
+
+    return {
+        'shard': os.path.basename(shard_path),
+        'keys': keys,
+        'keypoints': np.stack(keypoints) if keypoints else np.zeros((0, NUM_KEYPOINTS, 3), np.float32),
+        'labeled': labeled,
+        'unannotated': unannotated,
+        'missing': missing,
+        'skipped': skipped
+    }
+
+def _iter_shard_jobs(index: FallDatasetIndex, output_dir: str, shard_size: int,
+                     classes: List[str], snapshot_at: float, page_size: int = 5000):
+    """
+    分页读取索引并切分为分片任务（流式，不一次性载入全部样本）
+
+    服务运行中索引仍在插入与重新标注：按 (captured_at, filename) 键集分页，
+    且只导出 snapshot_at 之前最后修改的样本，导出内容即开始导出时的已标注样本
+    （之后新增或修改的样本留给下一次导出）。
+    """
+    image_dir = index.status_dir(STATUS_LABELED)
+    batch, shard_id, after = [], 0, None
+    while True:
+        page = index.list_samples(
+            limit=page_size, with_total=False, include_details=True, after=after,
+            status=STATUS_LABELED, updated_until=snapshot_at
+        )['samples']
+        if not page:
+            break
+        after = (page[-1]['captured_at'], page[-1]['filename'])
+        batch.extend(page)
+        while len(batch) >= shard_size:
+            yield (os.path.join(output_dir, f"shard-{shard_id:06d}.tar"), image_dir, batch[:shard_size], classes)
+            batch = batch[shard_size:]
+            shard_id += 1
+    if batch:
+        yield (os.path.join(output_dir, f"shard-{shard_id:06d}.tar"), image_dir, batch, classes)
+
+def _bounded_map(executor, fn, iterable, max_pending: int):
+    """按顺序返回结果的map，最多同时提交max_pending个任务（避免一次性读入全部样本）"""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def export_dataset(
+    root_dir: str,
+    output_dir: str,
+    shard_size: int = 1000,
+    workers: int = 4,
+    classes: Optional[List[str]] = None,
+    db_path: Optional[str] = None
+) -> Dict:
+    """
+    导出已标注样本为tar分片
+
+    Args:
+        root_dir: 数据集根目录（fall_training_data）
+        output_dir: 导出目录
+        shard_size: 每个分片的样本数
+        workers: 写分片的进程数，1表示在当前进程中执行
+        classes: 类别名列表，未设置标签的样本归为第一个类别
+        db_path: 数据集索引路径，默认为 root_dir/index.sqlite3
+
+    Returns:
+        导出清单
+    """
+    classes = list(classes or DEFAULT_CLASSES)
+    os.makedirs(output_dir, exist_ok=True)
+
+    index = FallDatasetIndex(root_dir, db_path)
+    index.sync()
+    snapshot_at = datetime.now().timestamp()
+    total = index.list_samples(limit=0, status=STATUS_LABELED, updated_until=snapshot_at)['total']
+    logger.info(f"开始导出 {total} 个已标注样本 -> {output_dir}")
+
+    keypoints_path = os.path.join(output_dir, 'keypoints.npy')
+    keypoints = np.lib.format.open_memmap(
+        keypoints_path, mode='w+', dtype=np.float32, shape=(total, NUM_KEYPOINTS, 3)
+    )
+
+    jobs = _iter_shard_jobs(index, output_dir, max(1, int(shard_size)), classes, snapshot_at)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = _bounded_map(executor, write_shard, jobs, workers * 2)
+    else:
+        executor = None
+        results = map(write_shard, jobs)
+
+    shards = []
+    totals = {'samples': 0, 'labeled': 0, 'unannotated': 0, 'missing': 0, 'skipped': 0}
+    row = 0
+    try:
+        with open(os.path.join(output_dir, 'samples.jsonl'), 'w') as index_file:
+            for result in results:
+                count = len(result['keys'])
+                keypoints[row:row + count] = result['keypoints']
+                for i, key in enumerate(result['keys']):
+                    index_file.write(json.dumps({'row': row + i, 'shard': result['shard'], 'key': key}) + '\n')
+                row += count
+
+                shards.append({'name': result['shard'], 'samples': count})
+                totals['samples'] += count
+                for name in ('labeled', 'unannotated', 'missing', 'skipped'):
+                    totals[name] += result[name]
+                logger.info(f"已写入分片 {result['shard']}: {count} 个样本")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        index.close()
+
+    keypoints.flush()
+    del keypoints
+    if row != total:
+        # 导出过程中样本缺失或被跳过，截断关键点数组
+        trimmed_path = keypoints_path + '.tmp.npy'
+        np.save(trimmed_path, np.load(keypoints_path, mmap_mode='r')[:row])
+        os.replace(trimmed_path, keypoints_path)
+
+    manifest = {
+        'created_at': datetime.now().isoformat(),
+        'format': 'webdataset',
+        'classes': classes,
+        'kpt_shape': [NUM_KEYPOINTS, 3],
+        'shard_size': shard_size,
+        'shards': shards,
+        **totals
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    logger.info(
+        f"导出完成: {totals['samples']} 个样本, {len(shards)} 个分片, "
+        f"含标签 {totals['labeled']}, 标注不完整跳过 {totals['unannotated']}, "
+        f"文件缺失 {totals['missing']}, 类别不符跳过 {totals['skipped']}"
+    )
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导出跌倒训练数据集为tar分片（WebDataset + YOLO-pose标签）')
+    parser.add_argument('--root', default='fall_training_data', help='数据集根目录')
+    parser.add_argument('--output', required=True, help='导出目录')
+    parser.add_argument('--shard-size', type=int, default=1000, help='每个分片的样本数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='写分片的进程数')
+    parser.add_argument('--classes', default=','.join(DEFAULT_CLASSES),
+                        help='逗号分隔的类别名，未设置标签的样本归为第一个类别')
+    parser.add_argument('--db', default=None, help='数据集索引路径')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    export_dataset(
+        args.root,
+        args.output,
+        shard_size=args.shard_size,
+        workers=args.workers,
+        classes=[c.strip() for c in args.classes.split(',') if c.strip()],
+        db_path=args.db
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+import os
+import ast
+import json
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+STATUS_UNLABELED = 'unlabeled'
+STATUS_LABELED = 'labeled'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    filename     TEXT PRIMARY KEY,
+    status       TEXT NOT NULL,
+    label        TEXT,
+    captured_at  REAL NOT NULL,
+    stream_id    TEXT,
+    track_id     INTEGER,
+    event_id     TEXT,
+    frame_kind   TEXT,
+    fall_score   REAL,
+    body_angle   REAL,
+    avg_score    REAL,
+    details      TEXT,
+    metadata     TEXT,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_samples_status_time ON samples (status, captured_at DESC, filename);
+CREATE INDEX IF NOT EXISTS idx_samples_stream_time ON samples (stream_id, captured_at DESC);
+CREATE INDEX IF NOT EXISTS idx_samples_event ON samples (event_id);
+CREATE INDEX IF NOT EXISTS idx_samples_score ON samples (fall_score);
+"""
+
+# 可用于过滤的列及其比较方式
+_FILTERS = {
+    'status': 'status = ?',
+    'label': 'label = ?',
+    'stream_id': 'stream_id = ?',
+    'track_id': 'track_id = ?',
+    'event_id': 'event_id = ?',
+    'frame_kind': 'frame_kind = ?',
+    'min_score': 'fall_score >= ?',
+    'max_score': 'fall_score <= ?',
+    'min_angle': 'body_angle >= ?',
+    'max_angle': 'body_angle <= ?',
+    'since': 'captured_at >= ?',
+    'until': 'captured_at < ?',
+    'updated_until': 'updated_at <= ?',
+}
+
+def _primary_details(details) -> Tuple[Optional[int], Dict]:
+    """
+    从跌倒详情中取出主要目标的详情
+
+    逐帧保存时详情为 [{'id': 目标ID, 'details': {...}}, ...]，取分数最高的目标；
+    事件采集时详情即为单个目标的详情字典。
+
+    Returns:
+        (目标ID或None, 详情字典)
+    """
+    if isinstance(details, dict):
+        return None, details
+    if isinstance(details, (list, tuple)):
+        best_id, best, best_score = None, {}, float('-inf')
+        for entry in details:
+            if not isinstance(entry, dict):
+                continue
+            entry_details = entry.get('details') or {}
+            score = entry_details.get('combined_score', entry_details.get('total_score', 0.0))
+            if score is not None and score > best_score:
+                best_id, best, best_score = entry.get('id'), entry_details, score
+        return best_id, best
+    return None, {}
+
+def parse_label_file(path: str) -> Tuple[Optional[float], object, Optional[Dict]]:
+    """
+    解析跌倒图片的标注信息(.txt)文件
+
+    Returns:
+        (时间戳, 详情, 元数据)，无法解析的字段为None
+    """
+    captured_at, details, metadata = None, None, None
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                key, _, value = line.partition(': ')
+                value = value.rstrip('\n')
+                if key == 'Timestamp':
+                    captured_at = datetime.fromisoformat(value).timestamp()
+                elif key == 'Details':
+                    try:
+                        details = ast.literal_eval(value)
+                    except (ValueError, SyntaxError):
+                        details = value
+                elif key == 'Metadata':
+                    metadata = json.loads(value)
+    except (OSError, ValueError) as e:
+        logger.warning(f"解析标注信息文件失败 {path}: {str(e)}")
+    return captured_at, details, metadata
+
+class FallDatasetIndex:
+    """跌倒训练数据集的SQLite索引
+
+    记录每张采集图片的状态（未标注/已标注）与结构化检测信息（分数、角度、跟踪ID、流ID、时间），
+    支持按条件分页查询、批量标注以及与目录内容的增量同步，
+    列表查询走索引，不再遍历目录。
+    """
+
+    def __init__(self, root_dir: str, db_path: Optional[str] = None):
+        """
+        初始化数据集索引
+
+        Args:
+            root_dir: 数据集根目录（包含unlabeled与labeled子目录）
+            db_path: SQLite数据库路径，默认为 root_dir/index.sqlite3
+        """
+        self.root_dir = str(root_dir)
+        self.db_path = db_path or os.path.join(self.root_dir, 'index.sqlite3')
+        for status in (STATUS_UNLABELED, STATUS_LABELED):
+            os.makedirs(self.status_dir(status), exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 多进程服务时各worker共用同一个数据库，写锁冲突时最多等待30秒
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+
+    def status_dir(self, status: str) -> str:
+        """指定状态的图片目录"""
+        return os.path.join(self.root_dir, status)
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _build_row(filename, status, details, metadata, captured_at, now) -> Tuple:
+        """由检测详情构造一行索引记录"""
+        metadata = metadata or {}
+        track_id, primary = _primary_details(details)
+        if metadata.get('track_id') is not None:
+            track_id = metadata['track_id']
+
+        fall_score = metadata.get('fall_score')
+        if fall_score is None:
+            fall_score = primary.get('combined_score', primary.get('total_score'))
+
+        return (
+            filename,
+            status,
+            None,
+            captured_at if captured_at is not None else now,
+            metadata.get('stream_id'),
+            track_id,
+            metadata.get('event_id'),
+            metadata.get('frame'),
+            fall_score,
+            primary.get('body_angle'),
+            primary.get('avg_score'),
+            json.dumps(details, ensure_ascii=False, default=str) if details is not None else None,
+            json.dumps(metadata, ensure_ascii=False) if metadata else None,
+            now
+        )
+
+    def add_samples(self, samples: Iterable[Dict], status: str = STATUS_UNLABELED,
+                    replace: bool = True) -> int:
+        """
+        批量添加（或覆盖）样本记录
+
+        Args:
+            samples: 样本字典列表，字段为 filename、details、metadata、captured_at（秒）
+            status: 样本状态
+            replace: 是否覆盖已有记录，False时已存在的文件名保持不变
+
+        Returns:
+            写入的记录数
+        """
+        now = datetime.now().timestamp()
+        rows = [
+            self._build_row(
+                s['filename'], status, s.get('details'), s.get('metadata'), s.get('captured_at'), now
+            )
+            for s in samples
+        ]
+        if not rows:
+            return 0
+
+        conflict = 'REPLACE' if replace else 'IGNORE'
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                f'INSERT OR {conflict} INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+        return len(rows) if replace else cursor.rowcount
+
+    def add_sample(self, filename: str, details=None, metadata: Optional[Dict] = None,
+                   captured_at: Optional[float] = None, status: str = STATUS_UNLABELED):
+        """添加（或覆盖）一条样本记录"""
+        self.add_samples([{
+            'filename': filename,
+            'details': details,
+            'metadata': metadata,
+            'captured_at': captured_at
+        }], status)
+
+    def list_samples(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        with_total: bool = True,
+        include_details: bool = False,
+        after: Optional[Tuple[float, str]] = None,
+        **filters
+    ) -> Dict:
+        """
+        分页查询样本（按采集时间倒序）
+
+        Args:
+            limit: 每页数量
+            offset: 偏移量
+            with_total: 是否统计满足条件的总数
+            include_details: 是否返回完整的详情与元数据
+            after: 键集分页，只返回排在 (captured_at, filename)（上一页最后一个样本）之后的样本；
+                   翻页期间有样本插入或删除时不会重复或遗漏，不统计在total中
+            **filters: 过滤条件，见 _FILTERS
+
+        Returns:
+            {'total': 总数或None, 'samples': 样本列表}
+        """
+        clauses, params = [], []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in _FILTERS:
+                raise ValueError(f'不支持的过滤条件: {name}')
+            clauses.append(_FILTERS[name])
+            params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        page_where, page_params = where, list(params)
+        if after is not None:
+            page_where = f"{where} AND " if where else 'WHERE '
+            page_where += '(captured_at < ? OR (captured_at = ? AND filename > ?))'
+            page_params += [after[0], after[0], after[1]]
+
+        columns = 'filename, status, label, captured_at, stream_id, track_id, event_id, frame_kind, ' \
+                  'fall_score, body_angle, avg_score'
+        if include_details:
+            columns += ', details, metadata'
+
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT {columns} FROM samples {page_where} '
+                f'ORDER BY captured_at DESC, filename LIMIT ? OFFSET ?',
+                page_params + [max(0, int(limit)), max(0, int(offset))]
+            ).fetchall()
+            total = None
+            if with_total:
+                total = self._conn.execute(f'SELECT COUNT(*) FROM samples {where}', params).fetchone()[0]
+
+        samples = []
+        for row in rows:
+            sample = dict(row)
+            if include_details:
+                sample['details'] = json.loads(sample['details']) if sample['details'] else None
+                sample['metadata'] = json.loads(sample['metadata']) if sample['metadata'] else None
+            samples.append(sample)
+
+        return {'total': total, 'samples': samples}
+
+    def get_sample(self, filename: str) -> Optional[Dict]:
+        """获取单个样本的完整记录"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM samples WHERE filename = ?', (filename,)).fetchone()
+        if row is None:
+            return None
+        sample = dict(row)
+        sample['details'] = json.loads(sample['details']) if sample['details'] else None
+        sample['metadata'] = json.loads(sample['metadata']) if sample['metadata'] else None
+        return sample
+
+    def relabel(self, filenames: List[str], status: str = STATUS_LABELED,
+                label: Optional[str] = None) -> Dict:
+        """
+        批量修改样本的标注状态，并把图片及其.txt文件移动到对应目录
+
+        Args:
+            filenames: 图片文件名列表
+            status: 目标状态 ('labeled' / 'unlabeled')
+            label: 标签（如 'fall' / 'not_fall'），None表示不修改
+
+        Returns:
+            {'updated': 成功的文件名列表, 'missing': 不存在的文件名列表}
+        """
+        if status not in (STATUS_UNLABELED, STATUS_LABELED):
+            raise ValueError(f'无效的状态: {status}')
+
+        filenames = [os.path.basename(f) for f in filenames]
+        known = {}
+        with self._lock:
+            # 分块查询，避免超出SQLite的参数个数上限
+            for start in range(0, len(filenames), 500):
+                chunk = filenames[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(
+                    f'SELECT filename, status FROM samples WHERE filename IN ({placeholders})', chunk
+                ):
+                    known[row['filename']] = row['status']
+
+        dest_dir = self.status_dir(status)
+        updated, missing = [], []
+        for filename in filenames:
+            current = known.get(filename)
+            src_status = current or STATUS_UNLABELED
+            src_path = os.path.join(self.status_dir(src_status), filename)
+            if not os.path.exists(src_path):
+                missing.append(filename)
+                continue
+
+            if src_status != status:
+                os.replace(src_path, os.path.join(dest_dir, filename))
+                txt_filename = os.path.splitext(filename)[0] + '.txt'
+                src_txt = os.path.join(self.status_dir(src_status), txt_filename)
+                if os.path.exists(src_txt):
+                    os.replace(src_txt, os.path.join(dest_dir, txt_filename))
+
+            if current is None:
+                # 索引中没有的旧文件：先补录再更新状态
+                captured_at, details, metadata = parse_label_file(
+                    os.path.join(dest_dir, os.path.splitext(filename)[0] + '.txt')
+                )
+                self.add_sample(filename, details, metadata, captured_at, status)
+            updated.append(filename)
+
+        now = datetime.now().timestamp()
+        with self._lock, self._conn:
+            if label is None:
+                self._conn.executemany(
+                    'UPDATE samples SET status = ?, updated_at = ? WHERE filename = ?',
+                    [(status, now, f) for f in updated]
+                )
+            else:
+                self._conn.executemany(
+                    'UPDATE samples SET status = ?, label = ?, updated_at = ? WHERE filename = ?',
+                    [(status, label, now, f) for f in updated]
+                )
+
+        return {'updated': updated, 'missing': missing}
+
+    def sync(self) -> Dict:
+        """
+        与目录内容增量同步
+
+        只解析索引中没有的新图片的.txt文件；目录中已不存在的图片从索引中删除；
+        被手动移动到另一目录的图片更新其状态。
+
+        同步可与归档写入、标注并发执行：先读取索引快照再扫描目录，
+        只删除或变更在扫描开始前就没有再更新过的记录，
+        扫描期间写入或标注的样本保持不变。
+
+        Returns:
+            同步统计 {'added': 新增数, 'removed': 删除数, 'moved': 状态变更数}
+        """
+        scan_started = datetime.now().timestamp()
+        with self._lock:
+            indexed = {
+                row[0]: row[1]
+                for row in self._conn.execute('SELECT filename, status FROM samples')
+            }
+
+        on_disk = {}
+        for status in (STATUS_UNLABELED, STATUS_LABELED):
+            with os.scandir(self.status_dir(status)) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        on_disk[entry.name] = (status, entry.stat().st_mtime)
+
+        # 扫描两个目录之间文件可能被移动，变更前再确认一次文件的当前位置
+        removed = [
+            f for f in indexed
+            if f not in on_disk and self._locate(f) is None
+        ]
+        moved = [
+            (on_disk[f][0], f) for f, status in indexed.items()
+            if f in on_disk and on_disk[f][0] != status and self._locate(f) == on_disk[f][0]
+        ]
+
+        new_samples = {STATUS_UNLABELED: [], STATUS_LABELED: []}
+        for filename, (status, mtime) in on_disk.items():
+            if filename in indexed:
+                continue
+            txt_path = os.path.join(self.status_dir(status), os.path.splitext(filename)[0] + '.txt')
+            captured_at, details, metadata = parse_label_file(txt_path) if os.path.exists(txt_path) \
+                else (None, None, None)
+            new_samples[status].append({
+                'filename': filename,
+                'details': details,
+                'metadata': metadata,
+                'captured_at': captured_at if captured_at is not None else mtime
+            })
+
+        # 扫描期间已由归档写入器录入的样本不覆盖
+        added = 0
+        for status, samples in new_samples.items():
+            added += self.add_samples(samples, status, replace=False)
+
+        now = datetime.now().timestamp()
+        with self._lock, self._conn:
+            removed_count = self._conn.executemany(
+                'DELETE FROM samples WHERE filename = ? AND updated_at < ?',
+                [(f, scan_started) for f in removed]
+            ).rowcount if removed else 0
+            moved_count = self._conn.executemany(
+                'UPDATE samples SET status = ?, updated_at = ? WHERE filename = ? AND updated_at < ?',
+                [(status, now, f, scan_started) for status, f in moved]
+            ).rowcount if moved else 0
+
+        if added or removed_count or moved_count:
+            logger.info(f"数据集索引同步完成: 新增 {added}, 删除 {removed_count}, 状态变更 {moved_count}")
+        return {'added': added, 'removed': removed_count, 'moved': moved_count}
+
+    def _locate(self, filename: str) -> Optional[str]:
+        """图片当前所在目录对应的状态，不存在时返回None"""
+        for status in (STATUS_UNLABELED, STATUS_LABELED):
+            if os.path.exists(os.path.join(self.status_dir(status), filename)):
+                return status
+        return None
+
+    def get_stats(self) -> Dict:
+        """获取各状态的样本数"""
+        with self._lock:
+            counts = {
+                row[0]: row[1]
+                for row in self._conn.execute('SELECT status, COUNT(*) FROM samples GROUP BY status')
+            }
+        return {
+            'db_path': self.db_path,
+            'unlabeled': counts.get(STATUS_UNLABELED, 0),
+            'labeled': counts.get(STATUS_LABELED, 0)
+        }
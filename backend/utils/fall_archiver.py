@@ -0,0 +1,375 @@
+import os
+import json
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def annotation_objects(detections: List[Dict], fall_flags: List[bool],
+                       scale_x: float = 1.0, scale_y: float = 1.0) -> List[Dict]:
+    """
+    画面中所有目标的几何信息（换算到原图坐标系），随跌倒图片一起归档，用于导出训练标签
+
+    未跌倒的目标同样保留，导出时每个人都有标签，不会被当作背景。
+
+    Args:
+        detections: 检测结果（带跟踪ID）
+        fall_flags: 与detections一一对应的是否判定为跌倒
+        scale_x: 检测图像到原图的x方向缩放比例
+        scale_y: 检测图像到原图的y方向缩放比例
+
+    Returns:
+        [{'track_id', 'fall', 'bbox', 'keypoints'}]
+    """
+    scale = np.array([scale_x, scale_y, scale_x, scale_y])
+    keypoint_scale = np.array([scale_x, scale_y, 1.0])
+    return [
+        {
+            'track_id': int(detection['id']),
+            'fall': bool(is_fall),
+            'bbox': (np.asarray(detection['bbox'], dtype=float) * scale).tolist(),
+            'keypoints': (np.asarray(detection['keypoints'], dtype=float) * keypoint_scale).tolist()
+        }
+        for detection, is_fall in zip(detections, fall_flags)
+    ]
+
+class _ArchiveItem:
+    """一条待写入的跌倒图片（或短视频片段）"""
+
+    __slots__ = ('key', 'image', 'basename', 'details', 'metadata', 'frames', 'fps', 'created_at')
+
+    def __init__(self, key, image, basename, details, metadata=None, frames=None, fps=0.0):
+        self.key = key
+        self.image = image
+        self.basename = basename
+        self.details = details
+        self.metadata = metadata
+        self.frames = frames
+        self.fps = fps
+        self.created_at = datetime.now()
+
+class FallImageArchiver:
+    """异步、有界的跌倒图片归档写入器
+
+    请求线程只负责入队；后台线程负责JPEG编码、写文件，并按批次统一fsync。
+    队列满时按策略丢弃；同一个key（如同一路流）尚未写入的图片会被新图片合并替换。
+    """
+
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+
+    def __init__(
+        self,
+        output_dir: str,
+        max_queue_size: int = 32,
+        drop_policy: str = DROP_OLDEST,
+        coalesce: bool = True,
+        fsync_batch: int = 8,
+        jpeg_quality: int = 95,
+        sample_index=None
+    ):
+        """
+        初始化归档写入器
+
+        Args:
+            output_dir: 图片保存目录
+            max_queue_size: 待写入队列的最大长度
+            drop_policy: 队列满时的丢弃策略 ('drop_oldest' 丢弃最旧, 'drop_newest' 丢弃新提交的)
+            coalesce: 是否合并同一key尚未写入的图片（只保留最新一张）
+            fsync_batch: 每批最多写入的图片数，每批结束时统一fsync
+            jpeg_quality: JPEG编码质量
+            sample_index: FallDatasetIndex实例，图片落盘后批量写入索引，可为None
+        """
+        self.output_dir = str(output_dir)
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.drop_policy = drop_policy
+        self.coalesce = coalesce
+        self.fsync_batch = max(1, int(fsync_batch))
+        self.jpeg_quality = jpeg_quality
+        self.sample_index = sample_index
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._pending_by_key: Dict[object, _ArchiveItem] = {}
+        self._stopping = False
+        self._worker = None
+
+        # 统计信息
+        self._submitted = 0
+        self._written = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._errors = 0
+        self._batches = 0
+        self._total_write_time = 0.0
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stopping = False
+        self._worker = threading.Thread(target=self._run, name='fall-archiver', daemon=True)
+        self._worker.start()
+        logger.info(f"跌倒图片归档写入器已启动: {self.output_dir}")
+
+    def stop(self, timeout: float = 10.0):
+        """停止后台写入线程（会先写完队列中剩余的图片）"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+        logger.info("跌倒图片归档写入器已停止")
+
+    def submit(
+        self,
+        image: np.ndarray,
+        basename: str,
+        details,
+        key=None,
+        metadata: Optional[Dict] = None
+    ) -> bool:
+        """
+        提交一张待归档的图片（非阻塞）
+
+        调用方提交后不能再修改image。
+
+        Args:
+            image: BGR图像
+            basename: 不含扩展名的文件名
+            details: 写入同名.txt文件的检测详情
+            key: 合并键（如流ID），None表示不参与合并
+            metadata: 额外写入.txt文件的元数据（以JSON写在 "Metadata:" 行）
+
+        Returns:
+            是否已入队（被丢弃时返回False）
+        """
+        return self._enqueue(_ArchiveItem(key, image, basename, details, metadata))
+
+    def submit_clip(self, frames: List[np.ndarray], basename: str, fps: float = 10.0) -> bool:
+        """
+        提交一段待归档的短视频片段（非阻塞，MJPG编码的.avi，不参与合并）
+
+        Args:
+            frames: 按时间顺序排列的BGR帧，提交后不能再修改
+            basename: 不含扩展名的文件名（可包含相对output_dir的子目录）
+            fps: 片段帧率
+
+        Returns:
+            是否已入队（被丢弃时返回False）
+        """
+        return self._enqueue(_ArchiveItem(None, None, basename, None, frames=list(frames), fps=fps))
+
+    def _enqueue(self, item: _ArchiveItem) -> bool:
+        """按合并与丢弃策略入队"""
+        key = item.key
+        basename = item.basename
+        with self._condition:
+            self._submitted += 1
+
+            if self.coalesce and key is not None:
+                pending = self._pending_by_key.get(key)
+                if pending is not None:
+                    # 用最新图片替换同一key尚未写入的图片
+                    pending.image = item.image
+                    pending.basename = basename
+                    pending.details = item.details
+                    pending.metadata = item.metadata
+                    pending.created_at = item.created_at
+                    self._coalesced += 1
+                    return True
+
+            if len(self._queue) >= self.max_queue_size:
+                if self.drop_policy == self.DROP_NEWEST:
+                    self._dropped += 1
+                    logger.warning(f"归档队列已满，丢弃图片: {basename}")
+                    return False
+                dropped = self._queue.popleft()
+                self._forget(dropped)
+                self._dropped += 1
+                logger.warning(f"归档队列已满，丢弃最旧的图片: {dropped.basename}")
+
+            self._queue.append(item)
+            if self.coalesce and key is not None:
+                self._pending_by_key[key] = item
+            self._condition.notify()
+
+        return True
+
+    def _forget(self, item: _ArchiveItem):
+        """从合并索引中移除（调用方需持有锁）"""
+        if item.key is not None and self._pending_by_key.get(item.key) is item:
+            del self._pending_by_key[item.key]
+
+    def _take_batch(self):
+        """取出一批待写入的图片，队列为空时阻塞"""
+        with self._condition:
+            while not self._queue and not self._stopping:
+                self._condition.wait()
+
+            batch = []
+            while self._queue and len(batch) < self.fsync_batch:
+                item = self._queue.popleft()
+                self._forget(item)
+                batch.append(item)
+            return batch
+
+    def _run(self):
+        """后台写入主循环"""
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """写入一批图片，全部写完后统一fsync"""
+        start = time.perf_counter()
+        opened_files = []
+        indexed_samples = []
+        written = 0
+        errors = 0
+
+        for item in batch:
+            try:
+                is_image = item.frames is None
+                opened_files.extend(self._write_item(item))
+                written += 1
+                if is_image:
+                    indexed_samples.append({
+                        'filename': f"{item.basename}.jpg",
+                        'details': item.details,
+                        'metadata': item.metadata,
+                        'captured_at': item.created_at.timestamp()
+                    })
+            except Exception as e:
+                errors += 1
+                logger.error(f"保存跌倒图片失败 {item.basename}: {str(e)}")
+
+        for f in opened_files:
+            try:
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError as e:
+                logger.error(f"fsync失败 {f.name}: {str(e)}")
+            finally:
+                f.close()
+        self._fsync_directory()
+
+        # 文件落盘后再写入索引，保证索引中的样本都能找到对应文件
+        if self.sample_index is not None and indexed_samples:
+            try:
+                self.sample_index.add_samples(indexed_samples)
+            except Exception as e:
+                errors += 1
+                logger.error(f"写入数据集索引失败: {str(e)}")
+
+        with self._condition:
+            self._written += written
+            self._errors += errors
+            self._batches += 1
+            self._total_write_time += time.perf_counter() - start
+
+    def _write_item(self, item: _ArchiveItem):
+        """写入图片与标注信息文件，返回尚未fsync的文件对象"""
+        if item.frames is not None:
+            return self._write_clip(item)
+
+        success, buffer = cv2.imencode('.jpg', item.image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not success:
+            raise ValueError('图像编码失败')
+
+        filepath = os.path.join(self.output_dir, f"{item.basename}.jpg")
+        label_filepath = os.path.join(self.output_dir, f"{item.basename}.txt")
+
+        image_file = open(filepath, 'wb')
+        try:
+            image_file.write(buffer.tobytes())
+            label_file = open(label_filepath, 'w')
+        except Exception:
+            image_file.close()
+            raise
+
+        try:
+            label_file.write(f"Timestamp: {item.created_at.isoformat()}\n")
+            label_file.write(f"Details: {str(item.details)}\n")
+            if item.metadata is not None:
+                label_file.write(f"Metadata: {json.dumps(item.metadata, ensure_ascii=False)}\n")
+        except Exception:
+            image_file.close()
+            label_file.close()
+            raise
+
+        item.image = None
+        logger.info(f"已保存跌倒图片: {filepath}")
+        return [image_file, label_file]
+
+    def _write_clip(self, item: _ArchiveItem):
+        """写入短视频片段，返回尚未fsync的文件对象"""
+        frames, item.frames = item.frames, None
+        if not frames:
+            return []
+
+        filepath = os.path.join(self.output_dir, f"{item.basename}.avi")
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        height, width = frames[0].shape[:2]
+        writer = cv2.VideoWriter(
+            filepath, cv2.VideoWriter_fourcc(*'MJPG'), max(float(item.fps), 1.0), (width, height)
+        )
+        if not writer.isOpened():
+            raise ValueError('无法创建视频文件')
+        try:
+            for frame in frames:
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                writer.write(frame)
+        finally:
+            writer.release()
+
+        logger.info(f"已保存跌倒片段: {filepath}")
+        return [open(filepath, 'rb')]
+
+    def _fsync_directory(self):
+        """fsync目录，保证新文件的目录项落盘（不支持的平台忽略）"""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        try:
+            fd = os.open(self.output_dir, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def get_stats(self) -> Dict:
+        """获取归档统计信息"""
+        with self._condition:
+            return {
+                'running': self._worker is not None and self._worker.is_alive(),
+                'queue_depth': len(self._queue),
+                'max_queue_size': self.max_queue_size,
+                'drop_policy': self.drop_policy,
+                'submitted': self._submitted,
+                'written': self._written,
+                'dropped': self._dropped,
+                'coalesced': self._coalesced,
+                'errors': self._errors,
+                'batches': self._batches,
+                'avg_batch_write_ms': (
+                    self._total_write_time / self._batches * 1000 if self._batches else 0.0
+                )
+            }
@@ -0,0 +1,363 @@
+import threading
+import time
+import logging
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.image_processor import ImageProcessor
+from utils.fall_archiver import annotation_objects
+
+logger = logging.getLogger(__name__)
+
+class FallEvent:
+    """一次跌倒事件：同一路流中同一跟踪目标连续的跌倒帧"""
+
+    def __init__(self, stream_id: str, track_id: int, timestamp: float):
+        self.event_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.stream_id = stream_id
+        self.track_id = track_id
+        self.started_at = timestamp
+        self.last_fall_at = timestamp
+        self.frame_count = 0
+        self.saved_frames = 0
+
+        # 峰值帧：只保留引用，事件结束时再决定是否归档
+        self.peak_score = -1.0
+        self.peak_frame = None
+        self.peak_detection = None
+        self.peak_objects = None
+        self.peak_details = None
+        self.peak_at = timestamp
+        self.onset_score = None
+
+        self.clip_frames: List[np.ndarray] = []
+
+    def get_info(self) -> Dict:
+        """获取事件信息"""
+        return {
+            'event_id': self.event_id,
+            'stream_id': self.stream_id,
+            'track_id': self.track_id,
+            'started_at': self.started_at,
+            'duration': self.last_fall_at - self.started_at,
+            'frame_count': self.frame_count,
+            'onset_score': self.onset_score,
+            'peak_score': self.peak_score,
+            'saved_frames': self.saved_frames
+        }
+
+class _StreamCaptureState:
+    """单路流的事件采集状态"""
+
+    def __init__(self, pre_roll: int, hash_history: int):
+        self.events: Dict[int, FallEvent] = {}
+        self.recent_frames = deque(maxlen=max(1, pre_roll))
+        self.recent_hashes = deque(maxlen=max(1, hash_history))
+        self.last_seen = time.time()
+
+class FallEventCapture:
+    """事件级跌倒图片采集
+
+    连续的跌倒帧按 (流ID, 跟踪ID) 归并为一次事件，每个事件只归档关键帧：
+    起始帧（onset）与分数最高的峰值帧（peak），可选附带一段短视频片段；
+    待归档的关键帧与该路流最近归档过的画面做感知哈希比对，相近的直接跳过。
+
+    流停止送帧后事件由后台线程按时结束（见 start），不依赖该路流的下一帧。
+    """
+
+    def __init__(
+        self,
+        archiver,
+        end_gap_seconds: float = 1.5,
+        max_event_seconds: float = 30.0,
+        hash_threshold: int = 6,
+        hash_history: int = 32,
+        clip_frames: int = 0,
+        clip_fps: float = 10.0,
+        stream_ttl_seconds: float = 300.0
+    ):
+        """
+        初始化事件采集器
+
+        Args:
+            archiver: FallImageArchiver实例，关键帧与片段都交给它异步写盘
+            end_gap_seconds: 目标连续多久未再判定为跌倒时结束事件
+            max_event_seconds: 单个事件的最长持续时间，超过后强制结束
+            hash_threshold: 感知哈希汉明距离不超过该值时视为重复画面
+            hash_history: 每路流保留的最近归档画面哈希数
+            clip_frames: 事件片段的最大帧数（含事件前的预录帧），0表示不保存片段
+            clip_fps: 片段帧率
+            stream_ttl_seconds: 流空闲超过该时间后释放其采集状态
+        """
+        self.archiver = archiver
+        self.end_gap_seconds = end_gap_seconds
+        self.max_event_seconds = max_event_seconds
+        self.hash_threshold = hash_threshold
+        self.hash_history = hash_history
+        self.clip_frames = max(0, int(clip_frames))
+        self.clip_fps = clip_fps
+        self.stream_ttl_seconds = stream_ttl_seconds
+
+        self._lock = threading.Lock()
+        self._streams: Dict[str, _StreamCaptureState] = {}
+        self._stop_event = threading.Event()
+        self._worker = None
+
+        # 统计信息
+        self._fall_frames = 0
+        self._events_started = 0
+        self._events_closed = 0
+        self._saved_frames = 0
+        self._duplicate_frames = 0
+        self._saved_clips = 0
+
+    def start(self):
+        """启动后台线程，定时结束超时未再跌倒的事件并释放空闲流的采集状态"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name='fall-events', daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程"""
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def _run(self):
+        """后台主循环：检查间隔取事件结束间隔的一半，结束时间最多延后半个间隔"""
+        interval = min(max(self.end_gap_seconds / 2, 0.05), 1.0)
+        while not self._stop_event.wait(interval):
+            try:
+                self.close_expired()
+            except Exception as e:
+                logger.error(f"结束超时跌倒事件失败: {str(e)}")
+
+    def close_expired(self, now: Optional[float] = None) -> int:
+        """
+        结束超时未再跌倒或超过最长持续时间的事件，并释放空闲流的采集状态
+
+        Args:
+            now: 当前时间（秒，与 process 的帧时间戳同一时钟），None表示当前时间
+
+        Returns:
+            结束的事件数
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            closed = self._events_closed
+            for state in self._streams.values():
+                self._close_expired_locked(state, now)
+            self._evict_idle_locked(now)
+            return self._events_closed - closed
+
+    def process(
+        self,
+        stream_id: str,
+        frame: np.ndarray,
+        detections: List[Dict],
+        scores: List,
+        timestamp: Optional[float] = None
+    ) -> Dict[int, str]:
+        """
+        处理一帧检测结果（每一帧都应调用，以便及时结束事件）
+
+        调用方之后不能再修改frame（关键帧只保存引用），可用 retains_frames() 判断是否仍被引用。
+
+        Args:
+            stream_id: 流ID
+            frame: 原始BGR帧
+            detections: 带跟踪ID的检测结果
+            scores: 与detections一一对应的 (is_fall, fall_score, details)
+            timestamp: 帧时间戳（秒），None表示当前时间
+
+        Returns:
+            {跟踪ID: 事件ID}，当前帧中处于跌倒事件中的目标
+        """
+        now = time.time() if timestamp is None else timestamp
+        active = {}
+
+        with self._lock:
+            state = self._streams.get(stream_id)
+            if state is None:
+                state = _StreamCaptureState(self.clip_frames, self.hash_history)
+                self._streams[stream_id] = state
+            state.last_seen = now
+
+            # 关键帧随画面中所有目标的几何信息一起归档（导出训练标签时每个人都要标注）
+            fall_flags = [is_fall for is_fall, _, _ in scores]
+            objects = annotation_objects(detections, fall_flags) if any(fall_flags) else []
+
+            for detection, (is_fall, fall_score, details) in zip(detections, scores):
+                if not is_fall:
+                    continue
+                self._fall_frames += 1
+                track_id = int(detection['id'])
+
+                event = state.events.get(track_id)
+                if event is not None and now - event.started_at > self.max_event_seconds:
+                    self._close_event(state, event)
+                    event = None
+
+                if event is None:
+                    event = FallEvent(stream_id, track_id, now)
+                    event.onset_score = float(fall_score)
+                    if self.clip_frames:
+                        event.clip_frames.extend(state.recent_frames)
+                    state.events[track_id] = event
+                    self._events_started += 1
+                    logger.info(f"跌倒事件开始: {event.event_id}, 流ID: {stream_id}, 目标: {track_id}")
+                    if self._save_key_frame(
+                        state, event, 'onset', frame, detection, objects, fall_score, details, now
+                    ):
+                        # 之后只有分数超过起始帧的画面才作为峰值帧归档
+                        event.peak_score = float(fall_score)
+                elif fall_score > event.peak_score:
+                    event.peak_score = float(fall_score)
+                    event.peak_frame = frame
+                    event.peak_detection = detection
+                    event.peak_objects = objects
+                    event.peak_details = details
+                    event.peak_at = now
+
+                event.last_fall_at = now
+                event.frame_count += 1
+                active[track_id] = event.event_id
+
+            # 结束超时未再跌倒的事件
+            self._close_expired_locked(state, now, active)
+
+            if self.clip_frames:
+                state.recent_frames.append(frame)
+                for event in state.events.values():
+                    if len(event.clip_frames) < self.clip_frames:
+                        event.clip_frames.append(frame)
+
+            self._evict_idle_locked(now)
+
+        return active
+
+    def _save_key_frame(self, state, event, kind, frame, detection, objects, fall_score, details, timestamp):
+        """归档一个关键帧，与最近归档的画面重复时跳过并返回False（调用方需持有锁）"""
+        frame_hash = ImageProcessor.perceptual_hash(frame)
+        for recent in state.recent_hashes:
+            if ImageProcessor.hash_distance(frame_hash, recent) <= self.hash_threshold:
+                self._duplicate_frames += 1
+                logger.debug(f"跌倒事件 {event.event_id} 的{kind}帧与最近归档的画面重复，已跳过")
+                return False
+        state.recent_hashes.append(frame_hash)
+
+        metadata = {
+            'event_id': event.event_id,
+            'stream_id': event.stream_id,
+            'track_id': event.track_id,
+            'frame': kind,
+            'frame_time': timestamp,
+            'fall_score': float(fall_score),
+            'bbox': [float(v) for v in detection['bbox']],
+            'keypoints': np.asarray(detection['keypoints'], dtype=float).tolist(),
+            'image_size': [int(frame.shape[1]), int(frame.shape[0])],
+            'objects': objects,
+            'phash': f"{frame_hash:016x}"
+        }
+        basename = f"fall_{event.event_id}_{kind}"
+        if self.archiver.submit(frame, basename, details, metadata=metadata):
+            event.saved_frames += 1
+            self._saved_frames += 1
+        return True
+
+    def _close_event(self, state, event):
+        """结束事件：归档峰值帧与片段（调用方需持有锁）"""
+        state.events.pop(event.track_id, None)
+        self._events_closed += 1
+
+        if event.peak_frame is not None:
+            self._save_key_frame(
+                state, event, 'peak', event.peak_frame, event.peak_detection, event.peak_objects,
+                event.peak_score, event.peak_details, event.peak_at
+            )
+            event.peak_frame = None
+            event.peak_objects = None
+
+        if event.clip_frames:
+            if self.archiver.submit_clip(event.clip_frames, f"clips/fall_{event.event_id}", self.clip_fps):
+                self._saved_clips += 1
+            event.clip_frames = []
+
+        logger.info(
+            f"跌倒事件结束: {event.event_id}, 持续 {event.last_fall_at - event.started_at:.2f} 秒, "
+            f"跌倒帧 {event.frame_count}, 归档关键帧 {event.saved_frames}"
+        )
+
+    def _close_expired_locked(self, state, now: float, active=()):
+        """结束该路流中超时未再跌倒或超过最长持续时间的事件，跳过当前帧仍在跌倒的目标（调用方需持有锁）"""
+        for event in list(state.events.values()):
+            if event.track_id in active:
+                continue
+            if now - event.last_fall_at > self.end_gap_seconds or now - event.started_at > self.max_event_seconds:
+                self._close_event(state, event)
+
+    def _evict_idle_locked(self, now: float):
+        """释放空闲流的采集状态（调用方需持有锁）"""
+        expired = [
+            stream_id for stream_id, state in self._streams.items()
+            if now - state.last_seen > self.stream_ttl_seconds
+        ]
+        for stream_id in expired:
+            state = self._streams.pop(stream_id)
+            for event in list(state.events.values()):
+                self._close_event(state, event)
+
+    def flush(self, stream_id: Optional[str] = None):
+        """
+        立即结束进行中的事件
+
+        Args:
+            stream_id: 流ID，None表示所有流
+        """
+        with self._lock:
+            if stream_id is None:
+                states = list(self._streams.values())
+            else:
+                state = self._streams.get(str(stream_id))
+                states = [state] if state is not None else []
+            for state in states:
+                for event in list(state.events.values()):
+                    self._close_event(state, event)
+
+    def retains_frames(self, stream_id: str) -> bool:
+        """该路流处理过的帧是否可能仍被引用（片段预录缓冲或进行中事件的关键帧）"""
+        if self.clip_frames:
+            return True
+        with self._lock:
+            state = self._streams.get(stream_id)
+            return state is not None and bool(state.events)
+
+    def list_events(self) -> List[Dict]:
+        """列出进行中的事件"""
+        with self._lock:
+            return [
+                event.get_info()
+                for state in self._streams.values()
+                for event in state.events.values()
+            ]
+
+    def get_stats(self) -> Dict:
+        """获取采集统计信息"""
+        with self._lock:
+            return {
+                'active_streams': len(self._streams),
+                'open_events': sum(len(state.events) for state in self._streams.values()),
+                'fall_frames': self._fall_frames,
+                'events_started': self._events_started,
+                'events_closed': self._events_closed,
+                'saved_frames': self._saved_frames,
+                'duplicate_frames': self._duplicate_frames,
+                'saved_clips': self._saved_clips
+            }
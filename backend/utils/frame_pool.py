@@ -0,0 +1,96 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+class FrameBufferPool:
+    """结果帧输出缓冲池
+
+    绘制结果时若原始帧仍被其他组件引用（异步归档队列、跌倒事件的关键帧与片段缓冲），
+    不能在原始帧上直接绘制，此时从池中取出一块同尺寸的输出缓冲，复制帧后在缓冲上绘制。
+    缓冲按尺寸复用，编码完成后归还，避免每帧重新分配一块整帧大小的内存；
+    未归还的缓冲（如请求异常）由垃圾回收释放，不会被重复借出。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_free_per_shape: int = 8):
+        """
+        初始化缓冲池
+
+        Args:
+            max_bytes: 池中空闲缓冲的总字节上限，超过后释放最久未使用尺寸的缓冲
+            max_free_per_shape: 每种尺寸最多保留的空闲缓冲数
+        """
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_free_per_shape = max(1, int(max_free_per_shape))
+
+        self._lock = threading.Lock()
+        # (shape, dtype) -> [空闲缓冲, ...]，按最近使用排序
+        self._free = OrderedDict()
+        # id(缓冲) -> 缓冲，借出中的缓冲（弱引用，未归还的缓冲可被正常回收）
+        self._leased = weakref.WeakValueDictionary()
+        self._free_bytes = 0
+        self._allocated = 0
+        self._reused = 0
+
+    def acquire(self, like: np.ndarray) -> np.ndarray:
+        """借出一块与like尺寸、类型相同的缓冲（内容未初始化）"""
+        key = (like.shape, like.dtype.str)
+        with self._lock:
+            buffers = self._free.get(key)
+            if buffers:
+                buffer = buffers.pop()
+                self._free.move_to_end(key)
+                self._free_bytes -= buffer.nbytes
+                self._reused += 1
+            else:
+                buffer = np.empty_like(like)
+                self._allocated += 1
+            self._leased[id(buffer)] = buffer
+        return buffer
+
+    def copy(self, image: np.ndarray) -> np.ndarray:
+        """借出一块缓冲并复制image的内容"""
+        buffer = self.acquire(image)
+        np.copyto(buffer, image)
+        return buffer
+
+    def release(self, buffer: Optional[np.ndarray]) -> bool:
+        """
+        归还缓冲；不是从池中借出的数组直接忽略
+
+        Returns:
+            是否归还了缓冲
+        """
+        if buffer is None:
+            return False
+        with self._lock:
+            if self._leased.pop(id(buffer), None) is None:
+                return False
+            key = (buffer.shape, buffer.dtype.str)
+            buffers = self._free.setdefault(key, [])
+            self._free.move_to_end(key)
+            if len(buffers) >= self.max_free_per_shape:
+                return True
+            buffers.append(buffer)
+            self._free_bytes += buffer.nbytes
+            while self._free_bytes > self.max_bytes and self._free:
+                oldest_key, oldest = next(iter(self._free.items()))
+                if oldest:
+                    self._free_bytes -= oldest.pop().nbytes
+                if not oldest:
+                    del self._free[oldest_key]
+        return True
+
+    def get_stats(self) -> Dict:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                'leased': len(self._leased),
+                'free_buffers': sum(len(buffers) for buffers in self._free.values()),
+                'free_mb': self._free_bytes / (1024 * 1024),
+                'max_mb': self.max_bytes / (1024 * 1024),
+                'allocated': self._allocated,
+                'reused': self._reused
+            }
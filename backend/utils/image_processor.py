@@ -4,6 +4,8 @@ import numpy as np
 from typing import Tuple, Optional
 import logging
 
+from utils.overlay import get_text_sprite, blend_sprite
+
 logger = logging.getLogger(__name__)
 
 class ImageProcessor:
@@ -27,6 +29,25 @@ class ImageProcessor:
             
             # 解码base64
             image_bytes = base64.b64decode(base64_string)
+            
+            return ImageProcessor.bytes_to_image(image_bytes)
+            
+        except Exception as e:
+            logger.error(f"Base64转图像失败: {str(e)}")
+            return None
+    
+    @staticmethod
+    def bytes_to_image(image_bytes: bytes) -> Optional[np.ndarray]:
+        """
+        二进制图像数据（JPEG/PNG）转换为图像
+        
+        Args:
+            image_bytes: 编码后的图像字节
+            
+        Returns:
+            numpy图像数组，失败返回None
+        """
+        try:
             nparr = np.frombuffer(image_bytes, np.uint8)
             
             # 解码图像
@@ -40,7 +61,7 @@ class ImageProcessor:
             return image
             
         except Exception as e:
-            logger.error(f"Base64转图像失败: {str(e)}")
+            logger.error(f"二进制数据转图像失败: {str(e)}")
             return None
     
     @staticmethod
@@ -61,17 +82,9 @@ class ImageProcessor:
             Base64编码的图像字符串，失败返回None
         """
         try:
-            # 编码参数
-            if format == '.jpg':
-                encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
-            else:
-                encode_params = [cv2.IMWRITE_PNG_COMPRESSION, 9]
-            
-            # 编码图像
-            success, buffer = cv2.imencode(format, image, encode_params)
+            buffer = ImageProcessor.image_to_bytes(image, format, quality)
             
-            if not success:
-                logger.error("图像编码失败")
+            if buffer is None:
                 return None
             
             # 转换为base64
@@ -88,6 +101,43 @@ class ImageProcessor:
             logger.error(f"图像转Base64失败: {str(e)}")
             return None
     
+    @staticmethod
+    def image_to_bytes(
+        image: np.ndarray, 
+        format: str = '.jpg',
+        quality: int = 85
+    ) -> Optional[bytes]:
+        """
+        图像编码为二进制数据（JPEG/PNG）
+        
+        Args:
+            image: numpy图像数组
+            format: 图像格式 ('.jpg' 或 '.png')
+            quality: JPEG质量 (1-100)
+            
+        Returns:
+            编码后的图像字节，失败返回None
+        """
+        try:
+            # 编码参数
+            if format == '.jpg':
+                encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+            else:
+                encode_params = [cv2.IMWRITE_PNG_COMPRESSION, 9]
+            
+            # 编码图像
+            success, buffer = cv2.imencode(format, image, encode_params)
+            
+            if not success:
+                logger.error("图像编码失败")
+                return None
+            
+            return buffer.tobytes()
+            
+        except Exception as e:
+            logger.error(f"图像编码失败: {str(e)}")
+            return None
+    
     @staticmethod
     def resize_image(
         image: np.ndarray, 
@@ -142,11 +192,41 @@ class ImageProcessor:
         
         return True
     
+    @staticmethod
+    def perceptual_hash(image: np.ndarray, hash_size: int = 8) -> int:
+        """
+        计算图像的感知哈希(pHash)
+        
+        缩放为灰度小图后做DCT，取左上角低频系数与其中位数比较得到二值指纹，
+        相似的画面（轻微位移、压缩噪声）哈希值的汉明距离很小。
+        
+        Args:
+            image: 输入图像
+            hash_size: 哈希边长，结果为 hash_size * hash_size 位整数
+            
+        Returns:
+            感知哈希值
+        """
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        size = hash_size * 4
+        small = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+        low_freq = cv2.dct(np.float32(small))[:hash_size, :hash_size]
+        
+        bits = (low_freq > np.median(low_freq)).ravel()
+        return int(np.packbits(bits).tobytes().hex(), 16)
+    
+    @staticmethod
+    def hash_distance(hash_a: int, hash_b: int) -> int:
+        """两个感知哈希之间的汉明距离"""
+        return bin(hash_a ^ hash_b).count('1')
+    
     @staticmethod
     def add_watermark(
         image: np.ndarray, 
         text: str = "Fall Detection System",
-        position: str = "bottom_right"
+        position: str = "bottom_right",
+        in_place: bool = False
     ) -> np.ndarray:
         """
         添加水印
@@ -155,22 +235,19 @@ class ImageProcessor:
             image: 输入图像
             text: 水印文本
             position: 位置 ('bottom_right', 'bottom_left', 'top_right', 'top_left')
+            in_place: 是否直接在输入图像上绘制（不复制）
             
         Returns:
             添加水印后的图像
         """
-        result = image.copy()
+        result = image if in_place else image.copy()
         height, width = result.shape[:2]
         
-        # 字体设置
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.5
-        thickness = 1
-        color = (255, 255, 255)
-        bg_color = (0, 0, 0)
-        
-        # 获取文本尺寸
-        (text_width, text_height), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+        # 水印贴图（黑底白字）按文本缓存，只混合到水印覆盖的区域
+        sprite = get_text_sprite(
+            text, 0.5, 1, (255, 255, 255), (0, 0, 0), (5, 5, 5, 5), cv2.LINE_AA
+        )
+        text_width, text_height = sprite.text_size
         
         # 计算位置
         padding = 10
@@ -187,16 +264,6 @@ class ImageProcessor:
             x = padding
             y = text_height + padding
         
-        # 绘制背景
-        cv2.rectangle(
-            result,
-            (x - 5, y - text_height - 5),
-            (x + text_width + 5, y + 5),
-            bg_color,
-            -1
-        )
-        
-        # 绘制文本
-        cv2.putText(result, text, (x, y), font, font_scale, color, thickness, cv2.LINE_AA)
+        blend_sprite(result, sprite, x, y)
         
         return result
\ No newline at end of file
@@ -0,0 +1,197 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# 处理阶段耗时直方图的桶上界（秒）
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 采集函数返回的指标族：(名称, 类型, 说明, [(标签字典, 值), ...])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict, float]]]
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+def _format_value(value) -> str:
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Counter:
+    """单调递增计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+class Histogram:
+    """累积分布直方图（Prometheus语义：桶计数按上界累积，另含总和与总数）"""
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值 -> [各桶（非累积）计数..., 超出最大上界的计数, 总和]
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：退出时记录耗时（秒），异常退出同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+        lines = []
+        for key, counts in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, 'le': _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """进程内指标注册表，按Prometheus文本格式导出
+
+    热路径上的指标（阶段耗时、丢帧计数）在发生时直接记录，每次只占用一把短锁；
+    队列深度等状态由采集函数在导出时从各组件的get_stats()读取，不给热路径增加开销。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """注册导出时调用的采集函数，返回 (名称, 类型, 说明, [(标签字典, 值), ...]) 序列"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """导出为Prometheus文本格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+
+        families = {}
+        for collector in collectors:
+            for name, metric_type, documentation, samples in collector():
+                family = families.setdefault(name, (metric_type, documentation, []))
+                family[2].extend(samples)
+        for name, (metric_type, documentation, samples) in families.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(
+                f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples
+            )
+        return '\n'.join(lines) + '\n'
+
+# 全局注册表与热路径指标
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.histogram(
+    'fall_stage_latency_seconds',
+    '检测各阶段耗时（秒）：decode/resize/detect/score/draw/encode/save/serialize',
+    ['stage']
+)
+DROPPED_FRAMES = registry.counter(
+    'fall_dropped_frames_total',
+    '处理跟不上而被丢弃的帧数',
+    ['source']
+)
+
+@contextmanager
+def timed(stage: str):
+    """记录一个处理阶段的耗时；registry.enabled为False时不计时"""
+    if not registry.enabled:
+        yield
+        return
+    with STAGE_LATENCY.time(stage=stage):
+        yield
+
+def count_dropped(source: str, count: int = 1):
+    """记录丢弃的帧"""
+    if registry.enabled:
+        DROPPED_FRAMES.inc(count, source=source)
@@ -0,0 +1,139 @@
+from functools import lru_cache
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+# 缓存的文字贴图数量上限（检测标签随跌倒分数变化，约两百种）
+SPRITE_CACHE_SIZE = 1024
+
+class TextSprite:
+    """预渲染的文字贴图（文字及其背景框）
+
+    颜色层按透明度预乘，贴到帧上时只处理贴图覆盖的区域，开销与帧尺寸无关。
+    """
+
+    __slots__ = ('premultiplied', 'inverse_alpha', 'color', 'opaque', 'offset', 'text_size')
+
+    def __init__(self, color: np.ndarray, alpha: np.ndarray, offset: Tuple[int, int], text_size: Tuple[int, int]):
+        """
+        Args:
+            color: 贴图颜色层 (h, w, 3)
+            alpha: 贴图透明度 (h, w)，0~255
+            offset: 贴图左上角相对文字原点（左下角基线位置）的偏移 (dx, dy)
+            text_size: cv2.getTextSize 得到的文字宽高
+        """
+        alpha = alpha[:, :, None].astype(np.uint16)
+        self.opaque = bool((alpha == 255).all())
+        self.color = color
+        self.premultiplied = color.astype(np.uint16) * alpha
+        self.inverse_alpha = 255 - alpha
+        self.offset = offset
+        self.text_size = text_size
+        for array in (self.color, self.premultiplied, self.inverse_alpha):
+            array.flags.writeable = False
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.color.shape[:2]
+
+@lru_cache(maxsize=SPRITE_CACHE_SIZE)
+def get_text_sprite(
+    text: str,
+    font_scale: float,
+    thickness: int,
+    text_color: Tuple[int, int, int],
+    bg_color: Tuple[int, int, int],
+    bg_padding: Tuple[int, int, int, int] = (0, 0, 0, 0),
+    line_type: int = cv2.LINE_8,
+    font: int = cv2.FONT_HERSHEY_SIMPLEX
+) -> TextSprite:
+    """
+    获取（首次调用时渲染）文字贴图
+
+    与直接调用 cv2.rectangle + cv2.putText 的绘制结果一致：背景框为
+    (x - 左, y - 文字高 - 上) 到 (x + 文字宽 + 右, y + 下)，(x, y) 为文字原点。
+
+    Args:
+        text: 文字
+        font_scale: 字体缩放
+        thickness: 文字线宽
+        text_color: 文字颜色(BGR)
+        bg_color: 背景框颜色(BGR)
+        bg_padding: 背景框相对文字的外扩 (左, 上, 右, 下)
+        line_type: 文字线型，cv2.LINE_AA 时边缘半透明
+        font: 字体
+
+    Returns:
+        文字贴图
+    """
+    (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
+    left, top, right, bottom = bg_padding
+
+    # 在足够大的画布上渲染，再裁剪到实际覆盖的区域
+    margin = text_height + thickness + 2
+    origin_x = left + margin
+    origin_y = text_height + top + margin
+    canvas_width = origin_x + text_width + right + margin
+    canvas_height = origin_y + bottom + margin
+
+    bg_mask = np.zeros((canvas_height, canvas_width), np.uint8)
+    cv2.rectangle(
+        bg_mask,
+        (origin_x - left, origin_y - text_height - top),
+        (origin_x + text_width + right, origin_y + bottom),
+        255,
+        -1
+    )
+    coverage = np.zeros((canvas_height, canvas_width), np.uint8)
+    cv2.putText(coverage, text, (origin_x, origin_y), font, font_scale, 255, thickness, line_type)
+
+    # 文字按覆盖率叠加在背景框上；背景框外只有文字本身
+    text_alpha = coverage[:, :, None].astype(np.float32) / 255.0
+    inside = bg_mask[:, :, None] > 0
+    background = np.where(inside, np.array(bg_color, np.float32), np.array(text_color, np.float32))
+    color = text_alpha * np.array(text_color, np.float32) + (1.0 - text_alpha) * background
+    alpha = np.maximum(bg_mask, coverage)
+
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    return TextSprite(
+        np.ascontiguousarray(np.rint(color[y0:y1, x0:x1]).astype(np.uint8)),
+        np.ascontiguousarray(alpha[y0:y1, x0:x1]),
+        (int(x0 - origin_x), int(y0 - origin_y)),
+        (text_width, text_height)
+    )
+
+def blend_sprite(image: np.ndarray, sprite: TextSprite, x: int, y: int) -> np.ndarray:
+    """
+    把贴图混合到图像上（原地修改），超出图像边界的部分被裁剪
+
+    Args:
+        image: BGR图像
+        sprite: 文字贴图
+        x, y: 文字原点在图像中的位置
+
+    Returns:
+        image
+    """
+    height, width = image.shape[:2]
+    sprite_height, sprite_width = sprite.shape
+    left, top = x + sprite.offset[0], y + sprite.offset[1]
+    x0, y0 = max(left, 0), max(top, 0)
+    x1, y1 = min(left + sprite_width, width), min(top + sprite_height, height)
+    if x0 >= x1 or y0 >= y1:
+        return image
+
+    roi = image[y0:y1, x0:x1]
+    crop = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+    if sprite.opaque:
+        roi[...] = sprite.color[crop]
+    else:
+        # color*alpha + roi*(255-alpha) 不超过 255*255，uint16 不会溢出
+        blended = roi * sprite.inverse_alpha[crop]
+        blended += sprite.premultiplied[crop]
+        blended += 127
+        blended //= 255
+        roi[...] = blended
+    return image
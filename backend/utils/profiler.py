@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+# 按源文件把耗时归到检测流水线的各组件
+COMPONENT_FILES = {
+    'image_processor.py': 'ImageProcessor',
+    'yolo_detector.py': 'YOLODetector',
+    'fall_detector.py': 'FallDetector',
+    'tracker.py': 'IoUTracker',
+    'batch_engine.py': 'BatchInferenceEngine'
+}
+
+# 代表请求执行推理的后台线程，采样模式下一并采样
+HELPER_THREAD_NAMES = ('batch-inference',)
+
+# 后台线程空闲等待时所在的文件，这些样本不计入
+_IDLE_FILES = ('threading.py', 'queue.py')
+
+def _component(filename: str) -> Optional[str]:
+    return COMPONENT_FILES.get(os.path.basename(filename))
+
+def _frame_label(code) -> str:
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+
+class _StackSampler:
+    """定时采样指定线程的调用栈，按折叠栈格式（flamegraph.pl / speedscope）累计样本数"""
+
+    def __init__(self, thread_ids: Dict[int, str], interval: float):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self.components = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, thread_name in self.thread_ids.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                codes.reverse()
+                if thread_name != 'request' and os.path.basename(codes[-1].co_filename) in _IDLE_FILES:
+                    continue
+                self.samples += 1
+                self.stacks[';'.join([thread_name] + [_frame_label(code) for code in codes])] += 1
+                # 归到调用栈中最内层的组件（例如批处理线程中的YOLODetector.detect_batch）
+                component = next(
+                    (name for name in map(_component, (code.co_filename for code in reversed(codes))) if name),
+                    'other'
+                )
+                self.components[component] += 1
+
+class ProfileSession:
+    """一次请求的采集状态"""
+
+    def __init__(self, mode: str, profiler=None, sampler=None):
+        self.mode = mode
+        self.profiler = profiler
+        self.sampler = sampler
+        self.started_at = time.perf_counter()
+
+    def stop(self) -> float:
+        """停止采集，返回请求耗时（秒）"""
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        return time.perf_counter() - self.started_at
+
+class RequestProfiler:
+    """按需采集检测请求的性能剖析数据
+
+    通过 arm() 为接下来的N个检测请求开启采集，或由单个请求的请求头开启；
+    未开启时每个请求只有一次计数判断的开销。
+
+    sample 模式定时采样请求线程与批处理推理线程的调用栈，输出折叠栈（.collapsed，
+    可直接用 flamegraph.pl / speedscope / inferno 生成火焰图）；
+    cprofile 模式记录请求线程内的每次函数调用，输出 .prof（snakeviz / flameprof / gprof2dot）；
+    cProfile 看不到批处理推理线程中的耗时，批处理线程运行时 cprofile 请求改用 sample 模式。
+    两种模式都会输出 .json 摘要：请求耗时、各组件（ImageProcessor / YOLODetector / FallDetector 等）
+    的耗时占比与最耗时的函数。
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        mode: str = 'sample',
+        sample_interval_ms: float = 2.0,
+        max_profiles: int = 100,
+        max_requests: int = 100
+    ):
+        """
+        初始化剖析器
+
+        Args:
+            output_dir: 输出目录
+            mode: 默认模式，'sample' 或 'cprofile'
+            sample_interval_ms: 采样间隔（毫秒）
+            max_profiles: 目录中最多保留的剖析结果数，超过后删除最旧的
+            max_requests: 单次 arm() 最多采集的请求数
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的剖析模式: {mode}，可选: {', '.join(PROFILE_MODES)}")
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.sample_interval = max(0.0005, sample_interval_ms / 1000.0)
+        self.max_profiles = max(1, int(max_profiles))
+        self.max_requests = max(1, int(max_requests))
+
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._armed_mode = mode
+        self._sequence = 0
+        self._profiled = 0
+        self._cprofile_running = False
+        self._recent = deque(maxlen=20)
+
+    @property
+    def active(self) -> bool:
+        """是否还有待采集的请求"""
+        return self._remaining > 0
+
+    def arm(self, count: int, mode: Optional[str] = None) -> Dict:
+        """为接下来的count个检测请求开启采集"""
+        mode = mode or self.mode
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的剖析模式: {mode}，可选: {', '.join(PROFILE_MODES)}")
+        with self._lock:
+            self._remaining = max(0, min(int(count), self.max_requests))
+            self._armed_mode = mode
+        logger.info(f"已开启性能剖析: 接下来 {self._remaining} 个检测请求, 模式 {mode}")
+        return self.get_status()
+
+    def disarm(self) -> Dict:
+        """取消尚未执行的采集"""
+        with self._lock:
+            self._remaining = 0
+        return self.get_status()
+
+    def claim(self, header_value: Optional[str] = None) -> Optional[str]:
+        """
+        判断当前请求是否需要采集
+
+        Args:
+            header_value: X-Profile 请求头的值（'1' / 'sample' / 'cprofile'），None表示未携带
+
+        Returns:
+            采集模式，不需要采集时返回None
+        """
+        if header_value:
+            value = header_value.strip().lower()
+            if value in PROFILE_MODES:
+                return value
+            if value not in ('0', 'false', 'no', 'off'):
+                return self.mode
+        if self._remaining <= 0:
+            return None
+        with self._lock:
+            if self._remaining <= 0:
+                return None
+            self._remaining -= 1
+            return self._armed_mode
+
+    def start(self, mode: str) -> ProfileSession:
+        """在当前（请求处理）线程开始采集"""
+        helper_threads = {
+            thread.ident: thread.name for thread in threading.enumerate()
+            if thread.name in HELPER_THREAD_NAMES and thread.ident is not None
+        }
+        if mode == 'cprofile' and helper_threads:
+            # 推理在批处理线程中执行，cProfile只记录请求线程，会漏掉推理耗时
+            mode = 'sample'
+
+        if mode == 'cprofile':
+            # 同一时刻只能有一个cProfile在运行，并发的请求改用采样模式
+            with self._lock:
+                use_cprofile = not self._cprofile_running
+                self._cprofile_running = True
+            if use_cprofile:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    with self._lock:
+                        self._cprofile_running = False
+                else:
+                    return ProfileSession(mode, profiler=profiler)
+            mode = 'sample'
+
+        thread_ids = {threading.get_ident(): 'request', **helper_threads}
+        sampler = _StackSampler(thread_ids, self.sample_interval)
+        sampler.start()
+        return ProfileSession(mode, sampler=sampler)
+
+    def finish(self, session: ProfileSession, label: str, status: Optional[int] = None) -> Dict:
+        """
+        结束采集并写出结果
+
+        Args:
+            session: start() 返回的采集状态
+            label: 请求标识（如接口名），用于文件名
+            status: 响应状态码
+
+        Returns:
+            摘要信息（含输出文件名）
+        """
+        duration = session.stop()
+        with self._lock:
+            if session.profiler is not None:
+                self._cprofile_running = False
+            self._sequence += 1
+            self._profiled += 1
+            sequence = self._sequence
+        stem = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{label.replace('.', '_')}_{sequence}"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        summary = {
+            'id': stem,
+            'label': label,
+            'mode': session.mode,
+            'status': status,
+            'duration_ms': duration * 1000,
+            'created_at': datetime.now().isoformat()
+        }
+        if session.mode == 'cprofile':
+            profile_path = self.output_dir / f"{stem}.prof"
+            session.profiler.dump_stats(str(profile_path))
+            summary.update(self._summarize_cprofile(session.profiler))
+        else:
+            profile_path = self.output_dir / f"{stem}.collapsed"
+            sampler = session.sampler
+            with open(profile_path, 'w', encoding='utf-8') as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            summary.update(self._summarize_samples(sampler))
+        summary['output'] = profile_path.name
+
+        with open(self.output_dir / f"{stem}.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        with self._lock:
+            self._recent.append({key: summary[key] for key in ('id', 'label', 'mode', 'duration_ms', 'output')})
+        self._prune()
+        logger.info(f"性能剖析结果已保存: {profile_path} ({duration * 1000:.1f} ms)")
+        return summary
+
+    def _summarize_samples(self, sampler: _StackSampler) -> Dict:
+        samples = sampler.samples
+        own_time = Counter()
+        for stack, count in sampler.stacks.items():
+            own_time[stack.rsplit(';', 1)[-1]] += count
+        return {
+            'samples': samples,
+            'sample_interval_ms': self.sample_interval * 1000,
+            'sampled_threads': sorted(set(sampler.thread_ids.values())),
+            'components': {
+                name: {'samples': count, 'ratio': count / samples}
+                for name, count in sampler.components.most_common()
+            },
+            'top_functions': [
+                {'function': label, 'samples': count, 'ratio': count / samples}
+                for label, count in own_time.most_common(20)
+            ]
+        }
+
+    def _summarize_cprofile(self, profiler: cProfile.Profile) -> Dict:
+        stats = pstats.Stats(profiler)
+        components = Counter()
+        total = 0.0
+        top = []
+        for (filename, line, name), (_, calls, own, cumulative, callers) in stats.stats.items():
+            total += own
+            top.append((own, cumulative, calls, f"{name} ({os.path.basename(filename)}:{line})"))
+            component = _component(filename)
+            if component is None:
+                continue
+            # 组件的包含时间：只累加从组件外部调用进来的部分，避免组件内部的嵌套调用重复计算
+            for caller, edge in callers.items():
+                if _component(caller[0]) != component:
+                    components[component] += edge[3]
+        top.sort(reverse=True)
+        return {
+            'profiled_seconds': total,
+            'components': {
+                name: {'seconds': seconds, 'ratio': seconds / total if total else 0.0}
+                for name, seconds in components.most_common()
+            },
+            'top_functions': [
+                {'function': label, 'own_seconds': own, 'cumulative_seconds': cumulative, 'calls': calls}
+                for own, cumulative, calls, label in top[:20]
+            ]
+        }
+
+    def _prune(self):
+        """只保留最近的max_profiles个剖析结果"""
+        summaries = sorted(self.output_dir.glob('*.json'), key=lambda path: path.stat().st_mtime)
+        for path in summaries[:-self.max_profiles]:
+            for suffix in ('.json', '.prof', '.collapsed'):
+                try:
+                    path.with_suffix(suffix).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def get_status(self) -> Dict:
+        """获取剖析器状态"""
+        with self._lock:
+            return {
+                'remaining_requests': self._remaining,
+                'mode': self._armed_mode if self._remaining else self.mode,
+                'profiled_requests': self._profiled,
+                'sample_interval_ms': self.sample_interval * 1000,
+                'output_dir': str(self.output_dir),
+                'recent': list(self._recent)
+            }
@@ -0,0 +1,75 @@
+import json
+from typing import Any, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时回退到标准库json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 未安装msgpack时仅提供JSON
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# 客户端在Accept中可能使用的MessagePack类型
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def json_default(obj):
+    """
+    numpy类型的序列化钩子（json.dumps/msgpack的default参数）
+
+    只在编码器遇到无法直接处理的对象时被调用，检测结果中的numpy数组、
+    numpy标量无需事先递归转换为Python原生类型。
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    raise TypeError(f"无法序列化的类型: {type(obj)}")
+
+def dumps_json(obj: Any) -> bytes:
+    """
+    将结果编码为紧凑的UTF-8 JSON
+
+    安装了orjson时直接按数组内存序列化numpy数组（boxes、keypoints等），
+    否则回退到标准库json并通过json_default转换numpy类型。
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+
+def dumps_msgpack(obj: Any) -> bytes:
+    """将结果编码为MessagePack（需要安装msgpack）"""
+    if msgpack is None:
+        raise RuntimeError('未安装msgpack，无法使用MessagePack格式')
+    return msgpack.packb(obj, default=json_default, use_bin_type=True)
+
+def msgpack_available() -> bool:
+    """是否可以使用MessagePack格式"""
+    return msgpack is not None
+
+def serialize(obj: Any, fmt: str = 'json') -> Tuple[bytes, str]:
+    """
+    按指定格式编码结果
+
+    Args:
+        obj: 待编码的结果（可直接包含numpy数组与标量）
+        fmt: 'json' 或 'msgpack'
+
+    Returns:
+        (编码后的字节串, 对应的mimetype)
+    """
+    if fmt == 'msgpack':
+        return dumps_msgpack(obj), MSGPACK_MIMETYPE
+    return dumps_json(obj), JSON_MIMETYPE
@@ -9,6 +9,15 @@ const request = axios.create({
   }
 })
 
+// 本页面的流ID：多进程服务（serve.py）按流ID把请求固定分配给同一个worker，
+// 每个检测请求都通过 X-Stream-ID 请求头（WebSocket用 stream_id 查询参数）携带流ID
+const clientId = Math.random().toString(36).slice(2, 10)
+export const videoStreamId = `web-${clientId}`
+// 图片检测使用单独的流，避免与视频流的跌倒历史混用
+export const imageStreamId = `web-${clientId}-image`
+
+const streamHeaders = (streamId, headers = {}) => ({ ...headers, 'X-Stream-ID': streamId })
+
 // 请求拦截器
 request.interceptors.request.use(
   config => {
@@ -56,30 +65,130 @@ export const getSystemStatus = () => {
 /**
  * 图片检测
  * @param {string} imageBase64 - Base64编码的图片
+ * @param {string} streamId - 流ID（可选）
  */
-export const detectImage = (imageBase64) => {
+export const detectImage = (imageBase64, streamId = imageStreamId) => {
   return request.post('/detect_image', {
-    image: imageBase64
+    image: imageBase64,
+    stream_id: streamId
+  }, {
+    headers: streamHeaders(streamId)
   })
 }
 
 /**
  * 视频帧检测
  * @param {string} frameBase64 - Base64编码的视频帧
+ * @param {boolean} render - 是否由服务端绘制结果帧，false时仅返回检测结果
+ * @param {string} streamId - 流ID（可选）
  */
-export const detectVideoFrame = (frameBase64) => {
+export const detectVideoFrame = (frameBase64, render = true, streamId = videoStreamId) => {
   return request.post('/detect_video', {
-    frame: frameBase64
+    frame: frameBase64,
+    render,
+    stream_id: streamId
+  }, {
+    headers: streamHeaders(streamId)
+  })
+}
+
+/**
+ * 解析二进制检测结果
+ * 格式：[4字节大端JSON长度][检测结果JSON][JPEG结果图像]
+ * @param {ArrayBuffer} buffer - 响应体
+ * @returns {{result: Object, image: Blob}}
+ */
+export const unpackDetectionResult = (buffer) => {
+  const view = new DataView(buffer)
+  const metaLength = view.getUint32(0, false)
+  const metaBytes = new Uint8Array(buffer, 4, metaLength)
+  const result = JSON.parse(new TextDecoder('utf-8').decode(metaBytes))
+  const image = new Blob([buffer.slice(4 + metaLength)], { type: 'image/jpeg' })
+  return { result, image }
+}
+
+/**
+ * 视频帧检测（二进制上传，避免Base64编解码）
+ * @param {Blob} frameBlob - JPEG帧数据
+ * @param {string} streamId - 流ID（可选）
+ */
+export const detectVideoFrameBinary = async (frameBlob, streamId = videoStreamId) => {
+  const buffer = await request.post('/detect_video_raw', frameBlob, {
+    headers: streamHeaders(streamId, { 'Content-Type': 'application/octet-stream' }),
+    responseType: 'arraybuffer'
   })
+  return unpackDetectionResult(buffer)
+}
+
+/**
+ * 图片检测（二进制上传，避免Base64编解码）
+ * @param {Blob|File} imageBlob - 图片数据
+ * @param {string} streamId - 流ID（可选）
+ */
+export const detectImageBinary = async (imageBlob, streamId = imageStreamId) => {
+  const buffer = await request.post('/detect_image_raw', imageBlob, {
+    headers: streamHeaders(streamId, { 'Content-Type': 'application/octet-stream' }),
+    responseType: 'arraybuffer'
+  })
+  return unpackDetectionResult(buffer)
+}
+
+/**
+ * 建立视频流检测WebSocket连接
+ * 发送二进制JPEG帧，服务端按最新帧处理并推送二进制结果
+ * @param {Object} handlers - 回调 { onResult, onOpen, onClose, onError }
+ * @param {boolean} render - 是否由服务端绘制结果帧，false时仅推送检测结果
+ * @param {string} streamId - 流ID（可选），与HTTP逐帧检测共用同一路流的跟踪与跌倒状态
+ * @returns {{send: Function, close: Function, isOpen: Function}}
+ */
+export const createDetectionStream = (
+  { onResult, onOpen, onClose, onError } = {}, render = true, streamId = videoStreamId
+) => {
+  // 浏览器不能为WebSocket设置请求头，流ID通过查询参数传递
+  const url = request.defaults.baseURL.replace(/^http/, 'ws') +
+    `/stream?render=${render ? 1 : 0}&stream_id=${encodeURIComponent(streamId)}`
+  const socket = new WebSocket(url)
+  socket.binaryType = 'arraybuffer'
+
+  socket.onopen = () => onOpen && onOpen()
+  socket.onclose = () => onClose && onClose()
+  socket.onerror = (event) => onError && onError(event)
+  socket.onmessage = (event) => {
+    if (typeof event.data === 'string') {
+      const message = JSON.parse(event.data)
+      if (message.success === false && onError) {
+        onError(new Error(message.error))
+      }
+      return
+    }
+    onResult && onResult(unpackDetectionResult(event.data))
+  }
+
+  return {
+    isOpen: () => socket.readyState === WebSocket.OPEN,
+    send: (frameBlob) => {
+      // 上一帧尚未发出时跳过本帧，避免在客户端堆积；返回是否已发送
+      if (socket.readyState === WebSocket.OPEN && socket.bufferedAmount === 0) {
+        socket.send(frameBlob)
+        return true
+      }
+      return false
+    },
+    close: () => socket.close()
+  }
 }
 
 /**
  * 重置检测器
  * @param {number} objectId - 对象ID（可选）
+ * @param {string} streamId - 流ID（可选）
  */
-export const resetDetector = (objectId = null) => {
+export const resetDetector = (objectId = null, streamId = videoStreamId) => {
   return request.post('/reset', {
-    object_id: objectId
+    object_id: objectId,
+    stream_id: streamId
+  }, {
+    headers: streamHeaders(streamId)
   })
 }
 
@@ -90,4 +199,49 @@ export const getConfig = () => {
   return request.get('/config')
 }
 
+/**
+ * 由服务端直接接入视频文件或RTSP/HTTP流（浏览器无需转发摄像头画面）
+ * @param {string} source - 流地址，或服务端视频目录下的文件名
+ * @param {string} streamId - 流ID（可选）
+ * @param {Object} options - { realtime, loop }
+ */
+export const startIngestSource = (source, streamId = null, options = {}) => {
+  return request.post('/ingest/sources', {
+    source,
+    stream_id: streamId,
+    ...options
+  }, {
+    headers: streamId ? { 'X-Stream-ID': streamId } : {}
+  })
+}
+
+/**
+ * 获取服务端接入视频源的统计与最新检测结果
+ * @param {string} streamId - 流ID
+ */
+export const getIngestSource = (streamId) => {
+  return request.get(`/ingest/sources/${encodeURIComponent(streamId)}`, {
+    headers: { 'X-Stream-ID': streamId }
+  })
+}
+
+/**
+ * 服务端接入视频源最新标注帧的地址（可直接用作<img>的src，定时刷新）
+ * @param {string} streamId - 流ID
+ */
+export const getIngestFrameUrl = (streamId) => {
+  return `${request.defaults.baseURL}/ingest/sources/${encodeURIComponent(streamId)}/frame` +
+    `?stream_id=${encodeURIComponent(streamId)}&t=${Date.now()}`
+}
+
+/**
+ * 停止服务端接入的视频源
+ * @param {string} streamId - 流ID
+ */
+export const stopIngestSource = (streamId) => {
+  return request.delete(`/ingest/sources/${encodeURIComponent(streamId)}`, {
+    headers: { 'X-Stream-ID': streamId }
+  })
+}
+
 export default request
\ No newline at end of file
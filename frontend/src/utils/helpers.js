@@ -61,4 +61,62 @@ export const formatFileSize = (bytes) => {
   const sizes = ['B', 'KB', 'MB', 'GB']
   const i = Math.floor(Math.log(bytes) / Math.log(k))
   return Math.round(bytes / Math.pow(k, i) * 100) / 100 + ' ' + sizes[i]
-}
\ No newline at end of file
+}
+// COCO骨架连接（与后端 YOLODetector._draw_skeleton 一致，1起始索引）
+const SKELETON = [
+  [16, 14], [14, 12], [17, 15], [15, 13], [12, 13],
+  [6, 12], [7, 13],
+  [6, 8], [7, 9], [8, 10], [9, 11],
+  [6, 7],
+  [1, 2], [0, 1], [0, 2], [1, 3], [2, 4], [3, 5], [4, 6]
+]
+
+/**
+ * 在画布上绘制检测结果（仅结果模式下由前端叠加边界框、关键点和标签）
+ * @param {CanvasRenderingContext2D} ctx - 画布上下文
+ * @param {Array} detections - 检测结果（包含bbox、keypoints、is_fall、fall_score）
+ * @param {number} scale - 检测坐标到画布坐标的缩放比例
+ */
+export const drawDetectionOverlay = (ctx, detections, scale = 1) => {
+  ctx.save()
+  ctx.lineWidth = 2
+  ctx.font = 'bold 14px sans-serif'
+  ctx.textBaseline = 'bottom'
+
+  detections.forEach(detection => {
+    const color = detection.is_fall ? '#ff0000' : '#00ff00'
+    const [x1, y1, x2, y2] = detection.bbox.map(v => v * scale)
+    const keypoints = detection.keypoints || []
+
+    ctx.strokeStyle = color
+    ctx.fillStyle = color
+    ctx.strokeRect(x1, y1, x2 - x1, y2 - y1)
+
+    keypoints.forEach(([x, y, conf]) => {
+      if (conf > 0.5) {
+        ctx.beginPath()
+        ctx.arc(x * scale, y * scale, 4, 0, Math.PI * 2)
+        ctx.fill()
+      }
+    })
+
+    SKELETON.forEach(([a, b]) => {
+      const kp1 = keypoints[a - 1]
+      const kp2 = keypoints[b - 1]
+      if (kp1 && kp2 && kp1[2] > 0.5 && kp2[2] > 0.5) {
+        ctx.beginPath()
+        ctx.moveTo(kp1[0] * scale, kp1[1] * scale)
+        ctx.lineTo(kp2[0] * scale, kp2[1] * scale)
+        ctx.stroke()
+      }
+    })
+
+    const text = `${detection.is_fall ? 'FALL!' : 'Normal'} (${detection.fall_score.toFixed(2)})`
+    const textWidth = ctx.measureText(text).width
+    ctx.fillRect(x1, y1 - 20, textWidth + 4, 20)
+    ctx.fillStyle = '#ffffff'
+    ctx.fillText(text, x1 + 2, y1 - 3)
+  })
+
+  ctx.restore()
+}
@@ -0,0 +1,1617 @@
+# filePath：YOLOV8-/tests/test_backend.py
+"""
+后端单元测试
+
+运行: python -m pytest -q tests
+依赖YOLO检测器（ultralytics）的用例在未安装ultralytics时跳过。
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+# ---------------------------------------------------------------- 测试数据
+
+def standing_pose(x=100.0, y=50.0, scale=1.0, hide=()):
+    """站立姿态的17个COCO关键点（hide中的关键点按ultralytics的方式置为(0,0)、低置信度）"""
+    points = [
+        (50, 10), (45, 5), (55, 5), (40, 8), (60, 8),      # 鼻、眼、耳
+        (35, 40), (65, 40), (30, 80), (70, 80),            # 肩、肘
+        (28, 115), (72, 115), (40, 130), (60, 130),        # 腕、髋
+        (40, 200), (60, 200), (40, 270), (60, 270)         # 膝、踝
+    ]
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    for i, (px, py) in enumerate(points):
+        if i in hide:
+            keypoints[i] = (0.0, 0.0, 0.2)
+        else:
+            keypoints[i] = (x + px * scale, y + py * scale, 0.9)
+    return keypoints
+
+class _Tensor:
+    """模拟推理结果中的张量（.cpu().numpy()）"""
+
+    def __init__(self, data):
+        self._data = np.asarray(data, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._data
+
+def fake_result(boxes, keypoints, confidences):
+    """模拟ultralytics的单张图像推理结果"""
+    return SimpleNamespace(
+        keypoints=SimpleNamespace(data=_Tensor(keypoints)),
+        boxes=SimpleNamespace(xyxy=_Tensor(boxes), conf=_Tensor(confidences))
+    )
+
+class FakeModel:
+    """按图像返回预设推理结果的模型，results_for(image) -> 结果对象"""
+
+    def __init__(self, results_for):
+        self.results_for = results_for
+        self.calls = []
+
+    def __call__(self, images, **kwargs):
+        batch = images if isinstance(images, list) else [images]
+        self.calls.append(len(batch))
+        return [self.results_for(image) for image in batch]
+
+def make_yolo_detector(model):
+    """不加载权重，直接以给定模型构造YOLODetector"""
+    pytest.importorskip('ultralytics')
+    from models.yolo_detector import YOLODetector
+    detector = YOLODetector.__new__(YOLODetector)
+    detector.model = model
+    detector._infer_lock = threading.Lock()
+    detector.confidence = 0.5
+    detector.backend = 'pytorch'
+    detector.precision = 'fp32'
+    return detector
+
+# ---------------------------------------------------------------- YOLODetector
+
+def test_region_detection_keeps_missing_keypoints_at_origin():
+    """ROI推理只平移可见关键点，缺失的关键点仍为(0,0)，跌倒分数与全画面推理一致"""
+    hidden = (13, 14, 15, 16)  # 膝、踝未检测到
+    region = (100, 50, 300, 450)
+    crop_keypoints = standing_pose(x=20, y=30, hide=hidden)
+    crop_raw = crop_keypoints.copy()
+    crop_box = [20, 30, 100, 330]
+
+    def results_for(image):
+        return fake_result([crop_box], [crop_keypoints], [0.9])
+
+    detector = make_yolo_detector(FakeModel(results_for))
+    from models.fall_detector import FallDetector
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    detections = detector.detect(image, regions=[region])
+
+    assert len(detections) == 1
+    detection = detections[0]
+    expected = standing_pose(x=120, y=80, hide=hidden)
+    np.testing.assert_allclose(detection['keypoints'], expected)
+    np.testing.assert_allclose(detection['bbox'], [120, 80, 200, 380])
+    assert detection['keypoints_array'] is detection['keypoints']
+    # 推理结果的原数组不被修改
+    np.testing.assert_array_equal(crop_keypoints, crop_raw)
+
+    roi_score = FallDetector().detect_batch(detection['keypoints'][None], [0])[0][1]
+    full_score = FallDetector().detect_batch(expected[None], [0])[0][1]
+    assert roi_score == pytest.approx(full_score)
+
+def test_model_calls_are_serialized_across_threads():
+    """单帧、区域与批量推理在多个线程中并发调用时，模型同一时刻只被一个线程使用"""
+    import time
+
+    state = {'active': 0, 'max_active': 0}
+    state_lock = threading.Lock()
+
+    def results_for(image):
+        with state_lock:
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+        time.sleep(0.002)
+        with state_lock:
+            state['active'] -= 1
+        return fake_result(np.zeros((0, 4)), np.zeros((0, 17, 3)), np.zeros(0))
+
+    detector = make_yolo_detector(FakeModel(results_for))
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    calls = [
+        lambda: detector.detect(image),
+        lambda: detector.detect(image, regions=[(0, 0, 32, 32)]),
+        lambda: detector.detect_batch([image, image])
+    ]
+    threads = [threading.Thread(target=lambda call=call: [call() for _ in range(10)]) for call in calls * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert state['max_active'] == 1
+
+# ---------------------------------------------------------------- 数据集导出
+
+def test_yolo_pose_label_marks_low_confidence_keypoints_invisible():
+    """低置信度或坐标为(0,0)的关键点导出为 0 0 0，可见关键点为 x y 2"""
+    from utils.dataset_export import yolo_pose_label
+
+    keypoints = standing_pose(hide=(15, 16))
+    keypoints[0, 2] = 0.2           # 低置信度但坐标未清零
+    keypoints[1] = (0.0, 0.0, 0.9)  # 坐标为(0,0)
+    label = yolo_pose_label([{'bbox': [100, 50, 200, 330], 'keypoints': keypoints}], [640, 480], 0)
+
+    values = label.split()
+    assert values[0] == '0' and len(values) == 5 + 17 * 3
+    triples = np.array(values[5:], dtype=float).reshape(17, 3)
+    hidden = [0, 1, 15, 16]
+    np.testing.assert_array_equal(triples[hidden], 0.0)
+    shown = [i for i in range(17) if i not in hidden]
+    assert (triples[shown, 2] == 2).all()
+    np.testing.assert_allclose(triples[shown, 0], keypoints[shown, 0] / 640, atol=1e-6)
+
+def test_export_labels_every_person_and_skips_incomplete_samples(tmp_path):
+    """画面中每个人都导出标签（误报样本的跌倒目标改为normal），只有跌倒目标几何信息的旧样本不导出"""
+    import tarfile
+    from utils.dataset_export import export_dataset
+    from utils.dataset_index import STATUS_LABELED
+
+    def person(x, fall):
+        return {'track_id': int(x), 'fall': fall, 'bbox': [x, 50.0, x + 100.0, 330.0],
+                'keypoints': standing_pose(x=x).tolist()}
+
+    samples = {
+        'fall_a.jpg': ('fall', {'image_size': [640, 480], 'objects': [person(100.0, True), person(300.0, False)]}),
+        'fall_b.jpg': ('normal', {'image_size': [640, 480], 'objects': [person(100.0, True)]}),
+        'fall_old.jpg': ('fall', {'image_size': [640, 480], 'bbox': [100.0, 50.0, 200.0, 330.0],
+                                  'keypoints': standing_pose().tolist()}),
+    }
+    index = _make_index(tmp_path)
+    for n, (filename, (label, metadata)) in enumerate(samples.items()):
+        (tmp_path / 'unlabeled' / filename).write_bytes(b'jpeg')
+        index.add_sample(filename, metadata=metadata, captured_at=1000.0 + n)
+        index.relabel([filename], STATUS_LABELED, label=label)
+    index.close()
+
+    manifest = export_dataset(str(tmp_path), str(tmp_path / 'out'), shard_size=10, workers=1)
+
+    assert (manifest['samples'], manifest['unannotated']) == (2, 1)
+    with tarfile.open(tmp_path / 'out' / 'shard-000000.tar') as tar:
+        names = sorted(tar.getnames())
+        labels = {name: tar.extractfile(name).read().decode() for name in names if name.endswith('.txt')}
+    assert not any(name.startswith('fall_old') for name in names)
+    assert [line.split()[0] for line in labels['fall_a.txt'].splitlines()] == ['0', '1']
+    assert [line.split()[0] for line in labels['fall_b.txt'].splitlines()] == ['1']
+    assert np.load(tmp_path / 'out' / 'keypoints.npy').shape == (2, 17, 3)
+
+# ---------------------------------------------------------------- WebSocket视频流
+
+def test_stream_sends_are_serialized():
+    """处理线程与控制消息共用连接时，发送不会并发进入WebSocket"""
+    import time
+    pytest.importorskip('ultralytics')
+    from api.stream import SerializedSender
+
+    class FakeWebSocket:
+        def __init__(self):
+            self.active = 0
+            self.max_active = 0
+            self.sent = []
+
+        def send(self, data):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            time.sleep(0.001)
+            self.sent.append(data)
+            self.active -= 1
+
+    ws = FakeWebSocket()
+    sender = SerializedSender(ws)
+    threads = [
+        threading.Thread(target=lambda i=i: [sender.send(f"{i}-{n}") for n in range(20)])
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert ws.max_active == 1
+    assert len(ws.sent) == 80
+
+# ---------------------------------------------------------------- 批处理推理引擎
+
+class CountingDetector:
+    """记录单帧与批量推理调用次数的检测器"""
+
+    def __init__(self, infer_delay=0.0):
+        self.infer_delay = infer_delay
+        self.single_calls = 0
+        self.batch_sizes = []
+
+    def detect(self, image):
+        self.single_calls += 1
+        return [{'source': 'single', 'value': int(image[0, 0, 0])}]
+
+    def detect_batch(self, images):
+        self.batch_sizes.append(len(images))
+        time.sleep(self.infer_delay)
+        return [[{'source': 'batch', 'value': int(image[0, 0, 0])}] for image in images]
+
+class _ThreadStub:
+    """模拟批处理线程：前 alive_checks 次 is_alive() 返回True，之后返回False"""
+
+    def __init__(self, alive_checks):
+        self.alive_checks = alive_checks
+
+    def is_alive(self):
+        self.alive_checks -= 1
+        return self.alive_checks >= 0
+
+def _frame(value):
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+def test_batch_engine_merges_concurrent_requests():
+    """并发请求被合并为批次，每个请求拿回自己的结果"""
+    pytest.importorskip('ultralytics')
+    from models.batch_engine import BatchInferenceEngine
+
+    detector = CountingDetector(infer_delay=0.02)
+    engine = BatchInferenceEngine(detector, max_batch_size=4, max_wait_ms=50)
+    engine.start()
+    results = {}
+    try:
+        threads = [
+            threading.Thread(target=lambda i=i: results.__setitem__(i, engine.detect(_frame(i))))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        engine.stop()
+
+    assert {i: result[0]['value'] for i, result in results.items()} == {i: i for i in range(8)}
+    assert sum(detector.batch_sizes) == 8 and max(detector.batch_sizes) > 1
+
+def test_batch_engine_dispatches_lone_request_without_waiting():
+    """空闲时的单个请求立即推理，不等待凑批窗口"""
+    pytest.importorskip('ultralytics')
+    from models.batch_engine import BatchInferenceEngine
+
+    detector = CountingDetector()
+    engine = BatchInferenceEngine(detector, max_batch_size=4, max_wait_ms=500)
+    engine.start()
+    try:
+        for value in range(3):
+            time.sleep(0.01)
+            start = time.perf_counter()
+            assert engine.detect(_frame(value)) == [{'source': 'batch', 'value': value}]
+            assert time.perf_counter() - start < 0.25
+    finally:
+        engine.stop()
+
+    assert detector.batch_sizes == [1, 1, 1]
+
+def test_batch_engine_falls_back_when_queue_is_full():
+    """队列已满时不阻塞请求线程，改为单帧推理"""
+    pytest.importorskip('ultralytics')
+    from models.batch_engine import BatchInferenceEngine
+
+    detector = CountingDetector()
+    engine = BatchInferenceEngine(detector, max_queue_size=1, enqueue_timeout=0.01, result_timeout=0.01)
+    engine._worker = _ThreadStub(alive_checks=10)
+    engine._queue.put(object())
+
+    assert engine.detect(_frame(3)) == [{'source': 'single', 'value': 3}]
+    assert detector.single_calls == 1
+
+def test_batch_engine_runs_request_directly_if_engine_stopped_after_enqueue():
+    """入队后引擎才停止（不再清空队列）时，等待超时后直接推理而不是永久阻塞"""
+    pytest.importorskip('ultralytics')
+    from models.batch_engine import BatchInferenceEngine
+
+    detector = CountingDetector()
+    engine = BatchInferenceEngine(detector, result_timeout=0.05)
+    engine._worker = _ThreadStub(alive_checks=1)
+
+    assert engine.detect(_frame(7)) == [{'source': 'single', 'value': 7}]
+    assert detector.single_calls == 1
+
+def _make_index(root, labeled=0, unlabeled=0, start=1000.0):
+    """在临时目录中建立数据集索引，样本按序号递增的采集时间写入"""
+    from utils.dataset_index import FallDatasetIndex, STATUS_LABELED, STATUS_UNLABELED
+    for status in (STATUS_LABELED, STATUS_UNLABELED):
+        (root / status).mkdir(parents=True, exist_ok=True)
+    index = FallDatasetIndex(str(root), str(root / 'index.sqlite3'))
+    for i in range(labeled):
+        index.add_sample(f"fall_l{i:03d}.jpg", captured_at=start + i, status=STATUS_LABELED)
+    for i in range(unlabeled):
+        index.add_sample(f"fall_u{i:03d}.jpg", captured_at=start + i, status=STATUS_UNLABELED)
+    return index
+
+def test_export_paging_is_stable_while_index_changes(tmp_path):
+    """导出分页期间插入新样本、重新标注旧样本，已标注样本既不重复也不遗漏"""
+    import time
+    from utils.dataset_export import _iter_shard_jobs
+    from utils.dataset_index import STATUS_LABELED
+
+    index = _make_index(tmp_path, labeled=10, unlabeled=3)
+    snapshot_at = time.time()
+    time.sleep(0.01)
+    jobs = _iter_shard_jobs(index, str(tmp_path / 'out'), 3, ['fall'], snapshot_at, page_size=2)
+
+    exported = []
+    for n, (_, _, samples, _) in enumerate(jobs):
+        exported.extend(sample['filename'] for sample in samples)
+        if n == 0:
+            # 比所有样本都新的样本会排到最前面，按偏移分页时会导致后续页重复
+            index.add_sample('fall_new.jpg', captured_at=5000.0, status=STATUS_LABELED)
+            (tmp_path / 'unlabeled' / 'fall_u001.jpg').write_bytes(b'')
+            index.relabel(['fall_u001.jpg'], STATUS_LABELED)
+    index.close()
+
+    assert exported == [f"fall_l{i:03d}.jpg" for i in range(9, -1, -1)]
+
+# ---------------------------------------------------------------- 数据集索引
+
+def test_dataset_index_sync_tracks_added_moved_and_removed_files(tmp_path):
+    """同步只补录新文件，并反映手动移动与删除"""
+    from utils.dataset_index import FallDatasetIndex, STATUS_LABELED, STATUS_UNLABELED
+
+    index = FallDatasetIndex(str(tmp_path))
+    unlabeled = tmp_path / STATUS_UNLABELED
+    for name in ('fall_a', 'fall_b', 'fall_c'):
+        (unlabeled / f"{name}.jpg").write_bytes(b'')
+    (unlabeled / 'fall_a.txt').write_text(
+        "Timestamp: 2025-10-04T20:22:14\n"
+        "Details: [{'id': 3, 'details': {'total_score': 0.8, 'body_angle': 70.0}}]\n"
+        'Metadata: {"stream_id": "camera-1"}\n'
+    )
+
+    assert index.sync() == {'added': 3, 'removed': 0, 'moved': 0}
+    sample = index.get_sample('fall_a.jpg')
+    assert sample['status'] == STATUS_UNLABELED
+    assert sample['stream_id'] == 'camera-1' and sample['track_id'] == 3
+    assert sample['fall_score'] == pytest.approx(0.8)
+    assert index.sync() == {'added': 0, 'removed': 0, 'moved': 0}
+
+    (unlabeled / 'fall_b.jpg').rename(tmp_path / STATUS_LABELED / 'fall_b.jpg')
+    (unlabeled / 'fall_c.jpg').unlink()
+    assert index.sync() == {'added': 0, 'removed': 1, 'moved': 1}
+    assert index.get_sample('fall_b.jpg')['status'] == STATUS_LABELED
+    assert index.get_sample('fall_c.jpg') is None
+    index.close()
+
+def test_dataset_index_sync_keeps_samples_written_during_scan(tmp_path, monkeypatch):
+    """扫描目录之后才落盘入索引的样本不被删除，扫描期间的标注不被回退"""
+    import os
+    import utils.dataset_index as dataset_index
+    from utils.dataset_index import FallDatasetIndex, STATUS_LABELED, STATUS_UNLABELED
+
+    index = FallDatasetIndex(str(tmp_path))
+    unlabeled = tmp_path / STATUS_UNLABELED
+    (unlabeled / 'fall_a.jpg').write_bytes(b'')
+    index.sync()
+
+    real_scandir = os.scandir
+    scanned = []
+
+    def scandir(path):
+        scanned.append(path)
+        if len(scanned) == 2:
+            # 目录扫描完之前：归档写入器落盘并入索引一张新图片，同时标注一张旧图片
+            (unlabeled / 'fall_new.jpg').write_bytes(b'')
+            index.add_sample('fall_new.jpg', metadata={'stream_id': 'camera-1'})
+            index.relabel(['fall_a.jpg'], STATUS_LABELED)
+        return real_scandir(path)
+
+    monkeypatch.setattr(dataset_index.os, 'scandir', scandir)
+    index.sync()
+    monkeypatch.setattr(dataset_index.os, 'scandir', real_scandir)
+
+    assert index.get_sample('fall_new.jpg')['stream_id'] == 'camera-1'
+    assert index.get_sample('fall_a.jpg')['status'] == STATUS_LABELED
+    assert index.sync() == {'added': 0, 'removed': 0, 'moved': 0}
+    index.close()
+
+def test_dataset_index_sync_alongside_archiver_writes(tmp_path):
+    """归档写入器持续写入、同时反复同步与标注时，索引始终与目录一致"""
+    from utils.dataset_index import FallDatasetIndex, STATUS_LABELED, STATUS_UNLABELED
+    from utils.fall_archiver import FallImageArchiver
+
+    index = FallDatasetIndex(str(tmp_path))
+    archiver = FallImageArchiver(
+        index.status_dir(STATUS_UNLABELED), max_queue_size=256, coalesce=False,
+        fsync_batch=2, sample_index=index
+    )
+    archiver.start()
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    total = 60
+    done = threading.Event()
+
+    def sync_and_label():
+        labeled = 0
+        while not done.is_set():
+            index.sync()
+            page = index.list_samples(limit=2, status=STATUS_UNLABELED, with_total=False)['samples']
+            if page and labeled < 20:
+                labeled += len(index.relabel([page[0]['filename']], STATUS_LABELED)['updated'])
+
+    worker = threading.Thread(target=sync_and_label)
+    worker.start()
+    try:
+        for i in range(total):
+            archiver.submit(image, f"fall_{i:03d}", details=[], metadata={'stream_id': 'camera-1'})
+    finally:
+        archiver.stop()
+        done.set()
+        worker.join()
+
+    samples = index.list_samples(limit=total * 2)['samples']
+    assert sorted(s['filename'] for s in samples) == [f"fall_{i:03d}.jpg" for i in range(total)]
+    for sample in samples:
+        assert (tmp_path / sample['status'] / sample['filename']).exists(), sample['filename']
+        assert sample['stream_id'] == 'camera-1'
+    assert index.sync() == {'added': 0, 'removed': 0, 'moved': 0}
+    index.close()
+
+def test_dataset_index_relabel_moves_files_and_updates_status(tmp_path):
+    """重新标注把图片与.txt移到目标目录，并更新状态与标签"""
+    from utils.dataset_index import FallDatasetIndex, STATUS_LABELED, STATUS_UNLABELED
+
+    index = FallDatasetIndex(str(tmp_path))
+    unlabeled, labeled = tmp_path / STATUS_UNLABELED, tmp_path / STATUS_LABELED
+    (unlabeled / 'fall_a.jpg').write_bytes(b'')
+    (unlabeled / 'fall_a.txt').write_text("Timestamp: 2025-10-04T20:22:14\n")
+    index.sync()
+    # 索引中尚没有的旧文件在标注时补录
+    (unlabeled / 'fall_b.jpg').write_bytes(b'')
+
+    result = index.relabel(['fall_a.jpg', 'fall_b.jpg', 'fall_x.jpg'], STATUS_LABELED, label='fall')
+
+    assert result == {'updated': ['fall_a.jpg', 'fall_b.jpg'], 'missing': ['fall_x.jpg']}
+    assert sorted(p.name for p in labeled.iterdir()) == ['fall_a.jpg', 'fall_a.txt', 'fall_b.jpg']
+    assert list(unlabeled.iterdir()) == []
+    for name in ('fall_a.jpg', 'fall_b.jpg'):
+        sample = index.get_sample(name)
+        assert (sample['status'], sample['label']) == (STATUS_LABELED, 'fall')
+    assert index.list_samples(status=STATUS_UNLABELED)['total'] == 0
+
+    index.relabel(['fall_a.jpg'], STATUS_UNLABELED)
+    assert (unlabeled / 'fall_a.jpg').exists() and (unlabeled / 'fall_a.txt').exists()
+    assert index.get_sample('fall_a.jpg')['status'] == STATUS_UNLABELED
+    index.close()
+
+# ---------------------------------------------------------------- 结果序列化
+
+def _numpy_payload():
+    keypoints = standing_pose().astype(np.float32)
+    return {
+        'detections': [{
+            'id': np.int64(3),
+            'bbox': np.array([1.5, 2.0, 30.25, 40.0], np.float32),
+            'keypoints': keypoints,
+            'is_fall': np.bool_(True),
+            'fall_score': np.float32(0.75),
+            'details': {'body_angle': np.float64(61.5)}
+        }]
+    }, keypoints
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_json_serialization_encodes_numpy_results_directly(monkeypatch, use_orjson):
+    """numpy数组与标量无需预先转换即可编码为JSON，orjson不可用时回退到标准库"""
+    import json
+    from utils import serialization
+
+    if use_orjson:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(serialization, 'orjson', None)
+    payload, keypoints = _numpy_payload()
+
+    body, mimetype = serialization.serialize(payload, 'json')
+    decoded = json.loads(body)['detections'][0]
+
+    assert mimetype == 'application/json'
+    assert decoded['id'] == 3 and decoded['is_fall'] is True
+    assert decoded['bbox'] == [1.5, 2.0, 30.25, 40.0]
+    np.testing.assert_allclose(decoded['keypoints'], keypoints, rtol=1e-6)
+    assert decoded['fall_score'] == pytest.approx(0.75) and decoded['details'] == {'body_angle': 61.5}
+
+def test_msgpack_serialization_round_trip(monkeypatch):
+    """MessagePack编码与（标准库）JSON编码得到相同的结构"""
+    import json
+    msgpack = pytest.importorskip('msgpack')
+    from utils import serialization
+
+    # orjson按float32的最短表示输出，与tolist()得到的float64不逐位相同
+    monkeypatch.setattr(serialization, 'orjson', None)
+    payload, _ = _numpy_payload()
+    body, mimetype = serialization.serialize(payload, 'msgpack')
+
+    assert mimetype == 'application/msgpack'
+    assert msgpack.unpackb(body) == json.loads(serialization.serialize(payload, 'json')[0])
+
+# ---------------------------------------------------------------- 跌倒图片归档
+
+def test_archiver_coalesces_per_key_and_drops_oldest_when_full(tmp_path):
+    """同一key未写盘的图片只保留最新一张；队列满时丢弃最旧的，停止时写完剩余图片"""
+    from utils.fall_archiver import FallImageArchiver
+
+    archiver = FallImageArchiver(str(tmp_path), max_queue_size=2)
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    assert archiver.submit(image, 'cam_1', 'a', key='cam')
+    assert archiver.submit(image, 'cam_2', 'b', key='cam')
+    assert archiver.submit(image, 'single_1', 'c')
+    assert archiver.submit(image, 'single_2', 'd')
+
+    stats = archiver.get_stats()
+    assert (stats['queue_depth'], stats['coalesced'], stats['dropped']) == (2, 1, 1)
+
+    archiver.start()
+    archiver.stop()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'single_1.jpg', 'single_1.txt', 'single_2.jpg', 'single_2.txt'
+    ]
+    assert archiver.get_stats()['written'] == 2
+
+def test_archiver_drop_newest_rejects_submissions_when_full(tmp_path):
+    """drop_newest 策略下队列满时拒绝新图片，不阻塞调用方"""
+    from utils.fall_archiver import FallImageArchiver
+
+    archiver = FallImageArchiver(str(tmp_path), max_queue_size=1, drop_policy=FallImageArchiver.DROP_NEWEST)
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    assert archiver.submit(image, 'first', 'a')
+    assert not archiver.submit(image, 'second', 'b')
+
+    archiver.start()
+    archiver.stop()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['first.jpg', 'first.txt']
+    assert 'Details: a' in (tmp_path / 'first.txt').read_text()
+
+# ---------------------------------------------------------------- 跌倒事件采集
+
+class RecordingArchiver:
+    """记录提交的关键帧元数据的归档写入器"""
+
+    def __init__(self):
+        self.frames = []
+
+    def submit(self, image, basename, details, key=None, metadata=None):
+        self.frames.append((basename, metadata))
+        return True
+
+    def submit_clip(self, frames, basename, fps=10.0):
+        return True
+
+def _fall_frame(capture, stream_id, seed, fall_score, timestamp=None):
+    """送入一帧：目标1跌倒、目标2正常站立，画面为随机噪声（各帧感知哈希不同）"""
+    frame = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    detections = [
+        {'id': 1, 'bbox': [10.0, 40.0, 60.0, 60.0], 'keypoints': standing_pose().tolist()},
+        {'id': 2, 'bbox': [0.0, 0.0, 20.0, 60.0], 'keypoints': standing_pose(x=0.0).tolist()},
+    ]
+    scores = [(True, fall_score, {}), (False, 0.1, {})]
+    return capture.process(stream_id, frame, detections, scores, timestamp=timestamp)
+
+def test_fall_events_close_after_stream_stops_sending_frames():
+    """流停止送帧后，事件由后台线程按时结束并归档峰值帧（含画面中所有目标）"""
+    from utils.fall_events import FallEventCapture
+
+    archiver = RecordingArchiver()
+    capture = FallEventCapture(archiver, end_gap_seconds=0.1)
+    capture.start()
+    try:
+        _fall_frame(capture, 'cam', seed=1, fall_score=0.8)
+        _fall_frame(capture, 'cam', seed=2, fall_score=0.9)
+        assert capture.get_stats()['open_events'] == 1
+        deadline = time.time() + 2.0
+        while capture.get_stats()['open_events'] and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        capture.stop()
+
+    assert capture.get_stats()['events_closed'] == 1
+    assert [metadata['frame'] for _, metadata in archiver.frames] == ['onset', 'peak']
+    for _, metadata in archiver.frames:
+        assert [(obj['track_id'], obj['fall']) for obj in metadata['objects']] == [(1, True), (2, False)]
+
+def test_fall_events_close_expired_without_new_frames():
+    """close_expired 只结束超过结束间隔的事件"""
+    from utils.fall_events import FallEventCapture
+
+    capture = FallEventCapture(RecordingArchiver(), end_gap_seconds=1.5)
+    _fall_frame(capture, 'cam', seed=1, fall_score=0.8, timestamp=100.0)
+
+    assert capture.close_expired(now=101.0) == 0
+    assert capture.close_expired(now=101.6) == 1
+    assert capture.list_events() == []
+
+def test_session_eviction_flushes_open_fall_events():
+    """会话被LRU淘汰或移除时立即结束该路流进行中的事件"""
+    pytest.importorskip('ultralytics')
+    from utils.fall_events import FallEventCapture
+
+    capture = FallEventCapture(RecordingArchiver(), end_gap_seconds=60)
+    session_manager = make_session_manager(max_sessions=1)
+    session_manager.on_evict = capture.flush
+
+    session_manager.get('a')
+    _fall_frame(capture, 'a', seed=1, fall_score=0.8)
+    session_manager.get('b')
+    _fall_frame(capture, 'b', seed=2, fall_score=0.8)
+    assert [event['stream_id'] for event in capture.list_events()] == ['b']
+
+    assert session_manager.remove('b')
+    assert capture.list_events() == []
+
+# ---------------------------------------------------------------- 二进制结果协议
+
+def test_binary_protocol_round_trip():
+    """检测结果（含NumPy数组与中文）与结果图像打包后可原样解析"""
+    from utils.binary_protocol import pack_detection_result, unpack_detection_result
+
+    keypoints = standing_pose()
+    result = {
+        'success': True,
+        'fall_detected': False,
+        'detections': [{'id': 1, 'bbox': np.array([1.5, 2.0, 30.0, 40.0], dtype=np.float32),
+                        'keypoints': keypoints, 'fall_score': np.float32(0.25)}],
+        'error': '无'
+    }
+    image_bytes = b'\xff\xd8jpeg-bytes\xff\xd9'
+
+    data = pack_detection_result(result, image_bytes)
+    decoded, image = unpack_detection_result(data)
+
+    assert image == image_bytes
+    assert decoded['error'] == '无' and decoded['success'] is True
+    detection = decoded['detections'][0]
+    assert detection['bbox'] == [1.5, 2.0, 30.0, 40.0]
+    np.testing.assert_allclose(detection['keypoints'], keypoints)
+    assert detection['fall_score'] == pytest.approx(0.25)
+
+    assert unpack_detection_result(pack_detection_result({'frame_seq': 3})) == ({'frame_seq': 3}, b'')
+    with pytest.raises(ValueError):
+        unpack_detection_result(data[:2])
+
+# ---------------------------------------------------------------- FallDetector
+
+def random_poses(rng, count):
+    """随机姿态：站立、倾斜与躺倒的人，部分关键点缺失"""
+    poses = []
+    for _ in range(count):
+        pose = standing_pose(x=rng.uniform(0, 400), y=rng.uniform(0, 200), scale=rng.uniform(0.5, 2.0))
+        if rng.random() < 0.4:
+            # 绕髋部旋转，模拟倾斜或躺倒
+            angle = np.radians(rng.uniform(20, 90))
+            center = pose[11:13, :2].mean(axis=0)
+            rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+            pose[:, :2] = (pose[:, :2] - center) @ rotation.T + center
+        pose[:, :2] += rng.normal(0, 2, (17, 2))
+        hidden = rng.random(17) < 0.15
+        pose[hidden] = (0.0, 0.0, 0.1)
+        poses.append(pose)
+    return np.stack(poses).astype(np.float32)
+
+def _assert_details_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, float):
+            np.testing.assert_allclose(actual[key], value, rtol=1e-9, atol=1e-12, err_msg=key)
+        else:
+            assert actual[key] == value, key
+
+@pytest.mark.filterwarnings('error::RuntimeWarning')
+def test_fall_scores_vectorized_matches_scalar():
+    """向量化的 calculate_fall_scores 与逐个调用 calculate_fall_score（math实现）结果一致，且不产生除零警告"""
+    pytest.importorskip('ultralytics')
+    from models.fall_detector import FallDetector
+
+    detector = FallDetector()
+    poses = random_poses(np.random.default_rng(0), 200)
+    # 肩髋等高（角度分母为0）与髋踝重合（腿长为0）的退化姿态
+    flat = standing_pose()
+    flat[11:13, 1] = flat[5:7, 1]
+    folded = standing_pose()
+    folded[15:17, :2] = folded[11:13, :2]
+    poses = np.concatenate([poses, flat[None], folded[None]])
+    scores, details_list = detector.calculate_fall_scores(poses)
+
+    for pose, score, details in zip(poses, scores, details_list):
+        expected_score, expected_details = detector.calculate_fall_score(pose)
+        np.testing.assert_allclose(score, expected_score, rtol=1e-9, atol=1e-12)
+        _assert_details_equal(details, expected_details)
+    assert details_list[-2]['body_angle'] == 90.0
+    assert details_list[-1]['body_ratio'] == 0.0
+
+def test_fall_detector_detect_batch_matches_detect(monkeypatch):
+    """detect_batch 与逐个调用 detect 的判断、分数与历史状态一致"""
+    pytest.importorskip('ultralytics')
+    import models.fall_detector as fall_module
+
+    clock = {'now': 0.0}
+
+    class FrameClock:
+        @staticmethod
+        def now():
+            return SimpleNamespace(timestamp=lambda: clock['now'])
+
+    monkeypatch.setattr(fall_module, 'datetime', FrameClock)
+    scalar, batch = fall_module.FallDetector(), fall_module.FallDetector()
+    rng = np.random.default_rng(1)
+    base = random_poses(rng, 4)
+    object_ids = [0, 1, 2, 3]
+
+    for frame in range(20):
+        clock['now'] = frame / 10.0
+        # 每帧在上一帧基础上移动，产生运动分数
+        poses = base.copy()
+        poses[:, :, :2] += frame * rng.uniform(0, 8, (4, 1, 2))
+        expected = [scalar.detect(pose, object_id) for pose, object_id in zip(poses, object_ids)]
+        actual = batch.detect_batch(poses, object_ids, timestamp=clock['now'])
+
+        for (is_fall, score, details), (exp_fall, exp_score, exp_details) in zip(actual, expected):
+            assert is_fall == exp_fall
+            np.testing.assert_allclose(score, exp_score, rtol=1e-9, atol=1e-12)
+            _assert_details_equal(details, exp_details)
+
+def test_fall_detector_scores_lying_pose_above_standing():
+    """躺倒姿态的跌倒分数高于站立姿态，缺失腿部关键点的站立姿态不被判为跌倒"""
+    pytest.importorskip('ultralytics')
+    from models.fall_detector import FallDetector
+
+    standing = standing_pose()
+    lying = standing.copy()
+    lying[:, 0], lying[:, 1] = standing[:, 1] + 100, 400 - standing[:, 0]
+    legs_missing = standing_pose(hide=(13, 14, 15, 16))
+
+    detector = FallDetector()
+    standing_score, _ = detector.calculate_fall_score(standing)
+    lying_score, _ = detector.calculate_fall_score(lying)
+    missing_score, _ = detector.calculate_fall_score(legs_missing)
+    assert lying_score > detector.fall_threshold > standing_score
+    assert missing_score < detector.fall_threshold
+
+# ---------------------------------------------------------------- 多目标跟踪
+
+def _person(box, object_id=0):
+    return {'id': object_id, 'bbox': np.asarray(box, dtype=np.float32),
+            'keypoints': standing_pose(), 'confidence': 0.9}
+
+@pytest.mark.parametrize('matcher', ['greedy', 'hungarian'])
+def test_tracker_keeps_ids_stable_and_expires_lost_tracks(matcher):
+    """移动中的目标保持跟踪ID（与检测顺序无关），消失超过max_age帧后淘汰，新目标不复用旧ID"""
+    pytest.importorskip('ultralytics')
+    from models.tracker import IoUTracker
+
+    tracker = IoUTracker(max_age=2, matcher=matcher)
+    first, _ = tracker.update([_person([0, 0, 50, 100]), _person([200, 0, 250, 100])])
+    ids = [d['id'] for d in first]
+    assert ids == [0, 1]
+
+    # 检测顺序交换且目标有位移，ID跟随目标
+    second, removed = tracker.update([_person([205, 3, 255, 103]), _person([4, 2, 54, 102])])
+    assert [d['id'] for d in second] == [1, 0] and removed == []
+    assert [d['track_id'] for d in second] == [1, 0]
+
+    # 目标1消失：max_age帧内保留轨迹，超过后淘汰
+    for _ in range(2):
+        _, removed = tracker.update([_person([8, 4, 58, 104])])
+        assert removed == []
+    _, removed = tracker.update([_person([10, 5, 60, 105])])
+    assert removed == [1]
+    assert [track['track_id'] for track in tracker.get_tracks()] == [0]
+
+    # 同一位置重新出现的目标得到新ID
+    third, _ = tracker.update([_person([10, 5, 60, 105]), _person([205, 3, 255, 103])])
+    assert [d['id'] for d in third] == [0, 2]
+
+# ---------------------------------------------------------------- 历史环形缓冲
+
+def test_history_buffer_wraps_around_in_time_order():
+    """环形缓冲写满后覆盖最旧记录，窗口读取仍按时间顺序；删除后槽位被复用"""
+    pytest.importorskip('ultralytics')
+    from models.history_buffer import TrackHistoryBuffer
+
+    buffer = TrackHistoryBuffer(history_length=4, initial_capacity=1)
+    for i in range(10):
+        buffer.append(7, score=i / 10, x=i, y=2 * i, timestamp=100 + i)
+
+    assert buffer.length(7) == 4
+    window = buffer.window(7)
+    np.testing.assert_array_equal(window[:, TrackHistoryBuffer.X], [6, 7, 8, 9])
+    np.testing.assert_array_equal(window[:, TrackHistoryBuffer.TIMESTAMP], [106, 107, 108, 109])
+    np.testing.assert_array_equal(buffer.window(7, 2)[:, TrackHistoryBuffer.Y], [16, 18])
+    assert buffer.mean_score(7) == pytest.approx(0.75)
+
+    # 槽位用尽时扩容，已有对象的历史不受影响
+    buffer.append(8, 1.0, 0, 0, 0)
+    assert len(buffer) == 2 and buffer.length(7) == 4 and buffer.length(8) == 1
+    np.testing.assert_array_equal(buffer.window(7)[:, TrackHistoryBuffer.X], [6, 7, 8, 9])
+
+    del buffer[7]
+    assert 7 not in buffer and buffer.window(7).shape == (0, TrackHistoryBuffer.NUM_FIELDS)
+    buffer.append(9, 0.5, 1, 1, 1)
+    assert buffer.length(9) == 1 and buffer.mean_score(9) == pytest.approx(0.5)
+
+# ---------------------------------------------------------------- 离线批量检测
+
+class ArchiveDetector:
+    """离线批量检测用的检测器：每帧一个人，位置由帧内容决定；可在第N次批量推理时模拟中断"""
+
+    def __init__(self, fail_on_call=None):
+        self.fail_on_call = fail_on_call
+        self.calls = 0
+        self.frames = 0
+
+    def detect_batch(self, images):
+        self.calls += 1
+        if self.fail_on_call is not None and self.calls >= self.fail_on_call:
+            raise KeyboardInterrupt
+        self.frames += len(images)
+        results = []
+        for image in images:
+            offset = float(image[0, 0, 0])
+            keypoints = standing_pose(x=offset, y=10, scale=0.3)
+            results.append([{'id': 0, 'bbox': np.array([offset, 10, offset + 40, 110], np.float32),
+                             'confidence': 0.9, 'keypoints': keypoints, 'keypoints_array': keypoints}])
+        return results
+
+def _write_archive(root):
+    """一段12帧的视频与3张单独的图片"""
+    import cv2
+    root.mkdir()
+    writer = cv2.VideoWriter(str(root / 'ward.avi'), cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(12):
+        writer.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    images = root / 'stills'
+    images.mkdir()
+    for i in range(3):
+        cv2.imwrite(str(images / f"still_{i}.jpg"), np.full((48, 64, 3), 50 * i, dtype=np.uint8))
+
+def _frame_keys(path):
+    return list(_frame_records(path))
+
+def _frame_records(path):
+    """{(来源, 帧号): 检测结果}，按写出顺序"""
+    import json
+    with open(path) as f:
+        return {(record['source'], record['frame']): record['detections'] for record in map(json.loads, f)}
+
+def test_batch_process_resumes_from_checkpoint(tmp_path):
+    """
+    中断后重新执行从检查点继续：每帧结果恰好写出一次，已完成的帧不再推理，
+    中断时进行中的视频沿用中断前的跟踪与跌倒历史，结果与不中断时相同
+    """
+    pytest.importorskip('ultralytics')
+    from utils.batch_process import process_archive
+
+    archive = tmp_path / 'archive'
+    _write_archive(archive)
+    kwargs = dict(fall_detector_config={}, tracker_config={}, batch_size=2, workers=1, checkpoint_seconds=0)
+
+    reference = tmp_path / 'reference.jsonl'
+    stats = process_archive(str(archive), str(reference), ArchiveDetector(), **kwargs)
+    expected = sorted(_frame_keys(reference))
+    assert stats['frames'] == len(expected) == 15 and len(set(expected)) == 15
+
+    output = tmp_path / 'results.jsonl'
+    with pytest.raises(KeyboardInterrupt):
+        process_archive(str(archive), str(output), ArchiveDetector(fail_on_call=4), **kwargs)
+    interrupted = _frame_keys(output)
+    assert 0 < len(interrupted) < 15
+
+    detector = ArchiveDetector()
+    stats = process_archive(str(archive), str(output), detector, **kwargs)
+    resumed = _frame_keys(output)
+    assert sorted(resumed) == expected
+    assert _frame_records(output) == _frame_records(reference)
+    assert stats['frames'] == 15
+    assert detector.frames == 15 - len(interrupted)
+
+    # 已完成时再次执行直接返回，不再推理
+    detector = ArchiveDetector()
+    assert process_archive(str(archive), str(output), detector, **kwargs)['frames'] == 15
+    assert detector.calls == 0
+
+# ---------------------------------------------------------------- 多进程服务
+
+def test_serve_routes_by_stream_header_or_query():
+    """主进程按请求头 X-Stream-ID 或查询参数 stream_id 路由，同一流总是分配到同一个worker"""
+    from serve import DEFAULT_ROUTE_KEY, parse_route_key, pick_worker
+
+    assert parse_route_key(b'POST /api/detect_video HTTP/1.1\r\nX-Stream-ID: camera-1\r\n\r\n{"x') == 'camera-1'
+    assert parse_route_key(b'GET /api/stream?render=0&stream_id=web-ab12 HTTP/1.1\r\nHost: a\r\n\r\n') == 'web-ab12'
+    # 只写在请求体中的流ID不参与路由
+    assert parse_route_key(
+        b'POST /api/detect_video HTTP/1.1\r\nHost: a\r\n\r\n{"stream_id": "camera-1"}'
+    ) == DEFAULT_ROUTE_KEY
+
+    workers = {key: pick_worker(key, 4) for key in (f"camera-{i}" for i in range(32))}
+    assert workers == {key: pick_worker(key, 4) for key in workers}
+    assert len(set(workers.values())) > 1
+
+def test_serve_worker_handles_one_request_per_connection():
+    """worker处理完一个请求就关闭连接，同一连接上的下一个请求会重新经主进程路由"""
+    import socket
+    from flask import Flask
+    from werkzeug.serving import make_server
+    from serve import make_request_handler
+
+    app = Flask(__name__)
+    app.add_url_rule('/ping', 'ping', lambda: 'pong')
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=make_request_handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        request = b'GET /ping HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n'
+        with socket.create_connection(('127.0.0.1', server.server_port), timeout=5) as conn:
+            conn.sendall(request * 2)
+            data = b''
+            while True:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+    finally:
+        server.shutdown()
+        thread.join()
+
+    assert data.count(b'HTTP/1.1 200') == 1
+    assert b'Connection: close' in data and data.endswith(b'pong')
+
+class ExportingYOLO:
+    """模拟ultralytics.YOLO的导出：分块写入导出文件，记录导出与加载次数"""
+
+    exports = 0
+    loads = []
+
+    def __init__(self, path, task=None):
+        self.path = str(path)
+        ExportingYOLO.loads.append(self.path)
+
+    def export(self, format, imgsz, dynamic):
+        import time
+        ExportingYOLO.exports += 1
+        target = Path(self.path).with_suffix('.onnx')
+        with open(target, 'wb') as f:
+            for _ in range(5):
+                f.write(b'\0' * 1024)
+                f.flush()
+                time.sleep(0.01)
+        return str(target)
+
+def _patch_exporter(monkeypatch, tmp_path):
+    import importlib.util
+    import models.yolo_detector as yolo_module
+
+    ExportingYOLO.exports, ExportingYOLO.loads = 0, []
+    monkeypatch.setattr(yolo_module, 'YOLO', ExportingYOLO)
+    real_find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util, 'find_spec',
+        lambda name, *args: object() if name == 'onnxruntime' else real_find_spec(name, *args)
+    )
+    weights = tmp_path / 'pose.pt'
+    weights.write_bytes(b'weights')
+    return yolo_module, weights
+
+def test_concurrent_workers_export_the_model_once(tmp_path, monkeypatch):
+    """多个进程/线程同时加载onnx后端时只导出一次，其余等待后使用完整的缓存文件"""
+    pytest.importorskip('ultralytics')
+    yolo_module, weights = _patch_exporter(monkeypatch, tmp_path)
+
+    paths = []
+    threads = [
+        threading.Thread(target=lambda: paths.append(
+            yolo_module.YOLODetector(str(weights), backend='onnx').runtime_model_path))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    export_path = tmp_path / 'pose.onnx'
+    assert paths == [str(export_path)] * 4
+    assert ExportingYOLO.exports == 1
+    assert export_path.stat().st_size == 5 * 1024
+
+def test_prepare_only_exports_without_loading_the_model(tmp_path, monkeypatch):
+    """fork前的准备步骤只导出模型文件，不创建推理会话；之后加载直接使用缓存"""
+    pytest.importorskip('ultralytics')
+    yolo_module, weights = _patch_exporter(monkeypatch, tmp_path)
+
+    prepared = yolo_module.YOLODetector(str(weights), backend='onnx', prepare_only=True)
+    assert prepared.model is None
+    assert ExportingYOLO.exports == 1
+    assert ExportingYOLO.loads == [str(weights)]
+
+    detector = yolo_module.YOLODetector(str(weights), backend='onnx')
+    assert ExportingYOLO.exports == 1
+    assert ExportingYOLO.loads[-1] == str(tmp_path / 'pose.onnx')
+    assert detector.model is not None
+
+def test_onnx_export_is_cached_until_the_weights_change(tmp_path, monkeypatch):
+    """导出模型缓存在权重旁边，权重文件变化后重新导出"""
+    import os
+    pytest.importorskip('ultralytics')
+    yolo_module, weights = _patch_exporter(monkeypatch, tmp_path)
+
+    yolo_module.YOLODetector(str(weights), backend='onnx')
+    yolo_module.YOLODetector(str(weights), backend='onnx')
+    assert ExportingYOLO.exports == 1
+
+    weights.write_bytes(b'retrained weights')
+    os.utime(weights, (1, 1))
+    detector = yolo_module.YOLODetector(str(weights), backend='onnx')
+    assert ExportingYOLO.exports == 2
+    assert detector.backend == 'onnx' and detector.runtime_model_path == str(tmp_path / 'pose.onnx')
+
+def test_missing_runtime_falls_back_to_pytorch(tmp_path, monkeypatch):
+    """所选后端的运行时未安装时回退到PyTorch模型，不导出"""
+    import importlib.util
+    pytest.importorskip('ultralytics')
+    yolo_module, weights = _patch_exporter(monkeypatch, tmp_path)
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name, *args: None)
+
+    detector = yolo_module.YOLODetector(str(weights), backend='openvino')
+
+    assert detector.backend == 'pytorch' and detector.runtime_model_path == str(weights)
+    assert ExportingYOLO.exports == 0 and ExportingYOLO.loads == [str(weights)]
+
+# ---------------------------------------------------------------- INT8量化
+
+def test_int8_evaluation_excludes_calibration_images(tmp_path, monkeypatch):
+    """量化记录实际使用的校准图片，评估集从其余图片中抽取；校准集不变时复用缓存的INT8模型"""
+    import cv2
+    pytest.importorskip('ultralytics')
+    import models.quantization as quantization
+    yolo_module, weights = _patch_exporter(monkeypatch, tmp_path)
+
+    calibrations = []
+
+    def fake_quantize(fp32_path, int8_path, image_paths, imgsz=640):
+        calibrations.append(list(image_paths))
+        Path(int8_path).write_bytes(b'int8')
+
+    monkeypatch.setattr(quantization, 'quantize_onnx_model', fake_quantize)
+    data = tmp_path / 'fall_training_data' / 'labeled'
+    data.mkdir(parents=True)
+    for i in range(10):
+        cv2.imwrite(str(data / f"fall_{i}.jpg"), np.full((8, 8, 3), i, dtype=np.uint8))
+
+    kwargs = dict(backend='onnx', precision='int8', calibration_dir=str(data.parent), calibration_size=4)
+    detector = yolo_module.YOLODetector(str(weights), **kwargs)
+    assert detector.precision == 'int8' and len(detector.calibration_images) == 4
+
+    evaluation = quantization.find_calibration_images(
+        str(data.parent), 100, seed=1, exclude=detector.calibration_images
+    )
+    assert len(evaluation) == 6
+    assert not {str(Path(path).resolve()) for path in evaluation} & set(detector.calibration_images)
+
+    again = yolo_module.YOLODetector(str(weights), **kwargs)
+    assert len(calibrations) == 1
+    assert again.calibration_images == detector.calibration_images
+
+def test_compare_models_reports_drift_and_fall_agreement(tmp_path):
+    """对比报告统计漏检、关键点漂移（按边界框对角线归一化）与跌倒判定一致性"""
+    import cv2
+    pytest.importorskip('ultralytics')
+    from models.quantization import compare_models
+
+    class FixedDetector:
+        def __init__(self, people):
+            self.people = people
+
+        def detect(self, image):
+            return [dict(person) for person in self.people]
+
+    pose = standing_pose()
+    person = {'bbox': [100.0, 50.0, 200.0, 330.0], 'keypoints': pose}
+    shifted = {'bbox': [100.0, 50.0, 200.0, 330.0], 'keypoints': pose + np.array([3.0, 4.0, 0.0])}
+    other = {'bbox': [400.0, 50.0, 500.0, 330.0], 'keypoints': standing_pose(x=400.0)}
+    image_path = tmp_path / 'frame.jpg'
+    cv2.imwrite(str(image_path), np.zeros((480, 640, 3), dtype=np.uint8))
+
+    report = compare_models(FixedDetector([person, other]), FixedDetector([shifted]), [str(image_path)] * 2)
+
+    assert report['images'] == 2
+    assert report['detections']['recall_vs_reference'] == 0.5
+    assert report['fall_decision']['agreement'] == 1.0
+    np.testing.assert_allclose(report['keypoint_drift']['max'], 5.0 / np.hypot(100.0, 280.0))
+
+# ---------------------------------------------------------------- 检测接口
+
+class SceneDetector:
+    """每帧检测到一个站立的人（位置由帧左上角像素决定），记录推理次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self.draws = 0
+
+    def detect(self, image, regions=None):
+        self.calls += 1
+        offset = float(image[0, 0, 0])
+        keypoints = standing_pose(x=offset, y=10)
+        return [{'id': 0, 'bbox': np.array([offset, 10, offset + 100, 330], np.float32),
+                 'confidence': 0.9, 'keypoints': keypoints, 'keypoints_array': keypoints}]
+
+    def draw_detections(self, image, detections, is_fall_list, fall_scores, out=None):
+        self.draws += 1
+        return image if out is None else out
+
+def init_detection_api(monkeypatch, detector, session_manager=None, **kwargs):
+    """用给定的检测器初始化检测接口模块，测试结束后恢复其全局状态"""
+    pytest.importorskip('ultralytics')
+    import api.detection as detection
+    from models.fall_detector import FallDetector
+
+    for name in ('yolo_detector', 'fall_detector', 'batch_engine', 'session_manager', 'archiver',
+                 'event_capture', 'dataset_index', 'frame_pool', 'frame_skip_default'):
+        monkeypatch.setattr(detection, name, getattr(detection, name))
+    detection.init_detectors(detector, FallDetector(), session_mgr=session_manager, **kwargs)
+    return detection
+
+def detection_client(detection):
+    """挂载检测蓝图的测试客户端"""
+    from flask import Flask
+    app = Flask(__name__)
+    app.register_blueprint(detection.detection_bp, url_prefix='/api')
+    return app.test_client()
+
+def _frame_data_url(frame):
+    import base64
+    import cv2
+    return 'data:image/jpeg;base64,' + base64.b64encode(cv2.imencode('.jpg', frame)[1].tobytes()).decode()
+
+def make_session_manager(**kwargs):
+    pytest.importorskip('ultralytics')
+    from models.fall_detector import FallDetector
+    from models.frame_scheduler import FrameScheduler
+    from models.stream_session import StreamSessionManager
+    from models.tracker import IoUTracker
+    return StreamSessionManager(
+        FallDetector, tracker_factory=IoUTracker,
+        scheduler_factory=lambda: FrameScheduler(max_skip_frames=10, max_skip_seconds=60), **kwargs
+    )
+
+def test_frame_scheduler_reuses_static_frames_until_limits():
+    """静止画面复用结果直到达到最大跳帧数；画面变化或跌倒分数上升时立即推理"""
+    pytest.importorskip('ultralytics')
+    from models.frame_scheduler import FrameScheduler
+
+    scheduler = FrameScheduler(max_skip_frames=2, max_skip_seconds=60, alert_hold_frames=2)
+    frame = np.full((72, 128, 3), 40, dtype=np.uint8)
+    moved = frame.copy()
+    moved[:, :64] = 200
+
+    def step(image, score=0.0):
+        keyframe, thumbnail, reason = scheduler.schedule(image)
+        if keyframe:
+            scheduler.update(image.shape, thumbnail, [{'id': 0}], [(False, score, {})])
+        return reason
+
+    assert [step(frame) for _ in range(4)] == ['first_frame', 'static', 'static', 'max_skip_frames']
+    assert step(moved) == 'motion'
+    assert [step(moved) for _ in range(2)] == ['static', 'static']
+    # 跌倒分数上升进入警戒状态，之后逐帧推理 alert_hold_frames 帧
+    assert step(moved, score=0.3) == 'max_skip_frames'
+    assert [step(moved, score=0.3) for _ in range(3)] == ['alert', 'alert', 'static']
+
+def test_video_frames_are_not_reused_unless_requested(monkeypatch):
+    """默认逐帧推理；请求开启 frame_skip 后静止帧复用上一关键帧的结果并标记 reused"""
+    detector = SceneDetector()
+    detection = init_detection_api(monkeypatch, detector, make_session_manager())
+    frame = np.full((480, 640, 3), 30, dtype=np.uint8)
+
+    responses = [detection.analyze_frame(frame, render=False, stream_id='cam')[0] for _ in range(3)]
+    assert detector.calls == 3
+    assert [r['reused'] for r in responses] == [False, False, False]
+    assert all('schedule_reason' not in r for r in responses)
+
+    responses = [
+        detection.analyze_frame(frame, render=False, stream_id='cam', frame_skip=True)[0] for _ in range(3)
+    ]
+    assert detector.calls == 4
+    assert [r['reused'] for r in responses] == [False, True, True]
+    assert [r['schedule_reason'] for r in responses] == ['first_frame', 'static', 'static']
+    assert responses[2]['detections'] == responses[0]['detections']
+
+    # 服务默认开启时，请求仍可关闭
+    detection = init_detection_api(
+        monkeypatch, detector, make_session_manager(), frame_skip_enabled=True
+    )
+    detection.analyze_frame(frame, render=False, stream_id='cam')
+    response, _ = detection.analyze_frame(frame, render=False, stream_id='cam')
+    assert response['reused'] is True
+    response, _ = detection.analyze_frame(frame, render=False, stream_id='cam', frame_skip=False)
+    assert response['reused'] is False
+
+def test_results_only_mode_skips_drawing_and_encoding(monkeypatch):
+    """render=false 时只返回边界框、关键点与跌倒分数，不绘制、不返回结果帧"""
+    detector = SceneDetector()
+    detection = init_detection_api(monkeypatch, detector, make_session_manager())
+    client = detection_client(detection)
+    frame = _frame_data_url(np.full((480, 640, 3), 30, dtype=np.uint8))
+
+    body = client.post('/api/detect_video', json={'frame': frame, 'render': False, 'stream_id': 'cam'}).get_json()
+    assert body['success'] and 'result_frame' not in body
+    assert detector.draws == 0
+    detected = body['detections'][0]
+    assert len(detected['bbox']) == 4 and np.asarray(detected['keypoints']).shape == (17, 3)
+    assert 'fall_score' in detected
+
+    body = client.post('/api/detect_video', json={'frame': frame, 'stream_id': 'cam'}).get_json()
+    assert body['result_frame'].startswith('data:image/jpeg;base64,')
+    assert detector.draws == 1 and 'keypoints' not in body['detections'][0]
+
+def test_session_manager_isolates_streams_and_caps_sessions():
+    """每路流独立的跌倒检测状态；超过上限按LRU淘汰，空闲超时的会话被淘汰"""
+    session_manager = make_session_manager(max_sessions=2, ttl_seconds=60)
+
+    a, b = session_manager.get('a'), session_manager.get('b')
+    assert a.fall_detector is not b.fall_detector and a.tracker is not b.tracker
+    assert session_manager.get('a') is a
+    session_manager.get('c')
+    assert [s.stream_id for s in session_manager.get_sessions()] == ['a', 'c']
+
+    session_manager.get_sessions()[0].last_access -= 120
+    assert session_manager.evict_idle() == 1
+    assert session_manager.find('a') is None
+    assert session_manager.get_stats()['evicted_sessions'] == 2
+
+def test_reset_unknown_stream_returns_404_without_creating_session(monkeypatch):
+    """重置不存在的流返回404，且不会创建会话"""
+    session_manager = make_session_manager()
+    detection = init_detection_api(monkeypatch, SceneDetector(), session_manager)
+    client = detection_client(detection)
+
+    response = client.post('/api/reset', json={}, headers={'X-Stream-ID': 'cam'})
+    assert response.status_code == 404
+    assert session_manager.get_sessions() == []
+
+    detection.analyze_frame(np.full((480, 640, 3), 30, dtype=np.uint8), render=False, stream_id='cam')
+    response = client.post('/api/reset', json={}, headers={'X-Stream-ID': 'cam'})
+    assert response.status_code == 200
+    assert len(session_manager.find('cam').fall_detector.history) == 0
+
+def test_images_and_video_frames_use_separate_default_streams(monkeypatch):
+    """未指定流ID时，单张图片与视频帧使用不同的默认流"""
+    session_manager = make_session_manager()
+    detection = init_detection_api(monkeypatch, SceneDetector(), session_manager)
+    image = np.full((480, 640, 3), 30, dtype=np.uint8)
+
+    image_response, _ = detection.analyze_image(image, render=False)
+    frame_response, _ = detection.analyze_frame(image, render=False)
+
+    assert image_response['stream_id'] != frame_response['stream_id']
+    assert len(session_manager.find(frame_response['stream_id']).fall_detector.history) == 1
+
+# ---------------------------------------------------------------- 性能剖析
+
+def make_profiled_app(monkeypatch, request_profiler, **kwargs):
+    """带剖析蓝图与一个可被剖析的 detection.detect_image 接口的应用"""
+    pytest.importorskip('ultralytics')
+    from flask import Blueprint, Flask
+    import api.profile as profile
+
+    for name in ('profiler', 'control_allowed', 'control_token'):
+        monkeypatch.setattr(profile, name, getattr(profile, name))
+    profile.init_profiler(request_profiler, **kwargs)
+
+    detection_bp = Blueprint('detection', __name__)
+    detection_bp.add_url_rule('/detect_image', 'detect_image', lambda: {'success': True}, methods=['POST'])
+    app = Flask(__name__)
+    app.register_blueprint(detection_bp, url_prefix='/api')
+    app.register_blueprint(profile.profile_bp, url_prefix='/api')
+    return app.test_client()
+
+def test_profile_control_requires_token_when_configured(tmp_path, monkeypatch):
+    """配置令牌后，开启采集与 X-Profile 请求头都须携带 X-Profile-Token"""
+    from utils.profiler import RequestProfiler
+
+    client = make_profiled_app(monkeypatch, RequestProfiler(str(tmp_path)), token='secret')
+    token = {'X-Profile-Token': 'secret'}
+
+    assert client.post('/api/profile', json={'requests': 1}).status_code == 401
+    assert client.post('/api/profile', json={'requests': 1}, headers=token).status_code == 200
+    response = client.post('/api/detect_image')
+    assert (tmp_path / f"{response.headers['X-Profile-Id']}.json").exists()
+
+    assert 'X-Profile-Id' not in client.post('/api/detect_image', headers={'X-Profile': '1'}).headers
+    response = client.post('/api/detect_image', headers={'X-Profile': '1', **token})
+    assert 'X-Profile-Id' in response.headers
+
+def test_profile_control_can_be_disabled(tmp_path, monkeypatch):
+    """禁止开启采集时接口返回403，X-Profile 请求头被忽略"""
+    from utils.profiler import RequestProfiler
+
+    client = make_profiled_app(monkeypatch, RequestProfiler(str(tmp_path)), control_enabled=False)
+
+    assert client.post('/api/profile', json={'requests': 1}).status_code == 403
+    assert 'X-Profile-Id' not in client.post('/api/detect_image', headers={'X-Profile': '1'}).headers
+    assert list(tmp_path.iterdir()) == []
+
+def test_cprofile_falls_back_to_sampling_while_batch_thread_runs(tmp_path):
+    """批处理推理线程运行时 cprofile 改用采样模式，推理线程的耗时才能计入"""
+    from utils.profiler import RequestProfiler
+
+    profiler = RequestProfiler(str(tmp_path))
+    session = profiler.start('cprofile')
+    assert session.mode == 'cprofile'
+    profiler.finish(session, 'test')
+
+    stop = threading.Event()
+    helper = threading.Thread(target=stop.wait, name='batch-inference', daemon=True)
+    helper.start()
+    try:
+        session = profiler.start('cprofile')
+        summary = profiler.finish(session, 'test')
+    finally:
+        stop.set()
+        helper.join()
+
+    assert summary['mode'] == 'sample'
+    assert 'batch-inference' in session.sampler.thread_ids.values()
+
+# ---------------------------------------------------------------- 运行指标
+
+def test_histogram_renders_cumulative_buckets():
+    """桶计数按上界累积，边界值计入该桶，超出最大上界的只计入+Inf"""
+    from utils.metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_latency_seconds', '测试', ['stage'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, stage='a"b')
+    registry.add_collector(lambda: [('test_queue_depth', 'gauge', '队列深度', [({'queue': 'q'}, 3)])])
+
+    lines = registry.render().splitlines()
+    assert '# TYPE test_latency_seconds histogram' in lines
+    assert 'test_latency_seconds_bucket{stage="a\\"b",le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{stage="a\\"b",le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{stage="a\\"b",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_sum{stage="a\\"b"} 2.65' in lines
+    assert 'test_latency_seconds_count{stage="a\\"b"} 4' in lines
+    assert 'test_queue_depth{queue="q"} 3' in lines
+
+def test_timed_records_nothing_when_metrics_disabled(monkeypatch):
+    from utils import metrics
+
+    monkeypatch.setattr(metrics.registry, 'enabled', False)
+    with metrics.timed('test-disabled'):
+        pass
+    assert ('test-disabled',) not in metrics.STAGE_LATENCY._values
+
+    monkeypatch.setattr(metrics.registry, 'enabled', True)
+    with pytest.raises(ValueError):
+        with metrics.timed('test-enabled'):
+            raise ValueError
+    assert metrics.STAGE_LATENCY._values[('test-enabled',)][-1] > 0
+
+def metrics_client(enabled=True):
+    from flask import Flask
+    from api.metrics import metrics_bp
+    from api.health import health_bp
+    app = Flask(__name__)
+    app.config['METRICS_ENABLED'] = enabled
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(health_bp, url_prefix='/api')
+    return app.test_client()
+
+def test_metrics_endpoint_exports_stage_latency_and_stream_counters(monkeypatch):
+    """检测过的帧计入阶段耗时直方图与该路流的帧计数"""
+    detection = init_detection_api(monkeypatch, SceneDetector(), make_session_manager())
+    response, _ = detection.analyze_frame(np.full((360, 640, 3), 40, np.uint8), stream_id='cam-metrics', render=False)
+    assert response['success']
+
+    result = metrics_client().get('/api/metrics')
+    assert result.status_code == 200
+    assert result.content_type.startswith('text/plain; version=0.0.4')
+    lines = result.get_data(as_text=True).splitlines()
+    assert any(line.startswith('fall_stage_latency_seconds_count{stage="detect"}') for line in lines)
+    assert any(line.startswith('fall_stage_latency_seconds_count{stage="score"}') for line in lines)
+    assert 'fall_stream_frames_total{stream_id="cam-metrics"} 1' in lines
+
+    assert metrics_client(enabled=False).get('/api/metrics').status_code == 404
+
+def test_status_samples_cpu_without_blocking(monkeypatch):
+    """状态接口只读取上次调用以来的CPU占用，不阻塞采样"""
+    pytest.importorskip('ultralytics')
+    import psutil
+
+    intervals = []
+    monkeypatch.setattr(psutil, 'cpu_percent', lambda interval=None: intervals.append(interval) or 12.5)
+    result = metrics_client().get('/api/status')
+
+    assert result.status_code == 200
+    assert result.get_json()['system']['cpu_percent'] == 12.5
+    assert intervals == [None]
+
+# ---------------------------------------------------------------- 性能基准
+
+def test_summarize_latencies_reports_percentiles_in_ms():
+    from utils.benchmark import summarize_latencies
+
+    summary = summarize_latencies([i / 1000 for i in range(1, 101)], elapsed=2.0, items=100)
+    assert summary['calls'] == 100
+    assert summary['throughput'] == 50.0
+    assert summary['p50_ms'] == pytest.approx(50.5)
+    assert summary['p95_ms'] == pytest.approx(95.05)
+    assert summary['p99_ms'] == pytest.approx(99.01)
+    assert summary['max_ms'] == pytest.approx(100.0)
+    assert summary['peak_rss_mb'] > 0
+
+    empty = summarize_latencies([], elapsed=0.0, items=0)
+    assert empty['throughput'] == 0.0 and empty['p95_ms'] == 0.0
+
+def test_compare_reports_flags_only_regressions_beyond_tolerance():
+    """p95延迟升高或吞吐量下降超过容差才算退化；基线中没有的场景不比较"""
+    from utils.benchmark import compare_reports
+
+    baseline = {'scenarios': {
+        'stage.detect': {'p95_ms': 10.0, 'throughput': 100.0},
+        'stage.draw': {'p95_ms': 2.0, 'throughput': 500.0}
+    }}
+    report = {'scenarios': {
+        'stage.detect': {'p95_ms': 12.0, 'throughput': 80.0},
+        'stage.draw': {'p95_ms': 1.0, 'throughput': 460.0},
+        'e2e.detect_video': {'p95_ms': 50.0, 'throughput': 20.0}
+    }}
+
+    regressions = compare_reports(report, baseline, tolerance=0.15)
+    assert [(item['scenario'], item['metric']) for item in regressions] == [
+        ('stage.detect', 'p95_ms'), ('stage.detect', 'throughput')
+    ]
+    assert regressions[0]['change'] == pytest.approx(0.2)
+    assert compare_reports(report, baseline, tolerance=0.25) == []
+
+def test_synthetic_sequence_is_reproducible_and_falls_midway():
+    from utils.benchmark import synthetic_sequence
+
+    first = synthetic_sequence(frames=12, persons=3, width=320, height=240, seed=7)
+    second = synthetic_sequence(frames=12, persons=3, width=320, height=240, seed=7)
+    for (frame_a, detections_a), (frame_b, detections_b) in zip(first, second):
+        assert np.array_equal(frame_a, frame_b)
+        for a, b in zip(detections_a, detections_b):
+            assert np.array_equal(a['keypoints'], b['keypoints'])
+    assert not np.array_equal(first[0][0], synthetic_sequence(frames=1, persons=3, width=320, height=240, seed=8)[0][0])
+
+    def aspect(detection):
+        x1, y1, x2, y2 = detection['bbox']
+        return (x2 - x1) / (y2 - y1)
+
+    # 第一个人在序列中段开始跌倒，结束时处于躺倒姿态；其他人保持站立
+    assert aspect(first[0][1][0]) < 1 < aspect(first[-1][1][0])
+    assert aspect(first[-1][1][1]) < 1
+
+def test_stage_benchmarks_time_every_stage():
+    pytest.importorskip('ultralytics')
+    from utils.benchmark import run_stage_benchmarks, synthetic_sequence
+
+    detector = SceneDetector()
+    sequence = synthetic_sequence(frames=4, persons=2, width=320, height=240)
+    results = run_stage_benchmarks(detector, {}, {}, [], sequence, batch_size=1, warmup=1)
+
+    assert set(results) == {
+        'stage.decode', 'stage.resize', 'stage.detect', 'stage.track_score',
+        'stage.draw', 'stage.encode', 'stage.serialize'
+    }
+    assert all(result['calls'] == 4 for result in results.values())
+    assert detector.calls == 5 and detector.draws == 5
+
+# ---------------------------------------------------------------- 结果帧缓冲
+
+def test_frame_pool_reuses_released_buffers_by_shape():
+    from utils.frame_pool import FrameBufferPool
+
+    pool = FrameBufferPool(max_free_per_shape=1)
+    frame = np.zeros((4, 6, 3), np.uint8)
+    buffer = pool.acquire(frame)
+    assert buffer.shape == frame.shape and buffer is not frame
+    assert pool.get_stats()['leased'] == 1
+
+    assert pool.release(buffer)
+    assert not pool.release(buffer)  # 重复归还被忽略
+    assert not pool.release(frame)  # 不是池中借出的数组
+    assert pool.acquire(frame) is buffer
+    assert pool.acquire(np.zeros((2, 2, 3), np.uint8)).shape == (2, 2, 3)
+
+    copy = pool.copy(np.full((4, 6, 3), 7, np.uint8))
+    assert (copy == 7).all()
+    pool.release(buffer)
+    pool.release(copy)  # 超过每种尺寸的空闲上限，不再保留
+    stats = pool.get_stats()
+    assert stats['free_buffers'] == 1 and stats['allocated'] == 3 and stats['reused'] == 1
+
+def test_frame_pool_trims_free_buffers_to_byte_limit():
+    from utils.frame_pool import FrameBufferPool
+
+    small, large = np.zeros((10, 10, 3), np.uint8), np.zeros((20, 20, 3), np.uint8)
+    pool = FrameBufferPool(max_bytes=large.nbytes)
+    buffers = [pool.acquire(small), pool.acquire(large)]
+    for buffer in buffers:
+        pool.release(buffer)
+
+    # 超出字节上限时释放最久未使用尺寸的缓冲
+    stats = pool.get_stats()
+    assert stats['free_buffers'] == 1
+    assert stats['free_mb'] * 1024 * 1024 == large.nbytes
+    assert pool.acquire(large) is buffers[1]
+
+def test_render_draws_in_place_unless_frame_is_retained(monkeypatch):
+    """帧不再被引用时直接在帧上绘制；仍被引用时在借出的缓冲上绘制，编码后归还"""
+    from utils.frame_pool import FrameBufferPool
+
+    pool = FrameBufferPool()
+    detector = make_yolo_detector(None)
+    detection = init_detection_api(monkeypatch, detector, frame_buffer_pool=pool)
+    person = SceneDetector().detect(np.zeros((1, 1, 3), np.uint8))
+
+    frame = np.zeros((360, 640, 3), np.uint8)
+    result = detection.render_detections(frame, person, [False], [0.1])
+    assert result is frame and frame.any()
+
+    frame = np.zeros((360, 640, 3), np.uint8)
+    result = detection.render_detections(frame, person, [True], [0.9], retained=True, watermark=True)
+    assert result is not frame and result.any()
+    assert not frame.any()
+    assert pool.get_stats()['leased'] == 1
+
+    assert detection.encode_result_image(result)[:2] == b'\xff\xd8'
+    assert pool.get_stats()['leased'] == 0
+    assert detection.render_detections(frame, person, [False], [0.1], retained=True) is result
+
+# ---------------------------------------------------------------- 文字贴图
+
+def _draw_text_directly(image, text, x, y, font_scale, thickness, text_color, bg_color, bg_padding, line_type):
+    """改用贴图之前的绘制方式：cv2.rectangle 背景框 + cv2.putText"""
+    import cv2
+    (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    left, top, right, bottom = bg_padding
+    cv2.rectangle(image, (x - left, y - text_height - top), (x + text_width + right, y + bottom), bg_color, -1)
+    cv2.putText(image, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, thickness, line_type)
+
+@pytest.mark.parametrize('style', [
+    ('ID:3 FALL 0.87', 0.6, 2, (255, 255, 255), (0, 0, 255), (0, 5, 0, 5), 0),
+    ('Fall Detection System', 0.5, 1, (255, 255, 255), (0, 0, 0), (5, 5, 5, 5), 1),
+    ('jpg Qy', 0.8, 2, (255, 255, 255), (0, 255, 0), (0, 0, 0, 0), 1),  # 下伸部分超出背景框，贴图半透明
+])
+@pytest.mark.parametrize('origin', [(20, 60), (-15, 8), (150, 118), (500, 500)])
+def test_text_sprite_matches_direct_drawing_and_clips_at_edges(style, origin):
+    import cv2
+    from utils.overlay import blend_sprite, get_text_sprite
+
+    style = style[:-1] + ((cv2.LINE_8, cv2.LINE_AA)[style[-1]],)
+    image = np.random.default_rng(0).integers(0, 256, (120, 200, 3), dtype=np.uint8)
+    expected = image.copy()
+    _draw_text_directly(expected, style[0], *origin, *style[1:])
+
+    assert blend_sprite(image, get_text_sprite(*style), *origin) is image
+    np.testing.assert_array_equal(image, expected)
+
+def test_text_sprites_are_cached_and_read_only():
+    from utils.overlay import get_text_sprite
+
+    sprite = get_text_sprite('ID:1 0.42', 0.6, 2, (255, 255, 255), (0, 255, 0), (0, 5, 0, 5))
+    assert get_text_sprite('ID:1 0.42', 0.6, 2, (255, 255, 255), (0, 255, 0), (0, 5, 0, 5)) is sprite
+    assert get_text_sprite('ID:1 0.42', 0.6, 2, (255, 255, 255), (0, 0, 255), (0, 5, 0, 5)) is not sprite
+    assert sprite.opaque
+    with pytest.raises(ValueError):
+        sprite.color[0, 0] = 0